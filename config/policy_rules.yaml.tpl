@@ -0,0 +1,29 @@
+# ポリシーファイルが存在する場合、組み込みのグローバルアクセス判定の代わりに使用されます。
+# 組み込みの判定を維持したい場合は global-ingress を残してください。
+- name: global-ingress
+  description: "インターネットに公開されたインバウンドルール"
+  match:
+    cidr:
+      global: true
+- name: ssh-open-to-world
+  description: "SSHがインターネットに公開されている"
+  match:
+    all:
+      - protocol: tcp
+      - port: 22
+      - cidr:
+          global: true
+- name: prod-wide-ipv6
+  description: "本番環境で広いIPv6範囲を許可している"
+  match:
+    all:
+      - tag:
+          key: Environment
+          value: prod
+      - cidr:
+          ipv6: true
+          max_prefix: 32
+      - not:
+          port_range:
+            from: 443
+            to: 443
@@ -0,0 +1,238 @@
+"""
+asyncioベースのスキャンエンジン
+
+スレッドプール版（find_globally_accessible_security_groups）と同じ検出結果を、
+1つのイベントループ上でセマフォにより同時API呼び出し数を制限しながら取得する。
+aiobotocore が必要（pip install aiobotocore）。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from src.metrics import record_api_error
+from src.utils import (
+    ExclusionIndex,
+    ScanReport,
+    compact_security_group,
+    compile_exclusion_rules,
+    evaluate_security_group,
+    get_all_regions,
+)
+
+try:
+    from aiobotocore.session import get_session
+
+    AIOBOTOCORE_AVAILABLE = True
+except ImportError:
+    AIOBOTOCORE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+async def _scan_region_async(
+    session: Any,
+    region: str,
+    exclusion_rules: Any,
+    config: Any | None,
+    policies: list[Any] | None,
+    semaphore: asyncio.Semaphore,
+    found: list[dict[str, str]],
+    pages_fetched: dict[str, int] | None = None,
+    region_deadline: float = 0.0,
+) -> list[dict[str, str]]:
+    """1リージョンのセキュリティグループをページ単位で取得して評価する内部関数
+
+    Note:
+        セマフォはページ取得ごとに確保するため、多数のリージョンが公平に進行する。
+        region_deadline はセマフォを最初に確保した時点（リージョンの取得開始）から計測し
+        （以降のページ取得でのセマフォの待機は含む）、超えた場合は TimeoutError を送出する。期限切れで打ち切られた場合も、それまでの
+        検出結果は found に、取得済みページ数は pages_fetched[region] に残る。
+        APIエラーはスレッドプール版（get_security_groups）と同じく記録して取得を終え、
+        それまでの検出結果を返す。
+    """
+    loop = asyncio.get_running_loop()
+    aws_config = config.get_aws_config() if config is not None else None
+    try:
+        async with (
+            asyncio.timeout(None) as deadline,
+            session.create_client("ec2", region_name=region, config=aws_config) as client,
+        ):
+            paginator = client.get_paginator("describe_security_groups")
+            pages = paginator.paginate().__aiter__()
+            while True:
+                async with semaphore:
+                    if region_deadline > 0 and deadline.when() is None:
+                        # セマフォの待機中は期限に含めない
+                        deadline.reschedule(loop.time() + region_deadline)
+                    try:
+                        page = await pages.__anext__()
+                    except StopAsyncIteration:
+                        break
+                if pages_fetched is not None:
+                    pages_fetched[region] = pages_fetched.get(region, 0) + 1
+                groups = [compact_security_group(sg) for sg in page["SecurityGroups"]]
+                has_next = bool(page.get("NextToken"))
+                del page
+                for sg in groups:
+                    group_info = evaluate_security_group(sg, region, exclusion_rules, policies)
+                    if group_info is not None:
+                        found.append(group_info)
+                if not has_next:
+                    # 最後のページの後はセマフォを待たずに終える
+                    break
+    except (BotoCoreError, ClientError) as e:
+        logger.error("リージョン %s でのセキュリティグループ取得エラー: %s", region, e)
+        record_api_error(region, "describe_security_groups", e)
+    return found
+
+
+async def find_globally_accessible_security_groups_async(
+    exclusion_rules: list[dict[str, Any]] | ExclusionIndex,
+    config: Any | None = None,
+    policies: list[Any] | None = None,
+    report: ScanReport | None = None,
+    checkpoint: Any | None = None,
+    session: Any | None = None,
+) -> list[dict[str, str]]:
+    """全リージョンのスキャンを1つのイベントループで実行する
+
+    Args:
+        exclusion_rules: 除外ルールのリストまたは索引
+        config: アプリケーション設定
+        policies: コンパイル済みポリシーのリスト
+        report: リージョンごとの完了状況を記録するオブジェクト
+        checkpoint: チェックポイント
+        session: aiobotocoreのセッション（省略時は新規作成）
+
+    Returns:
+        list[dict[str, str]]: 検出結果（スレッドプール版と同じ形式）
+
+    Raises:
+        RuntimeError: aiobotocoreが利用できない場合
+
+    Note:
+        scan_deadline / region_deadline に対応する。hedge_retry と fetch_mode: rules は対象外。
+        region_deadline はセマフォの待機を含めず、リージョンの取得開始から計測する。
+        APIエラーはスレッドプール版と同じく記録してリージョンを完了として扱い、
+        それ以外の例外が発生したリージョンはエラー（failed）とする。
+    """
+    if session is None:
+        if not AIOBOTOCORE_AVAILABLE:
+            raise RuntimeError(
+                "aiobotocore が利用できません。pip install aiobotocore でインストールしてください。"
+            )
+        session = get_session()
+    if report is None:
+        report = ScanReport()
+    if config is not None and getattr(config, "fetch_mode", "groups") == "rules":
+        logger.warning(
+            "非同期エンジンはルール単位の取得に対応していないため、グループ単位で取得します。"
+        )
+    exclusion_index = compile_exclusion_rules(exclusion_rules)
+
+    try:
+        regions = list(get_all_regions(config))
+    except Exception as e:
+        logger.error("リージョン一覧の取得に失敗しました: %s", e)
+        return []
+
+    max_concurrency = int(config.async_max_concurrency) if config is not None else 50
+    scan_deadline = float(config.scan_deadline) if config is not None else 0.0
+    region_deadline = float(config.region_deadline) if config is not None else 0.0
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    results: list[dict[str, str]] = []
+    partial: dict[str, list[dict[str, str]]] = {}
+    pages_fetched: dict[str, int] = {}
+    tasks: dict[asyncio.Task[list[dict[str, str]]], str] = {}
+
+    for region in regions:
+        if checkpoint is not None and checkpoint.is_completed(region):
+            logger.info("リージョン %s はチェックポイントから再開します。", region)
+            report.completed.append(region)
+            results.extend(checkpoint.completed[region])
+            continue
+        partial[region] = []
+        coroutine = _scan_region_async(
+            session,
+            region,
+            exclusion_index,
+            config,
+            policies,
+            semaphore,
+            partial[region],
+            pages_fetched,
+            region_deadline,
+        )
+        tasks[asyncio.ensure_future(coroutine)] = region
+
+    if not tasks:
+        return results
+
+    start = time.monotonic()
+    done, not_done = await asyncio.wait(tasks, timeout=scan_deadline if scan_deadline > 0 else None)
+    for task in not_done:
+        task.cancel()
+    if not_done:
+        logger.warning("スキャン全体の期限（%s秒）に達しました。", scan_deadline)
+        await asyncio.gather(*not_done, return_exceptions=True)
+
+    for task, region in tasks.items():
+        if task in not_done:
+            # 1ページも取得できていないリージョンは未スキャンとして扱う
+            # 検出結果が無くてもページを取得済みなら途中まで評価したものとする
+            if partial[region] or pages_fetched.get(region, 0) > 0:
+                report.incomplete.append(region)
+                results.extend(partial[region])
+            else:
+                report.skipped.append(region)
+            continue
+        error = task.exception()
+        if isinstance(error, asyncio.TimeoutError):
+            logger.warning(
+                "リージョン %s が期限（%s秒）内に完了しないため打ち切ります。",
+                region,
+                region_deadline,
+            )
+            report.incomplete.append(region)
+            results.extend(partial[region])
+        elif error is not None:
+            logger.error("リージョン %s のスキャン中にエラーが発生しました: %s", region, error)
+            report.failed.append(region)
+        else:
+            report.completed.append(region)
+            if checkpoint is not None:
+                checkpoint.record(region, task.result())
+            results.extend(task.result())
+
+    logger.debug("非同期スキャン完了: %.2f秒", time.monotonic() - start)
+    return results
+
+
+def run_async_scan(
+    exclusion_rules: list[dict[str, Any]] | ExclusionIndex,
+    config: Any | None = None,
+    policies: list[Any] | None = None,
+    report: ScanReport | None = None,
+    checkpoint: Any | None = None,
+) -> list[dict[str, str]]:
+    """非同期スキャンエンジンを同期的に実行する
+
+    Args:
+        exclusion_rules: 除外ルールのリストまたは索引
+        config: アプリケーション設定
+        policies: コンパイル済みポリシーのリスト
+        report: リージョンごとの完了状況を記録するオブジェクト
+        checkpoint: チェックポイント
+
+    Returns:
+        list[dict[str, str]]: 検出結果
+    """
+    return asyncio.run(
+        find_globally_accessible_security_groups_async(
+            exclusion_rules, config, policies=policies, report=report, checkpoint=checkpoint
+        )
+    )
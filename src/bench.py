@@ -0,0 +1,510 @@
+"""
+ベンチマーク（合成した在庫とスタブ化したEC2による計測）
+
+実際のAWSアカウントなしでスキャナーのスループットを計測する。
+合成したセキュリティグループを botocore の Stubber でページ単位に返し、
+API呼び出しごとの遅延とスロットリング（botocoreの再試行にかかる待機）を注入できる。
+取得・評価・スキャン全体・通知の各段階のスループットを個別に計測し、
+保存したベースラインと比較して性能の低下を検出する。
+"""
+
+import dataclasses
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import boto3
+from botocore.stub import Stubber
+
+from src.config import Config
+from src.utils import (
+    ClientPool,
+    ScanReport,
+    compile_exclusion_rules,
+    evaluate_security_group,
+    find_globally_accessible_security_groups,
+    format_slack_message,
+    get_security_groups,
+    send_slack_notification,
+)
+
+logger = logging.getLogger(__name__)
+
+# ベースラインのデフォルトの保存先（スクリプトのディレクトリからの相対パス）
+DEFAULT_BASELINE_FILE = "../config/bench_baseline.json"
+# ベースラインに対して許容するスコアの低下率
+DEFAULT_TOLERANCE = 0.3
+# ベースラインの処理時間がこれより短い段階は計測の揺らぎが大きいため比較しない（秒）
+MIN_CHECK_SECONDS = 0.05
+
+PHASES = ("fetch", "evaluate", "scan", "notify")
+
+_GLOBAL_CIDRS = ("0.0.0.0/0", "::/0")
+_PORTS = (22, 80, 443, 3306, 5432, 6379, 8080, 9200)
+
+
+@dataclass(frozen=True)
+class BenchProfile:
+    """ベンチマークの条件
+
+    Attributes:
+        regions: 合成するリージョン数
+        groups: セキュリティグループの総数（リージョンに均等に割り当てる）
+        rules: グループあたりのインバウンドルール数
+        exclusions: 除外ルールの数（グローバルなルールを持つグループから選ぶ）
+        global_ratio: 0.0.0.0/0 または ::/0 を許可するルールの割合
+        ipv6_ratio: IPv6のCIDRを使うルールの割合
+        page_size: 1ページあたりのグループ数
+        latency_ms: API呼び出し1回あたりに注入する遅延（ミリ秒）
+        throttle_rate: API呼び出しがスロットリングされて再試行される確率
+        notify_latency_ms: 通知先（ローカルのWebhook）の応答遅延（ミリ秒）
+        seed: 乱数のシード
+    """
+
+    regions: int = 4
+    groups: int = 5000
+    rules: int = 4
+    exclusions: int = 200
+    global_ratio: float = 0.05
+    ipv6_ratio: float = 0.1
+    page_size: int = 1000
+    latency_ms: float = 0.0
+    throttle_rate: float = 0.0
+    notify_latency_ms: float = 0.0
+    seed: int = 1
+
+
+@dataclass
+class PhaseResult:
+    """段階ごとの計測結果
+
+    Attributes:
+        phase: 段階（fetch, evaluate, scan, notify）
+        items: 処理した件数（グループ数、通知では検出件数）
+        seconds: 処理時間（秒）
+        rate: スループット（件/秒）
+        score: 計測環境の速度で正規化したスループット（rate × 校正用処理の時間）
+    """
+
+    phase: str
+    items: int
+    seconds: float
+    rate: float
+    score: float
+
+
+def synthetic_regions(count: int) -> list[str]:
+    """合成したリージョン名を返す"""
+    return [f"bench-{i + 1}" for i in range(count)]
+
+
+def generate_inventory(profile: BenchProfile) -> dict[str, list[dict[str, Any]]]:
+    """合成したセキュリティグループ（describe_security_groups の形式）をリージョンごとに返す
+
+    Args:
+        profile: ベンチマークの条件
+
+    Returns:
+        dict[str, list[dict[str, Any]]]: リージョン名とセキュリティグループのリスト
+    """
+    rng = random.Random(profile.seed)
+    regions = synthetic_regions(profile.regions)
+    inventory: dict[str, list[dict[str, Any]]] = {region: [] for region in regions}
+    for i in range(profile.groups):
+        permissions = []
+        for _ in range(profile.rules):
+            port = rng.choice(_PORTS)
+            ipv6 = rng.random() < profile.ipv6_ratio
+            if rng.random() < profile.global_ratio:
+                cidr = _GLOBAL_CIDRS[1] if ipv6 else _GLOBAL_CIDRS[0]
+            elif ipv6:
+                cidr = f"2001:db8:{rng.randrange(0xFFFF):x}::/48"
+            elif rng.random() < 0.5:
+                cidr = f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/24"
+            else:
+                cidr = f"203.0.113.{rng.randrange(256)}/32"
+            ranges = (
+                {"Ipv6Ranges": [{"CidrIpv6": cidr}]} if ipv6 else {"IpRanges": [{"CidrIp": cidr}]}
+            )
+            permissions.append({"IpProtocol": "tcp", "FromPort": port, "ToPort": port, **ranges})
+        inventory[regions[i % len(regions)]].append(
+            {
+                "GroupId": f"sg-{i:017x}",
+                "GroupName": f"bench-{i}",
+                "Description": "synthetic security group",
+                "OwnerId": "123456789012",
+                "VpcId": f"vpc-{i % 16:017x}",
+                "IpPermissions": permissions,
+                "IpPermissionsEgress": [
+                    {"IpProtocol": "-1", "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+                ],
+                "Tags": [{"Key": "env", "Value": rng.choice(("prod", "stg", "dev"))}],
+            }
+        )
+    return inventory
+
+
+def generate_exclusion_rules(
+    inventory: dict[str, list[dict[str, Any]]], profile: BenchProfile
+) -> list[dict[str, Any]]:
+    """グローバルなルールを持つグループから除外ルール（exclusion_rules.yaml の形式）を合成する"""
+    rng = random.Random(profile.seed + 1)
+    candidates = [
+        (sg, permission, cidr)
+        for groups in inventory.values()
+        for sg in groups
+        for permission in sg["IpPermissions"]
+        for cidr in [r["CidrIp"] for r in permission.get("IpRanges", [])]
+        + [r["CidrIpv6"] for r in permission.get("Ipv6Ranges", [])]
+        if cidr in _GLOBAL_CIDRS
+    ]
+    rules = []
+    for sg, permission, cidr in rng.sample(candidates, min(profile.exclusions, len(candidates))):
+        rules.append(
+            {
+                "security_group_id": sg["GroupId"],
+                "description": "synthetic exclusion",
+                "rules": [
+                    {
+                        "ip_address": cidr,
+                        "protocol": permission["IpProtocol"],
+                        "port_range": {"from": permission["FromPort"], "to": permission["ToPort"]},
+                    }
+                ],
+            }
+        )
+    return rules
+
+
+def stubbed_ec2_client(
+    region: str, groups: list[dict[str, Any]], profile: BenchProfile, seed: int = 0
+) -> Any:
+    """合成したセキュリティグループをページ単位で返すスタブ化したEC2クライアントを作成する
+
+    Args:
+        region: リージョン名
+        groups: 返すセキュリティグループ
+        profile: ベンチマークの条件（ページサイズ、遅延、スロットリング）
+        seed: スロットリングの発生を決める乱数のシード
+
+    Returns:
+        Any: Stubber を有効にした boto3 のEC2クライアント
+
+    Note:
+        Stubber の応答はbotocoreの再試行処理を通らないため、スロットリングは
+        botocoreが再試行した後の結果として注入する。スロットリングされた呼び出しは
+        指数バックオフ分の待機を加え、応答の ResponseMetadata.RetryAttempts に再試行回数を記録する。
+    """
+    client = boto3.session.Session().client(
+        "ec2",
+        region_name="us-east-1",
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+    )
+    stubber = Stubber(client)
+    rng = random.Random(f"{profile.seed}/{region}/{seed}")
+    delays: deque[float] = deque()
+    pages = [groups[i : i + profile.page_size] for i in range(0, len(groups), profile.page_size)]
+    for index, page_groups in enumerate(pages or [[]]):
+        retries = 0
+        while retries < 4 and rng.random() < profile.throttle_rate:
+            retries += 1
+        # botocoreの標準の再試行と同様の指数バックオフ（最大20秒、フルジッター）
+        backoff = sum(rng.uniform(0, min(20.0, 2**attempt)) for attempt in range(retries))
+        delays.append(profile.latency_ms / 1000 * (retries + 1) + backoff)
+        response: dict[str, Any] = {
+            "SecurityGroups": page_groups,
+            "ResponseMetadata": {"RetryAttempts": retries, "HTTPStatusCode": 200},
+        }
+        expected: dict[str, Any] = {}
+        if index + 1 < len(pages):
+            response["NextToken"] = f"page-{index + 1}"
+        if index > 0:
+            expected["NextToken"] = f"page-{index}"
+        stubber.add_response("describe_security_groups", response, expected)
+
+    def inject_delay(**kwargs: Any) -> None:
+        delay = delays.popleft() if delays else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+    # before-call はStubberが応答を返して打ち切るため、その前に発生するイベントで遅延させる
+    client.meta.events.register("before-parameter-build.ec2.DescribeSecurityGroups", inject_delay)
+    stubber.activate()
+    return client
+
+
+class StubClientPool(ClientPool):
+    """リージョンごとのスタブ化したEC2クライアントをあらかじめ用意したクライアントプール"""
+
+    def __init__(
+        self, inventory: dict[str, list[dict[str, Any]]], profile: BenchProfile, seed: int = 0
+    ) -> None:
+        super().__init__()
+        self._clients = {
+            region: stubbed_ec2_client(region, groups, profile, seed)
+            for region, groups in inventory.items()
+        }
+
+
+@contextmanager
+def local_webhook(latency_ms: float = 0.0) -> Generator[str, None, None]:
+    """Slackの Incoming Webhook の代わりに通知を受け取るローカルのHTTPサーバーを起動する
+
+    Yields:
+        str: WebhookのURL
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if latency_ms > 0:
+                time.sleep(latency_ms / 1000)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, name="bench-webhook", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def calibrate() -> float:
+    """計測環境の速度を表す校正用の処理時間（秒、3回の最小値）を返す
+
+    スループットにこの時間を掛けたスコアは、マシンの速度差の影響を受けにくい。
+    """
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        table: dict[str, int] = {}
+        for i in range(200_000):
+            key = f"sg-{i % 997}"
+            table[key] = table.get(key, 0) + (i & 7)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(profile: BenchProfile, repeat: int = 3) -> list[PhaseResult]:
+    """各段階のスループットを計測する
+
+    Args:
+        profile: ベンチマークの条件
+        repeat: 各段階の計測回数（最も速い回を採用する）
+
+    Returns:
+        list[PhaseResult]: fetch（取得と縮小）、evaluate（評価）、scan（スキャン全体）、
+            notify（メッセージの作成とWebhookへの送信）の計測結果
+    """
+    inventory = generate_inventory(profile)
+    exclusion_index = compile_exclusion_rules(generate_exclusion_rules(inventory, profile))
+    calibration = calibrate()
+    timings: dict[str, float] = {}
+    items: dict[str, int] = {}
+
+    def record(phase: str, seconds: float, count: int) -> None:
+        timings[phase] = min(timings.get(phase, float("inf")), seconds)
+        items[phase] = count
+
+    # ログ出力はスループットに影響するため計測中は抑止する
+    previous_disable = logging.root.manager.disable
+    logging.disable(logging.INFO)
+    try:
+        compacted: dict[str, list[dict[str, Any]]] = {}
+        for attempt in range(repeat):
+            pool = StubClientPool(inventory, profile, seed=attempt)
+            start = time.perf_counter()
+            for region in inventory:
+                compacted[region] = list(get_security_groups(region, client=pool.get(region)))
+            record("fetch", time.perf_counter() - start, sum(map(len, compacted.values())))
+
+        findings: list[dict[str, str]] = []
+        for _ in range(repeat):
+            findings = []
+            start = time.perf_counter()
+            for region, groups in compacted.items():
+                for sg in groups:
+                    group_info = evaluate_security_group(sg, region, exclusion_index)
+                    if group_info is not None:
+                        findings.append(group_info)
+            record("evaluate", time.perf_counter() - start, sum(map(len, compacted.values())))
+
+        config = Config(regions=list(inventory))
+        for attempt in range(repeat):
+            pool = StubClientPool(inventory, profile, seed=attempt)
+            start = time.perf_counter()
+            scanned = list(
+                find_globally_accessible_security_groups(
+                    exclusion_index, config, report=ScanReport(), clients=pool
+                )
+            )
+            record("scan", time.perf_counter() - start, profile.groups)
+            if len(scanned) != len(findings):
+                raise RuntimeError(
+                    f"スキャン全体の検出件数が評価の結果と一致しません: {len(scanned)} != {len(findings)}"
+                )
+
+        with local_webhook(profile.notify_latency_ms) as url:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                if not send_slack_notification(url, format_slack_message(findings)):
+                    raise RuntimeError("ローカルのWebhookへの通知に失敗しました。")
+                record("notify", time.perf_counter() - start, len(findings))
+    finally:
+        logging.disable(previous_disable)
+
+    results = []
+    for phase in PHASES:
+        seconds = max(timings[phase], 1e-9)
+        rate = items[phase] / seconds
+        results.append(PhaseResult(phase, items[phase], seconds, rate, rate * calibration))
+    return results
+
+
+def load_baseline(path: str) -> dict[str, Any] | None:
+    """保存したベースラインを読み込む（存在しない・破損時はNone）"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            baseline = json.load(file)
+        return baseline if isinstance(baseline, dict) else None
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(path: str, profile: BenchProfile, results: list[PhaseResult]) -> None:
+    """計測結果をベースラインとして保存する"""
+    baseline = {
+        "profile": asdict(profile),
+        "phases": {result.phase: asdict(result) for result in results},
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(baseline, file, ensure_ascii=False, indent=2)
+        file.write("\n")
+    os.replace(tmp_path, path)
+
+
+def find_regressions(
+    baseline: dict[str, Any],
+    profile: BenchProfile,
+    results: list[PhaseResult],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> list[str]:
+    """ベースラインよりスコアが許容範囲を超えて低下した段階を返す
+
+    Args:
+        baseline: 保存したベースライン
+        profile: 今回のベンチマークの条件
+        results: 今回の計測結果
+        tolerance: 許容する低下率（0.3 の場合は30%まで）
+
+    Returns:
+        list[str]: 低下した段階の説明（低下がない場合は空）
+
+    Raises:
+        ValueError: ベースラインと条件が異なる場合
+
+    Note:
+        ベースラインの処理時間が MIN_CHECK_SECONDS 未満の段階（既定の条件では notify）は
+        数ミリ秒の揺らぎでスコアが大きく変わるため比較しない。
+    """
+    if baseline.get("profile") != asdict(profile):
+        raise ValueError("ベースラインと条件が異なるため比較できません。")
+    regressions = []
+    for result in results:
+        phase = baseline.get("phases", {}).get(result.phase, {})
+        expected = phase.get("score")
+        if not expected or phase.get("seconds", 0.0) < MIN_CHECK_SECONDS:
+            continue
+        if result.score < expected * (1 - tolerance):
+            regressions.append(
+                f"{result.phase}: スコア {result.score:.1f}（ベースライン {expected:.1f}、"
+                f"{(1 - result.score / expected) * 100:.0f}% 低下）"
+            )
+    return regressions
+
+
+def bench_command(
+    profile: BenchProfile,
+    repeat: int = 3,
+    baseline_path: str | None = None,
+    save: bool = False,
+    check: bool = False,
+    tolerance: float = DEFAULT_TOLERANCE,
+    as_json: bool = False,
+) -> int:
+    """benchサブコマンドの実行
+
+    Args:
+        profile: ベンチマークの条件
+        repeat: 各段階の計測回数
+        baseline_path: ベースラインのファイル（省略時は config/bench_baseline.json）
+        save: Trueの場合は計測結果をベースラインとして保存する
+        check: Trueの場合はベースラインと比較し、低下があれば終了コード1を返す
+        tolerance: 許容する低下率
+        as_json: Trueの場合は計測結果をJSONで出力する
+
+    Returns:
+        int: 終了コード
+    """
+    if baseline_path is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        baseline_path = os.path.normpath(os.path.join(script_dir, DEFAULT_BASELINE_FILE))
+
+    results = run_benchmark(profile, repeat)
+    if as_json:
+        print(json.dumps([asdict(result) for result in results], ensure_ascii=False))
+    else:
+        print(f"{'phase':<10}{'items':>10}{'seconds':>10}{'items/s':>14}{'score':>10}")
+        for result in results:
+            print(
+                f"{result.phase:<10}{result.items:>10}{result.seconds:>10.3f}"
+                f"{result.rate:>14.0f}{result.score:>10.1f}"
+            )
+
+    if save:
+        save_baseline(baseline_path, profile, results)
+        print(f"ベースラインを {baseline_path} に保存しました。")
+    if check:
+        baseline = load_baseline(baseline_path)
+        if baseline is None:
+            print(f"エラー: ベースライン {baseline_path} が見つかりません。")
+            return 1
+        try:
+            regressions = find_regressions(baseline, profile, results, tolerance)
+        except ValueError as e:
+            print(f"エラー: {e}")
+            return 1
+        if regressions:
+            print("ベースラインからの性能低下を検出しました:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("ベースラインからの性能低下はありません。")
+    return 0
+
+
+def profile_from_args(**values: Any) -> BenchProfile:
+    """指定された値（Noneは既定値）からベンチマークの条件を作成する"""
+    return dataclasses.replace(
+        BenchProfile(), **{key: value for key, value in values.items() if value is not None}
+    )
@@ -0,0 +1,177 @@
+"""
+長時間スキャンのチェックポイントと再開処理
+
+完了した (アカウント, リージョン) 単位とその検出結果をJSON Lines形式で追記する。
+fsyncは一定件数・一定時間ごとにまとめて行うため、チェックポイントの記録による
+スキャンへの影響は小さい。
+"""
+
+import json
+import logging
+import os
+import time
+from typing import IO, Any
+
+logger = logging.getLogger(__name__)
+
+# --resume 指定時にパスが指定されていない場合のチェックポイントファイル
+DEFAULT_CHECKPOINT_FILE = "~/.cache/neko_sg/checkpoint.jsonl"
+
+
+class Checkpoint:
+    """スキャンのチェックポイントファイル
+
+    Attributes:
+        path: チェックポイントファイルのパス
+        account: 記録対象のAWSアカウントID
+        completed: 完了済みリージョンと検出結果（再開時に読み込んだものを含む）
+    """
+
+    def __init__(
+        self,
+        path: str,
+        account: str,
+        resume: bool = False,
+        fsync_every: int = 32,
+        fsync_interval: float = 5.0,
+    ) -> None:
+        """チェックポイントファイルを開く
+
+        Args:
+            path: チェックポイントファイルのパス
+            account: 記録対象のAWSアカウントID
+            resume: Trueの場合は既存の記録を読み込んで追記し、Falseの場合は新規に作成する
+            fsync_every: fsyncを行うまでに書き込む最大件数
+            fsync_interval: fsyncを行う最大間隔（秒）
+        """
+        self.path = path
+        self.account = account
+        self.completed: dict[str, list[dict[str, str]]] = {}
+        if resume:
+            self.completed = load_checkpoint(path).get(account, {})
+
+        self._fsync_every = fsync_every
+        self._fsync_interval = fsync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if resume:
+            _truncate_partial_line(path)
+        self._file: IO[str] | None = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def is_completed(self, region: str) -> bool:
+        """リージョンが完了済みか判定"""
+        return region in self.completed
+
+    def record(self, region: str, findings: list[dict[str, str]]) -> None:
+        """リージョンの完了と検出結果を追記する
+
+        Args:
+            region: 完了したリージョン名
+            findings: リージョンの検出結果
+        """
+        if self._file is None:
+            return
+        self.completed[region] = list(findings)
+        entry = {
+            "account": self.account,
+            "region": region,
+            "findings": findings,
+            "completed_at": time.time(),
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if (
+            self._unsynced >= self._fsync_every
+            or time.monotonic() - self._last_sync >= self._fsync_interval
+        ):
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._file is None or self._unsynced == 0:
+            return
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        """未同期の記録をfsyncしてファイルを閉じる"""
+        if self._file is None:
+            return
+        self._sync()
+        self._file.close()
+        self._file = None
+
+    def discard(self) -> None:
+        """スキャンが完了した場合にチェックポイントファイルを削除する"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            logger.warning("チェックポイントファイルの削除に失敗しました: %s", e)
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _truncate_partial_line(path: str) -> None:
+    """書き込み途中で中断された最終行（改行で終わらない行）を切り詰める内部関数
+
+    切り詰めないと、再開後の最初の記録がその断片に続けて書き込まれ、
+    読み込み時に不正な行としてまとめて捨てられてしまう。
+    """
+    try:
+        with open(path, "rb+") as file:
+            size = file.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            file.seek(size - 1)
+            if file.read(1) == b"\n":
+                return
+            # 最後の改行の直後まで切り詰める（改行がない場合は空にする）
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                file.seek(position - step)
+                index = file.read(step).rfind(b"\n")
+                if index >= 0:
+                    position = position - step + index + 1
+                    break
+                position -= step
+            file.truncate(position)
+            logger.warning("チェックポイントの書き込み途中の最終行を切り詰めました: %s", path)
+    except FileNotFoundError:
+        return
+
+
+def load_checkpoint(path: str) -> dict[str, dict[str, list[dict[str, str]]]]:
+    """チェックポイントファイルを読み込む
+
+    Args:
+        path: チェックポイントファイルのパス
+
+    Returns:
+        dict: アカウントID -> リージョン名 -> 検出結果。ファイルが存在しない場合は空の辞書
+
+    Note:
+        書き込み途中で中断された最終行などの不正な行は無視する
+    """
+    units: dict[str, dict[str, list[dict[str, str]]]] = {}
+    if not os.path.exists(path):
+        return units
+
+    try:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    units.setdefault(entry["account"], {})[entry["region"]] = entry["findings"]
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("チェックポイントの不正な行をスキップします: %s", line[:80])
+    except OSError as e:
+        logger.error("チェックポイントファイル '%s' の読み込みエラー: %s", path, e)
+    return units
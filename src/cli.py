@@ -4,12 +4,21 @@ CLIサブコマンド関連の機能
 
 import argparse
 import os
+import re
+import time
+from datetime import UTC, datetime
 from typing import Any
 
 import yaml
 
 from src.config import Config
-from src.utils import get_all_regions, get_security_groups
+from src.output import OUTPUT_FORMATS
+from src.scanner import Scanner
+from src.shard import parse_shard
+from src.utils import prune_expired_exclusions
+
+# 期間指定の単位（秒）
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
 
 
 def create_exclusion_rule_entry(
@@ -61,37 +70,22 @@ def create_exclusion_rule_entry(
 
 def find_security_group(sg_id: str) -> dict[str, Any] | None:
     """指定されたセキュリティグループIDを全リージョンから検索"""
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
     print(f"セキュリティグループ {sg_id} を全リージョンから並列検索中...")
 
-    config = Config.from_env()
-    try:
-        regions = list(get_all_regions(config))
-    except Exception as e:
-        print(f"エラー: リージョン一覧の取得に失敗しました: {e}")
-        return None
-
-    def check_region(region: str) -> dict[str, Any] | None:
+    with Scanner(Config.from_env()) as scanner:
         try:
-            for sg in get_security_groups(region, config):
-                if sg["GroupId"] == sg_id:
-                    sg["Region"] = region  # リージョン情報を追加
-                    return sg
-        except Exception:
-            pass
-        return None
-
-    with ThreadPoolExecutor(max_workers=min(len(regions), 10) if regions else 1) as executor:
-        futures = {executor.submit(check_region, r): r for r in regions}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                print(f"  見つかりました: {result['Region']}")
-                return result
+            found = scanner.find_groups([sg_id])
+        except Exception as e:
+            print(f"エラー: リージョン一覧の取得に失敗しました: {e}")
+            return None
 
-    print(f"  セキュリティグループ {sg_id} が見つかりませんでした")
-    return None
+    if not found:
+        print(f"  セキュリティグループ {sg_id} が見つかりませんでした")
+        return None
+    region, sg = found[0]
+    print(f"  見つかりました: {region}")
+    # リージョン情報を追加
+    return {**sg, "Region": region}
 
 
 def load_or_create_exclusion_rules(file_path: str) -> list[dict[str, Any]]:
@@ -114,18 +108,53 @@ def load_or_create_exclusion_rules(file_path: str) -> list[dict[str, Any]]:
 
 
 def save_exclusion_rules(file_path: str, rules: list[dict[str, Any]]) -> bool:
-    """除外ルールファイルを保存"""
+    """除外ルールファイルを保存（一時ファイル経由で置き換え、読み込み中のプロセスに途中の内容を見せない）"""
+    tmp_path = f"{file_path}.tmp"
     try:
-        with open(file_path, "w", encoding="utf-8") as file:
+        with open(tmp_path, "w", encoding="utf-8") as file:
             yaml.dump(rules, file, default_flow_style=False, allow_unicode=True, sort_keys=False)
+        if os.path.exists(file_path):
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o7777)
+        os.replace(tmp_path, file_path)
         return True
     except OSError as e:
         print(f"エラー: ファイル保存エラー: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return False
 
 
-def add_exclusion_command(sg_id: str, auto_detect: bool = True) -> int:
-    """除外ルール追加コマンドの実行"""
+def parse_duration(value: str) -> float:
+    """期間指定（7d, 12h, 30m, 45s, 2w または秒数）を秒に変換する（argparseの type として使用）
+
+    Raises:
+        argparse.ArgumentTypeError: 形式が不正な場合
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*", value.lower())
+    if match is None or float(match.group(1)) <= 0:
+        raise argparse.ArgumentTypeError(
+            f"期間は 7d, 12h, 30m, 45s のように正の値で指定してください: {value}"
+        )
+    return float(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]
+
+
+def format_expiry(ttl: float, now: float | None = None) -> str:
+    """現在時刻から ttl 秒後の期限を除外ルールに書く形式（ISO 8601, UTC）で返す"""
+    expires = datetime.fromtimestamp((time.time() if now is None else now) + ttl, UTC)
+    return expires.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def add_exclusion_command(sg_id: str, auto_detect: bool = True, ttl: float | None = None) -> int:
+    """除外ルール追加コマンドの実行
+
+    Args:
+        sg_id: 除外するセキュリティグループID
+        auto_detect: セキュリティグループを検索し、現在のルールを除外ルールにする場合True
+        ttl: 除外の有効期間（秒、指定した場合は expires_at を設定する。既に除外されている
+            セキュリティグループは期限だけを更新する）
+    """
     # 設定を読み込む
     config = Config.from_env()
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -136,10 +165,19 @@ def add_exclusion_command(sg_id: str, auto_detect: bool = True) -> int:
     # 既存の除外ルールを読み込み
     exclusion_rules = load_or_create_exclusion_rules(exclusion_rules_file)
 
+    expires_at = format_expiry(ttl) if ttl is not None else None
+
     # 既に除外されているかチェック
     for rule in exclusion_rules:
         if rule.get("security_group_id") == sg_id:
-            print(f"セキュリティグループ {sg_id} は既に除外ルールに含まれています。")
+            if expires_at is None:
+                print(f"セキュリティグループ {sg_id} は既に除外ルールに含まれています。")
+                return 0
+            rule["expires_at"] = expires_at
+            if not save_exclusion_rules(exclusion_rules_file, exclusion_rules):
+                print("エラー: 除外ルールの保存に失敗しました。")
+                return 1
+            print(f"除外ルールの期限を更新しました: {sg_id}（期限: {expires_at}）")
             return 0
 
     sg_info = None
@@ -153,6 +191,8 @@ def add_exclusion_command(sg_id: str, auto_detect: bool = True) -> int:
 
     # 除外ルールエントリを作成
     new_rule = create_exclusion_rule_entry(sg_id, sg_info)
+    if expires_at is not None:
+        new_rule["expires_at"] = expires_at
     exclusion_rules.append(new_rule)
 
     # ファイルに保存
@@ -163,6 +203,8 @@ def add_exclusion_command(sg_id: str, auto_detect: bool = True) -> int:
             print(f"  説明: {sg_info.get('Description', 'N/A')}")
             print(f"  リージョン: {sg_info.get('Region', 'N/A')}")
             print(f"  ルール数: {len(new_rule['rules'])}")
+        if expires_at is not None:
+            print(f"  期限: {expires_at}")
         return 0
     else:
         print("エラー: 除外ルールの保存に失敗しました。")
@@ -182,11 +224,412 @@ def setup_exclude_parser(subparsers: argparse._SubParsersAction) -> None:
     exclude_parser.add_argument(
         "--no-auto-detect", action="store_true", help="セキュリティグループの自動検索を無効にする"
     )
+    exclude_parser.add_argument(
+        "--ttl",
+        type=parse_duration,
+        metavar="DURATION",
+        help="除外の有効期間（例: 7d, 12h, 30m）。期限を過ぎると除外されなくなる",
+    )
     exclude_parser.set_defaults(
-        func=lambda args: add_exclusion_command(args.security_group_id, not args.no_auto_detect)
+        func=lambda args: add_exclusion_command(
+            args.security_group_id, not args.no_auto_detect, ttl=args.ttl
+        )
     )
 
 
+def prune_exclusions_command(dry_run: bool = False) -> int:
+    """prune サブコマンドの実行（期限切れの除外ルールをファイルから取り除く）
+
+    Args:
+        dry_run: 取り除く件数だけを表示し、ファイルを書き換えない場合True
+
+    Returns:
+        int: 終了コード
+    """
+    config = Config.from_env()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    exclusion_rules_file = config.get_exclusion_rules_path(script_dir)
+    if not os.path.exists(exclusion_rules_file):
+        print(f"除外ルールファイルがありません: {exclusion_rules_file}")
+        return 0
+
+    exclusion_rules = load_or_create_exclusion_rules(exclusion_rules_file)
+    kept, removed = prune_expired_exclusions(exclusion_rules)
+    if removed == 0:
+        print("期限切れの除外ルールはありません。")
+        return 0
+    removed_groups = sorted(
+        {rule.get("security_group_id", "") for rule in exclusion_rules}
+        - {rule.get("security_group_id", "") for rule in kept}
+    )
+    print(f"期限切れの除外ルール: {removed}件（除外ルールファイル: {exclusion_rules_file}）")
+    if removed_groups:
+        print(f"  取り除くセキュリティグループ: {', '.join(removed_groups)}")
+    if dry_run:
+        return 0
+    if not save_exclusion_rules(exclusion_rules_file, kept):
+        print("エラー: 除外ルールの保存に失敗しました。")
+        return 1
+    print("期限切れの除外ルールを取り除きました。")
+    return 0
+
+
+def setup_prune_parser(subparsers: argparse._SubParsersAction) -> None:
+    """prune サブコマンドのパーサーを設定"""
+    prune_parser = subparsers.add_parser(
+        "prune",
+        help="期限切れの除外ルールを取り除く",
+        description=(
+            "expires_at が過ぎた除外ルールを除外ルールファイルから取り除きます。"
+            "ファイルは一時ファイル経由で置き換えるため、常駐モードが途中の内容を読み込むことはありません。"
+        ),
+    )
+    prune_parser.add_argument(
+        "--dry-run", action="store_true", help="取り除く件数だけを表示し、ファイルは書き換えない"
+    )
+    prune_parser.set_defaults(func=lambda args: prune_exclusions_command(args.dry_run))
+
+
+def run_serve_command(args: argparse.Namespace) -> int:
+    """serve サブコマンドの実行（常駐モード）"""
+    from src.daemon import serve_command
+
+    return serve_command(args.interval, args.jitter)
+
+
+def setup_serve_parser(subparsers: argparse._SubParsersAction) -> None:
+    """serve サブコマンドのパーサーを設定"""
+    serve_parser = subparsers.add_parser(
+        "serve",
+        aliases=["daemon"],
+        help="常駐して定期的にスキャン",
+        description=(
+            "クライアント・除外ルール・在庫をメモリ上に保持したまま定期的にスキャンします。"
+            "SIGUSR1 を送ると即時スキャンを実行します。"
+        ),
+    )
+    serve_parser.add_argument(
+        "--interval", type=float, help="スキャン間隔（秒、デフォルト: SERVE_INTERVAL または 3600）"
+    )
+    serve_parser.add_argument(
+        "--jitter",
+        type=float,
+        help="スキャン間隔の揺らぎ（秒、デフォルト: SERVE_JITTER または 300）",
+    )
+    serve_parser.set_defaults(func=run_serve_command)
+
+
+def run_watch_command(args: argparse.Namespace) -> int:
+    """watch サブコマンドの実行（イベント駆動の差分評価）"""
+    from src.events import watch_command
+
+    return watch_command(args.events, args.initial_scan)
+
+
+def setup_watch_parser(subparsers: argparse._SubParsersAction) -> None:
+    """watch サブコマンドのパーサーを設定"""
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="変更イベントごとにセキュリティグループを再評価",
+        description=(
+            "CloudTrail / EventBridge のセキュリティグループ変更イベント（JSON Lines）を読み込み、"
+            "変更されたセキュリティグループだけを再取得して評価します。"
+        ),
+    )
+    watch_parser.add_argument(
+        "--events",
+        metavar="PATH",
+        help="イベントのJSON Linesファイル（省略時または - の場合は標準入力）",
+    )
+    watch_parser.add_argument(
+        "--initial-scan",
+        action="store_true",
+        help="開始前に全体をスキャンして現在の検出状態を取得する",
+    )
+    watch_parser.set_defaults(func=run_watch_command)
+
+
+def run_merge_command(args: argparse.Namespace) -> int:
+    """merge サブコマンドの実行（シャード結果の結合）"""
+    from src.shard import merge_command
+
+    return merge_command(args.files)
+
+
+def setup_merge_parser(subparsers: argparse._SubParsersAction) -> None:
+    """merge サブコマンドのパーサーを設定"""
+    merge_parser = subparsers.add_parser(
+        "merge",
+        help="シャードの部分結果を結合して通知",
+        description="scan --shard が書き出した部分結果ファイルを結合し、重複を除いて1回だけ通知します。",
+    )
+    merge_parser.add_argument("files", nargs="+", metavar="FILE", help="シャードの部分結果ファイル")
+    merge_parser.set_defaults(func=run_merge_command)
+
+
+def run_query_command(args: argparse.Namespace) -> int:
+    """query サブコマンドの実行（スナップショットの検索）"""
+    from src.store import query_command
+
+    return query_command(args.filters, args.store, args.json, args.export)
+
+
+def setup_query_parser(subparsers: argparse._SubParsersAction) -> None:
+    """query サブコマンドのパーサーを設定"""
+    query_parser = subparsers.add_parser(
+        "query",
+        help="保存済みのスナップショットを検索",
+        description=(
+            "直近のスキャンで保存したスナップショットから、条件に一致するルールを検索します"
+            "（AWS APIは呼び出しません）。検索項目: region, sg, name, protocol, port, cidr,"
+            " global, finding（例: region=eu-west-1 port=5432 global=true）"
+        ),
+    )
+    query_parser.add_argument(
+        "filters", nargs="*", metavar="KEY=VALUE", help="検索条件（!= で否定、複数指定はAND）"
+    )
+    query_parser.add_argument(
+        "--store", metavar="PATH", help="スナップショットストアのパス（デフォルト: SNAPSHOT_STORE）"
+    )
+    query_parser.add_argument("--json", action="store_true", help="1行1件のJSONで出力する")
+    query_parser.add_argument(
+        "--export",
+        metavar="PATH",
+        help="検索の代わりに最新のスナップショットを diff で比較できるファイルに書き出す",
+    )
+    query_parser.set_defaults(func=run_query_command)
+
+
+def run_diff_command(args: argparse.Namespace) -> int:
+    """diff サブコマンドの実行（スナップショットの比較）"""
+    from src.diff import diff_command
+
+    return diff_command(args.old, args.new, args.store, args.json)
+
+
+def setup_diff_parser(subparsers: argparse._SubParsersAction) -> None:
+    """diff サブコマンドのパーサーを設定"""
+    diff_parser = subparsers.add_parser(
+        "diff",
+        help="2つのスナップショットを比較",
+        description=(
+            "保存済みのスナップショット、またはエクスポートしたファイルを比較し、"
+            "追加・削除・変更されたセキュリティグループとルールを出力します。"
+        ),
+    )
+    diff_parser.add_argument(
+        "old",
+        nargs="?",
+        default="previous",
+        help=(
+            "比較元（latest, previous, スナップショットID、ファイル、または履歴の時点"
+            " @通番 / @日時。デフォルト: previous）"
+        ),
+    )
+    diff_parser.add_argument(
+        "new", nargs="?", default="latest", help="比較先（同上。デフォルト: latest）"
+    )
+    diff_parser.add_argument(
+        "--store", metavar="PATH", help="スナップショットストアのパス（デフォルト: SNAPSHOT_STORE）"
+    )
+    diff_parser.add_argument("--json", action="store_true", help="1行1件のJSONで出力する")
+    diff_parser.set_defaults(func=run_diff_command)
+
+
+def run_history_command(args: argparse.Namespace) -> int:
+    """history サブコマンドの実行（スナップショット履歴の一覧・書き出し・圧縮）"""
+    from src.history import history_command
+
+    return history_command(args.action, args.ref, args.path, args.dir)
+
+
+def setup_history_parser(subparsers: argparse._SubParsersAction) -> None:
+    """history サブコマンドのパーサーを設定"""
+    history_parser = subparsers.add_parser(
+        "history",
+        help="スナップショットの履歴を表示・書き出し・圧縮",
+        description=(
+            "HISTORY_DIR に記録したスナップショットの履歴（完全スナップショットと差分）を扱います。"
+            "export は指定した時点を diff で比較できるファイルに書き出し、"
+            "compact は保持期間外の履歴を削除して先頭を完全スナップショットにまとめ直します。"
+        ),
+    )
+    history_parser.add_argument(
+        "action", nargs="?", default="list", choices=("list", "export", "compact")
+    )
+    history_parser.add_argument(
+        "ref", nargs="?", help="export する時点（通番、latest、またはISO形式の日時）"
+    )
+    history_parser.add_argument("path", nargs="?", help="export の出力先ファイル")
+    history_parser.add_argument(
+        "--dir", metavar="PATH", help="履歴のディレクトリ（デフォルト: HISTORY_DIR）"
+    )
+    history_parser.set_defaults(func=run_history_command)
+
+
+def run_bench_command(args: argparse.Namespace) -> int:
+    """bench サブコマンドの実行（合成した在庫によるベンチマーク）"""
+    from src.bench import bench_command, profile_from_args
+
+    profile = profile_from_args(
+        regions=args.regions,
+        groups=args.groups,
+        rules=args.rules,
+        exclusions=args.exclusions,
+        global_ratio=args.global_ratio,
+        ipv6_ratio=args.ipv6_ratio,
+        page_size=args.page_size,
+        latency_ms=args.latency_ms,
+        throttle_rate=args.throttle_rate,
+        notify_latency_ms=args.notify_latency_ms,
+        seed=args.seed,
+    )
+    return bench_command(
+        profile,
+        repeat=args.repeat,
+        baseline_path=args.baseline,
+        save=args.save_baseline,
+        check=args.check,
+        tolerance=args.tolerance,
+        as_json=args.json,
+    )
+
+
+def setup_bench_parser(subparsers: argparse._SubParsersAction) -> None:
+    """bench サブコマンドのパーサーを設定"""
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="合成した在庫でスループットを計測",
+        description=(
+            "合成したセキュリティグループを botocore の Stubber で返し、取得・評価・スキャン全体・"
+            "通知のスループットを計測します（AWSアカウントは不要です）。"
+            "--check を指定すると保存したベースラインと比較し、性能が低下した場合は終了コード1を返します。"
+        ),
+    )
+    for name, value_type, help_text in (
+        ("--regions", int, "合成するリージョン数（デフォルト: 4）"),
+        ("--groups", int, "セキュリティグループの総数（デフォルト: 5000）"),
+        ("--rules", int, "グループあたりのインバウンドルール数（デフォルト: 4）"),
+        ("--exclusions", int, "除外ルールの数（デフォルト: 200）"),
+        (
+            "--global-ratio",
+            float,
+            "0.0.0.0/0 または ::/0 を許可するルールの割合（デフォルト: 0.05）",
+        ),
+        ("--ipv6-ratio", float, "IPv6のCIDRを使うルールの割合（デフォルト: 0.1）"),
+        ("--page-size", int, "1ページあたりのグループ数（デフォルト: 1000）"),
+        ("--latency-ms", float, "API呼び出し1回あたりの遅延（ミリ秒、デフォルト: 0）"),
+        ("--throttle-rate", float, "API呼び出しがスロットリングされる確率（デフォルト: 0）"),
+        ("--notify-latency-ms", float, "通知先の応答遅延（ミリ秒、デフォルト: 0）"),
+        ("--seed", int, "乱数のシード（デフォルト: 1）"),
+    ):
+        bench_parser.add_argument(name, type=value_type, help=help_text)
+    bench_parser.add_argument(
+        "--repeat", type=int, default=3, help="各段階の計測回数（最も速い回を採用、デフォルト: 3）"
+    )
+    bench_parser.add_argument(
+        "--baseline",
+        metavar="PATH",
+        help="ベースラインのファイル（デフォルト: config/bench_baseline.json）",
+    )
+    bench_parser.add_argument(
+        "--save-baseline", action="store_true", help="計測結果をベースラインとして保存する"
+    )
+    bench_parser.add_argument(
+        "--check", action="store_true", help="ベースラインと比較し、性能が低下した場合は失敗する"
+    )
+    bench_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.3,
+        help="許容するスコアの低下率（デフォルト: 0.3）",
+    )
+    bench_parser.add_argument("--json", action="store_true", help="計測結果をJSONで出力する")
+    bench_parser.set_defaults(func=run_bench_command)
+
+
+def run_outbox_command(args: argparse.Namespace) -> int:
+    """outbox サブコマンドの実行（通知のアウトボックスの確認・配信）"""
+    from src.outbox import outbox_command
+
+    return outbox_command(args.action, args.path)
+
+
+def setup_outbox_parser(subparsers: argparse._SubParsersAction) -> None:
+    """outbox サブコマンドのパーサーを設定"""
+    outbox_parser = subparsers.add_parser(
+        "outbox",
+        help="通知のアウトボックスを確認・配信",
+        description=(
+            "OUTBOX_FILE に記録した通知の配信状況を表示します。"
+            "flush は未配信の通知を配信し、retry は試行回数の上限に達した配信をやり直し、"
+            "purge は配信済みの通知を削除します。未配信または失敗した通知が残る場合は終了コード1を返します。"
+        ),
+    )
+    outbox_parser.add_argument(
+        "action", nargs="?", default="status", choices=("status", "flush", "retry", "purge")
+    )
+    outbox_parser.add_argument(
+        "--path", metavar="PATH", help="アウトボックスのパス（デフォルト: OUTBOX_FILE）"
+    )
+    outbox_parser.set_defaults(func=run_outbox_command)
+
+
+def run_remediate_command(args: argparse.Namespace) -> int:
+    """remediate サブコマンドの実行（グローバルアクセス可能なルールの一括削除）"""
+    from src.remediate import remediate_command
+
+    return remediate_command(
+        input_path=args.input,
+        dry_run=args.dry_run,
+        rollback_file=args.rollback_file,
+        rollback_from=args.rollback,
+        region_concurrency=args.region_concurrency,
+    )
+
+
+def setup_remediate_parser(subparsers: argparse._SubParsersAction) -> None:
+    """remediate サブコマンドのパーサーを設定"""
+    remediate_parser = subparsers.add_parser(
+        "remediate",
+        help="グローバルアクセス可能なインバウンドルールを一括で削除",
+        description=(
+            "検出結果のセキュリティグループから、グローバルなCIDRを許可するインバウンドルールを"
+            "ルールIDを指定してまとめて削除します。除外ルールに該当するルールは削除しません。"
+            "削除したルールはロールバックファイルに記録し、--rollback で元に戻せます。"
+        ),
+    )
+    remediate_parser.add_argument(
+        "--input",
+        metavar="PATH",
+        help="検出結果のファイル（scan --output jsonl、シャードの結果ファイル。省略時はスキャンする）",
+    )
+    remediate_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="削除対象を表示し、DryRun で権限だけを確認する（ルールは削除しない）",
+    )
+    remediate_parser.add_argument(
+        "--rollback-file",
+        metavar="PATH",
+        help=(
+            "削除したルールを記録するファイル（既存のファイルは不可。"
+            "デフォルト: remediation-rollback-<日時>.jsonl）"
+        ),
+    )
+    remediate_parser.add_argument(
+        "--rollback", metavar="PATH", help="ロールバックファイルに記録したルールを元に戻す"
+    )
+    remediate_parser.add_argument(
+        "--region-concurrency",
+        type=int,
+        default=4,
+        metavar="N",
+        help="リージョンごとに同時に実行する削除の数（デフォルト: 4）",
+    )
+    remediate_parser.set_defaults(func=run_remediate_command)
+
+
 def create_main_parser() -> argparse.ArgumentParser:
     """メインのargparseパーサーを作成"""
     parser = argparse.ArgumentParser(description="NeKo_AWS_SG - AWSセキュリティグループ監視ツール")
@@ -199,11 +642,84 @@ def create_main_parser() -> argparse.ArgumentParser:
         help="セキュリティグループをスキャン",
         description="AWSセキュリティグループをスキャンしてグローバルアクセス可能なルールを検出します。",
     )
+    scan_parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        help="完了したリージョンと検出結果を記録するチェックポイントファイル",
+    )
+    scan_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="チェックポイントから再開し、完了済みのリージョンをスキップする",
+    )
+    scan_parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="i/N",
+        help="(アカウント, リージョン) をN個に分割したうちi番目だけをスキャンし、結果をファイルに書き出す",
+    )
+    scan_parser.add_argument(
+        "--shard-output",
+        metavar="PATH",
+        help="シャードの部分結果ファイル（デフォルト: shard-i-of-N.json）",
+    )
+    scan_parser.add_argument(
+        "--output",
+        choices=OUTPUT_FORMATS,
+        help="検出結果を指定した形式（jsonl, csv, sarif）で1件ずつ書き出す",
+    )
+    scan_parser.add_argument(
+        "--output-file",
+        metavar="PATH",
+        help="--output の出力先ファイル（省略時または - の場合は標準出力）",
+    )
+    scan_parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="スキャン中のスタックを採取し、collapsed stack 形式で書き出す（集計は PATH.txt）",
+    )
+    scan_parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=5.0,
+        metavar="MS",
+        help="--profile のサンプリング間隔（ミリ秒、デフォルト: 5）",
+    )
     scan_parser.set_defaults(func=lambda args: 0)  # main()関数で処理
 
     # exclude サブコマンド
     setup_exclude_parser(subparsers)
 
+    # prune サブコマンド
+    setup_prune_parser(subparsers)
+
+    # serve サブコマンド
+    setup_serve_parser(subparsers)
+
+    # watch サブコマンド
+    setup_watch_parser(subparsers)
+
+    # merge サブコマンド
+    setup_merge_parser(subparsers)
+
+    # query サブコマンド
+    setup_query_parser(subparsers)
+
+    # diff サブコマンド
+    setup_diff_parser(subparsers)
+
+    # history サブコマンド
+    setup_history_parser(subparsers)
+
+    # bench サブコマンド
+    setup_bench_parser(subparsers)
+
+    # outbox サブコマンド
+    setup_outbox_parser(subparsers)
+
+    # remediate サブコマンド
+    setup_remediate_parser(subparsers)
+
     return parser
 
 
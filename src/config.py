@@ -3,10 +3,17 @@
 """
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any
 
 
+def _split_list(value: str | None) -> list[str]:
+    """カンマ区切りの環境変数をリストに変換"""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
 @dataclass
 class Config:
     """アプリケーション設定を管理するデータクラス
@@ -16,18 +23,88 @@ class Config:
         slack_bot_token: Slack Bot Token（Slack SDK使用時）
         slack_channel: Slack チャンネル名（Slack SDK使用時）
         use_slack_sdk: Slack SDK使用フラグ（Trueの場合はSlack SDKを使用）
+        slack_blocks: Slack SDK でサマリーとスレッドへの返信（Block Kit）で通知するフラグ
+        slack_thread_by: スレッドへの返信をまとめる単位（region または account）
+        slack_post_concurrency: スレッドへの返信を並列に投稿するスレッド数
+        slack_post_rate: Slack への1秒あたりの投稿数の上限（0の場合は制限しない）
         exclusion_rules_file: 除外ルールファイルのパス
+        policy_rules_file: ポリシールールファイルのパス（存在しない場合は組み込みの判定を使用）
         log_level: ログレベル（DEBUG, INFO, WARNING, ERROR, CRITICAL）
         aws_timeout: AWS API呼び出しのタイムアウト（秒）
+        vpc_partitioning: リージョン内のセキュリティグループをVPC単位で並列取得するフラグ
+        vpc_max_workers: VPC単位の並列取得で使用するスレッド数（リージョンごと）
+        scan_deadline: スキャン全体の期限（秒、0の場合は無制限）
+        region_deadline: リージョンごとのスキャン期限（秒、0の場合は無制限）
+        hedge_retry: リージョン期限切れ時に新しいクライアントで1回だけ再試行するフラグ
+        regions: スキャン対象リージョンの許可リスト（指定時はリージョン一覧を取得しない）
+        excluded_regions: スキャン対象から除外するリージョン
+        region_source: リージョン一覧の取得元（api: describe_regions, static: botocore同梱データ）
+        region_cache_file: リージョン一覧のキャッシュファイルのパス
+        region_cache_ttl: リージョン一覧のキャッシュ有効期間（秒、0の場合はキャッシュしない）
+        checkpoint_file: チェックポイントファイルのパス（空の場合は記録しない）
+        scan_engine: スキャンエンジン（thread: スレッドプール, async: asyncio + aiobotocore）
+        async_max_concurrency: 非同期エンジンで同時に実行するAPI呼び出しの上限
+        serve_interval: 常駐モードのスキャン間隔（秒）
+        serve_jitter: 常駐モードのスキャン間隔に加える揺らぎの最大値（秒）
+        fetch_mode: 取得方法（groups: describe_security_groups,
+            rules: describe_security_group_rules によるルール単位の取得）
+        snapshot_store: スキャン結果を保存するスナップショットストアのパス（空の場合は保存しない）
+        history_dir: スナップショットの履歴を記録するディレクトリ（空の場合は記録しない）
+        history_full_every: 履歴に完全スナップショットを記録する間隔（記録回数）
+        history_retention_days: 履歴を保持する日数（0の場合は無期限）
+        metrics_file: 実行ごとに計測値を書き出すOpenMetricsテキストファイルのパス（空の場合は書き出さない）
+        metrics_summary: 実行の終わりに計測値の集計表を標準エラー出力に表示するフラグ
+        trace_file: 実行ごとにトレース（Trace Event形式のJSON）を書き出すファイル（空の場合は記録しない）
+        lambda_safety_margin: Lambda の残り時間のうち、通知と応答のためにスキャンに使わない時間（秒）
+        lambda_max_resumes: Lambda でチェックポイントから続けて再開する回数の上限
+            （上限に達したらチェックポイントを破棄し、次の呼び出しは最初からスキャンする）
+        outbox_file: 通知のアウトボックス（SQLite）のパス（空の場合は直接送信する）
+        notify_sinks: 追加の通知先（slack:<チャンネル>, webhook:<URL>, file:<パス>）
+        outbox_max_attempts: 通知先ごとの配信の試行回数の上限
+        outbox_flush_timeout: CLIの実行の終わりに通知の配信を待つ時間（秒）
     """
 
     slack_webhook_url: str | None = None
     slack_bot_token: str | None = None
     slack_channel: str = "#alerts"
     use_slack_sdk: bool = False
+    slack_blocks: bool = False
+    slack_thread_by: str = "region"
+    slack_post_concurrency: int = 4
+    slack_post_rate: float = 1.0
     exclusion_rules_file: str = "../config/exclusion_rules.yaml"
+    policy_rules_file: str = "../config/policy_rules.yaml"
     log_level: str = "INFO"
     aws_timeout: int = 10
+    vpc_partitioning: bool = False
+    vpc_max_workers: int = 4
+    scan_deadline: float = 0.0
+    region_deadline: float = 0.0
+    hedge_retry: bool = False
+    regions: list[str] = field(default_factory=list)
+    excluded_regions: list[str] = field(default_factory=list)
+    region_source: str = "api"
+    region_cache_file: str = "~/.cache/neko_sg/regions.json"
+    region_cache_ttl: int = 86400
+    checkpoint_file: str = ""
+    scan_engine: str = "thread"
+    async_max_concurrency: int = 50
+    serve_interval: float = 3600.0
+    serve_jitter: float = 300.0
+    fetch_mode: str = "groups"
+    snapshot_store: str = ""
+    history_dir: str = ""
+    history_full_every: int = 10
+    history_retention_days: float = 90.0
+    metrics_file: str = ""
+    metrics_summary: bool = False
+    trace_file: str = ""
+    lambda_safety_margin: float = 10.0
+    lambda_max_resumes: int = 3
+    outbox_file: str = ""
+    notify_sinks: list[str] = field(default_factory=list)
+    outbox_max_attempts: int = 8
+    outbox_flush_timeout: float = 30.0
 
     @classmethod
     def from_env(cls) -> "Config":
@@ -41,11 +118,45 @@ class Config:
             slack_bot_token=os.getenv("SLACK_BOT_TOKEN"),
             slack_channel=os.getenv("SLACK_CHANNEL", "#alerts"),
             use_slack_sdk=os.getenv("USE_SLACK_SDK", "false").lower() == "true",
+            slack_blocks=os.getenv("SLACK_BLOCKS", "false").lower() == "true",
+            slack_thread_by=os.getenv("SLACK_THREAD_BY", "region").lower(),
+            slack_post_concurrency=int(os.getenv("SLACK_POST_CONCURRENCY", "4")),
+            slack_post_rate=float(os.getenv("SLACK_POST_RATE", "1")),
             exclusion_rules_file=os.getenv(
                 "EXCLUSION_RULES_FILE", "../config/exclusion_rules.yaml"
             ),
+            policy_rules_file=os.getenv("POLICY_RULES_FILE", "../config/policy_rules.yaml"),
             log_level=os.getenv("LOG_LEVEL", "INFO"),
             aws_timeout=int(os.getenv("AWS_TIMEOUT", "10")),
+            vpc_partitioning=os.getenv("VPC_PARTITIONING", "false").lower() == "true",
+            vpc_max_workers=int(os.getenv("VPC_MAX_WORKERS", "4")),
+            scan_deadline=float(os.getenv("SCAN_DEADLINE", "0")),
+            region_deadline=float(os.getenv("REGION_DEADLINE", "0")),
+            hedge_retry=os.getenv("HEDGE_RETRY", "false").lower() == "true",
+            regions=_split_list(os.getenv("AWS_REGIONS")),
+            excluded_regions=_split_list(os.getenv("EXCLUDED_REGIONS")),
+            region_source=os.getenv("REGION_SOURCE", "api").lower(),
+            region_cache_file=os.getenv("REGION_CACHE_FILE", "~/.cache/neko_sg/regions.json"),
+            region_cache_ttl=int(os.getenv("REGION_CACHE_TTL", "86400")),
+            checkpoint_file=os.getenv("CHECKPOINT_FILE", ""),
+            scan_engine=os.getenv("SCAN_ENGINE", "thread").lower(),
+            async_max_concurrency=int(os.getenv("ASYNC_MAX_CONCURRENCY", "50")),
+            serve_interval=float(os.getenv("SERVE_INTERVAL", "3600")),
+            serve_jitter=float(os.getenv("SERVE_JITTER", "300")),
+            fetch_mode=os.getenv("FETCH_MODE", "groups").lower(),
+            snapshot_store=os.getenv("SNAPSHOT_STORE", ""),
+            history_dir=os.getenv("HISTORY_DIR", ""),
+            history_full_every=int(os.getenv("HISTORY_FULL_EVERY", "10")),
+            history_retention_days=float(os.getenv("HISTORY_RETENTION_DAYS", "90")),
+            metrics_file=os.getenv("METRICS_FILE", ""),
+            metrics_summary=os.getenv("METRICS_SUMMARY", "false").lower() == "true",
+            trace_file=os.getenv("TRACE_FILE", ""),
+            lambda_safety_margin=float(os.getenv("LAMBDA_SAFETY_MARGIN", "10")),
+            lambda_max_resumes=int(os.getenv("LAMBDA_MAX_RESUMES", "3")),
+            outbox_file=os.getenv("OUTBOX_FILE", ""),
+            notify_sinks=_split_list(os.getenv("NOTIFY_SINKS")),
+            outbox_max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+            outbox_flush_timeout=float(os.getenv("OUTBOX_FLUSH_TIMEOUT", "30")),
         )
 
     def get_exclusion_rules_path(self, script_dir: str) -> str:
@@ -61,6 +172,19 @@ class Config:
             return self.exclusion_rules_file
         return os.path.join(script_dir, self.exclusion_rules_file)
 
+    def get_policy_rules_path(self, script_dir: str) -> str:
+        """ポリシールールファイルの絶対パスを取得
+
+        Args:
+            script_dir: スクリプトのディレクトリパス
+
+        Returns:
+            str: ポリシールールファイルの絶対パス
+        """
+        if os.path.isabs(self.policy_rules_file):
+            return self.policy_rules_file
+        return os.path.join(script_dir, self.policy_rules_file)
+
     def get_aws_config(self) -> Any:
         """boto3クライアント用の設定（タイムアウト等）を取得
 
@@ -0,0 +1,286 @@
+"""
+常駐（デーモン）モード
+
+EC2クライアント、索引化した除外ルール、リージョン一覧、セキュリティグループの在庫を
+Scanner に保持したまま、ジッター付きの間隔で定期的にスキャンを実行する。
+除外ルール・ポリシーファイルの変更は自動的に再読み込みし、SIGUSR1で即時スキャンを行う。
+期限付きの除外ルールは期限をヒープで管理し、期限が来たら索引を作り直して該当する
+セキュリティグループだけを再評価する（ファイルの再読み込みや全体のスキャンを待たない）。
+アウトボックスを使う設定の場合、通知はバックグラウンドのワーカーが配信し、スキャンは待たない。
+"""
+
+import heapq
+import logging
+import os
+import random
+import signal
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from src.config import Config
+from src.inventory import InventoryCache
+from src.main import send_slack_notification_if_configured
+from src.metrics import METRICS, finish_run
+from src.outbox import build_payload, open_worker
+from src.policy import load_policy_rules
+from src.scanner import Scanner
+from src.store import supports_snapshots
+from src.tracing import TRACER, finish_trace
+from src.utils import ScanReport, get_account_id, load_exclusion_rules
+
+logger = logging.getLogger(__name__)
+
+# 待機中に除外ルールファイルの変更を確認する間隔（秒）
+RELOAD_POLL_INTERVAL = 5.0
+
+
+def _mtime(path: str) -> float | None:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class Daemon:
+    """定期スキャンを実行する常駐プロセス
+
+    Attributes:
+        config: アプリケーション設定
+        interval: スキャン間隔（秒）
+        jitter: スキャン間隔に加えるランダムな揺らぎの最大値（秒）
+        inventory: 直近のスキャンで取得したセキュリティグループの在庫
+        scanner: EC2クライアント、スレッドプール、索引化した除外ルール、リージョン一覧を
+            保持するスキャナー（在庫は inventory を共有する）
+        notifier: 通知を配信するアウトボックスのワーカー（アウトボックスを使わない場合はNone）
+    """
+
+    def __init__(self, config: Config, script_dir: str, interval: float, jitter: float) -> None:
+        self.config = config
+        self.interval = interval
+        self.jitter = jitter
+        self.inventory = InventoryCache()
+        self.scanner = Scanner(config, inventory=self.inventory)
+        self.notifier = open_worker(config)
+        self._rules_path = config.get_exclusion_rules_path(script_dir)
+        self._policy_path = config.get_policy_rules_path(script_dir)
+        self._mtimes: dict[str, float | None] | None = None
+        self._account: str | None = None
+        self._save_snapshots = bool(config.snapshot_store) and supports_snapshots(config)
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def reload_if_changed(self) -> bool:
+        """除外ルール・ポリシーファイルが変更されていれば再読み込みする
+
+        Returns:
+            bool: 再読み込みした場合True
+        """
+        mtimes = {path: _mtime(path) for path in (self._rules_path, self._policy_path)}
+        if mtimes == self._mtimes:
+            return False
+        self._mtimes = mtimes
+        self.scanner.set_rules(
+            load_exclusion_rules(self._rules_path), load_policy_rules(self._policy_path)
+        )
+        self._rebuild_expiry_heap()
+        logger.info(
+            "除外ルールを読み込みました（除外ルール: %d件, 期限切れ: %d件, ポリシー: %d件）",
+            len(self.scanner.exclusion_index),
+            self.scanner.exclusion_index.expired,
+            len(self.scanner.policies or []),
+        )
+        return True
+
+    def _rebuild_expiry_heap(self) -> None:
+        """索引に含まれる除外ルールの期限からヒープを作り直す内部関数"""
+        self._expiry_heap = list(self.scanner.exclusion_index.expiries)
+        heapq.heapify(self._expiry_heap)
+
+    def seconds_until_expiry(self) -> float | None:
+        """次の除外ルールの期限までの秒数を返す（期限付きのルールがない場合はNone）"""
+        if not self._expiry_heap:
+            return None
+        return max(0.0, self._expiry_heap[0][0] - time.time())
+
+    def expire_due(self) -> list[dict[str, str]]:
+        """期限が来た除外ルールを無効にし、該当するセキュリティグループを再評価する
+
+        Returns:
+            list[dict[str, str]]: 再評価したセキュリティグループの検出結果
+                （期限が来たルールがない場合は空のリスト）
+        """
+        now = time.time()
+        group_ids: list[str] = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            group_ids.append(heapq.heappop(self._expiry_heap)[1])
+        if not group_ids:
+            return []
+        group_ids = list(dict.fromkeys(group_ids))
+        # 期限切れのルールを除いて索引を作り直す（ファイルは読み直さない）
+        self.scanner.set_rules(self.scanner.exclusion_index.rules, self.scanner.policies)
+        self._rebuild_expiry_heap()
+        logger.info("除外ルールの期限が切れました: %s", ", ".join(group_ids))
+        found_groups = self.scanner.scan_group(group_ids)
+        if found_groups:
+            self._notify(found_groups, ScanReport())
+        return found_groups
+
+    def _notify(self, found_groups: list[dict[str, str]], report: ScanReport) -> None:
+        """検出結果をアウトボックスのワーカー、またはSlackに直接通知する内部関数"""
+        if self.notifier is not None:
+            self.notifier.start()
+            self.notifier.submit(build_payload(found_groups, report))
+        else:
+            send_slack_notification_if_configured(self.config, found_groups, report=report)
+
+    def run_once(self) -> list[dict[str, str]]:
+        """スキャンを1回実行し、検出結果を通知する
+
+        Returns:
+            list[dict[str, str]]: 検出結果
+        """
+        self.reload_if_changed()
+        report = ScanReport()
+        start = time.monotonic()
+        run_span = TRACER.start("run", command="serve")
+        try:
+            found_groups = self.scanner.scan(report=report)
+        finally:
+            TRACER.end(run_span)
+        logger.info(
+            "スキャン完了: %d件検出, %.1f秒, 在庫 %d件",
+            len(found_groups),
+            time.monotonic() - start,
+            len(self.inventory),
+        )
+        if self._save_snapshots:
+            self._save_snapshot(found_groups, report)
+        if found_groups or report.is_partial:
+            self._notify(found_groups, report)
+        # カウンターは常駐プロセスの起動からの累計として書き出す
+        finish_run(self.config, report)
+        # トレースは毎回書き出して消去する（最新の1回分だけを残す）
+        finish_trace(self.config)
+        return found_groups
+
+    def _save_snapshot(self, found_groups: list[dict[str, str]], report: ScanReport) -> None:
+        """在庫と検出結果をスナップショットストアに保存する"""
+        from src.history import record_snapshot
+        from src.store import SnapshotStore
+
+        if self._account is None:
+            self._account = get_account_id(self.config)
+        try:
+            with SnapshotStore(self.config.snapshot_store) as store:
+                store.begin(self._account)
+                for region in self.inventory.regions():
+                    store.replace_region(region, self.inventory.groups(region))
+                for finding in found_groups:
+                    store.record_finding(finding)
+                store.commit(report)
+                record_snapshot(self.config, store, report)
+        except Exception as e:
+            logger.error("スナップショットの保存に失敗しました: %s", e)
+
+    def next_delay(self) -> float:
+        """次のスキャンまでの待機時間（ジッター込み）を返す"""
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    def trigger(self) -> None:
+        """即時スキャンを要求する"""
+        self._wake.set()
+
+    def stop(self) -> None:
+        """常駐ループを停止する"""
+        self._stop.set()
+        self._wake.set()
+
+    def install_signal_handlers(self) -> None:
+        """SIGUSR1で即時スキャン、SIGTERM/SIGINTで停止するシグナルハンドラを設定"""
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.trigger())
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+
+    def serve_forever(self, max_runs: int | None = None) -> None:
+        """停止要求があるまでスキャンを繰り返す
+
+        Args:
+            max_runs: 実行するスキャン回数の上限（主にテスト用）
+        """
+        runs = 0
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("スキャン中にエラーが発生しました: %s", e)
+            runs += 1
+            if max_runs is not None and runs >= max_runs:
+                break
+
+            deadline = time.monotonic() + self.next_delay()
+            while not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                timeout = min(remaining, RELOAD_POLL_INTERVAL)
+                until_expiry = self.seconds_until_expiry()
+                if until_expiry is not None:
+                    timeout = min(timeout, until_expiry)
+                if self._wake.wait(timeout):
+                    self._wake.clear()
+                    if not self._stop.is_set():
+                        logger.info("即時スキャンの要求を受け付けました。")
+                    break
+                # 待機中も除外ルールの変更と期限を監視する
+                self.reload_if_changed()
+                try:
+                    self.expire_due()
+                except Exception as e:
+                    logger.error("期限切れの除外ルールの再評価中にエラーが発生しました: %s", e)
+        self.scanner.close()
+        if self.notifier is not None:
+            self.notifier.stop(self.config.outbox_flush_timeout)
+        logger.info("常駐モードを終了します。")
+
+
+def serve_command(interval: float | None = None, jitter: float | None = None) -> int:
+    """serveサブコマンドの実行
+
+    Args:
+        interval: スキャン間隔（秒、省略時は設定値）
+        jitter: スキャン間隔の揺らぎ（秒、省略時は設定値）
+
+    Returns:
+        int: 終了コード
+    """
+    load_dotenv()
+    config = Config.from_env()
+    logging.basicConfig(
+        level=getattr(logging, config.log_level.upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    if config.metrics_file or config.metrics_summary:
+        METRICS.enable()
+    if config.trace_file:
+        TRACER.enable()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    daemon = Daemon(
+        config,
+        script_dir,
+        interval=interval if interval is not None else config.serve_interval,
+        jitter=jitter if jitter is not None else config.serve_jitter,
+    )
+    daemon.install_signal_handlers()
+    logger.info(
+        "常駐モードを開始します（PID: %d, 間隔: %s秒, ジッター: %s秒）",
+        os.getpid(),
+        daemon.interval,
+        daemon.jitter,
+    )
+    daemon.serve_forever()
+    return 0
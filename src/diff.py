@@ -0,0 +1,261 @@
+"""
+スナップショットの差分（変更履歴）
+
+2つのスナップショットのセキュリティグループを (リージョン, グループID) 順に並べ、
+ソート済みマージで突き合わせる。入力はどちらもストリームとして1グループずつ読むため、
+数百万ルールのスナップショットでも線形時間・一定のメモリで比較できる。
+"""
+
+import json
+import logging
+import os
+import sys
+from collections.abc import Generator, Iterable, Iterator
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from dotenv import load_dotenv
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GroupDiff:
+    """セキュリティグループ1件の差分
+
+    Attributes:
+        status: "added"、"removed"、"modified" のいずれか
+        region: リージョン名
+        group_id: セキュリティグループID
+        group_name: セキュリティグループ名（削除された場合は削除前の名前）
+        added_rules: 追加されたルール（[プロトコル, 開始ポート, 終了ポート, CIDR]）
+        removed_rules: 削除されたルール
+        changed_fields: 変更された属性（group_name, description）
+    """
+
+    status: str
+    region: str
+    group_id: str
+    group_name: str
+    added_rules: list[list[Any]] = field(default_factory=list)
+    removed_rules: list[list[Any]] = field(default_factory=list)
+    changed_fields: list[str] = field(default_factory=list)
+
+
+def _key(group: dict[str, Any]) -> tuple[str, str]:
+    return (group["region"], group["group_id"])
+
+
+def _checked_order(groups: Iterable[dict[str, Any]], name: str) -> Iterator[dict[str, Any]]:
+    """入力が (リージョン, グループID) 順に並んでいることを確認しながら返す内部関数"""
+    previous: tuple[str, str] | None = None
+    for group in groups:
+        key = _key(group)
+        if previous is not None and key <= previous:
+            raise ValueError(
+                f"{name} のセキュリティグループが (リージョン, グループID) 順に並んでいません: {key}"
+            )
+        previous = key
+        yield group
+
+
+def _rule_set(group: dict[str, Any]) -> set[tuple[Any, ...]]:
+    return {tuple(rule) for rule in group.get("rules", [])}
+
+
+def _sorted_rules(rules: set[tuple[Any, ...]]) -> list[list[Any]]:
+    return [list(rule) for rule in sorted(rules, key=lambda rule: tuple(str(v) for v in rule))]
+
+
+def diff_snapshots(
+    old: Iterable[dict[str, Any]], new: Iterable[dict[str, Any]]
+) -> Generator[GroupDiff, None, None]:
+    """2つのスナップショットの差分を返すジェネレータ
+
+    Args:
+        old: 比較元のセキュリティグループ（(リージョン, グループID) 順）
+        new: 比較先のセキュリティグループ（(リージョン, グループID) 順）
+
+    Yields:
+        GroupDiff: 追加・削除・変更されたセキュリティグループ（(リージョン, グループID) 順）
+
+    Raises:
+        ValueError: 入力が (リージョン, グループID) 順に並んでいない場合
+    """
+    old_iter = _checked_order(old, "比較元")
+    new_iter = _checked_order(new, "比較先")
+    old_group = next(old_iter, None)
+    new_group = next(new_iter, None)
+
+    while old_group is not None or new_group is not None:
+        if old_group is not None and (new_group is None or _key(old_group) < _key(new_group)):
+            yield GroupDiff(
+                "removed",
+                old_group["region"],
+                old_group["group_id"],
+                old_group.get("group_name", ""),
+                removed_rules=_sorted_rules(_rule_set(old_group)),
+            )
+            old_group = next(old_iter, None)
+        elif new_group is not None and (old_group is None or _key(new_group) < _key(old_group)):
+            yield GroupDiff(
+                "added",
+                new_group["region"],
+                new_group["group_id"],
+                new_group.get("group_name", ""),
+                added_rules=_sorted_rules(_rule_set(new_group)),
+            )
+            new_group = next(new_iter, None)
+        elif old_group is not None and new_group is not None:
+            old_rules, new_rules = _rule_set(old_group), _rule_set(new_group)
+            changed = [
+                name
+                for name in ("group_name", "description")
+                if old_group.get(name, "") != new_group.get(name, "")
+            ]
+            if old_rules != new_rules or changed:
+                yield GroupDiff(
+                    "modified",
+                    new_group["region"],
+                    new_group["group_id"],
+                    new_group.get("group_name", ""),
+                    added_rules=_sorted_rules(new_rules - old_rules),
+                    removed_rules=_sorted_rules(old_rules - new_rules),
+                    changed_fields=changed,
+                )
+            old_group = next(old_iter, None)
+            new_group = next(new_iter, None)
+
+
+def write_snapshot_file(path: str, groups: Iterable[dict[str, Any]]) -> int:
+    """スナップショットを1行1グループのJSON Lines形式で書き出す
+
+    Args:
+        path: 出力先のファイル
+        groups: (リージョン, グループID) 順のセキュリティグループ
+
+    Returns:
+        int: 書き出したグループ数
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for group in groups:
+            file.write(json.dumps(group, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def read_snapshot_file(path: str) -> Generator[dict[str, Any], None, None]:
+    """write_snapshot_file で書き出したスナップショットを1グループずつ読み込む"""
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _format_rule(rule: list[Any]) -> str:
+    protocol, from_port, to_port, cidr = rule
+    if protocol == "-1":
+        ports = "all"
+    elif from_port is None or from_port == to_port:
+        ports = str(from_port if from_port is not None else "all")
+    else:
+        ports = f"{from_port}-{to_port}"
+    return f"{protocol} {ports} {cidr}"
+
+
+def diff_command(
+    old_ref: str = "previous",
+    new_ref: str = "latest",
+    store_path: str | None = None,
+    as_json: bool = False,
+) -> int:
+    """diffサブコマンドの実行
+
+    Args:
+        old_ref: 比較元（latest, previous, スナップショットID、エクスポートしたファイル、
+            または履歴の時点 @通番 / @latest / @日時）
+        new_ref: 比較先（同上）
+        store_path: スナップショットストアのパス（省略時は SNAPSHOT_STORE）
+        as_json: Trueの場合は1行1件のJSONで出力する
+
+    Returns:
+        int: 終了コード（差分がない場合も0。一部のリージョンが未完了のスナップショットは比較せず1）
+    """
+    from src.store import SnapshotStore
+
+    load_dotenv()
+    config = Config.from_env()
+    path = store_path or config.snapshot_store
+    store: SnapshotStore | None = None
+
+    def open_history(ref: str) -> Iterable[dict[str, Any]] | None:
+        from src.history import HistoryLog
+
+        if not config.history_dir:
+            print("エラー: 履歴のディレクトリが設定されていません（HISTORY_DIR）")
+            return None
+        history = HistoryLog(config.history_dir, config.history_full_every)
+        entry = history.find(ref)
+        if entry is None:
+            print(f"エラー: 履歴 @{ref} が見つかりません。")
+            return None
+        return history.reconstruct(entry)
+
+    def open_ref(ref: str) -> Iterable[dict[str, Any]] | None:
+        nonlocal store
+        if os.path.isfile(ref):
+            return read_snapshot_file(ref)
+        if ref.startswith("@"):
+            return open_history(ref[1:])
+        if not path or not os.path.exists(os.path.expanduser(path)):
+            print(f"エラー: {ref} はファイルではなく、スナップショットストアも見つかりません。")
+            return None
+        if store is None:
+            store = SnapshotStore(path)
+        snapshot_id = store.resolve(ref)
+        if snapshot_id is None:
+            print(f"エラー: スナップショット {ref} が見つかりません。")
+            return None
+        snapshot = store.snapshot(snapshot_id)
+        if snapshot is not None and not snapshot["complete"]:
+            # 未完了のリージョンのグループがすべて削除（または追加）されたものとして表示されるため
+            print(
+                f"エラー: スナップショット {ref}（ID: {snapshot_id}）は一部のリージョンが未完了のため"
+                "比較できません。"
+            )
+            return None
+        return store.iter_groups(snapshot_id)
+
+    try:
+        old, new = open_ref(old_ref), open_ref(new_ref)
+        if old is None or new is None:
+            return 1
+        counts = {"added": 0, "removed": 0, "modified": 0}
+        for group_diff in diff_snapshots(old, new):
+            counts[group_diff.status] += 1
+            if as_json:
+                print(json.dumps(asdict(group_diff), ensure_ascii=False))
+                continue
+            mark = {"added": "+", "removed": "-", "modified": "~"}[group_diff.status]
+            print(f"{mark} {group_diff.region} {group_diff.group_id} ({group_diff.group_name})")
+            for name in group_diff.changed_fields:
+                print(f"    ~ {name}")
+            for rule in group_diff.added_rules:
+                print(f"    + {_format_rule(rule)}")
+            for rule in group_diff.removed_rules:
+                print(f"    - {_format_rule(rule)}")
+    except ValueError as e:
+        print(f"エラー: {e}")
+        return 1
+    finally:
+        if store is not None:
+            store.close()
+
+    print(
+        f"追加: {counts['added']}, 削除: {counts['removed']}, 変更: {counts['modified']}",
+        file=sys.stderr,
+    )
+    return 0
@@ -0,0 +1,327 @@
+"""
+CloudTrail / EventBridge のセキュリティグループ変更イベントによる差分評価
+
+変更イベントごとに対象のセキュリティグループだけを describe_security_groups(GroupIds=...)
+で再取得し、在庫キャッシュと直前の検出状態に対して再評価する。
+イベントはJSON Lines（ファイルまたは標準入力）や queue.Queue から受け取る。
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass
+from typing import IO, Any
+
+from botocore.exceptions import BotoCoreError, ClientError
+from dotenv import load_dotenv
+
+from src.config import Config
+from src.inventory import InventoryCache
+from src.policy import load_policy_rules
+from src.utils import (
+    ClientPool,
+    compact_security_group,
+    compile_exclusion_rules,
+    evaluate_security_group,
+    find_globally_accessible_security_groups,
+    load_exclusion_rules,
+)
+
+logger = logging.getLogger(__name__)
+
+# requestParameters.groupId で対象グループを特定できるイベント
+_GROUP_ID_EVENTS = {
+    "AuthorizeSecurityGroupIngress",
+    "AuthorizeSecurityGroupEgress",
+    "RevokeSecurityGroupIngress",
+    "RevokeSecurityGroupEgress",
+    "UpdateSecurityGroupRuleDescriptionsIngress",
+    "UpdateSecurityGroupRuleDescriptionsEgress",
+    "DeleteSecurityGroup",
+}
+
+SECURITY_GROUP_EVENTS = _GROUP_ID_EVENTS | {"CreateSecurityGroup", "ModifySecurityGroupRules"}
+
+
+@dataclass(frozen=True)
+class GroupChange:
+    """イベントから抽出したセキュリティグループの変更
+
+    Attributes:
+        region: リージョン名
+        group_id: セキュリティグループID
+        event_name: CloudTrailのイベント名
+    """
+
+    region: str
+    group_id: str
+    event_name: str
+
+
+@dataclass(frozen=True)
+class FindingChange:
+    """再評価による検出状態の変化
+
+    Attributes:
+        status: "opened"（新たに検出）または "resolved"（解消）
+        finding: 検出結果（resolvedの場合は直前の検出結果）
+    """
+
+    status: str
+    finding: dict[str, str]
+
+
+def parse_event(event: dict[str, Any]) -> GroupChange | None:
+    """CloudTrailレコードまたはEventBridgeイベントから変更対象を抽出する
+
+    Args:
+        event: CloudTrailレコード、またはEventBridgeの "AWS API Call via CloudTrail" イベント
+
+    Returns:
+        GroupChange | None: 変更対象。セキュリティグループの変更でない場合はNone
+    """
+    detail = event.get("detail", event)
+    if not isinstance(detail, dict):
+        return None
+    event_name = detail.get("eventName")
+    if event_name not in SECURITY_GROUP_EVENTS:
+        return None
+    if detail.get("errorCode"):
+        # 失敗したAPI呼び出しは状態を変えない
+        return None
+
+    region = detail.get("awsRegion") or event.get("region")
+    request = detail.get("requestParameters") or {}
+    response = detail.get("responseElements") or {}
+
+    group_id = None
+    if event_name in _GROUP_ID_EVENTS:
+        group_id = request.get("groupId")
+    elif event_name == "CreateSecurityGroup":
+        group_id = response.get("groupId")
+    elif event_name == "ModifySecurityGroupRules":
+        group_id = (request.get("ModifySecurityGroupRulesRequest") or request).get("GroupId")
+
+    if not region or not group_id:
+        logger.warning("イベント %s から対象のセキュリティグループを特定できません。", event_name)
+        return None
+    return GroupChange(region=str(region), group_id=str(group_id), event_name=str(event_name))
+
+
+def read_events(stream: IO[str]) -> Generator[dict[str, Any], None, None]:
+    """JSON Lines形式のイベントを1行ずつ読み込むジェネレータ
+
+    Args:
+        stream: イベントを読み込むストリーム（ファイルまたは標準入力）
+
+    Yields:
+        dict[str, Any]: イベント（不正な行はスキップする）
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            logger.warning("不正なイベント行をスキップします: %s", line[:80])
+            continue
+        if isinstance(event, dict):
+            yield event
+
+
+def iter_queue(
+    event_queue: "queue.Queue[dict[str, Any] | None]",
+) -> Generator[dict[str, Any], None, None]:
+    """キューからイベントを取り出すジェネレータ（Noneを受け取ると終了する）
+
+    Args:
+        event_queue: イベントのキュー（ローカルのキューサービスの代替）
+
+    Yields:
+        dict[str, Any]: イベント
+    """
+    while True:
+        event = event_queue.get()
+        if event is None:
+            return
+        yield event
+
+
+class EventProcessor:
+    """変更イベントごとに対象のセキュリティグループだけを再評価する
+
+    Attributes:
+        inventory: セキュリティグループの在庫キャッシュ
+        findings: 現在の検出状態（(リージョン, グループID) -> 検出結果）
+    """
+
+    def __init__(
+        self,
+        exclusion_rules: Any,
+        config: Any | None = None,
+        policies: list[Any] | None = None,
+        inventory: InventoryCache | None = None,
+        clients: ClientPool | None = None,
+    ) -> None:
+        self.exclusion_index = compile_exclusion_rules(exclusion_rules)
+        self.config = config
+        self.policies = policies
+        self.inventory = inventory if inventory is not None else InventoryCache()
+        self.clients = clients if clients is not None else ClientPool(config)
+        self.findings: dict[tuple[str, str], dict[str, str]] = {}
+
+    def prime(self) -> None:
+        """在庫キャッシュの内容から現在の検出状態を構築する"""
+        self.findings.clear()
+        for region in self.inventory.regions():
+            for sg in self.inventory.groups(region):
+                finding = evaluate_security_group(sg, region, self.exclusion_index, self.policies)
+                if finding is not None:
+                    self.findings[(region, sg["GroupId"])] = finding
+
+    def _fetch_group(self, region: str, group_id: str) -> dict[str, Any] | None:
+        """対象のセキュリティグループだけを取得する（削除済みの場合はNone）"""
+        ec2 = self.clients.get(region)
+        try:
+            response = ec2.describe_security_groups(GroupIds=[group_id])
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidGroup.NotFound":
+                return None
+            raise
+        groups = response.get("SecurityGroups", [])
+        return compact_security_group(groups[0]) if groups else None
+
+    def apply(self, change: GroupChange) -> FindingChange | None:
+        """変更を1件反映して再評価する
+
+        Args:
+            change: セキュリティグループの変更
+
+        Returns:
+            FindingChange | None: 検出状態が変化した場合はその内容
+        """
+        key = (change.region, change.group_id)
+        previous = self.findings.get(key)
+
+        if change.event_name == "DeleteSecurityGroup":
+            sg = None
+        else:
+            try:
+                sg = self._fetch_group(change.region, change.group_id)
+            except (BotoCoreError, ClientError) as e:
+                logger.error(
+                    "セキュリティグループ %s (%s) の取得エラー: %s",
+                    change.group_id,
+                    change.region,
+                    e,
+                )
+                return None
+
+        if sg is None:
+            self.inventory.remove(change.region, change.group_id)
+            finding = None
+        else:
+            self.inventory.upsert(change.region, sg)
+            finding = evaluate_security_group(
+                sg, change.region, self.exclusion_index, self.policies
+            )
+
+        if finding is not None:
+            self.findings[key] = finding
+            if previous is None:
+                return FindingChange("opened", finding)
+            return None
+        if previous is not None:
+            del self.findings[key]
+            return FindingChange("resolved", previous)
+        return None
+
+    def process(self, events: Iterable[dict[str, Any]]) -> Generator[FindingChange, None, None]:
+        """イベントを順に処理し、検出状態の変化を返すジェネレータ
+
+        Args:
+            events: CloudTrail / EventBridge イベント
+
+        Yields:
+            FindingChange: 検出状態の変化
+        """
+        for event in events:
+            change = parse_event(event)
+            if change is None:
+                continue
+            logger.debug("%s: %s (%s)", change.event_name, change.group_id, change.region)
+            result = self.apply(change)
+            if result is not None:
+                yield result
+
+
+def watch_command(events_path: str | None = None, initial_scan: bool = False) -> int:
+    """watchサブコマンドの実行
+
+    Args:
+        events_path: イベントのJSON Linesファイル（省略時または "-" の場合は標準入力）
+        initial_scan: Trueの場合は開始前に全体をスキャンして現在の検出状態を構築する
+
+    Returns:
+        int: 終了コード
+    """
+    from src.main import send_slack_notification_if_configured
+
+    load_dotenv()
+    config = Config.from_env()
+    logging.basicConfig(
+        level=getattr(logging, config.log_level.upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    exclusion_rules = load_exclusion_rules(config.get_exclusion_rules_path(script_dir))
+    policies = load_policy_rules(config.get_policy_rules_path(script_dir))
+    processor = EventProcessor(exclusion_rules, config, policies=policies)
+
+    if initial_scan:
+        logger.info("初回スキャンで現在の状態を取得しています...")
+        for _ in find_globally_accessible_security_groups(
+            processor.exclusion_index,
+            config,
+            policies=policies,
+            clients=processor.clients,
+            inventory=processor.inventory,
+        ):
+            pass
+        processor.prime()
+        logger.info("現在の検出数: %d件", len(processor.findings))
+
+    if not events_path or events_path == "-":
+        stream: IO[str] = sys.stdin
+    else:
+        try:
+            stream = open(events_path, encoding="utf-8")
+        except OSError as e:
+            logger.error("イベントファイル '%s' の読み込みエラー: %s", events_path, e)
+            return 1
+
+    try:
+        for change in processor.process(read_events(stream)):
+            finding = change.finding
+            if change.status == "opened":
+                logger.warning(
+                    "グローバルアクセス可能なSGを検出: %s in %s",
+                    finding["group_id"],
+                    finding["region"],
+                )
+                send_slack_notification_if_configured(config, [finding])
+            else:
+                logger.info(
+                    "グローバルアクセスが解消されました: %s in %s",
+                    finding["group_id"],
+                    finding["region"],
+                )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return 0
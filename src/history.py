@@ -0,0 +1,443 @@
+"""
+スナップショットの履歴ログ（定期的な完全スナップショット＋差分）
+
+履歴は追記専用のログファイル（history.log）とオフセット索引（history.idx）で構成する。
+ログの各レコードは固定長のヘッダーとzlibで圧縮したJSONからなり、
+完全スナップショット（全グループ）または前回からの差分（変更・削除されたグループのみ）を保持する。
+索引は固定長のエントリで、任意の時点を直前の完全スナップショットから差分を適用して再構築する。
+"""
+
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from dotenv import load_dotenv
+
+from src.config import Config
+from src.utils import ScanReport
+
+if TYPE_CHECKING:
+    from src.store import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "history.log"
+INDEX_FILE = "history.idx"
+
+KIND_FULL = 0
+KIND_DELTA = 1
+
+# レコードのヘッダー: マジック, 種類, 通番, 時刻（UNIX時間）, 圧縮後のペイロード長
+_HEADER = struct.Struct("<4sBQdI")
+_MAGIC = b"NSGH"
+# 索引のエントリ: 通番, 種類, 時刻, ログ内のオフセット, レコード長（ヘッダーを含む）
+_INDEX_ENTRY = struct.Struct("<QBdQI")
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    """履歴ログの索引エントリ
+
+    Attributes:
+        seq: 通番（1始まり、削除・圧縮後も変わらない）
+        kind: KIND_FULL（完全スナップショット）または KIND_DELTA（差分）
+        timestamp: 記録した時刻（UNIX時間）
+        offset: ログファイル内のオフセット
+        length: レコード長（ヘッダーを含む）
+    """
+
+    seq: int
+    kind: int
+    timestamp: float
+    offset: int
+    length: int
+
+
+def _group_key(group: dict[str, Any]) -> tuple[str, str]:
+    return (group["region"], group["group_id"])
+
+
+class HistoryLog:
+    """完全スナップショットと差分からなる追記専用の履歴ログ
+
+    Attributes:
+        directory: 履歴を保存するディレクトリ
+        full_every: 完全スナップショットを記録する間隔（記録回数）
+        retention_days: 履歴を保持する日数（0の場合は無期限）
+        entries: 索引エントリ（通番順）
+    """
+
+    def __init__(self, directory: str, full_every: int = 10, retention_days: float = 0) -> None:
+        self.directory = os.path.expanduser(directory)
+        self.full_every = max(1, full_every)
+        self.retention_days = retention_days
+        os.makedirs(self.directory, exist_ok=True)
+        self._log_path = os.path.join(self.directory, LOG_FILE)
+        self._index_path = os.path.join(self.directory, INDEX_FILE)
+        self.entries: list[HistoryEntry] = self._load_index()
+
+    # 索引の読み込みと修復
+
+    def _load_index(self) -> list[HistoryEntry]:
+        """索引を読み込み、ログと一致しない場合はログを走査して作り直す"""
+        entries: list[HistoryEntry] = []
+        try:
+            with open(self._index_path, "rb") as file:
+                data = file.read()
+            usable = len(data) - len(data) % _INDEX_ENTRY.size
+            entries = [
+                HistoryEntry(*_INDEX_ENTRY.unpack_from(data, offset))
+                for offset in range(0, usable, _INDEX_ENTRY.size)
+            ]
+        except OSError:
+            pass
+
+        log_size = os.path.getsize(self._log_path) if os.path.exists(self._log_path) else 0
+        end = entries[-1].offset + entries[-1].length if entries else 0
+        if end > log_size or (not entries and log_size):
+            logger.warning("履歴の索引がログと一致しないため作り直します。")
+            entries = []
+            end = 0
+        if end < log_size:
+            # 索引に記録されていないレコード（索引の書き込み前に中断した場合など）を回復する
+            entries.extend(self._scan(end, log_size))
+            self._write_index(entries)
+        return entries
+
+    def _scan(self, start: int, log_size: int) -> list[HistoryEntry]:
+        """ログを走査してレコードを列挙し、途中で壊れたレコード以降を切り詰める"""
+        entries: list[HistoryEntry] = []
+        offset = start
+        with open(self._log_path, "rb") as file:
+            file.seek(offset)
+            while offset + _HEADER.size <= log_size:
+                header = file.read(_HEADER.size)
+                magic, kind, seq, timestamp, length = _HEADER.unpack(header)
+                if magic != _MAGIC or offset + _HEADER.size + length > log_size:
+                    break
+                file.seek(length, os.SEEK_CUR)
+                entries.append(HistoryEntry(seq, kind, timestamp, offset, _HEADER.size + length))
+                offset += _HEADER.size + length
+        if offset < log_size:
+            logger.warning(
+                "履歴ログの末尾の不完全なレコードを切り詰めます（オフセット %d）", offset
+            )
+            with open(self._log_path, "r+b") as file:
+                file.truncate(offset)
+        return entries
+
+    def _write_index(self, entries: list[HistoryEntry]) -> None:
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            for entry in entries:
+                file.write(
+                    _INDEX_ENTRY.pack(
+                        entry.seq, entry.kind, entry.timestamp, entry.offset, entry.length
+                    )
+                )
+        os.replace(tmp_path, self._index_path)
+
+    # レコードの読み書き
+
+    def _read_payload(self, entry: HistoryEntry) -> Any:
+        with open(self._log_path, "rb") as file:
+            file.seek(entry.offset + _HEADER.size)
+            data = file.read(entry.length - _HEADER.size)
+        return json.loads(zlib.decompress(data))
+
+    def _append_record(self, kind: int, payload: Any, timestamp: float) -> HistoryEntry:
+        data = zlib.compress(
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        seq = self.entries[-1].seq + 1 if self.entries else 1
+        offset = os.path.getsize(self._log_path) if os.path.exists(self._log_path) else 0
+        with open(self._log_path, "ab") as file:
+            file.write(_HEADER.pack(_MAGIC, kind, seq, timestamp, len(data)) + data)
+            file.flush()
+            os.fsync(file.fileno())
+        entry = HistoryEntry(seq, kind, timestamp, offset, _HEADER.size + len(data))
+        with open(self._index_path, "ab") as file:
+            file.write(
+                _INDEX_ENTRY.pack(
+                    entry.seq, entry.kind, entry.timestamp, entry.offset, entry.length
+                )
+            )
+        self.entries.append(entry)
+        return entry
+
+    # 公開API
+
+    def find(self, ref: str) -> HistoryEntry | None:
+        """履歴の指定（通番、latest、またはISO形式の日時）からエントリを探す
+
+        Args:
+            ref: "latest"、通番、または "2026-01-31T12:00" などの日時
+                （日時の場合はその時点で最新のエントリ）
+
+        Returns:
+            HistoryEntry | None: 該当するエントリ
+        """
+        if not self.entries:
+            return None
+        if ref == "latest":
+            return self.entries[-1]
+        if ref.isdigit():
+            return next((entry for entry in self.entries if entry.seq == int(ref)), None)
+        try:
+            target = datetime.fromisoformat(ref).timestamp()
+        except ValueError:
+            return None
+        candidates = [entry for entry in self.entries if entry.timestamp <= target]
+        return candidates[-1] if candidates else None
+
+    def reconstruct(self, entry: HistoryEntry) -> list[dict[str, Any]]:
+        """指定したエントリの時点のスナップショットを再構築する
+
+        Args:
+            entry: 履歴のエントリ
+
+        Returns:
+            list[dict[str, Any]]: (リージョン, グループID) 順のセキュリティグループ
+        """
+        position = self.entries.index(entry)
+        base = max(i for i in range(position + 1) if self.entries[i].kind == KIND_FULL)
+        state = {_group_key(group): group for group in self._read_payload(self.entries[base])}
+        for delta_entry in self.entries[base + 1 : position + 1]:
+            delta = self._read_payload(delta_entry)
+            for region, group_id in delta["removed"]:
+                state.pop((region, group_id), None)
+            for group in delta["upserted"]:
+                state[_group_key(group)] = group
+        return [state[key] for key in sorted(state)]
+
+    def append(
+        self, groups: Iterable[dict[str, Any]], timestamp: float | None = None
+    ) -> HistoryEntry:
+        """スナップショットを記録する（前回から変更のあったグループのみを差分として記録）
+
+        Args:
+            groups: セキュリティグループ（SnapshotStore.iter_groups の形式）
+            timestamp: 記録する時刻（省略時は現在時刻）
+
+        Returns:
+            HistoryEntry: 追加したエントリ
+
+        Note:
+            直前の完全スナップショット以降の差分が full_every - 1 件に達した場合は
+            完全スナップショットを記録する。記録後に保持期間を過ぎた履歴を削除する。
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        deltas_since_full = 0
+        for entry in reversed(self.entries):
+            if entry.kind == KIND_FULL:
+                break
+            deltas_since_full += 1
+
+        if not self.entries or deltas_since_full + 1 >= self.full_every:
+            entry = self._append_record(KIND_FULL, list(groups), timestamp)
+        else:
+            previous = {_group_key(group): group for group in self.reconstruct(self.entries[-1])}
+            upserted = []
+            for group in groups:
+                if previous.pop(_group_key(group), None) != group:
+                    upserted.append(group)
+            removed = [list(key) for key in sorted(previous)]
+            entry = self._append_record(
+                KIND_DELTA, {"upserted": upserted, "removed": removed}, timestamp
+            )
+        logger.info(
+            "履歴を記録しました（通番 %d, %s, %d バイト）",
+            entry.seq,
+            "完全" if entry.kind == KIND_FULL else "差分",
+            entry.length,
+        )
+        if self.retention_days > 0:
+            self.prune()
+        return entry
+
+    def prune(self, now: float | None = None) -> int:
+        """保持期間を過ぎた完全スナップショットとその差分をまとめて削除する
+
+        次の完全スナップショットが保持期間の開始より古い場合のみ、その前の区間を
+        ログの先頭から取り除く（再構築に必要なレコードは削除しない）。
+
+        Returns:
+            int: 削除したエントリ数
+        """
+        if self.retention_days <= 0:
+            return 0
+        cutoff = (time.time() if now is None else now) - self.retention_days * 86400
+        keep_from = 0
+        for i, entry in enumerate(self.entries):
+            if entry.kind == KIND_FULL and entry.timestamp <= cutoff:
+                keep_from = i
+        if keep_from == 0:
+            return 0
+        self._rewrite(self.entries[keep_from:])
+        return keep_from
+
+    def compact(self, now: float | None = None) -> int:
+        """履歴を圧縮する
+
+        保持期間を過ぎたエントリを削除し、保持期間内の最初の時点を完全スナップショットとして
+        記録し直す。保持期間が無期限の場合は何もしない。
+
+        Returns:
+            int: 削除したエントリ数
+        """
+        if not self.entries or self.retention_days <= 0:
+            return 0
+        cutoff = (time.time() if now is None else now) - self.retention_days * 86400
+        retained = [entry for entry in self.entries if entry.timestamp >= cutoff]
+        if not retained:
+            retained = [self.entries[-1]]
+        first = retained[0]
+        base_groups = self.reconstruct(first) if first.kind != KIND_FULL else None
+        removed = len(self.entries) - len(retained)
+        self._rewrite(retained, base_groups)
+        return removed
+
+    def _rewrite(
+        self, retained: list[HistoryEntry], base_groups: list[dict[str, Any]] | None = None
+    ) -> None:
+        """指定したエントリだけを残してログと索引を書き直す（一時ファイル経由で置き換える）
+
+        Args:
+            retained: 残すエントリ
+            base_groups: 指定時は先頭のエントリをこの内容の完全スナップショットに置き換える
+        """
+        tmp_path = f"{self._log_path}.tmp"
+        new_entries: list[HistoryEntry] = []
+        with open(self._log_path, "rb") as source, open(tmp_path, "wb") as target:
+            for i, entry in enumerate(retained):
+                offset = target.tell()
+                if i == 0 and base_groups is not None:
+                    data = zlib.compress(
+                        json.dumps(base_groups, ensure_ascii=False, separators=(",", ":")).encode(
+                            "utf-8"
+                        )
+                    )
+                    target.write(
+                        _HEADER.pack(_MAGIC, KIND_FULL, entry.seq, entry.timestamp, len(data))
+                        + data
+                    )
+                    new_entries.append(
+                        HistoryEntry(
+                            entry.seq, KIND_FULL, entry.timestamp, offset, _HEADER.size + len(data)
+                        )
+                    )
+                    continue
+                source.seek(entry.offset)
+                target.write(source.read(entry.length))
+                new_entries.append(
+                    HistoryEntry(entry.seq, entry.kind, entry.timestamp, offset, entry.length)
+                )
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(tmp_path, self._log_path)
+        self._write_index(new_entries)
+        self.entries = new_entries
+
+    def iter_entries(self) -> Generator[HistoryEntry, None, None]:
+        """索引エントリを通番順に返す"""
+        yield from self.entries
+
+
+def record_snapshot(
+    config: Config, store: "SnapshotStore", report: ScanReport | None = None
+) -> HistoryEntry | None:
+    """HISTORY_DIR が設定されている場合に最新のスナップショットを履歴に記録する
+
+    Args:
+        config: アプリケーション設定
+        store: 確定済みのスナップショットを持つスナップショットストア
+        report: スキャンの完了状況
+
+    Returns:
+        HistoryEntry | None: 記録したエントリ（記録しなかった場合はNone）
+
+    Note:
+        完了しなかったリージョンがある場合（チェックポイントから再開した場合を含む）、
+        そのリージョンのグループが削除されたと記録されてしまうため履歴には記録しない。
+    """
+    if not config.history_dir:
+        return None
+    if report is not None and report.is_partial:
+        logger.warning("スキャンが完了しなかったため、履歴には記録しません。")
+        return None
+    snapshot_id = store.resolve("latest")
+    if snapshot_id is None:
+        return None
+    snapshot = store.snapshot(snapshot_id)
+    if snapshot is None or not snapshot["complete"]:
+        logger.warning("スナップショットが不完全なため、履歴には記録しません。")
+        return None
+    history = HistoryLog(
+        config.history_dir, config.history_full_every, config.history_retention_days
+    )
+    return history.append(store.iter_groups(snapshot_id))
+
+
+def history_command(
+    action: str = "list",
+    ref: str | None = None,
+    path: str | None = None,
+    history_dir: str | None = None,
+) -> int:
+    """historyサブコマンドの実行
+
+    Args:
+        action: list（履歴の一覧）、export（指定した時点をファイルに書き出す）、
+            compact（保持期間外の履歴を削除して圧縮する）
+        ref: export する時点（通番、latest、またはISO形式の日時）
+        path: export の出力先ファイル
+        history_dir: 履歴のディレクトリ（省略時は HISTORY_DIR）
+
+    Returns:
+        int: 終了コード
+    """
+    from src.diff import write_snapshot_file
+
+    load_dotenv()
+    config = Config.from_env()
+    directory = history_dir or config.history_dir
+    if not directory:
+        print("エラー: 履歴のディレクトリが設定されていません（--dir または HISTORY_DIR）")
+        return 1
+    history = HistoryLog(directory, config.history_full_every, config.history_retention_days)
+
+    if action == "compact":
+        if history.retention_days <= 0:
+            print("保持期間が無期限（HISTORY_RETENTION_DAYS=0）のため、履歴は削除しません。")
+            return 0
+        before = sum(entry.length for entry in history.entries)
+        removed = history.compact()
+        after = sum(entry.length for entry in history.entries)
+        print(f"{removed}件の履歴を削除しました（{before} バイト → {after} バイト）")
+        return 0
+
+    if action == "export":
+        entry = history.find(ref or "latest")
+        if entry is None or not path:
+            print(
+                f"エラー: 履歴 {ref} が見つかりません。"
+                if path
+                else "エラー: 出力先を指定してください。"
+            )
+            return 1
+        count = write_snapshot_file(path, history.reconstruct(entry))
+        print(f"通番 {entry.seq} の時点を {path} に書き出しました（{count}グループ）")
+        return 0
+
+    for entry in history.iter_entries():
+        recorded = datetime.fromtimestamp(entry.timestamp).isoformat(timespec="seconds")
+        kind = "full" if entry.kind == KIND_FULL else "delta"
+        print(f"{entry.seq:>6}  {recorded}  {kind:<5}  {entry.length:>10} バイト")
+    return 0
@@ -0,0 +1,71 @@
+"""
+セキュリティグループの在庫（インベントリ）キャッシュ
+"""
+
+import threading
+import time
+from typing import Any
+
+
+class InventoryCache:
+    """直近のスキャンで取得したセキュリティグループをメモリ上に保持するキャッシュ
+
+    デーモンモードやイベント駆動の評価で、AWS APIを再度呼び出さずに
+    直近の状態を参照するために使用する。スレッドセーフ。
+    """
+
+    def __init__(self) -> None:
+        self._groups: dict[str, dict[str, dict[str, Any]]] = {}
+        self._updated_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def replace_region(self, region: str, groups: list[dict[str, Any]]) -> None:
+        """リージョンの在庫を丸ごと置き換える
+
+        Args:
+            region: リージョン名
+            groups: リージョン内の全セキュリティグループ
+        """
+        with self._lock:
+            self._groups[region] = {sg["GroupId"]: sg for sg in groups}
+            self._updated_at[region] = time.time()
+
+    def upsert(self, region: str, sg: dict[str, Any]) -> None:
+        """セキュリティグループ1件を追加または更新する"""
+        with self._lock:
+            self._groups.setdefault(region, {})[sg["GroupId"]] = sg
+
+    def remove(self, region: str, group_id: str) -> None:
+        """セキュリティグループ1件を削除する"""
+        with self._lock:
+            self._groups.get(region, {}).pop(group_id, None)
+
+    def get(self, region: str, group_id: str) -> dict[str, Any] | None:
+        """セキュリティグループ1件を取得する"""
+        with self._lock:
+            return self._groups.get(region, {}).get(group_id)
+
+    def regions(self) -> list[str]:
+        """在庫のあるリージョンの一覧を返す"""
+        with self._lock:
+            return sorted(self._groups)
+
+    def groups(self, region: str | None = None) -> list[dict[str, Any]]:
+        """セキュリティグループの一覧を返す
+
+        Args:
+            region: リージョン名（省略時は全リージョン）
+        """
+        with self._lock:
+            if region is not None:
+                return list(self._groups.get(region, {}).values())
+            return [sg for groups in self._groups.values() for sg in groups.values()]
+
+    def updated_at(self, region: str) -> float | None:
+        """リージョンの在庫を最後に置き換えた時刻（UNIX時間）を返す"""
+        with self._lock:
+            return self._updated_at.get(region)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(groups) for groups in self._groups.values())
@@ -0,0 +1,267 @@
+"""
+AWS Lambda のハンドラー
+
+スケジュール実行（EventBridge Scheduler など）の Lambda でスキャンを実行する。
+ハンドラーは src.lambda_handler.handler を指定する。
+
+- boto3 や YAML などの重いモジュールは、モジュールの読み込み時ではなく最初の呼び出しで読み込む。
+- Scanner（EC2クライアントのプール、リージョン一覧、索引化した除外ルール）とアカウントIDは
+  モジュールの状態として保持し、ウォームスタートでは再利用する。除外ルール・ポリシーファイルは
+  変更された場合と、期限付きの除外ルールの期限が来た場合だけ読み込み直す。
+- context の残り時間からスキャン全体の期限を決め、期限までに終わらなかったリージョンは
+  途中結果として返す。CHECKPOINT_FILE を設定した場合は完了したリージョンを記録し、
+  次の呼び出しで続きから再開する。途中結果も不完全であることを明示して毎回通知する
+  （期限内に終わらないリージョンがあっても通知が止まらないようにする）。再開は
+  LAMBDA_MAX_RESUMES 回までとし、上限に達したらチェックポイントを破棄する。
+"""
+
+import dataclasses
+import logging
+import os
+import time
+import uuid
+from typing import TYPE_CHECKING, Any
+
+from src.config import Config
+
+if TYPE_CHECKING:
+    from src.scanner import Scanner
+
+logger = logging.getLogger(__name__)
+
+# Lambda の実行環境で書き込めるディレクトリ
+LAMBDA_TMP_DIR = "/tmp/neko_sg"
+
+# 期限に余裕がない場合でもスキャンに割り当てる最小の時間（秒）
+MIN_SCAN_BUDGET = 1.0
+
+
+class _WarmState:
+    """ウォームスタートで再利用する状態
+
+    Attributes:
+        scanner: 保持しているスキャナー
+        rules_mtimes: 読み込んだ除外ルール・ポリシーファイルの更新時刻
+        account: AWSアカウントID（チェックポイントの記録に使用）
+        invocations: この実行環境での呼び出し回数
+    """
+
+    def __init__(self) -> None:
+        self.scanner: Scanner | None = None
+        self.rules_mtimes: dict[str, float | None] | None = None
+        self.account: str | None = None
+        self.invocations = 0
+
+
+_STATE = _WarmState()
+
+
+class FakeContext:
+    """ローカルでの実行やテストで使う Lambda の context の代わり
+
+    Attributes:
+        function_name: 関数名
+        aws_request_id: リクエストID
+        memory_limit_in_mb: メモリの上限（MB）
+    """
+
+    def __init__(self, timeout: float = 900.0, function_name: str = "neko-sg-local") -> None:
+        """残り時間を数え始める
+
+        Args:
+            timeout: 関数のタイムアウト（秒、作成時から残り時間を数える）
+            function_name: 関数名
+        """
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 1024
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        """残り時間（ミリ秒）を返す"""
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def _load_config() -> Config:
+    """環境変数から設定を読み込み、Lambda の実行環境に合わせて調整する内部関数
+
+    Note:
+        Lambda では /tmp 以外に書き込めないため、REGION_CACHE_FILE が未設定の場合は
+        リージョン一覧のキャッシュを /tmp に置く。
+    """
+    config = Config.from_env()
+    if os.getenv("AWS_LAMBDA_FUNCTION_NAME") and not os.getenv("REGION_CACHE_FILE"):
+        config = dataclasses.replace(
+            config, region_cache_file=os.path.join(LAMBDA_TMP_DIR, "regions.json")
+        )
+    return config
+
+
+def _mtime(path: str) -> float | None:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _warm_scanner(config: Config) -> "Scanner":
+    """保持しているスキャナーを返す（初回は作成し、ルールファイルの変更時は読み込み直す）"""
+    from src.policy import load_policy_rules
+    from src.scanner import Scanner
+    from src.utils import load_exclusion_rules
+
+    if _STATE.scanner is None:
+        _STATE.scanner = Scanner(config)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    rules_path = config.get_exclusion_rules_path(script_dir)
+    policy_path = config.get_policy_rules_path(script_dir)
+    mtimes = {path: _mtime(path) for path in (rules_path, policy_path)}
+    next_expiry = _STATE.scanner.exclusion_index.next_expiry
+    if mtimes != _STATE.rules_mtimes or (next_expiry is not None and next_expiry <= time.time()):
+        _STATE.scanner.set_rules(load_exclusion_rules(rules_path), load_policy_rules(policy_path))
+        _STATE.rules_mtimes = mtimes
+        logger.info("除外ルールを読み込みました: %s", rules_path)
+    return _STATE.scanner
+
+
+def _resume_count_path(checkpoint_path: str) -> str:
+    return f"{checkpoint_path}.resumes"
+
+
+def _read_resume_count(checkpoint_path: str) -> int:
+    """チェックポイントから続けて再開した回数を読み込む内部関数（記録がない場合は0）"""
+    try:
+        with open(_resume_count_path(checkpoint_path), encoding="utf-8") as file:
+            return max(0, int(file.read().strip() or 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_resume_count(checkpoint_path: str, count: int) -> None:
+    """再開した回数を記録する内部関数（0の場合は記録を削除する）"""
+    path = _resume_count_path(checkpoint_path)
+    try:
+        if count <= 0:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(str(count))
+    except OSError as e:
+        logger.warning("再開回数の記録に失敗しました: %s", e)
+
+
+def _scan_budget(config: Config, context: Any) -> float:
+    """context の残り時間から通知と応答の分を差し引いたスキャンの期限（秒）を返す内部関数"""
+    remaining = float(context.get_remaining_time_in_millis()) / 1000
+    budget = max(MIN_SCAN_BUDGET, remaining - config.lambda_safety_margin)
+    if config.scan_deadline > 0:
+        budget = min(budget, config.scan_deadline)
+    return budget
+
+
+def handler(event: dict[str, Any] | None, context: Any) -> dict[str, Any]:
+    """Lambda のハンドラー
+
+    Args:
+        event: 呼び出しイベント（スケジュール実行では参照しない）
+        context: Lambda の context（get_remaining_time_in_millis を使用）
+
+    Returns:
+        dict[str, Any]: 実行結果
+            - findings: 検出結果
+            - finding_count: 検出件数
+            - partial: 期限切れなどで完了しなかったリージョンがある場合True
+            - resumable: チェックポイントにより次の呼び出しで再開する場合True
+            - resumes: この呼び出しまでにチェックポイントから続けて再開した回数
+            - completed / incomplete / skipped / failed: リージョンごとの完了状況
+            - cold_start: この実行環境での最初の呼び出しの場合True
+            - elapsed_seconds: 処理時間（秒）
+    """
+    from src.main import send_slack_notification_if_configured
+    from src.utils import ScanReport, get_account_id
+
+    started = time.monotonic()
+    cold_start = _STATE.invocations == 0
+    _STATE.invocations += 1
+    config = _load_config()
+    logging.getLogger().setLevel(getattr(logging, config.log_level.upper()))
+
+    scanner = _warm_scanner(config)
+    budget = _scan_budget(config, context)
+    # 呼び出しごとに期限だけを差し替える（クライアント、リージョン一覧、除外ルールはそのまま）
+    scanner.config = dataclasses.replace(config, scan_deadline=budget)
+    logger.info(
+        "スキャンを開始します（%s, 期限: %.1f秒）",
+        "コールドスタート" if cold_start else "ウォームスタート",
+        budget,
+    )
+
+    checkpoint = None
+    resumes = 0
+    if config.checkpoint_file:
+        from src.checkpoint import Checkpoint
+
+        if _STATE.account is None:
+            _STATE.account = get_account_id(config)
+        checkpoint = Checkpoint(
+            os.path.expanduser(config.checkpoint_file), _STATE.account, resume=True
+        )
+        resumes = _read_resume_count(checkpoint.path)
+
+    report = ScanReport()
+    try:
+        found_groups = scanner.scan(report=report, checkpoint=checkpoint)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    # 期限切れのリージョンだけを再開の対象とする（再開の回数には上限を設ける）
+    unfinished = report.incomplete + report.skipped
+    resumable = checkpoint is not None and bool(unfinished) and resumes < config.lambda_max_resumes
+    if checkpoint is not None:
+        if resumable:
+            resumes += 1
+            logger.warning(
+                "期限内に完了しなかったリージョンは次の呼び出しで再開します（未完了: %s, 再開: %d/%d回）",
+                ", ".join(unfinished),
+                resumes,
+                config.lambda_max_resumes,
+            )
+        else:
+            if unfinished:
+                logger.warning(
+                    "再開の上限（%d回）に達したため、チェックポイントを破棄します（未完了: %s）",
+                    config.lambda_max_resumes,
+                    ", ".join(unfinished),
+                )
+            checkpoint.discard()
+        _write_resume_count(checkpoint.path, resumes if resumable else 0)
+    # 途中結果も不完全であることを明示して通知する（再開を待つと通知が止まり続けることがある）
+    if found_groups or report.is_partial:
+        send_slack_notification_if_configured(config, found_groups, report=report)
+
+    return {
+        "findings": found_groups,
+        "finding_count": len(found_groups),
+        "partial": report.is_partial,
+        "resumable": resumable,
+        "resumes": resumes,
+        "completed": report.completed,
+        "incomplete": report.incomplete,
+        "skipped": report.skipped,
+        "failed": report.failed,
+        "cold_start": cold_start,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+
+
+if __name__ == "__main__":
+    # ローカルでの動作確認: python -m src.lambda_handler [タイムアウト秒]
+    import json
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    timeout = float(sys.argv[1]) if len(sys.argv) > 1 else 900.0
+    result = handler({}, FakeContext(timeout))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -2,26 +2,47 @@
 AWSセキュリティグループのグローバルアクセス可能なインバウンドルールを検索し、Slackに通知するスクリプト
 """
 
+import argparse
 import logging
 import os
 import sys
+from typing import TYPE_CHECKING, Any
 
 from dotenv import load_dotenv
 
+from src.checkpoint import DEFAULT_CHECKPOINT_FILE, Checkpoint
 from src.cli import parse_args
 from src.config import Config
+from src.metrics import METRICS, finish_run
+from src.policy import load_policy_rules
+from src.scanner import Scanner
+from src.tracing import TRACER, finish_trace
 from src.utils import (
-    find_globally_accessible_security_groups,
+    ScanReport,
     format_slack_message,
+    get_account_id,
     load_exclusion_rules,
     send_slack_notification,
     send_slack_notification_sdk,
 )
 
+if TYPE_CHECKING:
+    from src.output import FindingOutput
+    from src.profiling import SamplingProfiler
+    from src.store import SnapshotStore
 
-def scan_security_groups() -> None:
+
+def scan_security_groups(args: argparse.Namespace | None = None) -> None:
     """
     セキュリティグループをスキャンしてグローバルアクセス可能なルールを検出
+
+    Args:
+        args: scanサブコマンドの引数（--checkpoint, --resume, --shard, --shard-output,
+            --output, --output-file, --profile, --profile-interval）
+
+    Note:
+        検出結果は生成された順に --output の出力先へ書き出す。Slack通知が不要な場合
+        （--output 指定時にSlackが未設定の場合）は検出結果をリストに保持しない。
     """
     # .envファイルを読み込む
     load_dotenv()
@@ -36,18 +57,98 @@ def scan_security_groups() -> None:
     )
     logger = logging.getLogger(__name__)
 
+    if config.metrics_file or config.metrics_summary:
+        METRICS.enable()
+    if config.trace_file:
+        TRACER.enable()
+    report = ScanReport()
+    profiler = _start_profiler(args)
+    run_span = TRACER.start("run", command="scan")
+
     try:
         # スクリプトのディレクトリを取得
         script_dir = os.path.dirname(os.path.abspath(__file__))
         exclusion_rules_file = config.get_exclusion_rules_path(script_dir)
 
         exclusion_rules = load_exclusion_rules(exclusion_rules_file)
+        policies = load_policy_rules(config.get_policy_rules_path(script_dir))
+
+        shard = getattr(args, "shard", None)
+        if shard is not None:
+            from src.shard import apply_shard
+
+            config, account, shard_regions = apply_shard(config, *shard)
+            if not shard_regions:
+                # 担当リージョンがない場合は空の結果を書き出す（regions が空だと全リージョンになる）
+                _write_shard_result(args, shard, account, shard_regions, [], report)
+                return
+
+        checkpoint = _open_checkpoint(config, args)
+        # チェックポイントから再開したリージョンはストアにグループを書き込まない
+        resumed = checkpoint is not None and bool(checkpoint.completed)
+        store = _open_snapshot_store(config, account if shard is not None else None)
+
+        output = _open_output(args, policies)
+        # 通知（標準出力への表示を含む）やシャードの書き出しが不要な場合は検出結果を保持しない
+        keep_findings = shard is not None or _notification_needed(config, output)
 
         logger.info("グローバルにアクセス可能なセキュリティグループを検索中...")
-        found_groups = list(find_globally_accessible_security_groups(exclusion_rules, config))
+        account_span = None
+        if TRACER.enabled:
+            traced_account = account if shard is not None else get_account_id(config)
+            account_span = TRACER.start("account", account=traced_account)
+        found_groups: list[dict[str, str]] = []
+        found_count = 0
+        scanner = Scanner(config, exclusion_rules, policies)
+        try:
+            for finding in scanner.scan_iter(report=report, checkpoint=checkpoint, inventory=store):
+                found_count += 1
+                if store is not None:
+                    store.record_finding(finding)
+                if output is not None:
+                    output.write(finding)
+                if keep_findings:
+                    found_groups.append(finding)
+        except BaseException:
+            if store is not None:
+                store.rollback()
+                store.close()
+            raise
+        finally:
+            scanner.close()
+            TRACER.end(account_span)
+            if checkpoint is not None:
+                checkpoint.close()
+            if output is not None:
+                output.close()
+        if store is not None:
+            store.commit(report, resumed=resumed)
+            _record_history(config, store, report)
+            store.close()
+        if checkpoint is not None and not report.is_partial:
+            # 全リージョンが完了した場合は次回の再開対象にしない
+            checkpoint.discard()
+
+        if shard is not None:
+            # 通知は merge サブコマンドでまとめて行う
+            _write_shard_result(args, shard, account, shard_regions, found_groups, report)
+            return
 
-        if not found_groups:
+        if report.is_partial:
+            logger.warning(
+                "スキャンが完了しなかったリージョンがあります（期限切れ: %s, 未スキャン: %s, エラー: %s）",
+                ", ".join(report.incomplete) or "-",
+                ", ".join(report.skipped) or "-",
+                ", ".join(report.failed) or "-",
+            )
+
+        if not keep_findings:
+            logger.info("検索完了。%d件の検出結果を出力しました。", found_count)
+        elif not found_groups:
             logger.info("グローバルにアクセス可能なセキュリティグループは見つかりませんでした。")
+            if report.is_partial:
+                # 結果が不完全な場合は検出なしでも通知する
+                send_slack_notification_if_configured(config, found_groups, report=report)
         else:
             logger.info(
                 "検索完了。%d個のセキュリティグループにグローバルなインバウンドルールが見つかりました。",
@@ -59,11 +160,136 @@ def scan_security_groups() -> None:
                 )
 
             # Slack通知の処理
-            _send_slack_notification_if_configured(config, found_groups)
+            send_slack_notification_if_configured(config, found_groups, report=report)
 
     except Exception as e:
         logger.error("実行中にエラーが発生しました: %s", e)
         raise
+    finally:
+        TRACER.end(run_span)
+        finish_run(config, report)
+        finish_trace(config)
+        if profiler is not None:
+            _finish_profile(profiler, getattr(args, "profile", ""))
+
+
+def _start_profiler(args: argparse.Namespace | None) -> "SamplingProfiler | None":
+    """--profile が指定されている場合にプロファイラーを開始する内部関数"""
+    if not getattr(args, "profile", None):
+        return None
+    from src.profiling import start_profiler
+
+    return start_profiler(getattr(args, "profile_interval", 5.0) / 1000)
+
+
+def _finish_profile(profiler: "SamplingProfiler", path: str) -> None:
+    """プロファイラーを停止し、結果を --profile の出力先に書き出す内部関数"""
+    from src.profiling import finish_profile
+
+    try:
+        finish_profile(profiler, path)
+    except OSError as e:
+        logging.getLogger(__name__).error("プロファイルの書き出しに失敗しました: %s", e)
+
+
+def _open_snapshot_store(config: Config, account: str | None = None) -> "SnapshotStore | None":
+    """SNAPSHOT_STORE が設定されている場合にスナップショットの書き込みを開始する内部関数"""
+    if not config.snapshot_store:
+        return None
+    from src.store import SnapshotStore, supports_snapshots
+
+    if not supports_snapshots(config):
+        return None
+    store = SnapshotStore(config.snapshot_store)
+    store.begin(account if account is not None else get_account_id(config))
+    return store
+
+
+def _record_history(config: Config, store: "SnapshotStore", report: ScanReport) -> None:
+    """HISTORY_DIR が設定されている場合に確定したスナップショットを履歴に記録する内部関数"""
+    if not config.history_dir:
+        return
+    from src.history import record_snapshot
+
+    try:
+        record_snapshot(config, store, report)
+    except Exception as e:
+        # 履歴の記録に失敗してもスキャン結果の通知は行う
+        logging.getLogger(__name__).error("履歴の記録に失敗しました: %s", e)
+
+
+def _open_output(
+    args: argparse.Namespace | None, policies: list[Any] | None = None
+) -> "FindingOutput | None":
+    """--output が指定されている場合に検出結果の出力先を開く内部関数"""
+    output_format = getattr(args, "output", None)
+    if not output_format:
+        return None
+    from src.output import FindingOutput
+
+    return FindingOutput(output_format, getattr(args, "output_file", None), policies)
+
+
+def _notification_needed(config: Config, output: "FindingOutput | None") -> bool:
+    """Slack通知（未設定の場合は標準出力への表示）を行うか判定する内部関数
+
+    Note:
+        --output で標準出力に書き出す場合、Slackが未設定であれば通知メッセージを表示しない。
+        --output でファイルに書き出す場合も、Slackが未設定であれば通知は行わない。
+    """
+    if output is None:
+        return True
+    return bool(
+        config.slack_webhook_url
+        or (config.use_slack_sdk and config.slack_bot_token)
+        or config.notify_sinks
+    )
+
+
+def _write_shard_result(
+    args: argparse.Namespace | None,
+    shard: tuple[int, int],
+    account: str,
+    regions: list[str],
+    found_groups: list[dict[str, str]],
+    report: ScanReport,
+) -> None:
+    """シャードの部分結果ファイルを書き出す内部関数"""
+    from src.shard import DEFAULT_SHARD_OUTPUT, write_shard_result
+
+    index, count = shard
+    path = getattr(args, "shard_output", None) or DEFAULT_SHARD_OUTPUT.format(
+        index=index, count=count
+    )
+    write_shard_result(path, index, count, account, regions, found_groups, report)
+
+
+def _open_checkpoint(config: Config, args: argparse.Namespace | None) -> Checkpoint | None:
+    """引数と設定に応じてチェックポイントを開く内部関数
+
+    Args:
+        config: アプリケーション設定
+        args: scanサブコマンドの引数
+
+    Returns:
+        Checkpoint | None: チェックポイント。記録しない場合はNone
+    """
+    resume = bool(getattr(args, "resume", False))
+    path = getattr(args, "checkpoint", None) or config.checkpoint_file
+    if not path and resume:
+        path = DEFAULT_CHECKPOINT_FILE
+    if not path:
+        return None
+
+    path = os.path.expanduser(path)
+    checkpoint = Checkpoint(path, get_account_id(config), resume=resume)
+    if resume:
+        logging.getLogger(__name__).info(
+            "チェックポイント %s から再開します（完了済み: %d リージョン）",
+            path,
+            len(checkpoint.completed),
+        )
+    return checkpoint
 
 
 def main() -> None:
@@ -73,8 +299,11 @@ def main() -> None:
     環境変数:
         SLACK_WEBHOOK_URL: Slack Webhook URL（オプション）
         EXCLUSION_RULES_FILE: 除外ルールファイルのパス（デフォルト: ../config/exclusion_rules.yaml）
+        POLICY_RULES_FILE: ポリシールールファイルのパス（デフォルト: ../config/policy_rules.yaml）
         LOG_LEVEL: ログレベル（デフォルト: INFO）
         AWS_TIMEOUT: AWS APIタイムアウト（秒、デフォルト: 10）
+        SCAN_DEADLINE: スキャン全体の期限（秒、デフォルト: 0 = 無制限）
+        REGION_DEADLINE: リージョンごとのスキャン期限（秒、デフォルト: 0 = 無制限）
 
     Raises:
         Exception: AWS APIエラー、ファイル読み込みエラーなど
@@ -83,35 +312,53 @@ def main() -> None:
 
     # サブコマンドが指定されていない場合、またはscanの場合はスキャンを実行
     if not args.command or args.command == "scan":
-        scan_security_groups()
+        scan_security_groups(args)
     else:
         # サブコマンドの処理を実行
         result = args.func(args)
         sys.exit(result)
 
 
-def _send_slack_notification_if_configured(
-    config: Config, found_groups: list[dict[str, str]]
+def send_slack_notification_if_configured(
+    config: Config, found_groups: list[dict[str, str]], report: ScanReport | None = None
 ) -> None:
-    """設定されている場合のみSlack通知を送信する内部関数
+    """設定されている場合のみ通知を送信する（各サブコマンド、常駐モード、Lambda から使用）
 
     Args:
         config: アプリケーション設定
         found_groups: 発見されたグローバルアクセス可能なセキュリティグループのリスト
+        report: リージョンごとのスキャン完了状況
 
     Note:
         Slack SDK使用フラグが有効な場合はSlack SDKを使用し、
-        それ以外の場合は従来のIncoming Webhookを使用する
+        それ以外の場合は従来のIncoming Webhookを使用する。
+        OUTBOX_FILE または NOTIFY_SINKS が設定されている場合は、アウトボックスに登録して
+        すべての通知先に配信する（src.outbox.notify を参照）
     """
     logger = logging.getLogger(__name__)
 
-    message = format_slack_message(found_groups)
+    if config.outbox_file or config.notify_sinks:
+        from src.outbox import notify
+
+        if notify(config, found_groups, report):
+            return
+
+    message = format_slack_message(found_groups, report)
     success = False
 
     # Slack SDK使用が有効で、必要な設定が揃っている場合
     if config.use_slack_sdk and config.slack_bot_token:
         logger.info("Slack SDK を使用して通知を送信します。")
-        success = send_slack_notification_sdk(config.slack_bot_token, config.slack_channel, message)
+        if config.slack_blocks:
+            from src.slack_report import send_sdk_notification
+
+            success = send_sdk_notification(
+                config, config.slack_channel, found_groups, report, message=message
+            )
+        else:
+            success = send_slack_notification_sdk(
+                config.slack_bot_token, config.slack_channel, message
+            )
         if not success:
             logger.warning("Slack SDK による通知送信に失敗しました。")
 
@@ -0,0 +1,306 @@
+"""
+スキャンの計測（カウンターとレイテンシのヒストグラム）
+
+リージョン一覧の取得、ページごとの取得、評価、除外ルールの読み込み、通知の処理時間と件数を記録し、
+実行の終わりにOpenMetrics形式のテキストファイル（node_exporter の textfile collector など）に
+書き出すか、集計表を表示する。無効な場合は各計測点がフラグを確認してすぐに戻るため、
+ほとんどオーバーヘッドがない。
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections.abc import Generator
+from contextlib import contextmanager, nullcontext
+from typing import IO, Any
+
+# ヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# スロットリングとして数えるエラーコード
+THROTTLE_ERROR_CODES = frozenset(
+    {"Throttling", "ThrottlingException", "RequestLimitExceeded", "TooManyRequestsException"}
+)
+
+_HELP = {
+    "neko_sg_region_discovery_seconds": "Time spent listing regions.",
+    "neko_sg_region_scan_seconds": "Time spent scanning one region.",
+    "neko_sg_page_seconds": "Time spent fetching one page of security groups or rules.",
+    "neko_sg_pages": "Pages fetched from the EC2 API.",
+    "neko_sg_groups": "Security groups fetched.",
+    "neko_sg_rules": "Ingress CIDR entries fetched.",
+    "neko_sg_api_retries": "Retries performed by botocore, as reported in ResponseMetadata.",
+    "neko_sg_api_errors": "EC2 API calls that failed after retries.",
+    "neko_sg_api_throttles": "EC2 API calls that failed with a throttling error.",
+    "neko_sg_evaluations": "Security groups or rules evaluated.",
+    "neko_sg_evaluation_seconds": "Total time spent evaluating security groups or rules.",
+    "neko_sg_findings": "Findings reported.",
+    "neko_sg_exclusion_load_seconds": "Time spent loading the exclusion rules file.",
+    "neko_sg_notification_seconds": "Time spent delivering one notification.",
+    "neko_sg_notifications": "Notifications attempted, by sink and result.",
+    "neko_sg_regions": "Regions by scan outcome.",
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class _Histogram:
+    """累積バケット、合計、件数、最大値を保持するヒストグラム"""
+
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self, bucket_count: int) -> None:
+        self.counts = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+
+class MetricsRegistry:
+    """カウンターとヒストグラムを保持するレジストリ（スレッドセーフ）
+
+    Attributes:
+        enabled: 計測が有効な場合True（無効な場合は記録しない）
+        buckets: ヒストグラムのバケットの上限（秒）
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.enabled = False
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, _Histogram]] = {}
+
+    def enable(self) -> None:
+        """計測を有効にする"""
+        self.enabled = True
+
+    def reset(self) -> None:
+        """記録した値をすべて消去し、計測を無効にする"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+        self.enabled = False
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """カウンターを加算する
+
+        Args:
+            name: メトリクス名（OpenMetricsの出力時に _total を付ける）
+            value: 加算する値
+            **labels: ラベル
+        """
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """ヒストグラムに値（秒）を記録する"""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram.counts[i] += 1
+            histogram.sum += value
+            histogram.count += 1
+            histogram.max = max(histogram.max, value)
+
+    def timer(self, name: str, **labels: str) -> Any:
+        """with文のブロックの処理時間をヒストグラムに記録するコンテキストマネージャーを返す
+
+        Note:
+            無効な場合は何もしない共有のコンテキストマネージャーを返す
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timed(name, labels)
+
+    @contextmanager
+    def _timed(self, name: str, labels: dict[str, str]) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        """カウンターの値を返す（主にテスト用）"""
+        with self._lock:
+            return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0.0)
+
+    def histogram_count(self, name: str, **labels: str) -> int:
+        """ヒストグラムの記録件数を返す（ラベル省略時は全系列の合計）"""
+        with self._lock:
+            series = self._histograms.get(name, {})
+            if labels:
+                histogram = series.get(tuple(sorted(labels.items())))
+                return histogram.count if histogram is not None else 0
+            return sum(histogram.count for histogram in series.values())
+
+    # 出力
+
+    def render_openmetrics(self) -> str:
+        """記録した値をOpenMetricsのテキスト形式で返す"""
+        lines: list[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.extend(_family_header(name, "counter"))
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}_total{_format_labels(key)} {_format_value(value)}")
+            for name in sorted(self._histograms):
+                lines.extend(_family_header(name, "histogram"))
+                for key, histogram in sorted(self._histograms[name].items()):
+                    for bound, count in zip(self.buckets, histogram.counts, strict=True):
+                        labels = _format_labels(key + (("le", _format_value(bound)),))
+                        lines.append(f"{name}_bucket{labels} {count}")
+                    labels = _format_labels(key + (("le", "+Inf"),))
+                    lines.append(f"{name}_bucket{labels} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """OpenMetricsのテキストファイルを書き出す（一時ファイル経由で置き換える）
+
+        Note:
+            textfile collector が書き込み途中のファイルを読まないよう、同じディレクトリの
+            一時ファイルに書き出してから置き換える
+        """
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(self.render_openmetrics())
+        os.replace(tmp_path, path)
+
+    def print_summary(self, stream: IO[str] | None = None) -> None:
+        """記録した値の集計表を表示する（既定は標準エラー出力）"""
+        stream = stream if stream is not None else sys.stderr
+        rows: list[tuple[str, str, str, str, str]] = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                for key, histogram in sorted(self._histograms[name].items()):
+                    average = histogram.sum / histogram.count if histogram.count else 0.0
+                    rows.append(
+                        (
+                            name + _format_labels(key),
+                            str(histogram.count),
+                            f"{histogram.sum:.3f}s",
+                            f"{average * 1000:.1f}ms",
+                            f"{histogram.max * 1000:.1f}ms",
+                        )
+                    )
+            for name in sorted(self._counters):
+                for key, value in sorted(self._counters[name].items()):
+                    rows.append((name + _format_labels(key), _format_value(value), "", "", ""))
+        header = ("metric", "count", "total", "avg", "max")
+        widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+        for row in [header, *rows]:
+            stream.write(
+                "  ".join(
+                    cell.ljust(width) if i == 0 else cell.rjust(width)
+                    for i, (cell, width) in enumerate(zip(row, widths, strict=True))
+                ).rstrip()
+                + "\n"
+            )
+
+
+_NULL_TIMER = nullcontext()
+
+
+def _family_header(name: str, metric_type: str) -> list[str]:
+    lines = [f"# TYPE {name} {metric_type}"]
+    if name in _HELP:
+        lines.append(f"# HELP {name} {_HELP[name]}")
+    if name.endswith("_seconds"):
+        lines.append(f"# UNIT {name} seconds")
+    return lines
+
+
+def _format_labels(key: Labels) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isfinite(value) and value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+# プロセス全体で共有するレジストリ
+METRICS = MetricsRegistry()
+
+
+def record_page(region: str, api: str, page: dict[str, Any], started: float) -> None:
+    """取得したページの処理時間、件数、botocoreの再試行回数を記録する
+
+    Args:
+        region: リージョン名
+        api: API名（describe_security_groups など）
+        page: ページの応答
+        started: ページの取得を開始した時刻（time.perf_counter）
+    """
+    if not METRICS.enabled:
+        return
+    METRICS.observe("neko_sg_page_seconds", time.perf_counter() - started, region=region, api=api)
+    METRICS.inc("neko_sg_pages", region=region, api=api)
+    retries = page.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+    if retries:
+        METRICS.inc("neko_sg_api_retries", retries, region=region, api=api)
+    if "SecurityGroups" in page:
+        groups = page["SecurityGroups"]
+        METRICS.inc("neko_sg_groups", len(groups), region=region)
+        rules = sum(
+            len(permission.get("IpRanges", [])) + len(permission.get("Ipv6Ranges", []))
+            for sg in groups
+            for permission in sg.get("IpPermissions", [])
+        )
+        METRICS.inc("neko_sg_rules", rules, region=region)
+    elif "SecurityGroupRules" in page:
+        METRICS.inc("neko_sg_rules", len(page["SecurityGroupRules"]), region=region)
+
+
+def record_api_error(region: str, api: str, error: Exception) -> None:
+    """APIエラーを記録する（スロットリングの場合は別のカウンターにも記録する）"""
+    if not METRICS.enabled:
+        return
+    code = getattr(error, "response", {}).get("Error", {}).get("Code", type(error).__name__)
+    METRICS.inc("neko_sg_api_errors", region=region, api=api, code=str(code))
+    if code in THROTTLE_ERROR_CODES:
+        METRICS.inc("neko_sg_api_throttles", region=region, api=api)
+
+
+def finish_run(config: Any, report: Any | None = None) -> None:
+    """実行の終わりに完了状況を記録し、設定に応じてテキストファイルや集計表を出力する
+
+    Args:
+        config: アプリケーション設定（metrics_file, metrics_summary を参照）
+        report: スキャンの完了状況（ScanReport）
+    """
+    if not METRICS.enabled:
+        return
+    if report is not None:
+        for status in ("completed", "incomplete", "skipped", "failed"):
+            METRICS.inc("neko_sg_regions", len(getattr(report, status)), status=status)
+    if config.metrics_file:
+        METRICS.write_textfile(config.metrics_file)
+    if config.metrics_summary:
+        METRICS.print_summary()
@@ -0,0 +1,692 @@
+"""
+通知のアウトボックス（SQLite）
+
+検出結果の通知をSQLiteのファイルにキューとして記録し、設定した通知先（Slack、汎用の
+Webhook、ファイル）へ並列に配信する。配信に失敗した通知先は、指数バックオフ
+（フルジッター）で再試行する。通知先ごとの配信状態をメッセージキー単位で記録するため、
+再試行では配信済みの通知先に送り直さず、同じキーの登録は1件にまとめる。
+常駐モードではバックグラウンドのワーカーが配信し、スキャンは配信を待たない。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Collection
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import requests
+from dotenv import load_dotenv
+
+from src.config import Config
+from src.metrics import METRICS
+from src.slack_report import send_sdk_notification, thread_complete
+from src.tracing import TRACER
+from src.utils import (
+    ScanReport,
+    format_slack_message,
+    send_slack_notification,
+)
+
+logger = logging.getLogger(__name__)
+
+# 再試行の待機時間の基準値と上限（秒）
+DEFAULT_BACKOFF_BASE = 2.0
+DEFAULT_BACKOFF_MAX = 600.0
+
+# 配信中の通知を他のワーカーが取得しないようにする期間（秒）
+CLAIM_LEASE = 300.0
+
+# ワーカーが配信予定を確認する間隔の上限（秒）
+POLL_INTERVAL = 5.0
+
+STATE_PENDING = "pending"
+STATE_DELIVERED = "delivered"
+STATE_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    key TEXT NOT NULL,
+    sink TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT NOT NULL DEFAULT '',
+    delivered_at REAL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (key, sink)
+);
+CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries (state, next_attempt_at);
+"""
+
+# 通知先: (ペイロード, メッセージキー) を受け取り、失敗時は例外を送出する
+Sink = Callable[[dict[str, Any], str], None]
+
+
+class DeliveryError(Exception):
+    """通知先への配信に失敗した場合の例外"""
+
+
+def message_key(payload: dict[str, Any]) -> str:
+    """ペイロードの内容から決まるメッセージキーを返す"""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_payload(
+    found_groups: list[dict[str, str]], report: ScanReport | None = None
+) -> dict[str, Any]:
+    """通知のペイロードを作成する
+
+    Returns:
+        dict[str, Any]: 通知文（text）、検出結果、完了しなかったリージョン、作成時刻
+    """
+    payload: dict[str, Any] = {
+        "text": format_slack_message(found_groups, report),
+        "findings": found_groups,
+        "created_at": time.time(),
+    }
+    if report is not None:
+        payload.update(
+            partial=report.is_partial,
+            incomplete=report.incomplete,
+            skipped=report.skipped,
+            failed=report.failed,
+        )
+    return payload
+
+
+def backoff_delay(
+    attempts: int, base: float = DEFAULT_BACKOFF_BASE, cap: float = DEFAULT_BACKOFF_MAX
+) -> float:
+    """attempts 回失敗した後の待機時間を返す（指数バックオフ、フルジッター）"""
+    return random.uniform(0, min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+def _sink_filter(sinks: Collection[str] | None, column: str) -> tuple[str, tuple[str, ...]]:
+    """通知先で絞り込むSQLの条件とパラメータを返す内部関数（Noneの場合は絞り込まない）"""
+    if sinks is None:
+        return "", ()
+    if not sinks:
+        return " AND 0", ()
+    return f" AND {column} IN ({', '.join('?' * len(sinks))})", tuple(sinks)
+
+
+class Outbox:
+    """通知のキューと配信状態を保持するSQLiteのアウトボックス（スレッドセーフ）
+
+    Attributes:
+        path: データベースファイルのパス
+        max_attempts: 通知先ごとの配信の試行回数の上限（超えた場合は failed とする）
+    """
+
+    def __init__(self, path: str, max_attempts: int = 8) -> None:
+        self.path = os.path.expanduser(path)
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # 複数のプロセス（CLIと常駐モード）が同じファイルを使うため、ロックの解放を待つ
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(deliveries)")}
+            if "progress" not in columns:
+                # 進捗の列がない以前のファイルに列を追加する
+                self._conn.execute(
+                    "ALTER TABLE deliveries ADD COLUMN progress TEXT NOT NULL DEFAULT '{}'"
+                )
+
+    def __enter__(self) -> "Outbox":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """データベースを閉じる"""
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, payload: dict[str, Any], sinks: list[str], key: str | None = None) -> str:
+        """通知を登録する（同じキーの通知が登録済みの場合は追加しない）
+
+        Args:
+            payload: 通知のペイロード
+            sinks: 配信先の通知先
+            key: メッセージキー（省略時はペイロードの内容から決める）
+
+        Returns:
+            str: メッセージキー
+        """
+        key = key or message_key(payload)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO messages (key, created_at, payload) VALUES (?, ?, ?)",
+                (key, now, json.dumps(payload, ensure_ascii=False)),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO deliveries (key, sink, next_attempt_at) VALUES (?, ?, ?)",
+                ((key, sink, now) for sink in sinks),
+            )
+        return key
+
+    def claim_due(
+        self, limit: int = 100, sinks: Collection[str] | None = None
+    ) -> list[tuple[str, str, dict[str, Any]]]:
+        """配信時刻になった通知を取得し、一定期間ほかのワーカーが取得しないようにする
+
+        Args:
+            limit: 取得する最大件数
+            sinks: 取得する通知先（省略時はすべて）。設定されていない通知先の配信は
+                取得しないため、試行回数を消費しない
+
+        Returns:
+            list[tuple[str, str, dict[str, Any]]]: (メッセージキー, 通知先, ペイロード) のリスト
+        """
+        now = time.time()
+        claimed = []
+        sink_clause, sink_params = _sink_filter(sinks, "d.sink")
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT d.key, d.sink, d.next_attempt_at, m.payload FROM deliveries d "
+                "JOIN messages m ON m.key = d.key "
+                f"WHERE d.state = ? AND d.next_attempt_at <= ?{sink_clause} "
+                "ORDER BY d.next_attempt_at LIMIT ?",
+                (STATE_PENDING, now, *sink_params, limit),
+            ).fetchall()
+            for row in rows:
+                cursor = self._conn.execute(
+                    "UPDATE deliveries SET next_attempt_at = ?, attempts = attempts + 1 "
+                    "WHERE key = ? AND sink = ? AND state = ? AND next_attempt_at = ?",
+                    (
+                        now + CLAIM_LEASE,
+                        row["key"],
+                        row["sink"],
+                        STATE_PENDING,
+                        row["next_attempt_at"],
+                    ),
+                )
+                if cursor.rowcount == 1:
+                    claimed.append((row["key"], row["sink"], json.loads(row["payload"])))
+        return claimed
+
+    def mark_delivered(self, key: str, sink: str) -> None:
+        """配信済みとして記録する"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE deliveries SET state = ?, delivered_at = ?, last_error = '' "
+                "WHERE key = ? AND sink = ?",
+                (STATE_DELIVERED, time.time(), key, sink),
+            )
+
+    def mark_failed(self, key: str, sink: str, error: str) -> bool:
+        """配信の失敗を記録し、再試行を予約する
+
+        Returns:
+            bool: 再試行を予約した場合True（試行回数の上限に達した場合はFalse）
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT attempts FROM deliveries WHERE key = ? AND sink = ?", (key, sink)
+            ).fetchone()
+            attempts = row["attempts"] if row else self.max_attempts
+            retry = attempts < self.max_attempts
+            self._conn.execute(
+                "UPDATE deliveries SET state = ?, next_attempt_at = ?, last_error = ? "
+                "WHERE key = ? AND sink = ?",
+                (
+                    STATE_PENDING if retry else STATE_FAILED,
+                    time.time() + backoff_delay(attempts),
+                    error[:500],
+                    key,
+                    sink,
+                ),
+            )
+        return retry
+
+    def load_progress(self, key: str, sink: str) -> dict[str, Any]:
+        """通知先が記録した配信の進捗を返す（記録がない場合は空の辞書）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT progress FROM deliveries WHERE key = ? AND sink = ?", (key, sink)
+            ).fetchone()
+        try:
+            progress = json.loads(row["progress"]) if row else {}
+        except ValueError:
+            return {}
+        return progress if isinstance(progress, dict) else {}
+
+    def save_progress(self, key: str, sink: str, progress: dict[str, Any]) -> None:
+        """配信の進捗を記録する（再試行で途中から配信を続けるために使う）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE deliveries SET progress = ? WHERE key = ? AND sink = ?",
+                (json.dumps(progress, ensure_ascii=False), key, sink),
+            )
+
+    def next_due(self, sinks: Collection[str] | None = None) -> float | None:
+        """次に配信時刻になる未配信の通知の時刻を返す（なければNone）
+
+        Args:
+            sinks: 対象の通知先（省略時はすべて）
+        """
+        sink_clause, sink_params = _sink_filter(sinks, "sink")
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT MIN(next_attempt_at) FROM deliveries WHERE state = ?{sink_clause}",
+                (STATE_PENDING, *sink_params),
+            ).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> dict[str, int]:
+        """状態ごとの配信数を返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM deliveries GROUP BY state"
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def failures(self) -> list[dict[str, Any]]:
+        """試行回数の上限に達した配信を返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, sink, attempts, last_error FROM deliveries WHERE state = ? "
+                "ORDER BY key",
+                (STATE_FAILED,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def retry_failed(self) -> int:
+        """試行回数の上限に達した配信を未配信に戻す
+
+        Returns:
+            int: 戻した配信数
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE deliveries SET state = ?, attempts = 0, next_attempt_at = ? WHERE state = ?",
+                (STATE_PENDING, time.time(), STATE_FAILED),
+            )
+        return cursor.rowcount
+
+    def purge_delivered(self, older_than: float = 0.0) -> int:
+        """配信済みの通知を削除する（すべての通知先に配信したメッセージも削除する）
+
+        Args:
+            older_than: この秒数より前に配信したものだけを削除する
+
+        Returns:
+            int: 削除した配信数
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM deliveries WHERE state = ? AND delivered_at <= ?",
+                (STATE_DELIVERED, time.time() - older_than),
+            )
+            self._conn.execute("DELETE FROM messages WHERE key NOT IN (SELECT key FROM deliveries)")
+        return cursor.rowcount
+
+
+def _sink_type(sink: str) -> str:
+    return sink.split(":", 1)[0]
+
+
+def build_sinks(config: Config, outbox: "Outbox | None" = None) -> dict[str, Sink]:
+    """設定から通知先を作成する
+
+    Slackの設定（USE_SLACK_SDK / SLACK_WEBHOOK_URL）は通知先 slack とし、従来どおり
+    Slack SDK で送信できなければ Incoming Webhook で送信する。NOTIFY_SINKS で次の
+    通知先を追加できる。
+
+    - slack:<チャンネル>: Slack SDK で別のチャンネルに送信する（SLACK_BOT_TOKEN を使用）
+    - webhook:<URL>: ペイロードをJSONでPOSTする（Idempotency-Key ヘッダーにメッセージキー）
+    - file:<パス>: ペイロードをJSON Linesで追記する
+
+    Args:
+        config: アプリケーション設定
+        outbox: Slackのスレッドの投稿の進捗を記録するアウトボックス（省略時は記録しない）
+
+    Returns:
+        dict[str, Sink]: 通知先の名前と送信関数（未設定の場合は空）
+    """
+    sinks: dict[str, Sink] = {}
+    if config.slack_webhook_url or (config.use_slack_sdk and config.slack_bot_token):
+        sinks["slack"] = _slack_sink(config, outbox)
+    for spec in config.notify_sinks:
+        kind, _, target = spec.partition(":")
+        if not target:
+            logger.warning("通知先の指定が正しくありません: %s", spec)
+        elif kind == "slack":
+            sinks[spec] = _slack_channel_sink(config, target, spec, outbox)
+        elif kind == "webhook":
+            sinks[spec] = _webhook_sink(target)
+        elif kind == "file":
+            sinks[spec] = _file_sink(target)
+        else:
+            logger.warning("不明な種類の通知先です: %s", spec)
+    return sinks
+
+
+def _payload_report(payload: dict[str, Any]) -> ScanReport | None:
+    """ペイロードに記録したスキャン完了状況を復元する内部関数"""
+    if "partial" not in payload:
+        return None
+    return ScanReport(
+        incomplete=list(payload.get("incomplete", [])),
+        skipped=list(payload.get("skipped", [])),
+        failed=list(payload.get("failed", [])),
+    )
+
+
+def _send_thread(
+    config: Config,
+    channel: str,
+    payload: dict[str, Any],
+    key: str,
+    sink: str,
+    outbox: "Outbox | None",
+) -> bool:
+    """Slack SDK で送信し、スレッドの投稿の進捗をアウトボックスに記録する内部関数
+
+    前回の配信でサマリーを投稿済みの場合は、投稿できなかった返信だけを同じスレッドに投稿する。
+
+    Returns:
+        bool: サマリーを投稿できなかった場合False
+
+    Raises:
+        DeliveryError: サマリーは投稿できたが、返信の一部を投稿できなかった場合
+    """
+    thread = outbox.load_progress(key, sink) if outbox is not None else {}
+    try:
+        sent = send_sdk_notification(
+            config,
+            channel,
+            payload["findings"],
+            _payload_report(payload),
+            message=payload["text"],
+            thread=thread,
+        )
+    finally:
+        if outbox is not None and thread:
+            outbox.save_progress(key, sink, thread)
+    if sent and not thread_complete(thread):
+        raise DeliveryError(f"Slack（{channel}）のスレッドへの返信の一部を投稿できませんでした")
+    return sent
+
+
+def _slack_sink(config: Config, outbox: "Outbox | None") -> Sink:
+    """Slack SDK、失敗した場合は Incoming Webhook で送信する通知先を作成する内部関数"""
+
+    def deliver(payload: dict[str, Any], key: str) -> None:
+        if config.use_slack_sdk and config.slack_bot_token:
+            if _send_thread(config, config.slack_channel, payload, key, "slack", outbox):
+                return
+        if config.slack_webhook_url and send_slack_notification(
+            config.slack_webhook_url, payload["text"]
+        ):
+            return
+        raise DeliveryError("Slack通知の送信に失敗しました")
+
+    return deliver
+
+
+def _slack_channel_sink(
+    config: Config, channel: str, sink: str, outbox: "Outbox | None" = None
+) -> Sink:
+    def deliver(payload: dict[str, Any], key: str) -> None:
+        if not config.slack_bot_token:
+            raise DeliveryError("SLACK_BOT_TOKEN が設定されていません")
+        if not _send_thread(config, channel, payload, key, sink, outbox):
+            raise DeliveryError(f"Slack（{channel}）への送信に失敗しました")
+
+    return deliver
+
+
+def _webhook_sink(url: str) -> Sink:
+    def deliver(payload: dict[str, Any], key: str) -> None:
+        # 受信側で重複を除けるよう、再試行でも同じキーを送る
+        with TRACER.span("notification", sink="webhook"):
+            response = requests.post(
+                url,
+                data=json.dumps({"key": key, **payload}, ensure_ascii=False).encode("utf-8"),
+                headers={"Content-Type": "application/json", "Idempotency-Key": key},
+                timeout=10,
+            )
+            response.raise_for_status()
+
+    return deliver
+
+
+def _file_sink(path: str) -> Sink:
+    path = os.path.expanduser(path)
+    lock = threading.Lock()
+
+    def deliver(payload: dict[str, Any], key: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        line = json.dumps({"key": key, **payload}, ensure_ascii=False)
+        with lock, open(path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+    return deliver
+
+
+def deliver_due(outbox: Outbox, sinks: dict[str, Sink], executor: ThreadPoolExecutor) -> int:
+    """配信時刻になった通知を、通知先ごとに並列で1回ずつ配信する
+
+    Args:
+        outbox: アウトボックス
+        sinks: 通知先の名前と送信関数
+        executor: 配信に使うスレッドプール
+
+    Returns:
+        int: 配信を試みた件数
+    """
+    # 設定されていない通知先の配信は取得せず、設定されたときのために残しておく
+    claimed = outbox.claim_due(sinks=list(sinks))
+
+    def attempt(key: str, sink: str, payload: dict[str, Any]) -> None:
+        try:
+            sinks[sink](payload, key)
+        except Exception as e:
+            retry = outbox.mark_failed(key, sink, str(e) or type(e).__name__)
+            result = "retry" if retry else "failed"
+            log = logger.warning if retry else logger.error
+            log("通知先 %s への配信に失敗しました（%s）: %s", sink, key[:12], e)
+        else:
+            outbox.mark_delivered(key, sink)
+            result = "success"
+        METRICS.inc("neko_sg_outbox_deliveries", sink=_sink_type(sink), result=result)
+
+    for future in [executor.submit(attempt, *item) for item in claimed]:
+        future.result()
+    return len(claimed)
+
+
+def flush(
+    outbox: Outbox, sinks: dict[str, Sink], executor: ThreadPoolExecutor, timeout: float
+) -> bool:
+    """未配信の通知がなくなるまで配信を繰り返す（再試行の待機を含めて timeout 秒まで）
+
+    Returns:
+        bool: すべて配信（または試行回数の上限に到達）した場合True
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        deliver_due(outbox, sinks, executor)
+        due = outbox.next_due(list(sinks))
+        if due is None:
+            return True
+        wait = due - time.time()
+        if time.monotonic() + max(0.0, wait) > deadline:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+
+
+class OutboxWorker:
+    """アウトボックスの通知をバックグラウンドで配信するワーカー
+
+    Attributes:
+        outbox: アウトボックス
+        sinks: 通知先の名前と送信関数
+    """
+
+    def __init__(self, outbox: Outbox, sinks: dict[str, Sink], max_workers: int = 4) -> None:
+        self.outbox = outbox
+        self.sinks = sinks
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="neko-sg-notify"
+        )
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, payload: dict[str, Any], key: str | None = None) -> str:
+        """通知を登録し、ワーカーに配信を促す（配信は待たない）
+
+        Returns:
+            str: メッセージキー
+        """
+        key = self.outbox.enqueue(payload, list(self.sinks), key)
+        self._wake.set()
+        return key
+
+    def start(self) -> None:
+        """配信用のスレッドを開始する（開始済みの場合は何もしない）"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="neko-sg-outbox", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                deliver_due(self.outbox, self.sinks, self._executor)
+                due = self.outbox.next_due(list(self.sinks))
+            except Exception as e:
+                logger.error("通知の配信中にエラーが発生しました: %s", e)
+                due = None
+            wait = POLL_INTERVAL if due is None else min(POLL_INTERVAL, due - time.time())
+            if wait > 0 and self._wake.wait(wait):
+                self._wake.clear()
+
+    def stop(self, timeout: float = 0.0) -> bool:
+        """配信用のスレッドを停止し、残った通知を timeout 秒まで配信してから閉じる
+
+        Returns:
+            bool: 未配信の通知が残っていない場合True（残りは次回の起動で配信する）
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            return flush(self.outbox, self.sinks, self._executor, timeout)
+        finally:
+            self._executor.shutdown(wait=True)
+            self.outbox.close()
+
+
+def open_worker(config: Config) -> OutboxWorker | None:
+    """アウトボックスを使う設定の場合にワーカーを作成する（開始はしない）
+
+    Returns:
+        OutboxWorker | None: OUTBOX_FILE または NOTIFY_SINKS が設定され、通知先がある場合はワーカー
+
+    Note:
+        OUTBOX_FILE が未設定の場合はメモリ上のアウトボックスを使う（再試行と並列配信は行うが、
+        配信できなかった通知はプロセスの終了とともに失われる）。
+    """
+    if not (config.outbox_file or config.notify_sinks):
+        return None
+    if not build_sinks(config):
+        return None
+    outbox = Outbox(config.outbox_file or ":memory:", config.outbox_max_attempts)
+    return OutboxWorker(outbox, build_sinks(config, outbox))
+
+
+def notify(
+    config: Config, found_groups: list[dict[str, str]], report: ScanReport | None = None
+) -> bool:
+    """通知をアウトボックスに登録し、OUTBOX_FLUSH_TIMEOUT 秒まで配信する
+
+    以前の実行で配信できなかった通知もあわせて配信する。時間内に配信できなかった通知は
+    アウトボックスに残り、次回の実行（または常駐モード）で配信する。
+
+    Returns:
+        bool: アウトボックスに登録した場合True（アウトボックスや通知先が未設定の場合はFalse）
+    """
+    worker = open_worker(config)
+    if worker is None:
+        return False
+    key = worker.outbox.enqueue(build_payload(found_groups, report), list(worker.sinks))
+    logger.info("通知をアウトボックスに登録しました（%s）", key[:12])
+    if not worker.stop(config.outbox_flush_timeout):
+        if config.outbox_file:
+            logger.warning(
+                "配信できなかった通知はアウトボックス %s に残し、次回に再試行します。",
+                config.outbox_file,
+            )
+        else:
+            logger.error("配信できなかった通知があります（OUTBOX_FILE が未設定のため破棄します）")
+    return True
+
+
+def outbox_command(action: str = "status", path: str | None = None) -> int:
+    """outboxサブコマンドの実行
+
+    Args:
+        action: status（状態ごとの件数と失敗した配信の一覧）、flush（未配信の通知を配信する）、
+            retry（試行回数の上限に達した配信を未配信に戻して配信する）、
+            purge（配信済みの通知を削除する）
+        path: アウトボックスのパス（省略時は OUTBOX_FILE）
+
+    Returns:
+        int: 終了コード
+    """
+    load_dotenv()
+    config = Config.from_env()
+    path = path or config.outbox_file
+    if not path:
+        print("エラー: アウトボックスが設定されていません（--path または OUTBOX_FILE）")
+        return 1
+
+    with Outbox(path, config.outbox_max_attempts) as outbox:
+        if action == "purge":
+            print(f"{outbox.purge_delivered()}件の配信済みの通知を削除しました")
+            return 0
+        if action in ("flush", "retry"):
+            if action == "retry":
+                print(f"{outbox.retry_failed()}件の失敗した配信を再試行します")
+            sinks = build_sinks(config, outbox)
+            if not sinks:
+                print("エラー: 通知先が設定されていません（NOTIFY_SINKS または SLACK_WEBHOOK_URL）")
+                return 1
+            with ThreadPoolExecutor(thread_name_prefix="neko-sg-notify") as executor:
+                flush(outbox, sinks, executor, config.outbox_flush_timeout)
+
+        counts = outbox.counts()
+        print(
+            f"未配信: {counts.get(STATE_PENDING, 0)}件, 配信済み: {counts.get(STATE_DELIVERED, 0)}件, "
+            f"失敗: {counts.get(STATE_FAILED, 0)}件"
+        )
+        for failure in outbox.failures():
+            print(
+                f"  {failure['key'][:12]} {failure['sink']} "
+                f"（{failure['attempts']}回）: {failure['last_error']}"
+            )
+        return 1 if counts.get(STATE_PENDING) or counts.get(STATE_FAILED) else 0
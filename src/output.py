@@ -0,0 +1,207 @@
+"""
+検出結果の機械可読な出力（JSON Lines / CSV / SARIF）
+
+各ライターは検出結果を1件ずつ書き出し、リストに保持しない。
+パイプ先（jq やSIEMへの転送など）がすぐに読めるよう、1件ごとにフラッシュする。
+"""
+
+import csv
+import json
+import sys
+from typing import IO, Any
+
+OUTPUT_FORMATS = ("jsonl", "csv", "sarif")
+
+# CSVの列（存在しない項目は空文字）
+CSV_FIELDS = ["region", "group_id", "group_name", "description", "policy", "rule_id"]
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_RULE_ID = "global-ingress"
+
+
+class JsonLinesWriter:
+    """検出結果を1行1件のJSONで書き出すライター"""
+
+    def __init__(self, stream: IO[str]) -> None:
+        self.stream = stream
+        self.count = 0
+
+    def write(self, finding: dict[str, str]) -> None:
+        """検出結果を1件書き出す"""
+        self.stream.write(json.dumps(finding, ensure_ascii=False) + "\n")
+        self.stream.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        """出力を完了する"""
+        self.stream.flush()
+
+
+class CsvWriter(JsonLinesWriter):
+    """検出結果をヘッダー付きのCSVで書き出すライター"""
+
+    def __init__(self, stream: IO[str]) -> None:
+        super().__init__(stream)
+        self._writer = csv.DictWriter(
+            stream, fieldnames=CSV_FIELDS, restval="", extrasaction="ignore"
+        )
+        self._writer.writeheader()
+
+    def write(self, finding: dict[str, str]) -> None:
+        """検出結果を1件書き出す"""
+        self._writer.writerow(finding)
+        self.stream.flush()
+        self.count += 1
+
+
+class SarifWriter(JsonLinesWriter):
+    """検出結果をSARIF 2.1.0 のログとして書き出すライター
+
+    ポリシーごとに tool.driver.rules にルールを宣言し、複数のポリシーに該当した検出結果は
+    ポリシーごとの result（ruleIndex 付き）として書き出す。
+
+    Note:
+        SARIFは1つのJSONドキュメントのため、ヘッダーを先に書き出し、
+        results 配列の要素を1件ずつ追記して close() で閉じる。
+        ルールの一覧は書き出し中に初めて現れたポリシーも含めるため、close() で
+        results の後に tool として書き出す。
+    """
+
+    def __init__(self, stream: IO[str], policies: list[Any] | None = None) -> None:
+        """
+        Args:
+            stream: 出力先
+            policies: コンパイル済みポリシー（ルールの説明に使用する）
+        """
+        super().__init__(stream)
+        self._results = 0
+        self._rules: dict[str, dict[str, Any]] = {}
+        self._rule_index(SARIF_RULE_ID, "Security group allows inbound access from the internet")
+        for policy in policies or []:
+            self._rule_index(policy.name, policy.description or policy.name)
+        header = json.dumps({"$schema": SARIF_SCHEMA, "version": "2.1.0"}, ensure_ascii=False)
+        # 末尾の } を除いて runs と results を開く
+        self.stream.write(header[:-1] + ', "runs": [{"results": [')
+
+    def _rule_index(self, rule_id: str, description: str | None = None) -> int:
+        """ルールの tool.driver.rules での位置を返す（未宣言の場合は追加する）"""
+        if rule_id not in self._rules:
+            self._rules[rule_id] = {
+                "id": rule_id,
+                "shortDescription": {"text": description or f"Policy {rule_id}"},
+            }
+        return list(self._rules).index(rule_id)
+
+    def write(self, finding: dict[str, str]) -> None:
+        """検出結果を1件書き出す（該当したポリシーごとに result を書き出す）"""
+        rule_ids = [name for name in finding.get("policy", "").split(",") if name]
+        for rule_id in rule_ids or [SARIF_RULE_ID]:
+            if self._results:
+                self.stream.write(",")
+            result = _sarif_result(finding, rule_id, self._rule_index(rule_id))
+            self.stream.write("\n" + json.dumps(result, ensure_ascii=False))
+            self._results += 1
+        self.stream.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        """results 配列を閉じ、宣言したルールを書き出してドキュメントを閉じる"""
+        driver = {
+            "name": "neko-sg",
+            "informationUri": "https://github.com/ktamamu/neko_sg",
+            "rules": list(self._rules.values()),
+        }
+        self.stream.write(
+            '\n], "tool": {"driver": ' + json.dumps(driver, ensure_ascii=False) + "}}]}\n"
+        )
+        self.stream.flush()
+
+
+def _sarif_result(finding: dict[str, str], rule_id: str, rule_index: int) -> dict[str, Any]:
+    """検出結果をSARIFのresultに変換する内部関数"""
+    location = f"{finding['region']}/{finding['group_id']}"
+    if finding.get("rule_id"):
+        location += f"/{finding['rule_id']}"
+    text = (
+        f"Security group {finding['group_id']} ({finding.get('group_name', '')}) "
+        f"in {finding['region']} allows inbound access from the internet"
+    )
+    if finding.get("policy"):
+        text += f" (policy: {finding['policy']})"
+    return {
+        "ruleId": rule_id,
+        "ruleIndex": rule_index,
+        "level": "error",
+        "message": {"text": text},
+        "locations": [
+            {
+                "logicalLocations": [
+                    {
+                        "name": finding["group_id"],
+                        "fullyQualifiedName": location,
+                        "kind": "resource",
+                    }
+                ]
+            }
+        ],
+        "properties": finding,
+    }
+
+
+_WRITERS: dict[str, type[JsonLinesWriter]] = {
+    "jsonl": JsonLinesWriter,
+    "csv": CsvWriter,
+    "sarif": SarifWriter,
+}
+
+
+class FindingOutput:
+    """出力形式と出力先からライターを作成し、終了時に閉じるコンテキストマネージャー
+
+    Attributes:
+        writer: 検出結果のライター
+        to_stdout: 標準出力に書き出す場合True
+    """
+
+    def __init__(
+        self, output_format: str, path: str | None = None, policies: list[Any] | None = None
+    ) -> None:
+        """
+        Args:
+            output_format: 出力形式（jsonl, csv, sarif）
+            path: 出力先のファイル（省略時または "-" の場合は標準出力）
+            policies: コンパイル済みポリシー（SARIFのルールの宣言に使用する）
+
+        Raises:
+            ValueError: 未対応の出力形式の場合
+        """
+        if output_format not in _WRITERS:
+            raise ValueError(f"未対応の出力形式です: {output_format}")
+        self._file: IO[str] | None = None
+        if path and path != "-":
+            # CSVモジュールの改行変換を避けるため newline="" で開く
+            self._file = open(path, "w", encoding="utf-8", newline="")
+        self.to_stdout = self._file is None
+        stream = self._file if self._file is not None else sys.stdout
+        self.writer: JsonLinesWriter = (
+            SarifWriter(stream, policies)
+            if output_format == "sarif"
+            else _WRITERS[output_format](stream)
+        )
+
+    def write(self, finding: dict[str, str]) -> None:
+        """検出結果を1件書き出す"""
+        self.writer.write(finding)
+
+    def close(self) -> None:
+        """出力を完了し、ファイルを閉じる"""
+        self.writer.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "FindingOutput":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,459 @@
+"""
+宣言的ポリシールール（YAML）をPython関数にコンパイルするモジュール
+
+ポリシーファイルの例:
+
+    - name: ssh-open-to-world
+      description: "SSHがインターネットに公開されている"
+      match:
+        all:
+          - protocol: tcp
+          - port: 22
+          - cidr: {global: true}
+
+条件はロード時にクロージャへコンパイルされる。定数条件は畳み込まれ、
+all/any の子条件は推定コストと選択率に基づいて短絡評価しやすい順に並べ替えられる。
+"""
+
+import ipaddress
+import logging
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# (permission, cidr, security_group) -> bool
+Predicate = Callable[[dict[str, Any], str, dict[str, Any]], bool]
+
+# プロトコル名の別名（AWSのIpProtocol表現に正規化する）
+_PROTOCOL_ALIASES = {"all": "-1", "6": "tcp", "17": "udp", "1": "icmp", "58": "icmpv6"}
+
+
+@dataclass(frozen=True)
+class CompiledPolicy:
+    """コンパイル済みのポリシー
+
+    Attributes:
+        name: ポリシー名
+        description: ポリシーの説明
+        predicate: ルール（パーミッションとCIDRの組）に対する判定関数
+    """
+
+    name: str
+    description: str
+    predicate: Predicate
+
+    def matches(self, permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        """ルールがポリシーに該当するか判定"""
+        return self.predicate(permission, cidr, sg)
+
+
+@dataclass(frozen=True)
+class _Node:
+    """コンパイル途中の条件ノード
+
+    Attributes:
+        predicate: 判定関数（定数ノードの場合はNone）
+        constant: 定数ノードの値（定数でない場合はNone）
+        cost: 1回の評価にかかる推定コスト
+        selectivity: 条件がTrueになる推定確率
+    """
+
+    predicate: Predicate | None
+    constant: bool | None
+    cost: float
+    selectivity: float
+
+
+_TRUE = _Node(None, True, 0.0, 1.0)
+_FALSE = _Node(None, False, 0.0, 0.0)
+
+
+def _const(value: bool) -> _Node:
+    return _TRUE if value else _FALSE
+
+
+def _as_predicate(node: _Node) -> Predicate:
+    """ノードを判定関数に変換する（定数ノードは定数を返す関数になる）"""
+    if node.predicate is not None:
+        return node.predicate
+    value = bool(node.constant)
+    return lambda permission, cidr, sg: value
+
+
+@lru_cache(maxsize=4096)
+def _parse_network(cidr: str) -> ipaddress.IPv4Network | ipaddress.IPv6Network | None:
+    """CIDRを解析する（同一CIDRの繰り返し解析を避けるためキャッシュする）"""
+    try:
+        return ipaddress.ip_network(cidr, strict=False)
+    except ValueError:
+        return None
+
+
+def _port_bounds(permission: dict[str, Any]) -> tuple[int, int]:
+    """パーミッションのポート範囲を返す（全トラフィック・ICMP等は全ポート扱い）"""
+    if permission.get("IpProtocol") == "-1":
+        return 0, 65535
+    from_port = permission.get("FromPort")
+    to_port = permission.get("ToPort")
+    if from_port is None or to_port is None or from_port == -1 or to_port == -1:
+        return 0, 65535
+    return int(from_port), int(to_port)
+
+
+def _normalize_protocol(value: Any) -> str:
+    protocol = str(value).lower()
+    return _PROTOCOL_ALIASES.get(protocol, protocol)
+
+
+def _compile_protocol(spec: Any) -> _Node:
+    values = spec if isinstance(spec, list) else [spec]
+    protocols = frozenset(_normalize_protocol(v) for v in values)
+    if not protocols:
+        return _FALSE
+
+    def predicate(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        # 全トラフィック許可ルールは任意のプロトコルを公開している
+        protocol = permission.get("IpProtocol")
+        return protocol == "-1" or protocol in protocols
+
+    return _Node(predicate, None, 1.0, min(1.0, 0.3 * len(protocols)))
+
+
+def _compile_port(spec: Any) -> _Node:
+    port = int(spec)
+    if not 0 <= port <= 65535:
+        return _FALSE
+
+    def predicate(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        low, high = _port_bounds(permission)
+        return low <= port <= high
+
+    return _Node(predicate, None, 1.0, 0.1)
+
+
+def _compile_port_range(spec: Any) -> _Node:
+    if not isinstance(spec, dict):
+        raise ValueError(f"port_range には from/to を指定してください: {spec!r}")
+    low = int(spec.get("from", 0))
+    high = int(spec.get("to", 65535))
+    if low > high:
+        return _FALSE
+
+    def predicate(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        rule_low, rule_high = _port_bounds(permission)
+        return rule_low <= high and low <= rule_high
+
+    return _Node(predicate, None, 1.0, min(1.0, 0.05 + (high - low + 1) / 65536))
+
+
+def _compile_cidr(spec: Any) -> _Node:
+    if not isinstance(spec, dict):
+        raise ValueError(f"cidr には条件の辞書を指定してください: {spec!r}")
+
+    checks: list[_Node] = []
+    if "global" in spec:
+        expected = bool(spec["global"])
+
+        def is_global(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+            network = _parse_network(cidr)
+            return network is not None and (not network.is_private) == expected
+
+        checks.append(_Node(is_global, None, 3.0, 0.3 if expected else 0.7))
+
+    if "ipv6" in spec:
+        want_v6 = bool(spec["ipv6"])
+
+        def is_ipv6(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+            return (":" in cidr) == want_v6
+
+        checks.append(_Node(is_ipv6, None, 0.5, 0.3 if want_v6 else 0.7))
+
+    if "max_prefix" in spec:
+        max_prefix = int(spec["max_prefix"])
+
+        def prefix_at_most(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+            network = _parse_network(cidr)
+            return network is not None and network.prefixlen <= max_prefix
+
+        checks.append(_Node(prefix_at_most, None, 3.0, 0.3))
+
+    if "within" in spec:
+        values = spec["within"]
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list):
+            raise ValueError(f"within にはCIDRのリストを指定してください: {values!r}")
+        # 定数に畳み込む場合も含め、すべてのCIDRを厳密に検証してから判定を組み立てる
+        parents: list[ipaddress.IPv4Network | ipaddress.IPv6Network] = []
+        for value in values:
+            try:
+                if not isinstance(value, str):
+                    raise ValueError(value)
+                parents.append(ipaddress.ip_network(value.strip()))
+            except ValueError:
+                raise ValueError(f"無効なCIDR形式: {value}") from None
+        if not parents:
+            checks.append(_FALSE)
+        elif {p.version for p in parents if p.prefixlen == 0} == {4, 6}:
+            # IPv4/IPv6それぞれの全範囲を含む場合は常に成立する
+            checks.append(_TRUE)
+        else:
+            parent_tuple = tuple(parents)
+
+            def within(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+                network = _parse_network(cidr)
+                if network is None:
+                    return False
+                return any(
+                    network.version == parent.version and network.subnet_of(parent)  # type: ignore[arg-type]
+                    for parent in parent_tuple
+                )
+
+            checks.append(_Node(within, None, 4.0, 0.3))
+
+    unknown = set(spec) - {"global", "ipv6", "max_prefix", "within"}
+    if unknown:
+        raise ValueError(f"cidr の未知の条件: {sorted(unknown)}")
+    return _combine_all(checks)
+
+
+def _compile_tag(spec: Any) -> _Node:
+    if not isinstance(spec, dict) or "key" not in spec:
+        raise ValueError(f"tag には key を指定してください: {spec!r}")
+    key = str(spec["key"])
+    has_value = "value" in spec
+    value = str(spec.get("value", ""))
+
+    def predicate(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        for tag in sg.get("Tags", []):
+            if tag.get("Key") == key:
+                return not has_value or tag.get("Value") == value
+        return False
+
+    return _Node(predicate, None, 2.0, 0.2)
+
+
+def _combine_all(children: list[_Node]) -> _Node:
+    """AND結合（定数畳み込みと選択率による並べ替えを行う）"""
+    dynamic = []
+    for child in children:
+        if child.constant is False:
+            return _FALSE
+        if child.constant is None:
+            dynamic.append(child)
+    if not dynamic:
+        return _TRUE
+    if len(dynamic) == 1:
+        return dynamic[0]
+
+    # 失敗しやすく安価な条件を先に評価する
+    dynamic.sort(key=lambda n: n.cost / max(1.0 - n.selectivity, 1e-6))
+    predicates = tuple(_as_predicate(n) for n in dynamic)
+    selectivity = 1.0
+    cost = 0.0
+    for node in dynamic:
+        cost += node.cost * selectivity
+        selectivity *= node.selectivity
+
+    if len(predicates) == 2:
+        first, second = predicates
+
+        def all_of_two(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+            return first(permission, cidr, sg) and second(permission, cidr, sg)
+
+        return _Node(all_of_two, None, cost, selectivity)
+
+    def all_of(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        for predicate in predicates:
+            if not predicate(permission, cidr, sg):
+                return False
+        return True
+
+    return _Node(all_of, None, cost, selectivity)
+
+
+def _combine_any(children: list[_Node]) -> _Node:
+    """OR結合（定数畳み込みと選択率による並べ替えを行う）"""
+    dynamic = []
+    for child in children:
+        if child.constant is True:
+            return _TRUE
+        if child.constant is None:
+            dynamic.append(child)
+    if not dynamic:
+        return _FALSE
+    if len(dynamic) == 1:
+        return dynamic[0]
+
+    # 成立しやすく安価な条件を先に評価する
+    dynamic.sort(key=lambda n: n.cost / max(n.selectivity, 1e-6))
+    predicates = tuple(_as_predicate(n) for n in dynamic)
+    miss = 1.0
+    cost = 0.0
+    for node in dynamic:
+        cost += node.cost * miss
+        miss *= 1.0 - node.selectivity
+
+    if len(predicates) == 2:
+        first, second = predicates
+
+        def any_of_two(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+            return first(permission, cidr, sg) or second(permission, cidr, sg)
+
+        return _Node(any_of_two, None, cost, 1.0 - miss)
+
+    def any_of(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        for predicate in predicates:
+            if predicate(permission, cidr, sg):
+                return True
+        return False
+
+    return _Node(any_of, None, cost, 1.0 - miss)
+
+
+def _negate(child: _Node) -> _Node:
+    if child.constant is not None:
+        return _const(not child.constant)
+    inner = _as_predicate(child)
+
+    def predicate(permission: dict[str, Any], cidr: str, sg: dict[str, Any]) -> bool:
+        return not inner(permission, cidr, sg)
+
+    return _Node(predicate, None, child.cost, 1.0 - child.selectivity)
+
+
+_LEAF_COMPILERS: dict[str, Callable[[Any], _Node]] = {
+    "protocol": _compile_protocol,
+    "port": _compile_port,
+    "port_range": _compile_port_range,
+    "cidr": _compile_cidr,
+    "tag": _compile_tag,
+}
+
+
+def _compile_condition(condition: Any) -> _Node:
+    """条件式を再帰的にコンパイルする
+
+    Raises:
+        ValueError: 条件式の形式が不正な場合
+    """
+    if isinstance(condition, bool):
+        return _const(condition)
+    if isinstance(condition, list):
+        return _combine_all([_compile_condition(c) for c in condition])
+    if not isinstance(condition, dict):
+        raise ValueError(f"不正な条件式: {condition!r}")
+
+    # 1つの辞書に複数のキーがある場合は暗黙のANDとして扱う
+    nodes = []
+    for key, value in condition.items():
+        if key == "all":
+            nodes.append(_combine_all([_compile_condition(c) for c in value]))
+        elif key == "any":
+            nodes.append(_combine_any([_compile_condition(c) for c in value]))
+        elif key == "not":
+            nodes.append(_negate(_compile_condition(value)))
+        elif key in _LEAF_COMPILERS:
+            nodes.append(_LEAF_COMPILERS[key](value))
+        else:
+            raise ValueError(f"未知の条件: {key}")
+    return _combine_all(nodes)
+
+
+def compile_policy(entry: dict[str, Any]) -> CompiledPolicy:
+    """ポリシー定義1件を判定関数にコンパイルする
+
+    Args:
+        entry: ポリシー定義（name, description, match）
+
+    Returns:
+        CompiledPolicy: コンパイル済みのポリシー
+
+    Raises:
+        ValueError: ポリシー定義の形式が不正な場合
+    """
+    if not isinstance(entry, dict) or "name" not in entry or "match" not in entry:
+        raise ValueError("ポリシーには name と match が必要です")
+    node = _compile_condition(entry["match"])
+    return CompiledPolicy(
+        name=str(entry["name"]),
+        description=str(entry.get("description", "")),
+        predicate=_as_predicate(node),
+    )
+
+
+def load_policy_rules(file_path: str) -> list[CompiledPolicy]:
+    """YAMLファイルからポリシーを読み込んでコンパイルする
+
+    Args:
+        file_path: ポリシーYAMLファイルのパス
+
+    Returns:
+        list[CompiledPolicy]: コンパイル済みポリシーのリスト。ファイルが存在しない場合は空リスト
+
+    Note:
+        不正なポリシーは警告を出力してスキップする
+    """
+    if not os.path.exists(file_path):
+        return []
+
+    try:
+        with open(file_path, encoding="utf-8") as file:
+            entries = yaml.safe_load(file) or []
+    except yaml.YAMLError as e:
+        logger.error("YAMLファイル '%s' の読み込みエラー: %s", file_path, e)
+        return []
+    except OSError as e:
+        logger.error("ファイル '%s' の読み込みエラー: %s", file_path, e)
+        return []
+
+    policies = []
+    for entry in entries:
+        try:
+            policies.append(compile_policy(entry))
+        except (ValueError, TypeError) as e:
+            logger.warning("ポリシーのコンパイルに失敗したためスキップします: %s", e)
+    logger.info("%d件のポリシーを読み込みました。", len(policies))
+    return policies
+
+
+def matching_policies(
+    sg: dict[str, Any],
+    exclusion_rules: Any,
+    policies: list[CompiledPolicy],
+) -> list[str]:
+    """除外されていないルールに該当するポリシー名の一覧を返す
+
+    Args:
+        sg: セキュリティグループの詳細情報
+        exclusion_rules: 除外ルールのリストまたは索引（ExclusionIndex）
+        policies: コンパイル済みポリシーのリスト
+
+    Returns:
+        list[str]: 該当したポリシー名（ポリシーの定義順）
+    """
+    from src.utils import compile_exclusion_rules
+
+    sg_id = sg["GroupId"]
+    exclusion_index = compile_exclusion_rules(exclusion_rules)
+
+    matched: set[str] = set()
+    for permission in sg.get("IpPermissions", []):
+        cidrs = [r.get("CidrIp") for r in permission.get("IpRanges", [])]
+        cidrs += [r.get("CidrIpv6") for r in permission.get("Ipv6Ranges", [])]
+        for cidr in cidrs:
+            if not cidr:
+                continue
+            if exclusion_index.is_rule_excluded(sg_id, permission, cidr):
+                continue
+            for policy in policies:
+                if policy.name not in matched and policy.predicate(permission, cidr, sg):
+                    matched.add(policy.name)
+
+    return [policy.name for policy in policies if policy.name in matched]
@@ -0,0 +1,236 @@
+"""
+スキャンのプロファイリング（スタックのサンプリング）
+
+scan --profile で、一定間隔で全スレッドのスタックを採取し、スレッド名を根とする
+collapsed stack 形式（speedscope や flamegraph.pl で読み込める）のファイルに書き出す。
+あわせて、スレッドごとの内訳と、自己時間の多い関数の上位を短い集計として表示する。
+Python 3.12 以降の cProfile はプロセス全体で1つしか有効にできず、スレッドごとに
+計測できないため、sys._current_frames() によるサンプリングで計測する。
+"""
+
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import IO
+
+# サンプリングの間隔（秒）
+DEFAULT_INTERVAL = 0.005
+
+# 集計に表示する関数の件数
+DEFAULT_TOP = 15
+
+# 末尾のフレームがこれらのファイルにある場合は待機中（スレッドプールの待ち合わせなど）とみなす
+_IDLE_FILES = ("threading.py", "queue.py", os.path.join("concurrent", "futures", ""))
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_SITE_PACKAGES = "site-packages" + os.sep
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+Stack = tuple[str, ...]
+
+
+class SamplingProfiler:
+    """一定間隔で全スレッドのスタックを採取するプロファイラー
+
+    Attributes:
+        interval: サンプリングの間隔（秒）
+        rounds: 採取した回数
+        elapsed: 計測した時間（秒）
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL) -> None:
+        self.interval = interval
+        self.rounds = 0
+        self.elapsed = 0.0
+        self._stacks: Counter[tuple[str, Stack]] = Counter()
+        self._idle: set[Stack] = set()
+        self._labels: dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started = 0.0
+
+    def start(self) -> None:
+        """サンプリング用のスレッドを開始する"""
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="neko-sg-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """サンプリングを停止する"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed = time.perf_counter() - self._started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(exclude=own)
+
+    def sample(self, exclude: int | None = None) -> None:
+        """全スレッドのスタックを1回採取する
+
+        Args:
+            exclude: 採取しないスレッドのID（サンプリング用のスレッド自身）
+        """
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == exclude:
+                continue
+            labels: list[str] = []
+            leaf_file = frame.f_code.co_filename
+            current = frame
+            while current is not None:
+                labels.append(self._label(current.f_code))
+                current = current.f_back  # type: ignore[assignment]
+            stack = tuple(reversed(labels))
+            if any(part in leaf_file for part in _IDLE_FILES):
+                self._idle.add(stack)
+            self._stacks[(names.get(ident, f"thread-{ident}"), stack)] += 1
+        self.rounds += 1
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = _short_path(code.co_filename)
+            # collapsed stack 形式ではセミコロンがフレームの区切りになる
+            label = f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    # 集計
+
+    def threads(self) -> list[tuple[str, int, int, str]]:
+        """スレッドごとの内訳を返す
+
+        Returns:
+            list[tuple[str, int, int, str]]: (スレッド名, サンプル数, 待機中を除くサンプル数,
+                自己時間が最も多い関数) のリスト（スレッド名順）
+        """
+        totals: Counter[str] = Counter()
+        busy: Counter[str] = Counter()
+        leaves: dict[str, Counter[str]] = {}
+        for (thread_name, stack), count in self._stacks.items():
+            totals[thread_name] += count
+            if stack in self._idle or not stack:
+                continue
+            busy[thread_name] += count
+            leaves.setdefault(thread_name, Counter())[stack[-1]] += count
+        return [
+            (
+                name,
+                totals[name],
+                busy[name],
+                leaves[name].most_common(1)[0][0] if name in leaves else "-",
+            )
+            for name in sorted(totals)
+        ]
+
+    def hot_functions(self, top: int = DEFAULT_TOP) -> list[tuple[str, int, int]]:
+        """待機中を除いたサンプルから、自己時間の多い関数を返す
+
+        Returns:
+            list[tuple[str, int, int]]: (関数, 自己サンプル数, 累積サンプル数) のリスト
+        """
+        own: Counter[str] = Counter()
+        cumulative: Counter[str] = Counter()
+        for (_, stack), count in self._stacks.items():
+            if stack in self._idle or not stack:
+                continue
+            own[stack[-1]] += count
+            for label in set(stack):
+                cumulative[label] += count
+        return [(label, count, cumulative[label]) for label, count in own.most_common(top)]
+
+    # 出力
+
+    def write_collapsed(self, path: str) -> int:
+        """スレッド名を根とする collapsed stack 形式で書き出す
+
+        Returns:
+            int: 書き出した行数
+        """
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lines = sorted(
+            f"{thread_name.replace(';', ':').replace(' ', '_')};{';'.join(stack)} {count}"
+            for (thread_name, stack), count in self._stacks.items()
+        )
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(line + "\n" for line in lines)
+        return len(lines)
+
+    def write_summary(self, stream: IO[str], top: int = DEFAULT_TOP) -> None:
+        """スレッドごとの内訳と、自己時間の多い関数の上位を表示する"""
+        samples = sum(self._stacks.values())
+        stream.write(
+            f"プロファイル: {self.rounds}回の採取（{self.interval * 1000:g}ms間隔）、"
+            f"{samples}サンプル、経過 {self.elapsed:.2f}s\n\n"
+        )
+        rows: list[tuple[str, ...]] = [("thread", "samples", "busy", "top function")]
+        for name, total, busy, leaf in self.threads():
+            rows.append((name, str(total), f"{busy / total:.0%}" if total else "-", leaf))
+        _write_table(stream, rows)
+        busy_samples = max(1, sum(busy for _, _, busy, _ in self.threads()))
+        stream.write("\n")
+        rows = [("self", "total", "function")]
+        for label, own, cumulative in self.hot_functions(top):
+            rows.append(
+                (
+                    f"{own / busy_samples:.1%}",
+                    f"{cumulative / busy_samples:.1%}",
+                    label,
+                )
+            )
+        _write_table(stream, rows)
+
+
+def _short_path(filename: str) -> str:
+    if _SITE_PACKAGES in filename:
+        return filename.split(_SITE_PACKAGES, 1)[1]
+    if filename.startswith(_PROJECT_ROOT):
+        return filename[len(_PROJECT_ROOT) :]
+    if filename.startswith(_STDLIB):
+        return filename[len(_STDLIB) :]
+    return os.path.basename(filename)
+
+
+def _write_table(stream: IO[str], rows: list[tuple[str, ...]]) -> None:
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+    for row in rows:
+        cells = [
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths, strict=False))
+        ]
+        stream.write("  ".join([*cells, row[-1]]).rstrip() + "\n")
+
+
+def start_profiler(interval: float = DEFAULT_INTERVAL) -> SamplingProfiler:
+    """プロファイラーを作成して開始する"""
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    return profiler
+
+
+def finish_profile(profiler: SamplingProfiler, path: str, top: int = DEFAULT_TOP) -> None:
+    """プロファイラーを停止し、結果のファイルと集計（path.txt と標準エラー出力）を書き出す
+
+    Args:
+        profiler: 開始済みのプロファイラー
+        path: collapsed stack 形式の出力先
+        top: 集計に表示する関数の件数
+    """
+    profiler.stop()
+    profiler.write_collapsed(path)
+    summary_path = os.path.expanduser(path) + ".txt"
+    with open(summary_path, "w", encoding="utf-8") as file:
+        profiler.write_summary(file, top)
+    profiler.write_summary(sys.stderr, top)
+    sys.stderr.write(f"\nプロファイルを {path} に書き出しました（集計: {summary_path}）\n")
@@ -0,0 +1,462 @@
+"""
+グローバルアクセス可能なインバウンドルールの一括削除（remediate サブコマンド）
+
+検出結果（ライブのスキャン、または scan --output jsonl やシャードの結果ファイル）の
+セキュリティグループについて、現在のルールを describe_security_group_rules で取得し直し、
+除外ルール（とポリシー）を適用したうえで、グローバルなCIDRを許可するインバウンドルールを
+revoke_security_group_ingress でルールIDを指定してまとめて削除する。
+リージョンは並列に、リージョン内は同時実行数を制限して処理する。削除したルールは
+実行ごとに新しく作成するロールバックファイル（JSON Lines）に1グループ1行で記録し、
+--rollback で元に戻せる（ほかの実行で削除したルールは戻さない）。
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import IO, Any
+
+from botocore.exceptions import BotoCoreError, ClientError
+from dotenv import load_dotenv
+
+from src.config import Config
+from src.metrics import METRICS
+from src.policy import load_policy_rules
+from src.scanner import Scanner
+from src.utils import (
+    ClientPool,
+    ExclusionIndex,
+    _is_global_cidr,
+    compile_exclusion_rules,
+    evaluate_security_group_rule,
+    get_security_group_rules,
+    load_exclusion_rules,
+)
+
+logger = logging.getLogger(__name__)
+
+# 1回の revoke_security_group_ingress で指定するルールIDの数
+REVOKE_BATCH_SIZE = 100
+
+# describe_security_group_rules の group-id フィルタに指定するIDの数
+FILTER_BATCH_SIZE = 200
+
+# リージョンごとに同時に実行する削除の数
+DEFAULT_REGION_CONCURRENCY = 4
+
+# ロールバックファイルの名前（実行ごとに作成する。time.strftime の書式、UTC）
+DEFAULT_ROLLBACK_FILE = "remediation-rollback-%Y%m%dT%H%M%SZ.jsonl"
+
+
+@dataclass
+class GroupPlan:
+    """セキュリティグループ1つ分の削除対象
+
+    Attributes:
+        region: リージョン名
+        group_id: セキュリティグループID
+        rules: 削除するルール（describe_security_group_rules の形式）
+    """
+
+    region: str
+    group_id: str
+    rules: list[dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class RemediationResult:
+    """一括削除の結果
+
+    Attributes:
+        groups: 処理したセキュリティグループの数
+        rules: 削除した（ドライランでは削除できる）ルールの数
+        failed: 失敗したセキュリティグループ（リージョン, グループID, エラー）
+    """
+
+    groups: int = 0
+    rules: int = 0
+    failed: list[tuple[str, str, str]] = field(default_factory=list)
+
+
+def load_findings(path: str) -> list[dict[str, str]]:
+    """検出結果のファイルを読み込む
+
+    scan --output jsonl の JSON Lines、シャードの結果ファイル（findings を含むJSON）、
+    検出結果のJSON配列を受け付ける。
+
+    Raises:
+        OSError: ファイルを読み込めない場合
+        ValueError: JSONとして解釈できない場合、または region / group_id のない検出結果がある場合
+    """
+    with open(os.path.expanduser(path), encoding="utf-8") as file:
+        text = file.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        findings = list(json.loads(text))
+    elif stripped.startswith("{") and "\n{" not in stripped.rstrip():
+        data = json.loads(text)
+        findings = list(data.get("findings", [data]))
+    else:
+        findings = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for number, finding in enumerate(findings, 1):
+        if (
+            not isinstance(finding, dict)
+            or not finding.get("region")
+            or not finding.get("group_id")
+        ):
+            raise ValueError(f"{number}件目の検出結果に region または group_id がありません")
+    return findings
+
+
+def _target_rule_ids(findings: Iterable[dict[str, str]]) -> dict[tuple[str, str], set[str]]:
+    """検出結果をグループごとにまとめる（ルールIDを含む場合はそのルールだけを対象にする）"""
+    targets: dict[tuple[str, str], set[str]] = {}
+    for finding in findings:
+        rule_ids = targets.setdefault((finding["region"], finding["group_id"]), set())
+        if finding.get("rule_id"):
+            rule_ids.add(finding["rule_id"])
+    return targets
+
+
+def _rule_cidr(rule: dict[str, Any]) -> str:
+    return str(rule.get("CidrIpv4") or rule.get("CidrIpv6") or "")
+
+
+def build_plan(
+    findings: Iterable[dict[str, str]],
+    exclusion_index: ExclusionIndex,
+    clients: ClientPool,
+    config: Config,
+    policies: list[Any] | None = None,
+    executor: ThreadPoolExecutor | None = None,
+) -> list[GroupPlan]:
+    """検出結果のセキュリティグループの現在のルールを取得し、削除対象を決める
+
+    グローバルなCIDRを許可するインバウンドルールのうち、除外ルールに該当せず、
+    検出の判定（組み込みの判定またはポリシー）に該当するものを削除対象とする。
+
+    Returns:
+        list[GroupPlan]: 削除対象のあるセキュリティグループ（リージョン、グループIDの順）
+    """
+    targets = _target_rule_ids(findings)
+    by_region: dict[str, list[str]] = defaultdict(list)
+    for region, group_id in targets:
+        by_region[region].append(group_id)
+
+    def plan_region(region: str) -> list[GroupPlan]:
+        plans: dict[str, GroupPlan] = {}
+        group_ids = sorted(by_region[region])
+        client = clients.get(region)
+        for start in range(0, len(group_ids), FILTER_BATCH_SIZE):
+            batch = group_ids[start : start + FILTER_BATCH_SIZE]
+            for rule in get_security_group_rules(region, config, client, group_ids=batch):
+                group_id = rule["GroupId"]
+                wanted = targets.get((region, group_id))
+                if wanted is None or (wanted and rule.get("SecurityGroupRuleId") not in wanted):
+                    continue
+                if not _is_global_cidr(_rule_cidr(rule)):
+                    continue
+                if evaluate_security_group_rule(rule, region, exclusion_index, policies) is None:
+                    continue
+                plans.setdefault(group_id, GroupPlan(region, group_id)).rules.append(rule)
+        return [plans[group_id] for group_id in sorted(plans)]
+
+    regions = sorted(by_region)
+    if executor is None:
+        return [plan for region in regions for plan in plan_region(region)]
+    return [plan for plans in executor.map(plan_region, regions) for plan in plans]
+
+
+def _permission(rule: dict[str, Any]) -> dict[str, Any]:
+    """ルールを authorize_security_group_ingress の IpPermissions の形式に変換する"""
+    permission: dict[str, Any] = {"IpProtocol": rule["IpProtocol"]}
+    if rule.get("FromPort") is not None:
+        permission["FromPort"] = rule["FromPort"]
+        permission["ToPort"] = rule["ToPort"]
+    cidr_range: dict[str, Any] = {}
+    if rule.get("Description"):
+        cidr_range["Description"] = rule["Description"]
+    if rule.get("CidrIpv4"):
+        permission["IpRanges"] = [{"CidrIp": rule["CidrIpv4"], **cidr_range}]
+    else:
+        permission["Ipv6Ranges"] = [{"CidrIpv6": rule["CidrIpv6"], **cidr_range}]
+    return permission
+
+
+def _rollback_record(plan: GroupPlan) -> dict[str, Any]:
+    return {
+        "region": plan.region,
+        "group_id": plan.group_id,
+        "revoked_at": time.time(),
+        "rules": [
+            {
+                key: rule[key]
+                for key in (
+                    "SecurityGroupRuleId",
+                    "IpProtocol",
+                    "FromPort",
+                    "ToPort",
+                    "CidrIpv4",
+                    "CidrIpv6",
+                    "Description",
+                )
+                if rule.get(key) is not None
+            }
+            for rule in plan.rules
+        ],
+    }
+
+
+def _is_dry_run_success(error: ClientError) -> bool:
+    return bool(error.response.get("Error", {}).get("Code") == "DryRunOperation")
+
+
+class _RegionLimiter:
+    """リージョンごとの同時実行数を制限するセマフォの集合"""
+
+    def __init__(self, limit: int) -> None:
+        self._limit = max(1, limit)
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def get(self, region: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            return self._semaphores.setdefault(region, threading.BoundedSemaphore(self._limit))
+
+
+def revoke(
+    plans: list[GroupPlan],
+    clients: ClientPool,
+    dry_run: bool = False,
+    rollback_stream: IO[str] | None = None,
+    region_concurrency: int = DEFAULT_REGION_CONCURRENCY,
+    max_workers: int = 16,
+) -> RemediationResult:
+    """削除対象のルールをセキュリティグループごとにまとめて削除する
+
+    Args:
+        plans: 削除対象（build_plan の結果）
+        clients: EC2クライアントのプール
+        dry_run: Trueの場合は DryRun で権限と対象だけを確認する
+        rollback_stream: 削除したルールを追記するロールバックファイル（JSON Lines）
+        region_concurrency: リージョンごとの同時実行数（リクエストのスロットリングはリージョン単位）
+        max_workers: 全体の同時実行数
+
+    Returns:
+        RemediationResult: 結果
+    """
+    result = RemediationResult()
+    lock = threading.Lock()
+    limiter = _RegionLimiter(region_concurrency)
+
+    def revoke_group(plan: GroupPlan) -> None:
+        client = clients.get(plan.region)
+        rule_ids = [rule["SecurityGroupRuleId"] for rule in plan.rules]
+        revoked: list[dict[str, Any]] = []
+        error = ""
+        with limiter.get(plan.region):
+            for start in range(0, len(rule_ids), REVOKE_BATCH_SIZE):
+                batch = rule_ids[start : start + REVOKE_BATCH_SIZE]
+                try:
+                    client.revoke_security_group_ingress(
+                        GroupId=plan.group_id, SecurityGroupRuleIds=batch, DryRun=dry_run
+                    )
+                except ClientError as e:
+                    if not (dry_run and _is_dry_run_success(e)):
+                        error = str(e)
+                        break
+                except BotoCoreError as e:
+                    error = str(e)
+                    break
+                revoked.extend(rule for rule in plan.rules if rule["SecurityGroupRuleId"] in batch)
+
+        outcome = "failure" if error else "dry_run" if dry_run else "success"
+        METRICS.inc(
+            "neko_sg_remediated_rules", value=len(revoked), region=plan.region, result=outcome
+        )
+        with lock:
+            result.groups += 1
+            result.rules += len(revoked)
+            if error:
+                result.failed.append((plan.region, plan.group_id, error))
+                logger.error(
+                    "%s (%s) のルールの削除に失敗しました: %s", plan.group_id, plan.region, error
+                )
+            if revoked and rollback_stream is not None and not dry_run:
+                # 一部のバッチだけが成功した場合も、削除できた分は記録する
+                record = _rollback_record(GroupPlan(plan.region, plan.group_id, revoked))
+                rollback_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+                rollback_stream.flush()
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_workers), thread_name_prefix="neko-sg-remediate"
+    ) as executor:
+        list(executor.map(revoke_group, plans))
+    return result
+
+
+def rollback(path: str, clients: ClientPool, dry_run: bool = False) -> RemediationResult:
+    """ロールバックファイルに記録したルールを authorize_security_group_ingress で元に戻す
+
+    Note:
+        すでに存在するルール（InvalidPermission.Duplicate）は戻したものとして扱う。
+        ルールIDは新しく採番される。
+    """
+    result = RemediationResult()
+    with open(os.path.expanduser(path), encoding="utf-8") as file:
+        records = [json.loads(line) for line in file if line.strip()]
+
+    for record in records:
+        client = clients.get(record["region"])
+        result.groups += 1
+        for rule in record["rules"]:
+            try:
+                client.authorize_security_group_ingress(
+                    GroupId=record["group_id"], IpPermissions=[_permission(rule)], DryRun=dry_run
+                )
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code != "InvalidPermission.Duplicate" and not (
+                    dry_run and _is_dry_run_success(e)
+                ):
+                    result.failed.append((record["region"], record["group_id"], str(e)))
+                    continue
+            except BotoCoreError as e:
+                result.failed.append((record["region"], record["group_id"], str(e)))
+                continue
+            result.rules += 1
+    return result
+
+
+def _print_plan(plans: list[GroupPlan], stream: IO[str]) -> None:
+    for plan in plans:
+        for rule in plan.rules:
+            ports = (
+                "all"
+                if rule.get("FromPort") in (None, -1)
+                else f"{rule['FromPort']}-{rule['ToPort']}"
+            )
+            stream.write(
+                f"{plan.region}\t{plan.group_id}\t{rule['SecurityGroupRuleId']}\t"
+                f"{rule['IpProtocol']}\t{ports}\t{_rule_cidr(rule)}\n"
+            )
+
+
+def remediate_command(
+    input_path: str | None = None,
+    dry_run: bool = False,
+    rollback_file: str | None = None,
+    rollback_from: str | None = None,
+    region_concurrency: int = DEFAULT_REGION_CONCURRENCY,
+) -> int:
+    """remediateサブコマンドの実行
+
+    Args:
+        input_path: 検出結果のファイル（省略時はスキャンして検出結果を得る）
+        dry_run: Trueの場合は削除対象を表示し、DryRun で権限だけを確認する
+        rollback_file: 削除したルールを記録するロールバックファイル（省略時は実行ごとに
+            日時を付けたファイルを作成する。既存のファイルは上書きせずにエラーとする）
+        rollback_from: 指定した場合は、このロールバックファイルのルールを元に戻す
+        region_concurrency: リージョンごとの同時実行数
+
+    Returns:
+        int: 終了コード（失敗したセキュリティグループがある場合は1）
+    """
+    load_dotenv()
+    config = Config.from_env()
+    logging.basicConfig(
+        level=getattr(logging, config.log_level.upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    clients = ClientPool(config)
+
+    if rollback_from:
+        try:
+            result = rollback(rollback_from, clients, dry_run=dry_run)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"エラー: ロールバックファイル '{rollback_from}' を読み込めません: {e}")
+            return 1
+        print(
+            f"{result.groups}個のセキュリティグループの{result.rules}件のルールを"
+            f"{'戻せることを確認しました' if dry_run else '元に戻しました'}"
+            f"（失敗: {len(result.failed)}件）"
+        )
+        return 1 if result.failed else 0
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    exclusion_index = compile_exclusion_rules(
+        load_exclusion_rules(config.get_exclusion_rules_path(script_dir))
+    )
+    policies = load_policy_rules(config.get_policy_rules_path(script_dir))
+
+    with Scanner(config, exclusion_index, policies, clients=clients) as scanner:
+        if input_path:
+            try:
+                findings = load_findings(input_path)
+            except (OSError, ValueError) as e:
+                print(f"エラー: 検出結果のファイル '{input_path}' を読み込めません: {e}")
+                return 1
+        else:
+            logger.info("スキャンして削除対象を検出しています...")
+            findings = scanner.scan()
+    with ThreadPoolExecutor(thread_name_prefix="neko-sg-remediate") as executor:
+        plans = build_plan(findings, exclusion_index, clients, config, policies, executor)
+
+    rule_count = sum(len(plan.rules) for plan in plans)
+    logger.info(
+        "削除対象: %d個のセキュリティグループの%d件のルール（検出結果 %d件）",
+        len(plans),
+        rule_count,
+        len(findings),
+    )
+    if dry_run:
+        _print_plan(plans, sys.stdout)
+    if not plans:
+        print("削除対象のルールはありません")
+        return 0
+
+    rollback_path = os.path.expanduser(
+        rollback_file or time.strftime(DEFAULT_ROLLBACK_FILE, time.gmtime())
+    )
+    started = time.monotonic()
+    if dry_run:
+        result = revoke(plans, clients, dry_run=True, region_concurrency=region_concurrency)
+    else:
+        # ほかの実行の記録と混ざると、ロールバックでその実行の削除まで戻してしまうため
+        # 既存のファイルには追記しない
+        try:
+            os.makedirs(os.path.dirname(rollback_path) or ".", exist_ok=True)
+            stream = open(rollback_path, "x", encoding="utf-8")
+        except FileExistsError:
+            print(
+                f"エラー: ロールバックファイル '{rollback_path}' はすでに存在します。"
+                "別のパスを --rollback-file で指定してください。"
+            )
+            return 1
+        except OSError as e:
+            print(f"エラー: ロールバックファイル '{rollback_path}' を作成できません: {e}")
+            return 1
+        with stream:
+            result = revoke(
+                plans, clients, rollback_stream=stream, region_concurrency=region_concurrency
+            )
+
+    print(
+        f"{result.groups}個のセキュリティグループの{result.rules}件のルールを"
+        f"{'削除できることを確認しました（ドライラン）' if dry_run else '削除しました'}"
+        f"（失敗: {len(result.failed)}件, {time.monotonic() - started:.1f}秒）"
+    )
+    if not dry_run and result.rules:
+        print(
+            f"ロールバックファイル: {rollback_path}"
+            f"（元に戻す場合: neko-sg remediate --rollback {rollback_path}）"
+        )
+    for region, group_id, error in result.failed:
+        print(f"  {region} {group_id}: {error}")
+    return 1 if result.failed else 0
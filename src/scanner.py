@@ -0,0 +1,332 @@
+"""
+再利用できるスキャナー
+
+EC2クライアントのプール、リージョンのスキャンに使うスレッドプール、索引化した除外ルール、
+リージョン一覧、セキュリティグループの在庫を1つのオブジェクトに保持する。同じプロセスで
+何度もスキャンする場合（常駐モードや、このツールを組み込んだサービス）に、設定、セッション、
+スレッドプールを呼び出しごとに作り直さずに済む。CLI（main.py, cli.py）もこのクラスを通して
+スキャンする。
+"""
+
+import dataclasses
+import logging
+import threading
+import time
+from collections.abc import Callable, Generator, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, ParamSpec, TypeVar
+
+from src.config import Config
+from src.inventory import InventoryCache
+from src.utils import (
+    ClientPool,
+    ExclusionIndex,
+    ScanReport,
+    compile_exclusion_rules,
+    evaluate_security_group,
+    find_globally_accessible_security_groups,
+    get_all_regions,
+    get_security_groups,
+)
+
+logger = logging.getLogger(__name__)
+
+# リージョンのスキャンを並列に実行するスレッド数の上限
+DEFAULT_MAX_WORKERS = 10
+
+_P = ParamSpec("_P")
+_T = TypeVar("_T")
+
+
+class _TrackedExecutor(ThreadPoolExecutor):
+    """実行中（待機中を含む）のタスク数を数えるスレッドプール
+
+    期限切れで打ち切ったリージョンのワーカーは応答を待ったまま残るため、
+    スキャンの終了時にタスクが残っていればスレッドプールを作り直す判断に使う。
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._pending_lock = threading.Lock()
+        self.pending = 0
+
+    def submit(self, fn: Callable[_P, _T], /, *args: _P.args, **kwargs: _P.kwargs) -> "Future[_T]":
+        future = super().submit(fn, *args, **kwargs)
+        with self._pending_lock:
+            self.pending += 1
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future: "Future[Any]") -> None:
+        with self._pending_lock:
+            self.pending -= 1
+
+
+class Scanner:
+    """長期間保持して繰り返し使うスキャナー（スレッドセーフ）
+
+    Attributes:
+        config: アプリケーション設定
+        clients: 再利用するEC2クライアントのプール
+        exclusion_index: 索引化した除外ルール
+        policies: コンパイル済みポリシー（Noneの場合は組み込みの判定）
+        inventory: 直近のスキャンで取得したセキュリティグループの在庫（Noneの場合は保持しない）
+
+    Example:
+        with Scanner(config, load_exclusion_rules(path)) as scanner:
+            findings = scanner.scan()
+            findings = scanner.scan_group(["sg-0123456789abcdef0"])
+    """
+
+    def __init__(
+        self,
+        config: Config | None = None,
+        exclusion_rules: list[dict[str, Any]] | ExclusionIndex | None = None,
+        policies: list[Any] | None = None,
+        clients: ClientPool | None = None,
+        inventory: InventoryCache | None = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ) -> None:
+        self.config = config if config is not None else Config.from_env()
+        self.clients = clients if clients is not None else ClientPool(self.config)
+        self.exclusion_index = compile_exclusion_rules(exclusion_rules or [])
+        self.policies = policies
+        self.inventory = inventory
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: _TrackedExecutor | None = None
+        self._hedge_executor: _TrackedExecutor | None = None
+        self._regions: list[str] | None = None
+        self._regions_at = 0.0
+        self._closed = False
+
+    def __enter__(self) -> "Scanner":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def set_rules(
+        self,
+        exclusion_rules: list[dict[str, Any]] | ExclusionIndex,
+        policies: list[Any] | None = None,
+    ) -> None:
+        """除外ルールとポリシーを置き換える（実行中のスキャンには影響しない）"""
+        self.exclusion_index = compile_exclusion_rules(exclusion_rules)
+        self.policies = policies
+
+    def regions(self) -> list[str]:
+        """スキャン対象のリージョン一覧を返す（REGION_CACHE_TTL の間メモリ上に保持する）
+
+        Raises:
+            BotoCoreError: リージョン一覧の取得に失敗した場合
+            ClientError: 同上
+
+        Note:
+            REGION_CACHE_TTL が0の場合は毎回取得し直す（取得に失敗した場合のスキャンでは、
+            直前に取得した一覧を使う）。
+        """
+        ttl = self.config.region_cache_ttl
+        with self._lock:
+            if ttl > 0 and self._regions is not None and time.monotonic() - self._regions_at <= ttl:
+                return list(self._regions)
+        regions = list(get_all_regions(self.config))
+        with self._lock:
+            self._regions = regions
+            self._regions_at = time.monotonic()
+        return list(regions)
+
+    def _scan_config(self) -> Config:
+        """保持しているリージョン一覧を使い、スキャン時の再取得を省いた設定を返す"""
+        if self.config.regions:
+            return self.config
+        try:
+            regions = self.regions()
+        except Exception as e:
+            logger.error("リージョン一覧の取得に失敗しました: %s", e)
+            if self._regions is None:
+                return self.config
+            regions = list(self._regions)
+        return dataclasses.replace(self.config, regions=regions)
+
+    def _executors(self) -> tuple[_TrackedExecutor, _TrackedExecutor | None]:
+        """リージョンのスキャンと再試行に使うスレッドプールを返す（初回に作成する）"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Scanner は close() 済みです。")
+            if self._executor is None:
+                # スレッド名はプロファイルやトレースでワーカーを見分けるために付ける
+                self._executor = _TrackedExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="neko-sg-region"
+                )
+            if self.config.hedge_retry and self._hedge_executor is None:
+                # 再試行は応答のないスレッドに塞がれないよう別のスレッドプールで実行する
+                self._hedge_executor = _TrackedExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="neko-sg-hedge"
+                )
+            return self._executor, self._hedge_executor
+
+    def _retire_hung_executors(self) -> None:
+        """スキャンの終了後もタスクが残っているスレッドプールを手放す内部関数
+
+        期限切れで打ち切ったリージョンのワーカーは応答を待ったまま残り、そのまま使い続けると
+        次のスキャンで使えるワーカーが減っていく。次のスキャンでは新しいスレッドプールを作る。
+        手放したスレッドプールは、残ったタスクが終わり参照がなくなった時点でワーカーが終了する
+        （並行して実行中の別のスキャンが使っている場合もあるため shutdown は呼ばない）。
+        """
+        with self._lock:
+            for name in ("_executor", "_hedge_executor"):
+                executor = getattr(self, name)
+                if executor is not None and executor.pending > 0:
+                    logger.warning(
+                        "応答のないワーカーが %d 件残っているため、スレッドプールを作り直します",
+                        executor.pending,
+                    )
+                    setattr(self, name, None)
+
+    def scan_iter(
+        self,
+        report: ScanReport | None = None,
+        checkpoint: Any | None = None,
+        inventory: Any | None = None,
+    ) -> Generator[dict[str, str], None, None]:
+        """全リージョンをスキャンし、検出結果を見つかった順に返すジェネレータ
+
+        Args:
+            report: リージョンごとの完了状況を記録するオブジェクト
+            checkpoint: チェックポイント（完了済みのリージョンは記録済みの結果を返す）
+            inventory: 完了したリージョンのセキュリティグループの保存先
+                （省略時はこのスキャナーの在庫）
+
+        Yields:
+            dict[str, str]: グローバルアクセス可能なセキュリティグループの情報
+                （find_globally_accessible_security_groups を参照）
+
+        Raises:
+            RuntimeError: close() 済みの場合
+
+        Note:
+            SCAN_ENGINE が async の場合は aiobotocore でスキャンし、在庫は更新しない。
+        """
+        config = self._scan_config()
+        if config.scan_engine == "async":
+            from src.async_scan import run_async_scan
+
+            if self._closed:
+                raise RuntimeError("Scanner は close() 済みです。")
+            yield from run_async_scan(
+                self.exclusion_index,
+                config,
+                policies=self.policies,
+                report=report,
+                checkpoint=checkpoint,
+            )
+            return
+        executor, hedge_executor = self._executors()
+        try:
+            yield from find_globally_accessible_security_groups(
+                self.exclusion_index,
+                config,
+                policies=self.policies,
+                report=report,
+                checkpoint=checkpoint,
+                clients=self.clients,
+                inventory=inventory if inventory is not None else self.inventory,
+                executor=executor,
+                hedge_executor=hedge_executor,
+            )
+        finally:
+            self._retire_hung_executors()
+
+    def scan(
+        self, report: ScanReport | None = None, checkpoint: Any | None = None
+    ) -> list[dict[str, str]]:
+        """全リージョンをスキャンし、検出結果のリストを返す（scan_iter を参照）"""
+        return list(self.scan_iter(report=report, checkpoint=checkpoint))
+
+    def find_groups(
+        self, group_ids: Iterable[str], region: str | None = None
+    ) -> list[tuple[str, dict[str, Any]]]:
+        """指定したIDのセキュリティグループを取得する
+
+        Args:
+            group_ids: セキュリティグループID
+            region: リージョン名（省略時は在庫にあるリージョン、なければ全リージョンを検索する）
+
+        Returns:
+            list[tuple[str, dict[str, Any]]]: (リージョン名, 縮小したセキュリティグループ) のリスト。
+                見つからなかったIDは含まない
+        """
+        ids = list(dict.fromkeys(group_ids))
+        if not ids:
+            return []
+        if region is not None:
+            regions = [region]
+        else:
+            regions = self._known_regions(ids) or self.regions()
+        executor, _ = self._executors()
+
+        def fetch(fetch_region: str) -> list[tuple[str, dict[str, Any]]]:
+            client = self.clients.get(fetch_region)
+            return [
+                (fetch_region, sg)
+                for sg in get_security_groups(fetch_region, self.config, client, group_ids=ids)
+            ]
+
+        found = [item for items in executor.map(fetch, regions) for item in items]
+        missing = set(ids) - {sg["GroupId"] for _, sg in found}
+        if missing:
+            logger.warning(
+                "セキュリティグループが見つかりませんでした: %s", ", ".join(sorted(missing))
+            )
+        return found
+
+    def _known_regions(self, group_ids: list[str]) -> list[str]:
+        """すべてのIDが在庫にある場合はそのリージョンを返す（1つでもなければ空のリスト）"""
+        if self.inventory is None:
+            return []
+        regions: set[str] = set()
+        inventory_regions = self.inventory.regions()
+        for group_id in group_ids:
+            region = next(
+                (r for r in inventory_regions if self.inventory.get(r, group_id) is not None), None
+            )
+            if region is None:
+                return []
+            regions.add(region)
+        return sorted(regions)
+
+    def scan_group(
+        self, group_ids: Iterable[str], region: str | None = None
+    ) -> list[dict[str, str]]:
+        """指定したIDのセキュリティグループだけを取得して評価する
+
+        Args:
+            group_ids: セキュリティグループID
+            region: リージョン名（省略時は find_groups と同様に検索する）
+
+        Returns:
+            list[dict[str, str]]: 検出結果（除外ルール適用済み）
+
+        Note:
+            取得したセキュリティグループで在庫を更新する。
+        """
+        findings = []
+        for group_region, sg in self.find_groups(group_ids, region):
+            if self.inventory is not None:
+                self.inventory.upsert(group_region, sg)
+            finding = evaluate_security_group(sg, group_region, self.exclusion_index, self.policies)
+            if finding is not None:
+                findings.append(finding)
+        return findings
+
+    def close(self) -> None:
+        """スレッドプールを停止し、保持しているクライアントを破棄する（複数回呼び出してもよい）"""
+        with self._lock:
+            self._closed = True
+            executors = [self._executor, self._hedge_executor]
+            self._executor = self._hedge_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self.clients.clear()
@@ -0,0 +1,219 @@
+"""
+複数のプロセス・ホストに分割したスキャン（シャード）と結果のマージ
+
+(アカウント, リージョン) の単位を安定したハッシュでシャードに割り当てるため、
+調整用のサービスなしに各ランナーが同じ分割結果を得られる。
+各シャードは部分結果ファイルを書き出し、merge サブコマンドで1つの通知にまとめる。
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Callable
+
+from dotenv import load_dotenv
+
+from src.config import Config
+from src.utils import ScanReport, get_account_id, get_all_regions
+
+logger = logging.getLogger(__name__)
+
+# --shard-output を省略した場合の部分結果ファイル名
+DEFAULT_SHARD_OUTPUT = "shard-{index}-of-{count}.json"
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """シャード指定（i/N 形式）を解析する（argparseの type として使用）
+
+    Args:
+        value: シャード指定（iは1始まり）
+
+    Returns:
+        tuple[int, int]: (シャード番号, シャード数)
+
+    Raises:
+        argparse.ArgumentTypeError: 形式が不正な場合
+    """
+    try:
+        index_text, count_text = value.split("/", 1)
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"シャードは i/N の形式で指定してください: {value}"
+        ) from None
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"シャード番号は 1 から {count} の範囲です: {value}")
+    return index, count
+
+
+def shard_of(account: str, region: str, count: int) -> int:
+    """(アカウント, リージョン) の単位が属するシャード番号（1始まり）を返す
+
+    Note:
+        Pythonの hash() は実行ごとに変わるため、SHA-256による安定したハッシュを使用する
+    """
+    digest = hashlib.sha256(f"{account}/{region}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def apply_shard(config: Config, index: int, count: int) -> tuple[Config, str, list[str]]:
+    """設定のリージョン一覧をシャードに割り当てられたものだけに絞り込む
+
+    Args:
+        config: アプリケーション設定
+        index: シャード番号（1始まり）
+        count: シャード数
+
+    Returns:
+        tuple[Config, str, list[str]]: 絞り込んだ設定、アカウントID、担当リージョン
+    """
+    account = get_account_id(config)
+    regions = [
+        region for region in get_all_regions(config) if shard_of(account, region, count) == index
+    ]
+    logger.info(
+        "シャード %d/%d: アカウント %s の %d リージョンを担当します。",
+        index,
+        count,
+        account,
+        len(regions),
+    )
+    return dataclasses.replace(config, regions=regions), account, regions
+
+
+def write_shard_result(
+    path: str,
+    index: int,
+    count: int,
+    account: str,
+    regions: list[str],
+    findings: list[dict[str, str]],
+    report: ScanReport,
+) -> None:
+    """シャードの部分結果ファイルを書き出す（一時ファイル経由で置き換える）"""
+    result = {
+        "shard": {"index": index, "count": count},
+        "account": account,
+        "regions": regions,
+        "findings": findings,
+        "report": dataclasses.asdict(report),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(result, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    logger.info("シャードの結果を %s に書き出しました（%d件）", path, len(findings))
+
+
+def merge_shard_results(
+    paths: list[str], list_regions: Callable[[], list[str]] | None = None
+) -> tuple[list[dict[str, str]], ScanReport]:
+    """シャードの部分結果ファイルを結合し、重複を取り除く
+
+    Args:
+        paths: 部分結果ファイルのパス
+        list_regions: 全リージョンの一覧を返す関数（欠けているシャードの担当リージョンを
+            求めるために、シャードが欠けている場合だけ呼び出す）
+
+    Returns:
+        tuple[list[dict[str, str]], ScanReport]: 検出結果と結合した完了状況
+
+    Note:
+        検出結果は (アカウント, リージョン, グループID, ルールID) で重複を取り除く。
+        読み込めないファイルは警告を出力する。シャード数に対して欠けているシャードの
+        担当リージョンは未スキャン（skipped）として記録し、結果を不完全として扱う。
+        担当リージョンを求められない場合は shard-i-of-N の形式で記録する。
+    """
+    findings: list[dict[str, str]] = []
+    seen: set[tuple[str, str, str, str]] = set()
+    report = ScanReport()
+    shards: dict[int, set[int]] = {}
+    accounts: dict[int, set[str]] = {}
+
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as file:
+                result = json.load(file)
+            shard = result["shard"]
+            shards.setdefault(int(shard["count"]), set()).add(int(shard["index"]))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("シャードの結果ファイル '%s' の読み込みエラー: %s", path, e)
+            continue
+
+        account = str(result.get("account", ""))
+        accounts.setdefault(int(shard["count"]), set()).add(account)
+        for finding in result.get("findings", []):
+            key = (
+                account,
+                finding.get("region", ""),
+                finding.get("group_id", ""),
+                finding.get("rule_id", ""),
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            findings.append(finding)
+        for name in ("completed", "incomplete", "skipped", "failed"):
+            for region in result.get("report", {}).get(name, []):
+                if region not in getattr(report, name):
+                    getattr(report, name).append(region)
+
+    regions: list[str] | None = None
+    for count, indexes in shards.items():
+        missing = sorted(set(range(1, count + 1)) - indexes)
+        if not missing:
+            continue
+        logger.warning(
+            "%d分割のうち次のシャードの結果がありません: %s",
+            count,
+            ", ".join(str(index) for index in missing),
+        )
+        if regions is None and list_regions is not None:
+            try:
+                regions = list(list_regions())
+            except Exception as e:
+                logger.error("欠けているシャードの担当リージョンを求められません: %s", e)
+                regions = []
+        unscanned = [
+            region
+            for region in regions or []
+            for account in sorted(accounts.get(count, ()))
+            if shard_of(account, region, count) in missing
+        ]
+        if not unscanned:
+            unscanned = [f"shard-{index}-of-{count}" for index in missing]
+        for region in unscanned:
+            if region not in report.skipped:
+                report.skipped.append(region)
+    return findings, report
+
+
+def merge_command(paths: list[str]) -> int:
+    """mergeサブコマンドの実行
+
+    Args:
+        paths: 部分結果ファイルのパス
+
+    Returns:
+        int: 終了コード
+    """
+    from src.main import send_slack_notification_if_configured
+
+    load_dotenv()
+    config = Config.from_env()
+    logging.basicConfig(
+        level=getattr(logging, config.log_level.upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    findings, report = merge_shard_results(paths, lambda: list(get_all_regions(config)))
+    logger.info("%d件のシャード結果を結合しました（検出: %d件）", len(paths), len(findings))
+    if findings or report.is_partial:
+        send_slack_notification_if_configured(config, findings, report=report)
+    else:
+        logger.info("グローバルにアクセス可能なセキュリティグループは見つかりませんでした。")
+    return 0
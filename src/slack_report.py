@@ -0,0 +1,379 @@
+"""
+Slack の Block Kit によるレポート
+
+検出件数とリージョンごとの内訳をまとめたメッセージを投稿し、検出結果はリージョン
+（またはアカウント）ごとにまとめてスレッドに返信する。返信はメッセージの大きさの上限
+（1メッセージ50ブロック、1セクション3000文字、全体40000文字）に収まるよう分割し、共有した1つの
+WebClient で並列に投稿する。投稿の間隔はクライアント側のトークンバケットで制限し、
+レート制限（HTTP 429）を受けた場合は Retry-After に従って再試行する。
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from src.config import Config
+from src.metrics import METRICS
+from src.tracing import TRACER
+from src.utils import (
+    ScanReport,
+    _format_partial_regions,
+    format_slack_message,
+    send_slack_notification_sdk,
+)
+
+try:
+    from slack_sdk import WebClient
+    from slack_sdk.errors import SlackApiError
+    from slack_sdk.http_retry.builtin_handlers import (
+        ConnectionErrorRetryHandler,
+        RateLimitErrorRetryHandler,
+    )
+
+    SLACK_SDK_AVAILABLE = True
+except ImportError:
+    SLACK_SDK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Block Kit の上限（1メッセージのブロック数、セクションの文字数）
+MAX_BLOCKS = 50
+MAX_SECTION_CHARS = 3000
+
+# 1件の返信に含めるセクション数（メッセージ全体を40000文字未満に保つ）
+SECTIONS_PER_REPLY = 12
+
+# サマリーに表示するリージョンの数の上限
+SUMMARY_GROUPS = 20
+
+# 返信を並列に投稿するスレッド数と、1秒あたりの投稿数・連続して投稿できる数
+DEFAULT_CONCURRENCY = 4
+DEFAULT_POST_RATE = 1.0
+DEFAULT_POST_BURST = 5
+
+GROUP_KEYS = ("region", "account")
+
+_clients: dict[str, "WebClient"] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(token: str) -> "WebClient":
+    """トークンごとに共有する WebClient を返す（初回に作成する）
+
+    Note:
+        レート制限と接続エラーはSDKの再試行ハンドラーで再試行する。
+    """
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = WebClient(token=token)
+            client.retry_handlers.extend(
+                [RateLimitErrorRetryHandler(max_retry_count=3), ConnectionErrorRetryHandler()]
+            )
+            _clients[token] = client
+        return client
+
+
+class RateLimiter:
+    """投稿の間隔を制限するトークンバケット（スレッドセーフ）
+
+    Attributes:
+        rate: 1秒あたりに補充するトークン数
+        burst: バケットの容量（連続して投稿できる数）
+    """
+
+    def __init__(self, rate: float = DEFAULT_POST_RATE, burst: int = DEFAULT_POST_BURST) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """トークンを1つ取得する（なければ補充されるまで待つ）"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # 取得の順に待ち時間を割り当てる（ロックを持ったまま待たない）
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _group_key(finding: dict[str, str], group_by: str) -> str:
+    return finding.get(group_by) or "-"
+
+
+def _finding_line(finding: dict[str, str], group_by: str) -> str:
+    """検出結果1件の表示（mrkdwn）"""
+    line = f"• `{finding['group_id']}` {_escape(finding.get('group_name', ''))}"
+    if finding.get("rule_id"):
+        line += f" / `{finding['rule_id']}`"
+    if finding.get("policy"):
+        line += f" （{_escape(finding['policy'])}）"
+    if group_by != "region":
+        line += f" - {finding.get('region', '-')}"
+    return line
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _section(text: str) -> dict[str, Any]:
+    return {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+
+def _chunk_lines(lines: list[str], limit: int = MAX_SECTION_CHARS) -> list[str]:
+    """行をセクションの文字数の上限に収まるようにまとめる"""
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in lines:
+        line = line[:limit]
+        if current and size + len(line) + 1 > limit:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def group_findings(
+    findings: list[dict[str, str]], group_by: str = "region"
+) -> dict[str, list[dict[str, str]]]:
+    """検出結果をリージョン（またはアカウント）ごとにまとめる（キーの順）"""
+    groups: dict[str, list[dict[str, str]]] = defaultdict(list)
+    for finding in findings:
+        groups[_group_key(finding, group_by)].append(finding)
+    return {key: groups[key] for key in sorted(groups)}
+
+
+def build_summary(
+    findings: list[dict[str, str]],
+    report: ScanReport | None = None,
+    group_by: str = "region",
+) -> tuple[str, list[dict[str, Any]]]:
+    """サマリーのメッセージを作成する
+
+    Returns:
+        tuple[str, list[dict[str, Any]]]: 通知用のテキストとブロック
+    """
+    groups = group_findings(findings, group_by)
+    if findings:
+        text = f"グローバルなインバウンドルールを持つセキュリティグループが {len(findings)} 件見つかりました"
+    else:
+        text = "グローバルにアクセス可能なセキュリティグループは見つかりませんでした"
+    blocks: list[dict[str, Any]] = [
+        {"type": "header", "text": {"type": "plain_text", "text": "NeKo_AWS_SG スキャン結果"}},
+        _section(f"*{text}*"),
+    ]
+    if groups:
+        ranked = sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))
+        lines = [f"• {key}: {len(items)} 件" for key, items in ranked[:SUMMARY_GROUPS]]
+        if len(ranked) > SUMMARY_GROUPS:
+            lines.append(f"• ほか {len(ranked) - SUMMARY_GROUPS} 件のグループ")
+        blocks.extend(_section(chunk) for chunk in _chunk_lines(lines))
+        blocks.append(
+            {
+                "type": "context",
+                "elements": [{"type": "mrkdwn", "text": "詳細はスレッドに返信しています。"}],
+            }
+        )
+    if report is not None and report.is_partial:
+        blocks.extend(
+            _section(chunk) for chunk in _chunk_lines(_format_partial_regions(report).splitlines())
+        )
+    return text, blocks[:MAX_BLOCKS]
+
+
+def build_replies(
+    findings: list[dict[str, str]], group_by: str = "region"
+) -> list[tuple[str, list[dict[str, Any]]]]:
+    """スレッドに返信するメッセージを作成する（グループごと、上限を超える場合は分割する）
+
+    Returns:
+        list[tuple[str, list[dict[str, Any]]]]: (通知用のテキスト, ブロック) のリスト
+    """
+    replies = []
+    for key, items in group_findings(findings, group_by).items():
+        sections = _chunk_lines([_finding_line(finding, group_by) for finding in items])
+        pages = [
+            sections[i : i + SECTIONS_PER_REPLY]
+            for i in range(0, len(sections), SECTIONS_PER_REPLY)
+        ]
+        for page_index, page in enumerate(pages, start=1):
+            title = f"{key}（{len(items)} 件）"
+            if len(pages) > 1:
+                title += f" {page_index}/{len(pages)}"
+            blocks = [_section(f"*{_escape(title)}*"), *(_section(chunk) for chunk in page)]
+            replies.append((title, blocks))
+    return replies
+
+
+def send_slack_report(
+    client: "WebClient",
+    channel: str,
+    findings: list[dict[str, str]],
+    report: ScanReport | None = None,
+    group_by: str = "region",
+    concurrency: int = DEFAULT_CONCURRENCY,
+    limiter: RateLimiter | None = None,
+    thread: dict[str, Any] | None = None,
+) -> bool:
+    """サマリーを投稿し、検出結果をスレッドに並列で返信する
+
+    Args:
+        client: 共有する WebClient
+        channel: 送信先チャンネル名（#付きまたはチャンネルID）
+        findings: 検出結果
+        report: リージョンごとのスキャン完了状況
+        group_by: 返信をまとめる単位（region または account）
+        concurrency: 返信を並列に投稿するスレッド数
+        limiter: 投稿の間隔を制限するトークンバケット（省略時は既定の間隔）
+        thread: 投稿の進捗（channel, ts, replies, posted）。前回の進捗を渡すと
+            サマリーを送り直さず、投稿済みでない返信だけを同じスレッドに投稿する。
+            渡した辞書は今回の進捗で更新する（thread_complete で完了を判定できる）
+
+    Returns:
+        bool: サマリーを投稿できた（または投稿済みの）場合True（返信の失敗はログと thread に記録する）
+    """
+    limiter = limiter or RateLimiter()
+    thread = thread if thread is not None else {}
+    with (
+        METRICS.timer("neko_sg_notification_seconds", sink="blocks"),
+        TRACER.span("notification", sink="blocks", channel=channel) as span,
+    ):
+        if not thread.get("ts"):
+            text, blocks = build_summary(findings, report, group_by)
+            try:
+                limiter.acquire()
+                response = client.chat_postMessage(
+                    channel=channel,
+                    text=text,
+                    blocks=blocks,
+                    username="NeKo_AWS_SG",
+                    icon_emoji=":warning:",
+                )
+            except SlackApiError as e:
+                logger.error("Slack API エラー: %s", e.response["error"])
+                METRICS.inc("neko_sg_notifications", sink="blocks", result="failure")
+                return False
+            except Exception as e:
+                logger.error("Slack通知の送信中にエラーが発生しました: %s", e)
+                METRICS.inc("neko_sg_notifications", sink="blocks", result="failure")
+                return False
+            # 返信の投稿先はサマリーの投稿で決まったチャンネルIDとタイムスタンプ
+            thread.update(channel=response.get("channel", channel), ts=response["ts"], posted=[])
+        else:
+            logger.info("投稿済みのスレッドに未投稿の返信だけを投稿します（%s）。", thread["ts"])
+
+        thread_channel = thread["channel"]
+        thread_ts = thread["ts"]
+        replies = build_replies(findings, group_by)
+        thread["replies"] = len(replies)
+        posted = set(thread.setdefault("posted", []))
+        posted_lock = threading.Lock()
+
+        def post(reply: tuple[str, list[dict[str, Any]]]) -> bool:
+            reply_text, reply_blocks = reply
+            with TRACER.span("notification.reply", parent=span, title=reply_text):
+                limiter.acquire()
+                try:
+                    client.chat_postMessage(
+                        channel=thread_channel,
+                        thread_ts=thread_ts,
+                        text=reply_text,
+                        blocks=reply_blocks,
+                        username="NeKo_AWS_SG",
+                        icon_emoji=":warning:",
+                    )
+                except Exception as e:
+                    logger.error("スレッドへの返信（%s）に失敗しました: %s", reply_text, e)
+                    return False
+                with posted_lock:
+                    thread["posted"].append(reply_text)
+                return True
+
+        pending = [reply for reply in replies if reply[0] not in posted]
+        failed = 0
+        if pending:
+            with ThreadPoolExecutor(
+                max_workers=max(1, concurrency), thread_name_prefix="neko-sg-slack"
+            ) as executor:
+                failed = sum(1 for ok in executor.map(post, pending) if not ok)
+
+    METRICS.inc("neko_sg_notifications", sink="blocks", result="success")
+    if failed:
+        METRICS.inc("neko_sg_notification_replies", value=failed, result="failure")
+    METRICS.inc("neko_sg_notification_replies", value=len(pending) - failed, result="success")
+    logger.info(
+        "Slack通知が正常に送信されました（Block Kit, 返信 %d 件, 失敗 %d 件）。",
+        len(pending),
+        failed,
+    )
+    return True
+
+
+def thread_complete(thread: dict[str, Any]) -> bool:
+    """send_slack_report の進捗からスレッドへの返信がすべて投稿済みか判定する
+
+    Block Kit を使わずに送信した場合（進捗が空の場合）はTrueを返す。
+    """
+    if not thread.get("ts"):
+        return True
+    return len(set(thread.get("posted", []))) >= int(thread.get("replies", 0))
+
+
+def send_sdk_notification(
+    config: Config,
+    channel: str,
+    findings: list[dict[str, str]],
+    report: ScanReport | None = None,
+    message: str | None = None,
+    thread: dict[str, Any] | None = None,
+) -> bool:
+    """Slack SDK で通知する（SLACK_BLOCKS が有効な場合は Block Kit のレポート）
+
+    Args:
+        config: アプリケーション設定（SLACK_BOT_TOKEN を使用）
+        channel: 送信先チャンネル名
+        findings: 検出結果
+        report: リージョンごとのスキャン完了状況
+        message: テキストで通知する場合のメッセージ（省略時は作成する）
+        thread: Block Kit のレポートの投稿の進捗（send_slack_report を参照）
+
+    Returns:
+        bool: 送信成功時はTrue、失敗時はFalse（slack-sdkが利用できない場合もFalse）
+    """
+    if not config.slack_blocks:
+        text = message if message is not None else format_slack_message(findings, report)
+        return send_slack_notification_sdk(config.slack_bot_token or "", channel, text)
+    if not SLACK_SDK_AVAILABLE:
+        logger.error(
+            "slack-sdk が利用できません。pip install slack-sdk でインストールしてください。"
+        )
+        return False
+    group_by = config.slack_thread_by
+    if group_by not in GROUP_KEYS:
+        logger.warning("不明な SLACK_THREAD_BY です（region を使用します）: %s", group_by)
+        group_by = "region"
+    return send_slack_report(
+        shared_client(config.slack_bot_token or ""),
+        channel,
+        findings,
+        report,
+        group_by=group_by,
+        concurrency=config.slack_post_concurrency,
+        limiter=RateLimiter(config.slack_post_rate),
+        thread=thread,
+    )
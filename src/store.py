@@ -0,0 +1,521 @@
+"""
+ローカルのスナップショットストア（在庫と検出結果）
+
+スキャンで取得したセキュリティグループをルール単位に展開してSQLiteに保存し、
+リージョン・ポート・プロトコル・CIDR・セキュリティグループIDの索引で検索する。
+query サブコマンドはAWS APIを呼び出さずに直近のスナップショットから回答する。
+"""
+
+import logging
+import os
+import sqlite3
+import sys
+import time
+from collections.abc import Generator
+from dataclasses import dataclass
+from typing import Any
+
+from dotenv import load_dotenv
+
+from src.config import Config
+from src.utils import ScanReport, _is_global_cidr
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    committed INTEGER NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS groups (
+    snapshot_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    group_id TEXT NOT NULL,
+    group_name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (snapshot_id, region, group_id)
+);
+CREATE TABLE IF NOT EXISTS rules (
+    snapshot_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    group_id TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    from_port INTEGER,
+    to_port INTEGER,
+    cidr TEXT NOT NULL,
+    is_global INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS findings (
+    snapshot_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    group_id TEXT NOT NULL,
+    policy TEXT NOT NULL DEFAULT '',
+    rule_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS rules_region ON rules (snapshot_id, region, group_id);
+CREATE INDEX IF NOT EXISTS rules_group ON rules (snapshot_id, group_id);
+CREATE INDEX IF NOT EXISTS rules_port ON rules (snapshot_id, from_port, to_port);
+CREATE INDEX IF NOT EXISTS rules_protocol ON rules (snapshot_id, protocol);
+CREATE INDEX IF NOT EXISTS rules_cidr ON rules (snapshot_id, cidr);
+CREATE INDEX IF NOT EXISTS findings_group ON findings (snapshot_id, region, group_id);
+"""
+
+# 確定時に残すスナップショットの数（最新と直前）
+SNAPSHOT_KEEP = 2
+
+# query の検索条件で指定できる項目
+QUERY_KEYS = ("region", "sg", "name", "protocol", "port", "cidr", "global", "finding")
+
+
+@dataclass(frozen=True)
+class QueryFilter:
+    """query の検索条件（key=value または key!=value）
+
+    Attributes:
+        key: 項目名（QUERY_KEYS のいずれか）
+        value: 値
+        negate: != の場合True
+    """
+
+    key: str
+    value: str
+    negate: bool = False
+
+
+def parse_filter(expression: str) -> QueryFilter:
+    """検索条件の式を解析する
+
+    Args:
+        expression: "region=eu-west-1"、"port=5432"、"cidr!=0.0.0.0/0" などの式
+
+    Returns:
+        QueryFilter: 検索条件
+
+    Raises:
+        ValueError: 式の形式や項目名、値が不正な場合
+    """
+    negate = "!=" in expression
+    key, sep, value = expression.partition("!=" if negate else "=")
+    key, value = key.strip().lower(), value.strip()
+    if not sep or not value:
+        raise ValueError(f"検索条件は key=value の形式で指定してください: {expression}")
+    if key not in QUERY_KEYS:
+        raise ValueError(f"未対応の検索項目です: {key}（{', '.join(QUERY_KEYS)}）")
+    if key == "port" and not value.isdigit():
+        raise ValueError(f"port には数値を指定してください: {value}")
+    if key in ("global", "finding") and value.lower() not in ("true", "false"):
+        raise ValueError(f"{key} には true または false を指定してください: {value}")
+    return QueryFilter(key, value, negate)
+
+
+def _filter_sql(query_filter: QueryFilter) -> tuple[str, list[Any]]:
+    """検索条件をSQLの条件式に変換する内部関数"""
+    key, value = query_filter.key, query_filter.value
+    params: list[Any]
+    if key == "region":
+        clause, params = "r.region = ?", [value]
+    elif key == "sg":
+        clause, params = "r.group_id = ?", [value]
+    elif key == "name":
+        clause, params = "g.group_name LIKE ?", [value.replace("*", "%")]
+    elif key == "protocol":
+        protocol = "-1" if value.lower() in ("all", "-1") else value.lower()
+        clause, params = "r.protocol = ?", [protocol]
+    elif key == "port":
+        # 全プロトコルを許可するルールは全ポートに該当する
+        clause = "(r.protocol = '-1' OR (r.from_port <= ? AND r.to_port >= ?))"
+        params = [int(value), int(value)]
+    elif key == "cidr":
+        clause, params = "r.cidr = ?", [value]
+    elif key == "global":
+        clause, params = "r.is_global = ?", [int(value.lower() == "true")]
+    else:
+        clause = (
+            "EXISTS (SELECT 1 FROM findings f WHERE f.snapshot_id = r.snapshot_id"
+            " AND f.region = r.region AND f.group_id = r.group_id)"
+        )
+        params = []
+        if value.lower() == "false":
+            clause = f"NOT {clause}"
+    if query_filter.negate:
+        clause = f"NOT ({clause})"
+    return clause, params
+
+
+def _rule_rows(snapshot_id: int, region: str, sg: dict[str, Any]) -> Generator[tuple, None, None]:
+    """セキュリティグループをCIDRごとのルール行に展開する内部関数"""
+    for permission in sg.get("IpPermissions", []):
+        protocol = str(permission.get("IpProtocol", "-1"))
+        from_port = permission.get("FromPort")
+        to_port = permission.get("ToPort")
+        cidrs = [r["CidrIp"] for r in permission.get("IpRanges", []) if r.get("CidrIp")]
+        cidrs += [r["CidrIpv6"] for r in permission.get("Ipv6Ranges", []) if r.get("CidrIpv6")]
+        for cidr in cidrs:
+            yield (
+                snapshot_id,
+                region,
+                sg["GroupId"],
+                protocol,
+                from_port,
+                to_port,
+                cidr,
+                int(_is_global_cidr(cidr)),
+            )
+
+
+def _rule_sort_key(rule: list[Any]) -> tuple:
+    """ルールの並び順（ポートがNoneの場合も比較できるようにする）"""
+    protocol, from_port, to_port, cidr = rule
+    return (
+        protocol,
+        -2 if from_port is None else from_port,
+        -2 if to_port is None else to_port,
+        cidr,
+    )
+
+
+def supports_snapshots(config: Config) -> bool:
+    """設定がスナップショットの保存に対応しているか判定する（非対応の場合は警告を出す）
+
+    セキュリティグループ単位の在庫を取得しない設定（async エンジン、FETCH_MODE=rules）では
+    ストアに何も書き込まれず、完了したスナップショットが空になる。query が何も返さず、
+    diff と history がすべてのグループを削除されたものとして扱うため、保存しない。
+    """
+    if config.scan_engine == "async":
+        logger.warning("スナップショットの保存は thread エンジンのみ対応しています。")
+        return False
+    if config.fetch_mode == "rules":
+        logger.warning("スナップショットの保存は FETCH_MODE=groups のみ対応しています。")
+        return False
+    return True
+
+
+class SnapshotStore:
+    """直近のスキャン結果を保存するSQLiteのストア
+
+    スキャン中は find_globally_accessible_security_groups の inventory として渡し、
+    リージョンが完了するたびにそのリージョンのセキュリティグループを書き込む。
+
+    Attributes:
+        path: データベースファイルのパス
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._snapshot_id: int | None = None
+
+    def begin(self, account: str) -> int:
+        """新しいスナップショットの書き込みを開始する
+
+        Args:
+            account: AWSアカウントID
+
+        Returns:
+            int: スナップショットID
+        """
+        cursor = self._conn.execute(
+            "INSERT INTO snapshots (account, created_at) VALUES (?, ?)", (account, time.time())
+        )
+        self._snapshot_id = int(cursor.lastrowid or 0)
+        return self._snapshot_id
+
+    def replace_region(self, region: str, groups: list[dict[str, Any]]) -> None:
+        """リージョンのセキュリティグループを書き込み中のスナップショットに保存する
+
+        Args:
+            region: リージョン名
+            groups: リージョン内の全セキュリティグループ
+        """
+        snapshot_id = self._require_snapshot()
+        self._conn.execute(
+            "DELETE FROM groups WHERE snapshot_id = ? AND region = ?", (snapshot_id, region)
+        )
+        self._conn.execute(
+            "DELETE FROM rules WHERE snapshot_id = ? AND region = ?", (snapshot_id, region)
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO groups VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    snapshot_id,
+                    region,
+                    sg["GroupId"],
+                    sg.get("GroupName", ""),
+                    sg.get("Description", ""),
+                )
+                for sg in groups
+            ),
+        )
+        self._conn.executemany(
+            "INSERT INTO rules VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (row for sg in groups for row in _rule_rows(snapshot_id, region, sg)),
+        )
+
+    def record_finding(self, finding: dict[str, str]) -> None:
+        """検出結果を書き込み中のスナップショットに保存する"""
+        self._conn.execute(
+            "INSERT INTO findings VALUES (?, ?, ?, ?, ?)",
+            (
+                self._require_snapshot(),
+                finding["region"],
+                finding["group_id"],
+                finding.get("policy", ""),
+                finding.get("rule_id", ""),
+            ),
+        )
+
+    def commit(
+        self, report: ScanReport | None = None, keep: int = SNAPSHOT_KEEP, resumed: bool = False
+    ) -> None:
+        """書き込み中のスナップショットを確定し、古いスナップショットを削除する
+
+        Args:
+            report: スキャンの完了状況（完了しなかったリージョンがある場合は不完全として記録）
+            keep: 残す確定済みスナップショットの数（diff で直前のスキャンと比較するため既定は2）
+            resumed: チェックポイントから再開したリージョンがある場合True。そのリージョンの
+                グループは書き込まれていないため、不完全として記録する
+        """
+        snapshot_id = self._require_snapshot()
+        complete = not resumed and (report is None or not report.is_partial)
+        if resumed:
+            logger.warning(
+                "チェックポイントから再開したリージョンがあるため、スナップショットを不完全として記録します。"
+            )
+        self._conn.execute(
+            "UPDATE snapshots SET committed = 1, complete = ? WHERE id = ?",
+            (int(complete), snapshot_id),
+        )
+        kept = [
+            row["id"]
+            for row in self._conn.execute(
+                "SELECT id FROM snapshots WHERE committed = 1 ORDER BY id DESC LIMIT ?",
+                (max(1, keep),),
+            )
+        ]
+        placeholders = ", ".join("?" for _ in kept)
+        for table in ("groups", "rules", "findings"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE snapshot_id NOT IN ({placeholders})", kept
+            )
+        self._conn.execute(f"DELETE FROM snapshots WHERE id NOT IN ({placeholders})", kept)
+        self._conn.commit()
+        self._snapshot_id = None
+
+    def rollback(self) -> None:
+        """書き込み中のスナップショットを破棄する"""
+        self._conn.rollback()
+        self._snapshot_id = None
+
+    def latest(self) -> dict[str, Any] | None:
+        """確定済みの最新スナップショットの情報を返す"""
+        row = self._conn.execute(
+            "SELECT * FROM snapshots WHERE committed = 1 ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def snapshots(self) -> list[dict[str, Any]]:
+        """確定済みのスナップショットの一覧を新しい順に返す"""
+        return [
+            dict(row)
+            for row in self._conn.execute(
+                "SELECT * FROM snapshots WHERE committed = 1 ORDER BY id DESC"
+            )
+        ]
+
+    def snapshot(self, snapshot_id: int) -> dict[str, Any] | None:
+        """確定済みのスナップショットの情報を返す（該当するものがない場合はNone）"""
+        row = self._conn.execute(
+            "SELECT * FROM snapshots WHERE committed = 1 AND id = ?", (snapshot_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def resolve(self, ref: str) -> int | None:
+        """スナップショットの指定（latest, previous, またはID）をIDに変換する
+
+        Args:
+            ref: "latest"（最新）、"previous"（直前）、またはスナップショットID
+
+        Returns:
+            int | None: スナップショットID。該当するものがない場合はNone
+        """
+        snapshots = self.snapshots()
+        if ref == "latest":
+            return snapshots[0]["id"] if snapshots else None
+        if ref == "previous":
+            return snapshots[1]["id"] if len(snapshots) > 1 else None
+        if ref.isdigit() and any(snapshot["id"] == int(ref) for snapshot in snapshots):
+            return int(ref)
+        return None
+
+    def iter_groups(self, snapshot_id: int) -> Generator[dict[str, Any], None, None]:
+        """スナップショットのセキュリティグループを (リージョン, グループID) 順に返すジェネレータ
+
+        Args:
+            snapshot_id: スナップショットID
+
+        Yields:
+            dict[str, Any]: region, group_id, group_name, description,
+                rules（[プロトコル, 開始ポート, 終了ポート, CIDR] のソート済みリスト）
+
+        Note:
+            グループとルールをそれぞれ索引順に読み出して突き合わせるため、
+            スナップショット全体をメモリに読み込まない。
+        """
+        rules = self._conn.execute(
+            "SELECT region, group_id, protocol, from_port, to_port, cidr FROM rules"
+            " WHERE snapshot_id = ? ORDER BY region, group_id",
+            (snapshot_id,),
+        )
+        pending = rules.fetchone()
+        for row in self._conn.execute(
+            "SELECT region, group_id, group_name, description FROM groups"
+            " WHERE snapshot_id = ? ORDER BY region, group_id",
+            (snapshot_id,),
+        ):
+            key = (row["region"], row["group_id"])
+            group_rules = []
+            while pending is not None and (pending["region"], pending["group_id"]) <= key:
+                if (pending["region"], pending["group_id"]) == key:
+                    group_rules.append(
+                        [
+                            pending["protocol"],
+                            pending["from_port"],
+                            pending["to_port"],
+                            pending["cidr"],
+                        ]
+                    )
+                pending = rules.fetchone()
+            group = dict(row)
+            group["rules"] = sorted(group_rules, key=_rule_sort_key)
+            yield group
+
+    def query(self, filters: list[QueryFilter]) -> Generator[dict[str, Any], None, None]:
+        """最新スナップショットのルールを検索するジェネレータ
+
+        Args:
+            filters: 検索条件（すべてを満たすルールを返す）
+
+        Yields:
+            dict[str, Any]: region, group_id, group_name, protocol, from_port, to_port, cidr
+        """
+        snapshot = self.latest()
+        if snapshot is None:
+            return
+        clauses = ["r.snapshot_id = ?"]
+        params: list[Any] = [snapshot["id"]]
+        for query_filter in filters:
+            clause, clause_params = _filter_sql(query_filter)
+            clauses.append(clause)
+            params.extend(clause_params)
+        sql = (
+            "SELECT r.region, r.group_id, g.group_name, r.protocol, r.from_port, r.to_port, r.cidr"
+            " FROM rules r JOIN groups g ON g.snapshot_id = r.snapshot_id"
+            " AND g.region = r.region AND g.group_id = r.group_id"
+            f" WHERE {' AND '.join(clauses)}"
+            " ORDER BY r.region, r.group_id"
+        )
+        for row in self._conn.execute(sql, params):
+            yield dict(row)
+
+    def _require_snapshot(self) -> int:
+        if self._snapshot_id is None:
+            raise RuntimeError("スナップショットの書き込みが開始されていません。")
+        return self._snapshot_id
+
+    def close(self) -> None:
+        """データベースを閉じる"""
+        self._conn.close()
+
+    def __enter__(self) -> "SnapshotStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _format_ports(row: dict[str, Any]) -> str:
+    """ルールのポート範囲を表示用の文字列にする内部関数"""
+    if row["protocol"] == "-1":
+        return "all"
+    if row["from_port"] is None or row["from_port"] == row["to_port"]:
+        return str(row["from_port"] if row["from_port"] is not None else "all")
+    return f"{row['from_port']}-{row['to_port']}"
+
+
+def query_command(
+    expressions: list[str],
+    store_path: str | None = None,
+    as_json: bool = False,
+    export_path: str | None = None,
+) -> int:
+    """queryサブコマンドの実行
+
+    Args:
+        expressions: 検索条件の式（例: region=eu-west-1 port=5432）
+        store_path: スナップショットストアのパス（省略時は SNAPSHOT_STORE）
+        as_json: Trueの場合は1行1件のJSONで出力する
+        export_path: 指定時は検索の代わりに最新のスナップショットを diff 用のファイルに書き出す
+
+    Returns:
+        int: 終了コード
+    """
+    import json
+
+    load_dotenv()
+    config = Config.from_env()
+    path = store_path or config.snapshot_store
+    if not path:
+        print("エラー: スナップショットストアが設定されていません（--store または SNAPSHOT_STORE）")
+        return 1
+    if not os.path.exists(os.path.expanduser(path)):
+        print(
+            f"エラー: スナップショットストア {path} が見つかりません。先にスキャンを実行してください。"
+        )
+        return 1
+
+    try:
+        filters = [parse_filter(expression) for expression in expressions]
+    except ValueError as e:
+        print(f"エラー: {e}")
+        return 1
+
+    with SnapshotStore(path) as store:
+        snapshot = store.latest()
+        if snapshot is None:
+            print("エラー: 確定済みのスナップショットがありません。")
+            return 1
+        if export_path:
+            if not snapshot["complete"]:
+                # 未完了のリージョンのグループが diff で削除されたものとして扱われるため書き出さない
+                print(
+                    "エラー: 最新のスナップショットは一部のリージョンが未完了のため書き出せません。"
+                )
+                return 1
+            from src.diff import write_snapshot_file
+
+            count = write_snapshot_file(export_path, store.iter_groups(snapshot["id"]))
+            print(f"{count}件のセキュリティグループを {export_path} に書き出しました。")
+            return 0
+        if not snapshot["complete"]:
+            print("警告: 最新のスナップショットは一部のリージョンが未完了です。", file=sys.stderr)
+        count = 0
+        for row in store.query(filters):
+            count += 1
+            if as_json:
+                print(json.dumps(row, ensure_ascii=False))
+            else:
+                print(
+                    f"{row['region']}\t{row['group_id']}\t{row['group_name']}\t"
+                    f"{row['protocol']}\t{_format_ports(row)}\t{row['cidr']}"
+                )
+    if not as_json:
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["created_at"]))
+        print(f"{count}件（スナップショット: {created}）", file=sys.stderr)
+    return 0
@@ -0,0 +1,331 @@
+"""
+スキャンのトレース（階層化したスパン）
+
+run → account → region → page → evaluate → notification の階層でスパンを記録し、
+Chrome / Perfetto のトレースビューアで読み込めるTrace Event形式のJSONに書き出す。
+スパンはスレッドごとのスタックで親子関係を決め、スレッドプールのワーカーで実行する
+リージョンのスパンには親を明示的に渡す。無効な場合は各計測点がフラグを確認してすぐに戻る。
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Generator, Iterable
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# 記録するスパン数の上限（超えた分は破棄する）
+DEFAULT_MAX_SPANS = 500_000
+
+T = TypeVar("T")
+
+
+class Span:
+    """トレースのスパン
+
+    Attributes:
+        name: スパン名
+        span_id: スパンID
+        parent: 親スパン（ルートの場合はNone）
+        start_ns: 開始時刻（time.perf_counter_ns）
+        end_ns: 終了時刻（終了前は0）
+        thread_id: 開始したスレッドのID
+        attributes: 属性（リージョン名、ページのサイズ、再試行回数など）
+    """
+
+    __slots__ = ("name", "span_id", "parent", "start_ns", "end_ns", "thread_id", "attributes")
+
+    def __init__(self, name: str, span_id: int, parent: "Span | None", attributes: dict) -> None:
+        self.name = name
+        self.span_id = span_id
+        self.parent = parent
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = 0
+        self.thread_id = threading.get_ident()
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        """属性を追加する"""
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """スパンを記録し、Trace Event形式で書き出すトレーサー（スレッドセーフ）
+
+    Attributes:
+        enabled: 記録が有効な場合True
+        max_spans: 記録するスパン数の上限
+        dropped: 上限を超えて破棄したスパン数
+    """
+
+    def __init__(self, max_spans: int = DEFAULT_MAX_SPANS) -> None:
+        self.enabled = False
+        self.max_spans = max_spans
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._spans: list[Span] = []
+        self._thread_names: dict[int, str] = {}
+        self._local = threading.local()
+        self._origin_ns = time.perf_counter_ns()
+        self._origin_epoch_us = time.time_ns() // 1000
+
+    def enable(self) -> None:
+        """記録を有効にする"""
+        self.enabled = True
+
+    def clear(self) -> None:
+        """記録したスパンを消去する（有効・無効は変えない）"""
+        with self._lock:
+            self._spans = []
+            self._thread_names = {}
+            self.dropped = 0
+
+    def reset(self) -> None:
+        """記録したスパンを消去し、記録を無効にする"""
+        self.clear()
+        self.enabled = False
+
+    def _stack(self) -> list[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self) -> Span | None:
+        """現在のスレッドで実行中のスパンを返す"""
+        if not self.enabled:
+            return None
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def _start(self, name: str, parent: Span | None, attributes: dict[str, Any]) -> Span:
+        stack = self._stack()
+        if parent is None and stack:
+            parent = stack[-1]
+        span = Span(name, next(self._ids), parent, attributes)
+        stack.append(span)
+        return span
+
+    def _end(self, span: Span, record: bool = True) -> None:
+        span.end_ns = time.perf_counter_ns()
+        stack = self._stack()
+        # 中断したジェネレータが別のスレッドで閉じられた場合はスタックにない
+        if span in stack:
+            stack.remove(span)
+        if record:
+            self._finish(span)
+
+    @contextmanager
+    def _span(
+        self, name: str, parent: Span | None, attributes: dict[str, Any]
+    ) -> Generator[Span, None, None]:
+        span = self._start(name, parent, attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self._end(span)
+
+    def start(self, name: str, **attributes: Any) -> Span | None:
+        """with文を使わずにスパンを開始する（end() で終了する）
+
+        Returns:
+            Span | None: 開始したスパン（無効な場合はNone）
+        """
+        if not self.enabled:
+            return None
+        return self._start(name, None, attributes)
+
+    def end(self, span: Span | None) -> None:
+        """start() で開始したスパンを終了する（Noneの場合は何もしない）"""
+        if span is not None:
+            self._end(span)
+
+    def span(self, name: str, parent: Span | None = None, **attributes: Any) -> Any:
+        """with文のブロックをスパンとして記録するコンテキストマネージャーを返す
+
+        Args:
+            name: スパン名
+            parent: 親スパン（省略時は現在のスレッドで実行中のスパン）
+            **attributes: 属性
+
+        Note:
+            無効な場合は何もしないコンテキストマネージャーを返す（as で受け取る値はNone）
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, parent, attributes)
+
+    def traced(
+        self, items: Iterable[T], name: str, parent: Span | None = None, **attributes: Any
+    ) -> Generator[T, None, None]:
+        """イテラブルの各要素をスパンで囲んで返すジェネレータ
+
+        要素の取得から、呼び出し側が次の要素を要求するまでを1つのスパンとする。
+        ページの取得とそのページの評価を同じスパンにまとめるために使用する。
+        取得にかかった時間は属性 fetch_ms に記録する。
+
+        Args:
+            items: イテラブル（ページネーターなど）
+            name: スパン名
+            parent: 親スパン（省略時は現在のスレッドで実行中のスパン）
+            **attributes: 属性
+        """
+        if not self.enabled:
+            yield from items
+            return
+        iterator = iter(items)
+        while True:
+            span = self._start(name, parent, dict(attributes))
+            try:
+                item = next(iterator)
+            except StopIteration:
+                # 最後の空の取得はスパンとして記録しない
+                self._end(span, record=False)
+                return
+            except Exception as e:
+                span.attributes["error"] = type(e).__name__
+                self._end(span)
+                raise
+            span.set(fetch_ms=round((time.perf_counter_ns() - span.start_ns) / 1e6, 3))
+            try:
+                yield item
+            finally:
+                self._end(span)
+
+    def annotate(self, **attributes: Any) -> None:
+        """現在のスレッドで実行中のスパンに属性を追加する"""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        if stack:
+            stack[-1].set(**attributes)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            if len(self._spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self._spans.append(span)
+            if span.thread_id not in self._thread_names:
+                self._thread_names[span.thread_id] = threading.current_thread().name
+
+    def spans(self) -> list[Span]:
+        """記録済み（終了済み）のスパンを返す"""
+        with self._lock:
+            return list(self._spans)
+
+    # 出力
+
+    def to_trace_events(self) -> dict[str, Any]:
+        """記録したスパンをTrace Event形式（chrome://tracing, Perfetto）に変換する
+
+        Note:
+            スパンは完了イベント（ph: X）とし、別スレッドの親を持つスパンには
+            親から子へのフローイベント（ph: s / f）を追加する。
+        """
+        pid = os.getpid()
+        events: list[dict[str, Any]] = []
+        with self._lock:
+            spans = list(self._spans)
+            thread_names = dict(self._thread_names)
+            dropped = self.dropped
+        for thread_id, thread_name in thread_names.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": thread_id,
+                    "args": {"name": thread_name},
+                }
+            )
+        for span in sorted(spans, key=lambda span: span.start_ns):
+            start_us = self._to_us(span.start_ns)
+            args = {"span_id": span.span_id, **_json_safe(span.attributes)}
+            if span.parent is not None:
+                args["parent_id"] = span.parent.span_id
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": "neko_sg",
+                    "ph": "X",
+                    "ts": start_us,
+                    "dur": max(0.0, (span.end_ns - span.start_ns) / 1000),
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": args,
+                }
+            )
+            if span.parent is not None and span.parent.thread_id != span.thread_id:
+                flow = {"name": "spawn", "cat": "neko_sg", "id": span.span_id, "pid": pid}
+                events.append({**flow, "ph": "s", "ts": start_us, "tid": span.parent.thread_id})
+                events.append({**flow, "ph": "f", "bp": "e", "ts": start_us, "tid": span.thread_id})
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"tool": "neko-sg", "dropped_spans": dropped},
+        }
+
+    def _to_us(self, perf_ns: int) -> float:
+        return self._origin_epoch_us + (perf_ns - self._origin_ns) / 1000
+
+    def export(self, path: str) -> int:
+        """記録したスパンをJSONファイルに書き出す（一時ファイル経由で置き換える）
+
+        Returns:
+            int: 書き出したスパン数
+        """
+        trace = self.to_trace_events()
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(trace, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        count = sum(1 for event in trace["traceEvents"] if event["ph"] == "X")
+        logger.info("トレースを %s に書き出しました（%dスパン）", path, count)
+        return count
+
+
+class _NullSpan:
+    """無効時に返す何もしないコンテキストマネージャー"""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _json_safe(attributes: dict[str, Any]) -> dict[str, Any]:
+    return {
+        key: value if isinstance(value, str | int | float | bool) or value is None else str(value)
+        for key, value in attributes.items()
+    }
+
+
+# プロセス全体で共有するトレーサー
+TRACER = Tracer()
+
+
+def finish_trace(config: Any) -> None:
+    """TRACE_FILE が設定されている場合にトレースを書き出し、記録を消去する"""
+    if not TRACER.enabled or not config.trace_file:
+        return
+    try:
+        TRACER.export(config.trace_file)
+    except OSError as e:
+        logger.error("トレースの書き出しに失敗しました: %s", e)
+    TRACER.clear()
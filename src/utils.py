@@ -6,7 +6,12 @@ import ipaddress
 import json
 import logging
 import os
+import sys
+import threading
+import time
 from collections.abc import Generator
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime
 from typing import Any
 
 import boto3
@@ -14,6 +19,9 @@ import requests
 import yaml
 from botocore.exceptions import BotoCoreError, ClientError
 
+from src.metrics import METRICS, record_api_error, record_page
+from src.tracing import TRACER
+
 try:
     from slack_sdk import WebClient
     from slack_sdk.errors import SlackApiError
@@ -26,6 +34,178 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# describe_security_groups(GroupIds=...) で1回に指定するグループIDの数
+_GROUP_ID_BATCH_SIZE = 200
+
+
+@dataclass
+class ScanReport:
+    """リージョンごとのスキャン完了状況
+
+    Attributes:
+        completed: スキャンが完了したリージョン
+        incomplete: 期限切れにより途中までの結果となったリージョン
+        skipped: 全体の期限切れによりスキャンを開始できなかったリージョン
+        failed: エラーによりスキャンが中断したリージョン
+    """
+
+    completed: list[str] = field(default_factory=list)
+    incomplete: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+    @property
+    def is_partial(self) -> bool:
+        """完了しなかったリージョンがある場合True"""
+        return bool(self.incomplete or self.skipped or self.failed)
+
+
+class PartialFetchError(Exception):
+    """リージョンの一部のセキュリティグループを取得できなかった場合の例外
+
+    取得できた分はこの例外の送出前に返されている。
+    """
+
+
+@dataclass
+class _RegionAttempt:
+    """リージョンのスキャン1回分の状態（ヘッジ再試行ごとに作成する）"""
+
+    region: str
+    is_hedge: bool = False
+    started: float | None = None
+    timed_out: bool = False
+    partial: bool = False
+    cancel: threading.Event = field(default_factory=threading.Event)
+    found: list[dict[str, str]] = field(default_factory=list)
+    groups: list[dict[str, Any]] = field(default_factory=list)
+
+
+class ExclusionIndex:
+    """除外ルールをセキュリティグループIDごとに索引化したもの
+
+    除外ルールの読み込み時に1度だけ構築し、ルールごとの除外判定を
+    (CIDR, プロトコル, 開始ポート, 終了ポート) の集合の参照で行う。
+
+    security_group_rule_id を指定した除外ルールは、ルール単位の取得（fetch_mode: rules）で
+    ルールIDにより除外する。
+
+    expires_at（エントリ単位またはルール単位）が構築時点で過ぎているルールは索引に含めない。
+
+    Attributes:
+        rules: 索引化する前の除外ルールのリスト
+        rule_ids: ルールIDで指定された除外対象（SecurityGroupRuleId）
+        expiries: 索引に含めた期限付きのルールの (期限（UNIX時間）, セキュリティグループID)
+        expired: 期限切れのため索引に含めなかったルールの数
+    """
+
+    def __init__(self, exclusion_rules: list[dict[str, Any]], now: float | None = None) -> None:
+        self.rules = exclusion_rules
+        self.rule_ids: set[str] = set()
+        self.expiries: list[tuple[float, str]] = []
+        self.expired = 0
+        self._keys: dict[str, set[tuple[Any, Any, int, int]]] = {}
+        now = time.time() if now is None else now
+        for rule in exclusion_rules:
+            sg_id = rule.get("security_group_id", "")
+            entry_expiry = parse_expiry(rule.get("expires_at"))
+            keys = self._keys.setdefault(sg_id, set())
+            for excluded_rule in rule.get("rules", []) or []:
+                try:
+                    expiry = _earliest(entry_expiry, parse_expiry(excluded_rule.get("expires_at")))
+                    if expiry is not None:
+                        if expiry <= now:
+                            self.expired += 1
+                            continue
+                        self.expiries.append((expiry, sg_id))
+                    if excluded_rule.get("security_group_rule_id"):
+                        self.rule_ids.add(str(excluded_rule["security_group_rule_id"]))
+                        continue
+                    port_range = excluded_rule.get("port_range", {})
+                    keys.add(
+                        (
+                            excluded_rule.get("ip_address"),
+                            excluded_rule.get("protocol"),
+                            int(port_range.get("from", -1)),
+                            int(port_range.get("to", -1)),
+                        )
+                    )
+                except (ValueError, TypeError, AttributeError) as e:
+                    logger.warning("除外ルールのマッチング処理中にエラー: %s", e)
+
+    @property
+    def next_expiry(self) -> float | None:
+        """索引に含めたルールのうち最も早い期限（期限付きのルールがない場合はNone）"""
+        return min(self.expiries)[0] if self.expiries else None
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def is_rule_excluded(self, sg_id: str, permission: dict[str, Any], cidr: str) -> bool:
+        """パーミッションとCIDRの組が除外ルールに該当するか判定
+
+        Args:
+            sg_id: セキュリティグループID
+            permission: セキュリティグループのパーミッション情報
+            cidr: CIDR記法のIPアドレス範囲
+
+        Returns:
+            bool: 除外ルールに該当する場合True
+        """
+        keys = self._keys.get(sg_id)
+        if not keys:
+            return False
+        key = (
+            cidr,
+            permission.get("IpProtocol"),
+            permission.get("FromPort"),
+            permission.get("ToPort"),
+        )
+        return key in keys
+
+
+def compile_exclusion_rules(
+    exclusion_rules: "list[dict[str, Any]] | ExclusionIndex",
+) -> ExclusionIndex:
+    """除外ルールを索引化する（索引化済みの場合はそのまま返す）
+
+    Args:
+        exclusion_rules: 除外ルールのリストまたは索引
+
+    Returns:
+        ExclusionIndex: 除外ルールの索引
+    """
+    if isinstance(exclusion_rules, ExclusionIndex):
+        return exclusion_rules
+    return ExclusionIndex(exclusion_rules)
+
+
+class ClientPool:
+    """リージョンごとのEC2クライアントを保持して再利用するプール
+
+    boto3のクライアントはスレッドセーフなため、同じリージョンのスキャンで共有できる。
+    """
+
+    def __init__(self, config: Any | None = None) -> None:
+        self._config = config
+        self._clients: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, region: str) -> Any:
+        """リージョンのEC2クライアントを取得（未作成の場合は作成する）"""
+        client = self._clients.get(region)
+        if client is not None:
+            return client
+        aws_config = self._config.get_aws_config() if self._config is not None else None
+        client = boto3.session.Session().client("ec2", region_name=region, config=aws_config)
+        with self._lock:
+            return self._clients.setdefault(region, client)
+
+    def clear(self) -> None:
+        """保持しているクライアントを破棄する"""
+        with self._lock:
+            self._clients.clear()
+
 
 def get_all_regions(config: Any | None = None) -> Generator[str, None, None]:
     """AWSの全リージョンを取得するジェネレータ
@@ -39,61 +219,432 @@ def get_all_regions(config: Any | None = None) -> Generator[str, None, None]:
     Raises:
         BotoCoreError: AWS API呼び出しエラー
         ClientError: AWSクライアントエラー
+
+    Note:
+        設定で許可リストが指定されている場合はAPIを呼び出さずにそのリージョンを返す。
+        それ以外の場合は有効期間内のキャッシュ、botocore同梱のエンドポイントデータ、
+        describe_regions（オプトイン済みのリージョンのみ）の順に取得元を決める。
+        botocore同梱のデータはオプトインの状態を含まないため、describe_regions の結果の
+        キャッシュがあれば（有効期間を過ぎていても）そのリージョンに絞り込む。
     """
+    if config is not None and config.regions:
+        yield from _filter_regions(config.regions, config)
+        return
+
+    cache_path = None
+    if config is not None and config.region_source != "static" and config.region_cache_ttl > 0:
+        cache_path = os.path.expanduser(config.region_cache_file)
+        cached = _load_region_cache(cache_path, config.region_cache_ttl)
+        if cached is not None:
+            logger.debug("キャッシュからリージョン一覧を読み込みました: %s", cache_path)
+            yield from _filter_regions(cached, config)
+            return
+
     try:
-        aws_config = None
-        if config is not None:
-            aws_config = config.get_aws_config()
-        elif os.getenv("AWS_TIMEOUT"):
-            from src.config import Config
-
-            aws_config = Config.from_env().get_aws_config()
-
-        session = boto3.session.Session()
-        ec2 = session.client("ec2", config=aws_config)
-        regions = [region["RegionName"] for region in ec2.describe_regions()["Regions"]]
-        yield from regions
+        source = config.region_source if config is not None else "api"
+        with METRICS.timer("neko_sg_region_discovery_seconds", source=source):
+            aws_config = None
+            if config is not None:
+                aws_config = config.get_aws_config()
+            elif os.getenv("AWS_TIMEOUT"):
+                from src.config import Config
+
+                aws_config = Config.from_env().get_aws_config()
+
+            session = boto3.session.Session()
+            if config is not None and config.region_source == "static":
+                regions = _opted_in_static_regions(session.get_available_regions("ec2"), config)
+            else:
+                ec2 = session.client("ec2", config=aws_config)
+                response = ec2.describe_regions(
+                    Filters=[
+                        {"Name": "opt-in-status", "Values": ["opt-in-not-required", "opted-in"]}
+                    ]
+                )
+                regions = [region["RegionName"] for region in response["Regions"]]
     except (BotoCoreError, ClientError) as e:
         logger.error("リージョン取得エラー: %s", e)
+        record_api_error("global", "describe_regions", e)
         raise
 
+    if cache_path is not None:
+        _save_region_cache(cache_path, regions)
+    yield from _filter_regions(regions, config)
+
+
+def get_account_id(config: Any | None = None) -> str:
+    """現在の認証情報のAWSアカウントIDを取得する
+
+    Args:
+        config: アプリケーション設定
+
+    Returns:
+        str: AWSアカウントID。取得に失敗した場合は "unknown"
+    """
+    try:
+        aws_config = config.get_aws_config() if config is not None else None
+        sts = boto3.session.Session().client("sts", config=aws_config)
+        return str(sts.get_caller_identity()["Account"])
+    except (BotoCoreError, ClientError) as e:
+        logger.warning("アカウントIDの取得に失敗しました: %s", e)
+        return "unknown"
+
+
+def _filter_regions(regions: list[str], config: Any | None) -> list[str]:
+    """除外リストに含まれるリージョンを取り除く内部関数"""
+    if config is None or not config.excluded_regions:
+        return list(regions)
+    excluded = set(config.excluded_regions)
+    return [region for region in regions if region not in excluded]
+
+
+def _opted_in_static_regions(regions: list[str], config: Any) -> list[str]:
+    """botocore同梱のリージョン一覧をオプトイン済みのリージョンに絞り込む内部関数
+
+    describe_regions の結果のキャッシュ（REGION_SOURCE=api で保存したもの）を使う。
+    キャッシュがない場合はオプトインの状態を確認できないため、そのまま返す。
+    """
+    cached = _load_region_cache(os.path.expanduser(config.region_cache_file), None)
+    if cached is None:
+        logger.info(
+            "リージョン一覧のキャッシュがないため、オプトインしていないリージョンも対象にします。"
+        )
+        return list(regions)
+    enabled = set(cached)
+    skipped = [region for region in regions if region not in enabled]
+    if skipped:
+        logger.info("オプトインしていないリージョンを除外します: %s", ", ".join(skipped))
+    return [region for region in regions if region in enabled]
+
+
+def _load_region_cache(cache_path: str, ttl: int | None) -> list[str] | None:
+    """有効期間内のリージョン一覧キャッシュを読み込む内部関数
+
+    Args:
+        cache_path: キャッシュファイルのパス
+        ttl: 有効期間（秒、Noneの場合は期限を確認しない）
+
+    Returns:
+        list[str] | None: キャッシュされたリージョン一覧。存在しない・期限切れ・破損時はNone
+    """
+    try:
+        with open(cache_path, encoding="utf-8") as file:
+            data = json.load(file)
+        if ttl is not None and time.time() - float(data["fetched_at"]) > ttl:
+            return None
+        return [str(region) for region in data["regions"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_region_cache(cache_path: str, regions: list[str]) -> None:
+    """リージョン一覧をキャッシュファイルに保存する内部関数（失敗しても処理は継続する）"""
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"fetched_at": time.time(), "regions": regions}, file)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("リージョン一覧のキャッシュ保存に失敗しました: %s", e)
+
 
 def get_security_groups(
-    region: str, config: Any | None = None
+    region: str,
+    config: Any | None = None,
+    client: Any | None = None,
+    group_ids: list[str] | None = None,
 ) -> Generator[dict[str, Any], None, None]:
     """指定されたリージョンのセキュリティグループを取得するジェネレータ
 
     Args:
         region: AWSリージョン名
         config: アプリケーション設定
+        client: 再利用するEC2クライアント（省略時は新規作成）
+        group_ids: 取得するセキュリティグループID（省略時は全件。存在しないIDは無視する）
 
     Yields:
-        Dict[str, Any]: セキュリティグループの詳細情報
+        Dict[str, Any]: 評価に必要なフィールドだけに縮小したセキュリティグループ
+            （compact_security_group を参照）
 
     Note:
-        エラーが発生した場合は空のジェネレータを返す
+        エラーが発生した場合は空のジェネレータを返す。
+        各ページは取得直後に縮小し、元の応答は次のページの取得前に解放する。
     """
     try:
-        aws_config = None
-        if config is not None:
-            aws_config = config.get_aws_config()
-        elif os.getenv("AWS_TIMEOUT"):
-            from src.config import Config
-
-            aws_config = Config.from_env().get_aws_config()
-
-        session = boto3.session.Session()
-        ec2 = session.client("ec2", region_name=region, config=aws_config)
+        ec2 = client if client is not None else _create_ec2_client(region, config)
+        if group_ids is None and config is not None and getattr(config, "vpc_partitioning", False):
+            yield from _get_security_groups_by_vpc(ec2, region, config.vpc_max_workers)
+            return
         paginator = ec2.get_paginator("describe_security_groups")
-        for page in paginator.paginate():
-            yield from page["SecurityGroups"]
+        # GroupIds ではなくフィルターで指定し、他のリージョンのIDが含まれてもエラーにしない
+        filters = [{"Name": "group-id", "Values": group_ids}] if group_ids is not None else []
+        pages = TRACER.traced(
+            paginator.paginate(Filters=filters) if filters else paginator.paginate(),
+            "page",
+            region=region,
+            api="describe_security_groups",
+        )
+        started = time.perf_counter()
+        for page in pages:
+            record_page(region, "describe_security_groups", page, started)
+            groups = _compact_page(page)
+            TRACER.annotate(page_size=len(groups), retries=_retry_attempts(page))
+            del page
+            with TRACER.span("evaluate", groups=len(groups)):
+                yield from groups
+            started = time.perf_counter()
     except (BotoCoreError, ClientError) as e:
         logger.error("リージョン %s でのセキュリティグループ取得エラー: %s", region, e)
+        record_api_error(region, "describe_security_groups", e)
         # エラーが発生した場合は空のジェネレータを返す
         return
         yield  # unreachable, but makes the type checker happy
 
 
+def _retry_attempts(page: dict[str, Any]) -> int:
+    """応答のメタデータからbotocoreの再試行回数を返す内部関数"""
+    return int(page.get("ResponseMetadata", {}).get("RetryAttempts", 0))
+
+
+def compact_security_group(sg: dict[str, Any]) -> dict[str, Any]:
+    """評価に必要なフィールドだけを残したセキュリティグループのレコードを返す
+
+    アウトバウンドルール、UserIdGroupPairs、PrefixListIds、CIDRの説明、OwnerId などの
+    評価で参照しないフィールドを取り除き、CIDRとプロトコルの文字列はインターンして共有する。
+    タグはポリシーの tag 条件で参照するため Key と Value だけを残す。
+
+    Args:
+        sg: describe_security_groups が返したセキュリティグループ
+
+    Returns:
+        dict[str, Any]: GroupId, GroupName, Description, IpPermissions（CIDRを含むもののみ）,
+            Tags（存在する場合のみ）からなるレコード
+    """
+    permissions = []
+    for permission in sg.get("IpPermissions", []):
+        ip_ranges = [
+            {"CidrIp": sys.intern(ip_range["CidrIp"])}
+            for ip_range in permission.get("IpRanges", [])
+            if ip_range.get("CidrIp")
+        ]
+        ipv6_ranges = [
+            {"CidrIpv6": sys.intern(ipv6_range["CidrIpv6"])}
+            for ipv6_range in permission.get("Ipv6Ranges", [])
+            if ipv6_range.get("CidrIpv6")
+        ]
+        if not ip_ranges and not ipv6_ranges:
+            continue
+        compact: dict[str, Any] = {}
+        if "IpProtocol" in permission:
+            compact["IpProtocol"] = sys.intern(str(permission["IpProtocol"]))
+        if "FromPort" in permission:
+            compact["FromPort"] = permission["FromPort"]
+        if "ToPort" in permission:
+            compact["ToPort"] = permission["ToPort"]
+        if ip_ranges:
+            compact["IpRanges"] = ip_ranges
+        if ipv6_ranges:
+            compact["Ipv6Ranges"] = ipv6_ranges
+        permissions.append(compact)
+
+    record: dict[str, Any] = {
+        "GroupId": sg["GroupId"],
+        "GroupName": sg.get("GroupName", ""),
+        "Description": sg.get("Description", ""),
+        "IpPermissions": permissions,
+    }
+    if sg.get("Tags"):
+        record["Tags"] = [{"Key": tag["Key"], "Value": tag.get("Value", "")} for tag in sg["Tags"]]
+    return record
+
+
+def _compact_page(page: dict[str, Any]) -> list[dict[str, Any]]:
+    """ページ内のセキュリティグループを縮小したレコードのリストに変換する内部関数"""
+    return [compact_security_group(sg) for sg in page["SecurityGroups"]]
+
+
+def _create_ec2_client(region: str, config: Any | None = None) -> Any:
+    """リージョンのEC2クライアントを新規作成する内部関数"""
+    aws_config = None
+    if config is not None:
+        aws_config = config.get_aws_config()
+    elif os.getenv("AWS_TIMEOUT"):
+        from src.config import Config
+
+        aws_config = Config.from_env().get_aws_config()
+
+    session = boto3.session.Session()
+    return session.client("ec2", region_name=region, config=aws_config)
+
+
+def get_security_group_rules(
+    region: str,
+    config: Any | None = None,
+    client: Any | None = None,
+    group_ids: list[str] | None = None,
+) -> Generator[dict[str, Any], None, None]:
+    """指定されたリージョンのセキュリティグループルールを取得するジェネレータ
+
+    describe_security_group_rules はルール単位のレコード（SecurityGroupRuleId付き）を返し、
+    タグやグループのメタデータを含まないため、応答がグループ単位の取得より小さい。
+
+    Args:
+        region: AWSリージョン名
+        config: アプリケーション設定
+        client: 再利用するEC2クライアント（省略時は新規作成）
+        group_ids: 対象のセキュリティグループID（指定時はサーバー側で group-id フィルタを適用）
+
+    Yields:
+        Dict[str, Any]: セキュリティグループルール
+
+    Note:
+        エラーが発生した場合は空のジェネレータを返す
+    """
+    try:
+        ec2 = client if client is not None else _create_ec2_client(region, config)
+        params: dict[str, Any] = {}
+        if group_ids:
+            params["Filters"] = [{"Name": "group-id", "Values": group_ids}]
+        paginator = ec2.get_paginator("describe_security_group_rules")
+        pages = TRACER.traced(
+            paginator.paginate(**params), "page", region=region, api="describe_security_group_rules"
+        )
+        started = time.perf_counter()
+        for page in pages:
+            record_page(region, "describe_security_group_rules", page, started)
+            rules = page["SecurityGroupRules"]
+            TRACER.annotate(page_size=len(rules), retries=_retry_attempts(page))
+            with TRACER.span("evaluate", rules=len(rules)):
+                yield from rules
+            started = time.perf_counter()
+    except (BotoCoreError, ClientError) as e:
+        logger.error("リージョン %s でのセキュリティグループルール取得エラー: %s", region, e)
+        record_api_error(region, "describe_security_group_rules", e)
+        return
+        yield  # unreachable, but makes the type checker happy
+
+
+def _fill_group_names(
+    region: str, findings: list[dict[str, str]], config: Any | None, client: Any | None
+) -> None:
+    """ルール単位の検出結果にセキュリティグループ名と説明を補う内部関数
+
+    ルールのレコードにはグループ名が含まれないため、検出されたグループだけを
+    describe_security_groups(GroupIds=...) でまとめて取得する。
+    """
+    group_ids = sorted({finding["group_id"] for finding in findings})
+    if not group_ids:
+        return
+    names: dict[str, tuple[str, str]] = {}
+    try:
+        ec2 = client if client is not None else _create_ec2_client(region, config)
+        for i in range(0, len(group_ids), _GROUP_ID_BATCH_SIZE):
+            response = ec2.describe_security_groups(
+                GroupIds=group_ids[i : i + _GROUP_ID_BATCH_SIZE]
+            )
+            for sg in response.get("SecurityGroups", []):
+                names[sg["GroupId"]] = (sg.get("GroupName", ""), sg.get("Description", ""))
+    except (BotoCoreError, ClientError) as e:
+        logger.warning("リージョン %s のセキュリティグループ名の取得に失敗しました: %s", region, e)
+    for finding in findings:
+        if finding["group_id"] in names:
+            finding["group_name"], finding["description"] = names[finding["group_id"]]
+
+
+def _get_security_groups_by_vpc(
+    ec2: Any, region: str, max_workers: int
+) -> Generator[dict[str, Any], None, None]:
+    """VPCごとにセキュリティグループを並列取得する内部関数
+
+    Args:
+        ec2: EC2クライアント（スレッド間で共有する）
+        region: AWSリージョン名
+        max_workers: 並列取得に使用する最大スレッド数
+
+    Yields:
+        Dict[str, Any]: 縮小したセキュリティグループ（GroupIdで重複排除済み）
+
+    Raises:
+        PartialFetchError: 一部のVPCの取得に失敗した場合（取得できたVPCの分を返した後に送出する）
+
+    Note:
+        VPC一覧の取得に失敗した場合やVPCが1つ以下の場合は通常のページングで取得する
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    try:
+        vpc_ids = [
+            vpc["VpcId"]
+            for page in ec2.get_paginator("describe_vpcs").paginate()
+            for vpc in page["Vpcs"]
+        ]
+    except (BotoCoreError, ClientError) as e:
+        logger.warning("リージョン %s のVPC一覧取得に失敗したため通常取得します: %s", region, e)
+        vpc_ids = []
+
+    paginator = ec2.get_paginator("describe_security_groups")
+    if len(vpc_ids) <= 1:
+        started = time.perf_counter()
+        for page in paginator.paginate():
+            record_page(region, "describe_security_groups", page, started)
+            groups = _compact_page(page)
+            del page
+            yield from groups
+            started = time.perf_counter()
+        return
+
+    # VPCごとの取得はワーカースレッドで行うため、ページのスパンの親を明示的に渡す
+    trace_parent = TRACER.current()
+
+    def fetch_vpc(vpc_id: str) -> list[dict[str, Any]]:
+        groups = []
+        pages = TRACER.traced(
+            paginator.paginate(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}]),
+            "page",
+            parent=trace_parent,
+            region=region,
+            vpc_id=vpc_id,
+            api="describe_security_groups",
+        )
+        started = time.perf_counter()
+        for page in pages:
+            record_page(region, "describe_security_groups", page, started)
+            compacted = _compact_page(page)
+            TRACER.annotate(page_size=len(compacted), retries=_retry_attempts(page))
+            groups.extend(compacted)
+            started = time.perf_counter()
+        return groups
+
+    seen: set[str] = set()
+    failed_vpcs: list[str] = []
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(len(vpc_ids), max_workers)), thread_name_prefix="neko-sg-vpc"
+    ) as executor:
+        futures = {executor.submit(fetch_vpc, vpc_id): vpc_id for vpc_id in vpc_ids}
+        for future in as_completed(futures):
+            try:
+                groups = future.result()
+            except (BotoCoreError, ClientError) as e:
+                logger.error(
+                    "リージョン %s のVPC %s でのセキュリティグループ取得エラー: %s",
+                    region,
+                    futures[future],
+                    e,
+                )
+                record_api_error(region, "describe_security_groups", e)
+                failed_vpcs.append(futures[future])
+                continue
+            for sg in groups:
+                if sg["GroupId"] not in seen:
+                    seen.add(sg["GroupId"])
+                    yield sg
+    if failed_vpcs:
+        raise PartialFetchError(
+            f"リージョン {region} のVPC {', '.join(sorted(failed_vpcs))} を取得できませんでした"
+        )
+
+
 def is_globally_accessible(sg: dict[str, Any]) -> bool:
     """セキュリティグループがグローバルにアクセス可能かチェック
 
@@ -134,6 +685,75 @@ def _is_global_cidr(cidr: str) -> bool:
         return False
 
 
+def parse_expiry(value: Any) -> float | None:
+    """除外ルールの expires_at をUNIX時間に変換する
+
+    ISO 8601 の日時（タイムゾーンがない場合はUTC）、日付（その日の0時、UTC）、
+    UNIX時間を受け付ける。YAMLが日時として読み込んだ値もそのまま受け付ける。
+
+    Returns:
+        float | None: 期限（未指定または解釈できない場合はNone = 無期限）
+    """
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, bool):
+            raise TypeError(value)
+        if isinstance(value, int | float):
+            return float(value)
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.strip())
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=UTC)
+            return float(value.timestamp())
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day, tzinfo=UTC).timestamp()
+    except (ValueError, TypeError, OverflowError):
+        pass
+    logger.warning("除外ルールの expires_at を解釈できません（無期限として扱います）: %r", value)
+    return None
+
+
+def _earliest(*expiries: float | None) -> float | None:
+    values = [expiry for expiry in expiries if expiry is not None]
+    return min(values) if values else None
+
+
+def prune_expired_exclusions(
+    exclusion_rules: list[dict[str, Any]], now: float | None = None
+) -> tuple[list[dict[str, Any]], int]:
+    """期限切れの除外ルールを取り除く
+
+    エントリの expires_at が過ぎている場合はエントリごと、ルールの expires_at が
+    過ぎている場合はそのルールを取り除く。ルールがすべて期限切れになったエントリも取り除く。
+
+    Returns:
+        tuple[list[dict[str, Any]], int]: (残った除外ルール, 取り除いたルールの数)
+    """
+    now = time.time() if now is None else now
+    kept: list[dict[str, Any]] = []
+    removed = 0
+    for entry in exclusion_rules:
+        rules = entry.get("rules", []) or []
+        entry_expiry = parse_expiry(entry.get("expires_at"))
+        if entry_expiry is not None and entry_expiry <= now:
+            removed += max(1, len(rules))
+            continue
+        active = [
+            rule
+            for rule in rules
+            if not isinstance(rule, dict)
+            or (expiry := parse_expiry(rule.get("expires_at"))) is None
+            or expiry > now
+        ]
+        removed += len(rules) - len(active)
+        if rules and not active:
+            continue
+        kept.append({**entry, "rules": active} if len(active) != len(rules) else entry)
+    return kept, removed
+
+
 def load_exclusion_rules(file_path: str) -> list[dict[str, Any]]:
     """YAMLファイルから除外ルールを読み込む
 
@@ -144,7 +764,8 @@ def load_exclusion_rules(file_path: str) -> list[dict[str, Any]]:
         list[dict[str, Any]]: 除外ルールのリスト。ファイルが存在しない場合は空リスト
 
     Note:
-        ファイルが見つからない場合やYAML解析エラーの場合は空リストを返す
+        ファイルが見つからない場合やYAML解析エラーの場合は空リストを返す。
+        期限切れの除外ルールは読み込み時に取り除く（ファイルは書き換えない）
     """
     if not os.path.exists(file_path):
         logger.warning(
@@ -153,9 +774,11 @@ def load_exclusion_rules(file_path: str) -> list[dict[str, Any]]:
         return []
 
     try:
-        with open(file_path, encoding="utf-8") as file:
+        with (
+            METRICS.timer("neko_sg_exclusion_load_seconds"),
+            open(file_path, encoding="utf-8") as file,
+        ):
             rules = yaml.safe_load(file)
-            return rules if rules is not None else []
     except yaml.YAMLError as e:
         logger.error("YAMLファイル '%s' の読み込みエラー: %s", file_path, e)
         return []
@@ -163,13 +786,22 @@ def load_exclusion_rules(file_path: str) -> list[dict[str, Any]]:
         logger.error("ファイル '%s' の読み込みエラー: %s", file_path, e)
         return []
 
+    if not isinstance(rules, list):
+        return rules if rules is not None else []
+    kept, removed = prune_expired_exclusions(rules)
+    if removed:
+        logger.info(
+            "期限切れの除外ルール %d件を無視します（neko-sg prune で削除できます）", removed
+        )
+    return kept
+
 
 def is_excluded(sg: dict[str, Any], exclusion_rules: list[dict[str, Any]]) -> bool:
     """セキュリティグループが除外ルールに該当するかチェック
 
     Args:
         sg: セキュリティグループの詳細情報
-        exclusion_rules: 除外ルールのリスト
+        exclusion_rules: 除外ルールのリスト（期限切れのルールを取り除いたもの）
 
     Returns:
         bool: 除外ルールに該当する場合True
@@ -267,12 +899,20 @@ def send_slack_notification(webhook_url: str, message: str) -> bool:
     payload = {"text": message}
 
     try:
-        response = requests.post(webhook_url, data=json.dumps(payload), headers=headers, timeout=10)
-        response.raise_for_status()
+        with (
+            METRICS.timer("neko_sg_notification_seconds", sink="webhook"),
+            TRACER.span("notification", sink="webhook"),
+        ):
+            response = requests.post(
+                webhook_url, data=json.dumps(payload), headers=headers, timeout=10
+            )
+            response.raise_for_status()
         logger.info("Slack通知が正常に送信されました。")
+        METRICS.inc("neko_sg_notifications", sink="webhook", result="success")
         return True
     except requests.exceptions.RequestException as e:
         logger.error("Slack通知の送信中にエラーが発生しました: %s", e)
+        METRICS.inc("neko_sg_notifications", sink="webhook", result="failure")
         return False
 
 
@@ -298,58 +938,111 @@ def send_slack_notification_sdk(bot_token: str, channel: str, message: str) -> b
 
     try:
         client = WebClient(token=bot_token)
-        response = client.chat_postMessage(
-            channel=channel, text=message, username="NeKo_AWS_SG", icon_emoji=":warning:"
-        )
+        with (
+            METRICS.timer("neko_sg_notification_seconds", sink="sdk"),
+            TRACER.span("notification", sink="sdk", channel=channel),
+        ):
+            response = client.chat_postMessage(
+                channel=channel, text=message, username="NeKo_AWS_SG", icon_emoji=":warning:"
+            )
 
         if response["ok"]:
             logger.info("Slack通知が正常に送信されました（SDK使用）。")
+            METRICS.inc("neko_sg_notifications", sink="sdk", result="success")
             return True
         else:
             logger.error(
                 "Slack通知の送信に失敗しました: %s", response.get("error", "Unknown error")
             )
+            METRICS.inc("neko_sg_notifications", sink="sdk", result="failure")
             return False
 
     except SlackApiError as e:
         logger.error("Slack API エラー: %s", e.response["error"])
+        METRICS.inc("neko_sg_notifications", sink="sdk", result="failure")
         return False
     except Exception as e:
         logger.error("Slack通知の送信中にエラーが発生しました: %s", e)
+        METRICS.inc("neko_sg_notifications", sink="sdk", result="failure")
         return False
 
 
-def format_slack_message(security_groups: list[dict[str, str]]) -> str:
+def format_slack_message(
+    security_groups: list[dict[str, str]], report: ScanReport | None = None
+) -> str:
     """セキュリティグループの情報をSlack通知用にフォーマットする関数
 
     Args:
         security_groups: セキュリティグループ情報のリスト
+        report: リージョンごとのスキャン完了状況（完了しなかったリージョンを追記する）
 
     Returns:
         str: Slack通知用にフォーマットされたメッセージ
     """
     if not security_groups:
-        return "グローバルにアクセス可能なセキュリティグループは見つかりませんでした。"
+        message = "グローバルにアクセス可能なセキュリティグループは見つかりませんでした。"
+        if report is not None and report.is_partial:
+            message += "\n" + _format_partial_regions(report)
+        return message
 
     message = "以下のセキュリティグループにグローバルなインバウンドルールが見つかりました：\n"
     for sg in security_groups:
-        message += f"• リージョン: {sg['region']}, セキュリティグループID: {sg['group_id']}, 名前: {sg['group_name']}\n"
+        message += f"• リージョン: {sg['region']}, セキュリティグループID: {sg['group_id']}, 名前: {sg['group_name']}"
+        if sg.get("rule_id"):
+            message += f", ルールID: {sg['rule_id']}"
+        message += "\n"
+    if report is not None and report.is_partial:
+        message += _format_partial_regions(report)
+    return message
+
+
+def _format_partial_regions(report: ScanReport) -> str:
+    """完了しなかったリージョンの一覧をフォーマットする内部関数"""
+    message = "※ 以下のリージョンはスキャンが完了していないため、結果が不完全な可能性があります：\n"
+    if report.incomplete:
+        message += f"• 期限切れ（途中までの結果）: {', '.join(sorted(report.incomplete))}\n"
+    if report.skipped:
+        message += f"• 未スキャン: {', '.join(sorted(report.skipped))}\n"
+    if report.failed:
+        message += f"• エラー: {', '.join(sorted(report.failed))}\n"
     return message
 
 
-def has_unexcluded_global_access(sg: dict[str, Any], exclusion_rules: list[dict[str, Any]]) -> bool:
+def has_unexcluded_global_access(
+    sg: dict[str, Any], exclusion_rules: list[dict[str, Any]] | ExclusionIndex
+) -> bool:
     """セキュリティグループ内に、除外されていないグローバルアクセス可能なルールがあるか判定
 
     Args:
         sg: セキュリティグループの詳細情報
-        exclusion_rules: 除外ルールのリスト
+        exclusion_rules: 除外ルールのリスト（期限切れのルールを取り除いたもの）または索引
 
     Returns:
         bool: 除外されていないグローバルアクセス可能なルールがある場合True
     """
     sg_id = sg["GroupId"]
 
-    # 該当するSGの除外ルールを取得
+    if isinstance(exclusion_rules, ExclusionIndex):
+        for permission in sg.get("IpPermissions", []):
+            for ip_range in permission.get("IpRanges", []):
+                cidr = ip_range.get("CidrIp")
+                if (
+                    cidr
+                    and _is_global_cidr(cidr)
+                    and not exclusion_rules.is_rule_excluded(sg_id, permission, cidr)
+                ):
+                    return True
+            for ipv6_range in permission.get("Ipv6Ranges", []):
+                cidr_ipv6 = ipv6_range.get("CidrIpv6")
+                if (
+                    cidr_ipv6
+                    and _is_global_cidr(cidr_ipv6)
+                    and not exclusion_rules.is_rule_excluded(sg_id, permission, cidr_ipv6)
+                ):
+                    return True
+        return False
+
+    # 該当するSGの除外ルールを取得（期限切れのルールは読み込み時に取り除いている）
     sg_rules = []
     for rule in exclusion_rules:
         if rule.get("security_group_id") == sg_id:
@@ -385,15 +1078,132 @@ def has_unexcluded_global_access(sg: dict[str, Any], exclusion_rules: list[dict[
     return False
 
 
+def evaluate_security_group(
+    sg: dict[str, Any],
+    region: str,
+    exclusion_rules: list[dict[str, Any]] | ExclusionIndex,
+    policies: list[Any] | None = None,
+) -> dict[str, str] | None:
+    """セキュリティグループを評価し、検出対象の場合は検出結果を返す
+
+    Args:
+        sg: セキュリティグループの詳細情報
+        region: リージョン名
+        exclusion_rules: 除外ルールのリストまたは索引
+        policies: コンパイル済みポリシーのリスト（指定時は組み込みの判定の代わりに使用）
+
+    Returns:
+        dict[str, str] | None: 検出結果。検出対象でない場合はNone
+    """
+    if not METRICS.enabled:
+        return _evaluate_security_group(sg, region, exclusion_rules, policies)
+    engine = "policy" if policies else "builtin"
+    started = time.perf_counter()
+    group_info = _evaluate_security_group(sg, region, exclusion_rules, policies)
+    METRICS.inc("neko_sg_evaluation_seconds", time.perf_counter() - started, engine=engine)
+    METRICS.inc("neko_sg_evaluations", region=region, engine=engine)
+    if group_info is not None:
+        METRICS.inc("neko_sg_findings", region=region)
+    return group_info
+
+
+def _evaluate_security_group(
+    sg: dict[str, Any],
+    region: str,
+    exclusion_rules: list[dict[str, Any]] | ExclusionIndex,
+    policies: list[Any] | None,
+) -> dict[str, str] | None:
+    """evaluate_security_group の本体（計測を含まない）"""
+    if policies:
+        from src.policy import matching_policies
+
+        matched = matching_policies(sg, exclusion_rules, policies)
+        if not matched:
+            return None
+    elif not has_unexcluded_global_access(sg, exclusion_rules):
+        return None
+
+    group_info = {
+        "region": region,
+        "group_id": sg["GroupId"],
+        "group_name": sg["GroupName"],
+        "description": sg.get("Description", ""),
+    }
+    if policies:
+        group_info["policy"] = ",".join(matched)
+    logger.info("グローバルアクセス可能なSG発見: %s in %s", group_info["group_id"], region)
+    return group_info
+
+
+def evaluate_security_group_rule(
+    rule: dict[str, Any],
+    region: str,
+    exclusion_rules: list[dict[str, Any]] | ExclusionIndex,
+    policies: list[Any] | None = None,
+) -> dict[str, str] | None:
+    """describe_security_group_rules のルール1件を評価し、検出対象の場合は検出結果を返す
+
+    Args:
+        rule: セキュリティグループルール
+        region: リージョン名
+        exclusion_rules: 除外ルールのリストまたは索引
+        policies: コンパイル済みポリシーのリスト（タグはルールのタグで評価する）
+
+    Returns:
+        dict[str, str] | None: 検出結果（rule_id を含む）。検出対象でない場合はNone。
+            group_name と description は呼び出し側で補う
+    """
+    if rule.get("IsEgress"):
+        return None
+    exclusion_index = compile_exclusion_rules(exclusion_rules)
+    rule_id = rule.get("SecurityGroupRuleId", "")
+    if rule_id in exclusion_index.rule_ids:
+        return None
+
+    permission: dict[str, Any] = {
+        "IpProtocol": rule.get("IpProtocol"),
+        "FromPort": rule.get("FromPort"),
+        "ToPort": rule.get("ToPort"),
+        "IpRanges": [{"CidrIp": rule["CidrIpv4"]}] if rule.get("CidrIpv4") else [],
+        "Ipv6Ranges": [{"CidrIpv6": rule["CidrIpv6"]}] if rule.get("CidrIpv6") else [],
+    }
+    sg = {
+        "GroupId": rule["GroupId"],
+        "GroupName": "",
+        "IpPermissions": [permission],
+        "Tags": rule.get("Tags", []),
+    }
+    group_info = evaluate_security_group(sg, region, exclusion_index, policies)
+    if group_info is not None:
+        group_info["rule_id"] = rule_id
+    return group_info
+
+
 def find_globally_accessible_security_groups(
-    exclusion_rules: list[dict[str, Any]],
+    exclusion_rules: list[dict[str, Any]] | ExclusionIndex,
     config: Any | None = None,
+    policies: list[Any] | None = None,
+    report: ScanReport | None = None,
+    checkpoint: Any | None = None,
+    clients: ClientPool | None = None,
+    inventory: Any | None = None,
+    executor: Any | None = None,
+    hedge_executor: Any | None = None,
 ) -> Generator[dict[str, str], None, None]:
     """全リージョンでグローバルにアクセス可能なセキュリティグループを見つけるジェネレータ（除外ルール適用）
 
     Args:
-        exclusion_rules: 除外ルールのリスト
+        exclusion_rules: 除外ルールのリストまたは索引
         config: アプリケーション設定
+        policies: コンパイル済みポリシーのリスト（指定時は組み込みの判定の代わりに使用）
+        report: リージョンごとの完了状況を記録するオブジェクト
+        checkpoint: チェックポイント（完了済みリージョンは記録済みの結果を返し、
+            新たに完了したリージョンを記録する）
+        clients: 再利用するEC2クライアントのプール（再試行時は使用せず新規作成する）
+        inventory: 完了したリージョンのセキュリティグループを保存する在庫キャッシュ
+        executor: リージョンのスキャンに使うスレッドプール（省略時は呼び出しごとに作成し、
+            終了時に停止する。指定した場合は停止しない）
+        hedge_executor: 再試行に使うスレッドプール（executor を指定した場合のみ使用）
 
     Yields:
         dict[str, str]: グローバルアクセス可能なセキュリティグループの情報
@@ -401,40 +1211,209 @@ def find_globally_accessible_security_groups(
             - group_id: セキュリティグループID
             - group_name: セキュリティグループ名
             - description: セキュリティグループの説明
+            - policy: 該当したポリシー名（カンマ区切り、ポリシー使用時のみ）
+            - rule_id: セキュリティグループルールID（fetch_mode が rules の場合のみ）
+
+    Note:
+        fetch_mode が rules の場合はルール単位で取得・評価し、検出結果もルールごとに返す。
+        この場合、在庫キャッシュにはセキュリティグループを保存しない。
+
+        設定で期限（scan_deadline / region_deadline）が指定された場合、期限までに完了しなかった
+        リージョンは打ち切り、それまでに見つかった結果のみを返す。打ち切られたスレッドは
+        次のページ境界で停止する。hedge_retry が有効な場合は、リージョン期限切れ時に
+        新しいクライアントで1回だけ再試行する。
     """
-    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+    if report is None:
+        report = ScanReport()
+    exclusion_index = compile_exclusion_rules(exclusion_rules)
 
     try:
-        regions = list(get_all_regions(config))
+        with TRACER.span("regions"):
+            regions = list(get_all_regions(config))
     except Exception as e:
         logger.error("リージョン一覧の取得に失敗しました: %s", e)
         return
-
-    def scan_region(region: str) -> list[dict[str, str]]:
+    # リージョンのスキャンはワーカースレッドで行うため、呼び出し元のスパンを親として渡す
+    trace_parent = TRACER.current()
+
+    scan_deadline = float(config.scan_deadline) if config is not None else 0.0
+    region_deadline = float(config.region_deadline) if config is not None else 0.0
+    hedge_retry = bool(config.hedge_retry) if config is not None else False
+    fetch_rules = config is not None and getattr(config, "fetch_mode", "groups") == "rules"
+
+    def scan_region(attempt: _RegionAttempt) -> list[dict[str, str]]:
+        with (
+            METRICS.timer("neko_sg_region_scan_seconds", region=attempt.region),
+            TRACER.span(
+                "region", parent=trace_parent, region=attempt.region, hedge=attempt.is_hedge
+            ),
+        ):
+            found = _scan_region(attempt)
+            TRACER.annotate(findings=len(found), cancelled=attempt.cancel.is_set())
+            return found
+
+    def _scan_region(attempt: _RegionAttempt) -> list[dict[str, str]]:
+        region = attempt.region
+        attempt.started = time.monotonic()
         logger.info("リージョン %s を検索中...", region)
-        found = []
-        for sg in get_security_groups(region, config):
-            if has_unexcluded_global_access(sg, exclusion_rules):
-                group_info = {
-                    "region": region,
-                    "group_id": sg["GroupId"],
-                    "group_name": sg["GroupName"],
-                    "description": sg.get("Description", ""),
-                }
-                logger.info(
-                    "グローバルアクセス可能なSG発見: %s in %s", group_info["group_id"], region
-                )
-                found.append(group_info)
-        return found
+        client = clients.get(region) if clients is not None and not attempt.is_hedge else None
+        if fetch_rules:
+            for rule in get_security_group_rules(region, config, client=client):
+                if attempt.cancel.is_set():
+                    break
+                group_info = evaluate_security_group_rule(rule, region, exclusion_index, policies)
+                if group_info is not None:
+                    attempt.found.append(group_info)
+            _fill_group_names(region, attempt.found, config, client)
+            return attempt.found
+        try:
+            for sg in get_security_groups(region, config, client=client):
+                if attempt.cancel.is_set():
+                    break
+                if inventory is not None:
+                    attempt.groups.append(sg)
+                group_info = evaluate_security_group(sg, region, exclusion_index, policies)
+                if group_info is not None:
+                    attempt.found.append(group_info)
+        except PartialFetchError as e:
+            logger.warning("%s（取得できた分のみ評価します）", e)
+            attempt.partial = True
+        return attempt.found
 
     # ThreadPoolExecutorを使用してリージョンごとのスキャンを並列化
-    max_workers = min(len(regions), 10) if regions else 1
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(scan_region, region): region for region in regions}
-        for future in futures:
-            region = futures[future]
-            try:
-                results = future.result()
+    owns_executors = executor is None
+    if executor is None:
+        max_workers = min(len(regions), 10) if regions else 1
+        # スレッド名はプロファイルやトレースでワーカーを見分けるために付ける
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="neko-sg-region")
+        # 再試行は応答のないスレッドに塞がれないよう別のスレッドプールで実行する
+        hedge_executor = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="neko-sg-hedge")
+            if hedge_retry
+            else None
+        )
+    start = time.monotonic()
+    global_deadline = start + scan_deadline if scan_deadline > 0 else None
+    pending: dict[Future[list[dict[str, str]]], _RegionAttempt] = {}
+
+    def submit(attempt: _RegionAttempt) -> None:
+        pool = hedge_executor if attempt.is_hedge and hedge_executor else executor
+        pending[pool.submit(scan_region, attempt)] = attempt
+
+    def abandon(region: str) -> list[_RegionAttempt]:
+        """リージョンの全試行を打ち切り、保留中の一覧から取り除く"""
+        attempts = []
+        for future, attempt in list(pending.items()):
+            if attempt.region == region:
+                attempt.cancel.set()
+                future.cancel()
+                del pending[future]
+                attempts.append(attempt)
+        return attempts
+
+    def give_up(region: str) -> list[dict[str, str]]:
+        """リージョンを打ち切り、最も進んでいた試行の途中結果を返す"""
+        attempts = abandon(region)
+        if not any(attempt.started is not None for attempt in attempts):
+            report.skipped.append(region)
+            return []
+        report.incomplete.append(region)
+        return list(max(attempts, key=lambda attempt: len(attempt.found)).found)
+
+    try:
+        for region in regions:
+            if checkpoint is not None and checkpoint.is_completed(region):
+                logger.info("リージョン %s はチェックポイントから再開します。", region)
+                report.completed.append(region)
+                yield from checkpoint.completed[region]
+                continue
+            submit(_RegionAttempt(region))
+
+        while pending:
+            timeouts = []
+            if global_deadline is not None:
+                timeouts.append(global_deadline)
+            if region_deadline > 0:
+                timeouts.extend(
+                    attempt.started + region_deadline
+                    for attempt in pending.values()
+                    if attempt.started is not None and not attempt.timed_out
+                )
+            timeout: float | None = None
+            if timeouts:
+                timeout = max(0.0, min(timeouts) - time.monotonic())
+            if region_deadline > 0:
+                # 待機中に開始したリージョンの期限も確認できるよう待機時間に上限を設ける
+                timeout = region_deadline if timeout is None else min(timeout, region_deadline)
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future not in pending:
+                    continue
+                attempt = pending[future]
+                abandon(attempt.region)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logger.error(
+                        "リージョン %s のスキャン中にエラーが発生しました: %s", attempt.region, e
+                    )
+                    report.failed.append(attempt.region)
+                    continue
+                if attempt.partial:
+                    # 一部のVPCを取得できなかったリージョンは、完了として記録・保存しない
+                    report.incomplete.append(attempt.region)
+                    yield from results
+                    continue
+                if attempt.is_hedge:
+                    logger.info("リージョン %s は再試行で完了しました。", attempt.region)
+                report.completed.append(attempt.region)
+                if checkpoint is not None:
+                    checkpoint.record(attempt.region, results)
+                if inventory is not None and not fetch_rules:
+                    inventory.replace_region(attempt.region, attempt.groups)
                 yield from results
-            except Exception as e:
-                logger.error("リージョン %s のスキャン中にエラーが発生しました: %s", region, e)
+
+            now = time.monotonic()
+            if global_deadline is not None and now >= global_deadline:
+                logger.warning("スキャン全体の期限（%s秒）に達しました。", scan_deadline)
+                for region in sorted({attempt.region for attempt in pending.values()}):
+                    yield from give_up(region)
+                break
+
+            if region_deadline <= 0:
+                continue
+            for attempt in list(pending.values()):
+                if (
+                    attempt.timed_out
+                    or attempt.started is None
+                    or now < attempt.started + region_deadline
+                ):
+                    continue
+                attempt.timed_out = True
+                if hedge_retry and not attempt.is_hedge:
+                    logger.warning(
+                        "リージョン %s が期限（%s秒）内に完了しないため再試行します。",
+                        attempt.region,
+                        region_deadline,
+                    )
+                    submit(_RegionAttempt(attempt.region, is_hedge=True))
+                elif all(
+                    other.timed_out for other in pending.values() if other.region == attempt.region
+                ):
+                    logger.warning(
+                        "リージョン %s が期限（%s秒）内に完了しないため打ち切ります。",
+                        attempt.region,
+                        region_deadline,
+                    )
+                    yield from give_up(attempt.region)
+    finally:
+        for future, attempt in pending.items():
+            attempt.cancel.set()
+            future.cancel()
+        if owns_executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if hedge_executor is not None:
+                hedge_executor.shutdown(wait=False, cancel_futures=True)
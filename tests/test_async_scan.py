@@ -0,0 +1,187 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from src.async_scan import find_globally_accessible_security_groups_async, run_async_scan
+from src.config import Config
+from src.utils import ScanReport, find_globally_accessible_security_groups
+
+INVENTORY = {
+    "us-east-1": [
+        [
+            {
+                "GroupId": "sg-1",
+                "GroupName": "open-sg",
+                "Description": "Open to world",
+                "IpPermissions": [{"IpRanges": [{"CidrIp": "0.0.0.0/0"}], "Ipv6Ranges": []}],
+            },
+        ],
+        [{"GroupId": "sg-2", "GroupName": "private-sg", "IpPermissions": []}],
+    ],
+    "eu-west-1": [
+        [
+            {
+                "GroupId": "sg-3",
+                "GroupName": "v6-sg",
+                "IpPermissions": [{"IpRanges": [], "Ipv6Ranges": [{"CidrIpv6": "::/0"}]}],
+            }
+        ]
+    ],
+}
+
+class FakePaginator:
+    def __init__(self, pages, delay):
+        self.pages = pages
+        self.delay = delay
+
+    async def _iterate(self):
+        for index, page in enumerate(self.pages):
+            await asyncio.sleep(self.delay)
+            response = {"SecurityGroups": page}
+            if index < len(self.pages) - 1:
+                response["NextToken"] = str(index + 1)
+            yield response
+
+    def paginate(self):
+        return self._iterate()
+
+class FakeClient:
+    def __init__(self, region, delays):
+        self.region = region
+        self.delays = delays
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def get_paginator(self, name):
+        assert name == "describe_security_groups"
+        return FakePaginator(INVENTORY[self.region], self.delays.get(self.region, 0))
+
+class FakeSession:
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.regions = []
+
+    def create_client(self, service, region_name, config=None):
+        self.regions.append(region_name)
+        return FakeClient(region_name, self.delays)
+
+@mock.patch("src.async_scan.get_all_regions", return_value=["us-east-1", "eu-west-1"])
+def test_async_scan_matches_threaded(mock_regions):
+    session = FakeSession()
+    results = asyncio.run(find_globally_accessible_security_groups_async([], session=session))
+    assert sorted(session.regions) == ["eu-west-1", "us-east-1"]
+
+    def get_groups(region, config=None, client=None):
+        for page in INVENTORY[region]:
+            yield from page
+
+    with mock.patch("src.utils.get_all_regions", return_value=["us-east-1", "eu-west-1"]), \
+         mock.patch("src.utils.get_security_groups", side_effect=get_groups):
+        threaded = list(find_globally_accessible_security_groups([]))
+
+    def key(r):
+        return r["group_id"]
+
+    assert sorted(results, key=key) == sorted(threaded, key=key)
+
+@mock.patch("src.async_scan.get_all_regions", return_value=["us-east-1", "eu-west-1"])
+def test_async_scan_region_deadline(mock_regions):
+    session = FakeSession(delays={"us-east-1": 0.3})
+    report = ScanReport()
+    results = asyncio.run(find_globally_accessible_security_groups_async(
+        [], Config(region_deadline=0.1), report=report, session=session
+    ))
+    assert [r["group_id"] for r in results] == ["sg-3"]
+    assert report.completed == ["eu-west-1"]
+    assert report.incomplete == ["us-east-1"]
+
+@mock.patch("src.async_scan.get_all_regions", return_value=["us-east-1", "eu-west-1"])
+def test_async_scan_checkpoint(mock_regions):
+    checkpoint = mock.Mock()
+    checkpoint.is_completed.side_effect = lambda region: region == "us-east-1"
+    checkpoint.completed = {"us-east-1": [{"region": "us-east-1", "group_id": "sg-old", "group_name": "old"}]}
+    session = FakeSession()
+
+    results = asyncio.run(find_globally_accessible_security_groups_async(
+        [], checkpoint=checkpoint, session=session
+    ))
+    assert session.regions == ["eu-west-1"]
+    assert sorted(r["group_id"] for r in results) == ["sg-3", "sg-old"]
+    checkpoint.record.assert_called_once()
+
+@mock.patch("src.async_scan.AIOBOTOCORE_AVAILABLE", False)
+@mock.patch("src.async_scan.get_all_regions", return_value=["us-east-1"])
+def test_run_async_scan_requires_aiobotocore(mock_regions):
+    with pytest.raises(RuntimeError):
+        run_async_scan([])
+
+@mock.patch.dict(INVENTORY, {"ap-northeast-1": [
+    [{"GroupId": "sg-4", "GroupName": "private-a", "IpPermissions": []}],
+    [{"GroupId": "sg-5", "GroupName": "private-b", "IpPermissions": []}],
+]})
+@mock.patch("src.async_scan.get_all_regions", return_value=["ap-northeast-1"])
+def test_async_scan_deadline_marks_fetched_region_incomplete(mock_regions):
+    """検出結果が無くてもページを取得済みのリージョンは未完了として扱うこと"""
+    session = FakeSession(delays={"ap-northeast-1": 0.2})
+    report = ScanReport()
+    results = asyncio.run(find_globally_accessible_security_groups_async(
+        [], Config(scan_deadline=0.3), report=report, session=session
+    ))
+    assert results == []
+    assert report.incomplete == ["ap-northeast-1"]
+    assert report.skipped == []
+
+@mock.patch.dict(INVENTORY, {
+    "ap-northeast-1": [[{"GroupId": "sg-4", "GroupName": "a", "IpPermissions": []}]],
+    "ap-southeast-1": [[{"GroupId": "sg-5", "GroupName": "b", "IpPermissions": []}]],
+})
+@mock.patch("src.async_scan.get_all_regions", return_value=["ap-northeast-1", "ap-southeast-1"])
+def test_async_scan_region_deadline_excludes_queueing(mock_regions):
+    """セマフォの待機時間はリージョンの期限に含めないこと"""
+    session = FakeSession(delays={"ap-northeast-1": 0.2, "ap-southeast-1": 0.2})
+    report = ScanReport()
+    asyncio.run(find_globally_accessible_security_groups_async(
+        [], Config(region_deadline=0.3, async_max_concurrency=1), report=report, session=session
+    ))
+    assert sorted(report.completed) == ["ap-northeast-1", "ap-southeast-1"]
+    assert report.incomplete == []
+
+@mock.patch("src.async_scan.get_all_regions", return_value=["us-east-1"])
+def test_async_scan_api_error_matches_threaded(mock_regions):
+    """APIエラーはスレッドプール版と同じく、それまでの検出結果を返してリージョンを完了とすること"""
+    from botocore.exceptions import ClientError
+
+    error = ClientError({"Error": {"Code": "RequestLimitExceeded"}}, "DescribeSecurityGroups")
+
+    class FailingPaginator(FakePaginator):
+        async def _iterate(self):
+            yield {"SecurityGroups": self.pages[0], "NextToken": "1"}
+            raise error
+
+    session = FakeSession()
+    with mock.patch(f"{__name__}.FakePaginator", FailingPaginator):
+        report = ScanReport()
+        results = asyncio.run(find_globally_accessible_security_groups_async(
+            [], report=report, session=session
+        ))
+
+    threaded_report = ScanReport()
+    client = mock.Mock()
+
+    def pages(**kwargs):
+        yield {"SecurityGroups": INVENTORY["us-east-1"][0]}
+        raise error
+
+    client.get_paginator.return_value.paginate.side_effect = pages
+    with mock.patch("src.utils.get_all_regions", return_value=["us-east-1"]), \
+         mock.patch("src.utils._create_ec2_client", return_value=client):
+        threaded = list(find_globally_accessible_security_groups([], report=threaded_report))
+
+    assert [r["group_id"] for r in results] == [r["group_id"] for r in threaded] == ["sg-1"]
+    assert report.completed == threaded_report.completed == ["us-east-1"]
+    assert report.failed == threaded_report.failed == []
@@ -0,0 +1,80 @@
+import json
+from unittest import mock
+
+import pytest
+
+from src.bench import (
+    BenchProfile,
+    PhaseResult,
+    StubClientPool,
+    bench_command,
+    find_regressions,
+    generate_exclusion_rules,
+    generate_inventory,
+    local_webhook,
+    run_benchmark,
+    save_baseline,
+)
+from src.utils import get_security_groups, send_slack_notification
+
+SMALL = BenchProfile(regions=2, groups=60, rules=3, exclusions=5, global_ratio=0.3, page_size=25)
+
+def test_generate_inventory_is_deterministic():
+    inventory = generate_inventory(SMALL)
+    assert list(inventory) == ["bench-1", "bench-2"]
+    assert sum(len(groups) for groups in inventory.values()) == 60
+    assert all(len(sg["IpPermissions"]) == 3 for sg in inventory["bench-1"])
+    assert inventory == generate_inventory(SMALL)
+    rules = generate_exclusion_rules(inventory, SMALL)
+    assert len(rules) == 5
+    assert all(rule["rules"][0]["ip_address"] in ("0.0.0.0/0", "::/0") for rule in rules)
+
+def test_stubbed_client_pages_and_throttles():
+    profile = BenchProfile(regions=1, groups=60, page_size=25, throttle_rate=1.0)
+    inventory = generate_inventory(profile)
+    pool = StubClientPool(inventory, profile)
+    client = pool.get("bench-1")
+    with mock.patch("src.bench.time.sleep") as mock_sleep:
+        pages = list(client.get_paginator("describe_security_groups").paginate())
+    assert [len(page["SecurityGroups"]) for page in pages] == [25, 25, 10]
+    assert all(page["ResponseMetadata"]["RetryAttempts"] == 4 for page in pages)
+    # スロットリングされた呼び出しごとにバックオフ分の待機が入る
+    assert mock_sleep.call_count == 3
+
+def test_stubbed_client_serves_scanner():
+    inventory = generate_inventory(SMALL)
+    pool = StubClientPool(inventory, SMALL)
+    groups = list(get_security_groups("bench-1", client=pool.get("bench-1")))
+    assert [sg["GroupId"] for sg in groups] == [sg["GroupId"] for sg in inventory["bench-1"]]
+
+def test_local_webhook():
+    with local_webhook() as url:
+        assert send_slack_notification(url, "hello")
+
+def test_run_benchmark_reports_each_phase():
+    results = run_benchmark(SMALL, repeat=1)
+    assert [result.phase for result in results] == ["fetch", "evaluate", "scan", "notify"]
+    assert results[0].items == 60
+    assert all(result.rate >= 0 and result.seconds > 0 for result in results)
+
+def test_find_regressions(tmp_path):
+    path = tmp_path / "baseline.json"
+    baseline_results = [PhaseResult("fetch", 10, 1.0, 10.0, 100.0)]
+    save_baseline(str(path), SMALL, baseline_results)
+    baseline = json.loads(path.read_text())
+    assert find_regressions(baseline, SMALL, [PhaseResult("fetch", 10, 1.0, 10.0, 80.0)]) == []
+    regressions = find_regressions(baseline, SMALL, [PhaseResult("fetch", 10, 1.0, 10.0, 50.0)])
+    assert len(regressions) == 1 and regressions[0].startswith("fetch")
+    with pytest.raises(ValueError):
+        find_regressions(baseline, BenchProfile(), baseline_results)
+
+    # 処理時間が短すぎる段階は揺らぎが大きいため比較しない
+    save_baseline(str(path), SMALL, [PhaseResult("notify", 10, 0.003, 3333.0, 100.0)])
+    baseline = json.loads(path.read_text())
+    assert find_regressions(baseline, SMALL, [PhaseResult("notify", 10, 0.01, 1000.0, 30.0)]) == []
+
+def test_bench_command_check(tmp_path, capsys):
+    path = str(tmp_path / "baseline.json")
+    assert bench_command(SMALL, repeat=1, baseline_path=path, check=True) == 1
+    assert bench_command(SMALL, repeat=1, baseline_path=path, save=True, check=True) == 0
+    assert "性能低下はありません" in capsys.readouterr().out
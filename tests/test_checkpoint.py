@@ -0,0 +1,76 @@
+import json
+from unittest import mock
+
+from src.checkpoint import Checkpoint, load_checkpoint
+
+
+def test_checkpoint_record_and_resume(tmp_path):
+    path = tmp_path / "state" / "checkpoint.jsonl"
+    findings = [{"region": "us-east-1", "group_id": "sg-1", "group_name": "web"}]
+
+    with Checkpoint(str(path), "111111111111") as checkpoint:
+        checkpoint.record("us-east-1", findings)
+        checkpoint.record("us-west-2", [])
+
+    loaded = load_checkpoint(str(path))
+    assert loaded["111111111111"]["us-east-1"] == findings
+    assert loaded["111111111111"]["us-west-2"] == []
+
+    resumed = Checkpoint(str(path), "111111111111", resume=True)
+    assert resumed.is_completed("us-east-1")
+    assert not resumed.is_completed("eu-west-1")
+    resumed.record("eu-west-1", [])
+    resumed.close()
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+
+    # 別アカウントの記録は再開対象にしない
+    other = Checkpoint(str(path), "222222222222", resume=True)
+    assert other.completed == {}
+    other.close()
+
+def test_checkpoint_new_scan_truncates(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text(json.dumps({"account": "a", "region": "r", "findings": []}) + "\n")
+    Checkpoint(str(path), "a").close()
+    assert load_checkpoint(str(path)) == {}
+
+def test_checkpoint_fsync_batched(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    with mock.patch("src.checkpoint.os.fsync") as mock_fsync:
+        checkpoint = Checkpoint(str(path), "a", fsync_every=3, fsync_interval=3600)
+        checkpoint.record("r1", [])
+        checkpoint.record("r2", [])
+        assert mock_fsync.call_count == 0
+        checkpoint.record("r3", [])
+        assert mock_fsync.call_count == 1
+        checkpoint.record("r4", [])
+        checkpoint.close()
+        assert mock_fsync.call_count == 2
+
+def test_load_checkpoint_ignores_truncated_line(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text(
+        json.dumps({"account": "a", "region": "r1", "findings": []}) + "\n" + '{"account": "a", "reg',
+        encoding="utf-8",
+    )
+    assert load_checkpoint(str(path)) == {"a": {"r1": []}}
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == {}
+
+    # 再開後の記録が途中の行に続けて書き込まれず、再読み込みで失われないこと
+    with Checkpoint(str(path), "a", resume=True) as checkpoint:
+        checkpoint.record("r2", [])
+    assert load_checkpoint(str(path)) == {"a": {"r1": [], "r2": []}}
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 2
+
+    # 改行を1つも含まない場合は空にしてから追記する
+    path.write_text('{"account": "a", "reg', encoding="utf-8")
+    with Checkpoint(str(path), "a", resume=True) as checkpoint:
+        checkpoint.record("r3", [])
+    assert load_checkpoint(str(path)) == {"a": {"r3": []}}
+
+def test_checkpoint_discard(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = Checkpoint(str(path), "a")
+    checkpoint.record("r1", [])
+    checkpoint.discard()
+    assert not path.exists()
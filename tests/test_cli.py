@@ -2,6 +2,7 @@ import pytest
 from unittest import mock
 import os
 import yaml
+from src.config import Config
 from src.cli import (
     create_exclusion_rule_entry,
     find_security_group,
@@ -9,6 +10,8 @@ from src.cli import (
     save_exclusion_rules,
     add_exclusion_command,
     parse_args,
+    parse_duration,
+    prune_exclusions_command,
 )
 
 def test_create_exclusion_rule_entry():
@@ -38,15 +41,18 @@ def test_create_exclusion_rule_entry():
     assert entry_with_info["rules"][0]["ip_address"] == "0.0.0.0/0"
     assert entry_with_info["rules"][1]["ip_address"] == "::/0"
 
-@mock.patch("src.cli.get_all_regions")
-@mock.patch("src.cli.get_security_groups")
-def test_find_security_group(mock_get_groups, mock_get_regions):
+@mock.patch("src.cli.Config.from_env", return_value=Config())
+@mock.patch("src.scanner.get_all_regions")
+@mock.patch("src.scanner.get_security_groups")
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_find_security_group(mock_client, mock_get_groups, mock_get_regions, mock_config):
     mock_get_regions.return_value = ["us-east-1", "us-west-2"]
     
-    def get_groups_mock(region, config=None):
+    def get_groups_mock(region, config=None, client=None, group_ids=None):
+        groups = [{"GroupId": "sg-other", "GroupName": "other-sg"}]
         if region == "us-west-2":
-            return [{"GroupId": "sg-target", "GroupName": "target-sg"}]
-        return [{"GroupId": "sg-other", "GroupName": "other-sg"}]
+            groups.append({"GroupId": "sg-target", "GroupName": "target-sg"})
+        return [sg for sg in groups if sg["GroupId"] in group_ids]
 
     mock_get_groups.side_effect = get_groups_mock
 
@@ -107,6 +113,12 @@ def test_add_exclusion_command(mock_find, mock_save, mock_load, mock_config):
 def test_parse_args():
     args = parse_args(["scan"])
     assert args.command == "scan"
+    assert not args.resume
+    assert args.checkpoint is None
+
+    args = parse_args(["scan", "--checkpoint", "/tmp/cp.jsonl", "--resume"])
+    assert args.resume
+    assert args.checkpoint == "/tmp/cp.jsonl"
 
     args = parse_args(["exclude", "sg-123"])
     assert args.command == "exclude"
@@ -115,3 +127,127 @@ def test_parse_args():
 
     args = parse_args(["exclude", "sg-123", "--no-auto-detect"])
     assert args.no_auto_detect
+
+    args = parse_args(["serve", "--interval", "600", "--jitter", "30"])
+    assert args.command == "serve"
+    assert args.interval == 600
+    assert args.jitter == 30
+
+    args = parse_args(["daemon"])
+    assert args.interval is None
+
+def test_parse_args_watch():
+    """watchサブコマンドの解析"""
+    args = parse_args(["watch", "--events", "events.jsonl", "--initial-scan"])
+    assert args.command == "watch"
+    assert args.events == "events.jsonl"
+    assert args.initial_scan
+
+    args = parse_args(["watch"])
+    assert args.events is None
+    assert not args.initial_scan
+
+def test_parse_args_shard_and_merge():
+    """scan --shard と merge サブコマンドの解析"""
+    args = parse_args(["scan", "--shard", "2/4", "--shard-output", "out.json"])
+    assert args.shard == (2, 4)
+    assert args.shard_output == "out.json"
+
+    with pytest.raises(SystemExit):
+        parse_args(["scan", "--shard", "5/4"])
+
+    args = parse_args(["merge", "a.json", "b.json"])
+    assert args.command == "merge"
+    assert args.files == ["a.json", "b.json"]
+
+def test_parse_args_output():
+    """scan --output の解析"""
+    args = parse_args(["scan", "--output", "sarif", "--output-file", "out.sarif"])
+    assert args.output == "sarif"
+    assert args.output_file == "out.sarif"
+
+    with pytest.raises(SystemExit):
+        parse_args(["scan", "--output", "xml"])
+
+def test_parse_args_query():
+    """query サブコマンドの解析"""
+    args = parse_args(["query", "region=eu-west-1", "port=5432", "--store", "db.sqlite", "--json"])
+    assert args.command == "query"
+    assert args.filters == ["region=eu-west-1", "port=5432"]
+    assert args.store == "db.sqlite"
+    assert args.json
+
+def test_parse_args_diff():
+    """diff サブコマンドの解析"""
+    args = parse_args(["diff"])
+    assert (args.old, args.new) == ("previous", "latest")
+    args = parse_args(["diff", "old.jsonl", "new.jsonl", "--json"])
+    assert (args.old, args.new) == ("old.jsonl", "new.jsonl")
+    assert args.json
+
+def test_parse_args_history():
+    """history サブコマンドの解析"""
+    args = parse_args(["history"])
+    assert args.action == "list"
+    args = parse_args(["history", "export", "42", "out.jsonl", "--dir", "/tmp/h"])
+    assert (args.action, args.ref, args.path, args.dir) == ("export", "42", "out.jsonl", "/tmp/h")
+
+def test_parse_args_profile():
+    """scan --profile の解析"""
+    args = parse_args(["scan", "--profile", "scan.folded", "--profile-interval", "2"])
+    assert args.profile == "scan.folded"
+    assert args.profile_interval == 2.0
+    assert parse_args(["scan"]).profile is None
+
+@mock.patch("src.remediate.remediate_command", return_value=0)
+def test_parse_args_remediate(mock_remediate):
+    """remediate サブコマンドの解析"""
+    args = parse_args(["remediate", "--input", "findings.jsonl", "--dry-run"])
+    assert args.func(args) == 0
+    mock_remediate.assert_called_once_with(
+        input_path="findings.jsonl",
+        dry_run=True,
+        rollback_file=None,
+        rollback_from=None,
+        region_concurrency=4,
+    )
+
+def test_parse_duration():
+    assert parse_duration("7d") == 604800
+    assert parse_duration("12h") == 43200
+    assert parse_duration("90") == 90
+    with pytest.raises(SystemExit):
+        parse_args(["exclude", "sg-123", "--ttl", "soon"])
+    assert parse_args(["exclude", "sg-123", "--ttl", "30m"]).ttl == 1800
+
+@mock.patch("src.cli.find_security_group", return_value=None)
+def test_add_exclusion_command_ttl(mock_find, tmp_path, monkeypatch):
+    """--ttl で期限付きの除外ルールを追加し、既存の除外ルールは期限を更新する"""
+    rules_file = tmp_path / "rules.yaml"
+    monkeypatch.setenv("EXCLUSION_RULES_FILE", str(rules_file))
+    with mock.patch("src.cli.time.time", return_value=0):
+        assert add_exclusion_command("sg-123", auto_detect=False, ttl=3600) == 0
+    assert yaml.safe_load(rules_file.read_text())[0]["expires_at"] == "1970-01-01T01:00:00Z"
+    with mock.patch("src.cli.time.time", return_value=86400):
+        assert add_exclusion_command("sg-123", auto_detect=False, ttl=60) == 0
+    rules = yaml.safe_load(rules_file.read_text())
+    assert len(rules) == 1
+    assert rules[0]["expires_at"] == "1970-01-02T00:01:00Z"
+
+def test_prune_exclusions_command(tmp_path, monkeypatch):
+    """期限切れの除外ルールを取り除き、ファイルを一時ファイル経由で置き換える"""
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        "- security_group_id: sg-old\n  expires_at: 2000-01-01T00:00:00Z\n  rules: []\n"
+        "- security_group_id: sg-keep\n  rules: []\n",
+        encoding="utf-8",
+    )
+    os.chmod(rules_file, 0o640)
+    monkeypatch.setenv("EXCLUSION_RULES_FILE", str(rules_file))
+
+    assert prune_exclusions_command(dry_run=True) == 0
+    assert "sg-old" in rules_file.read_text()
+    assert prune_exclusions_command() == 0
+    assert [r["security_group_id"] for r in yaml.safe_load(rules_file.read_text())] == ["sg-keep"]
+    assert os.stat(rules_file).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["rules.yaml"]
@@ -9,8 +9,25 @@ def test_config_default():
     assert config.slack_channel == "#alerts"
     assert config.use_slack_sdk is False
     assert config.exclusion_rules_file == "../config/exclusion_rules.yaml"
+    assert config.policy_rules_file == "../config/policy_rules.yaml"
     assert config.log_level == "INFO"
     assert config.aws_timeout == 10
+    assert config.vpc_partitioning is False
+    assert config.vpc_max_workers == 4
+    assert config.scan_deadline == 0.0
+    assert config.region_deadline == 0.0
+    assert config.hedge_retry is False
+    assert config.regions == []
+    assert config.excluded_regions == []
+    assert config.region_source == "api"
+    assert config.region_cache_file == "~/.cache/neko_sg/regions.json"
+    assert config.region_cache_ttl == 86400
+    assert config.checkpoint_file == ""
+    assert config.scan_engine == "thread"
+    assert config.async_max_concurrency == 50
+    assert config.serve_interval == 3600
+    assert config.serve_jitter == 300
+    assert config.fetch_mode == "groups"
 
 @mock.patch.dict(os.environ, {
     "SLACK_WEBHOOK_URL": "http://example.com/webhook",
@@ -18,8 +35,22 @@ def test_config_default():
     "SLACK_CHANNEL": "#general",
     "USE_SLACK_SDK": "true",
     "EXCLUSION_RULES_FILE": "/path/to/rules.yaml",
+    "POLICY_RULES_FILE": "/path/to/policies.yaml",
     "LOG_LEVEL": "DEBUG",
     "AWS_TIMEOUT": "20",
+    "VPC_PARTITIONING": "true",
+    "VPC_MAX_WORKERS": "8",
+    "SCAN_DEADLINE": "300",
+    "REGION_DEADLINE": "60.5",
+    "HEDGE_RETRY": "true",
+    "AWS_REGIONS": "us-east-1, ap-northeast-1",
+    "EXCLUDED_REGIONS": "me-south-1",
+    "REGION_SOURCE": "static",
+    "REGION_CACHE_FILE": "/tmp/regions.json",
+    "REGION_CACHE_TTL": "0",
+    "SCAN_ENGINE": "async",
+    "ASYNC_MAX_CONCURRENCY": "200",
+    "FETCH_MODE": "Rules",
 })
 def test_config_from_env():
     config = Config.from_env()
@@ -28,8 +59,22 @@ def test_config_from_env():
     assert config.slack_channel == "#general"
     assert config.use_slack_sdk is True
     assert config.exclusion_rules_file == "/path/to/rules.yaml"
+    assert config.policy_rules_file == "/path/to/policies.yaml"
     assert config.log_level == "DEBUG"
     assert config.aws_timeout == 20
+    assert config.vpc_partitioning is True
+    assert config.vpc_max_workers == 8
+    assert config.scan_deadline == 300.0
+    assert config.region_deadline == 60.5
+    assert config.hedge_retry is True
+    assert config.regions == ["us-east-1", "ap-northeast-1"]
+    assert config.excluded_regions == ["me-south-1"]
+    assert config.region_source == "static"
+    assert config.region_cache_file == "/tmp/regions.json"
+    assert config.region_cache_ttl == 0
+    assert config.scan_engine == "async"
+    assert config.async_max_concurrency == 200
+    assert config.fetch_mode == "rules"
 
 def test_get_exclusion_rules_path():
     config = Config(exclusion_rules_file="rules.yaml")
@@ -38,6 +83,13 @@ def test_get_exclusion_rules_path():
     config_abs = Config(exclusion_rules_file="/absolute/rules.yaml")
     assert config_abs.get_exclusion_rules_path("/app") == "/absolute/rules.yaml"
 
+def test_get_policy_rules_path():
+    config = Config(policy_rules_file="policies.yaml")
+    assert config.get_policy_rules_path("/app") == "/app/policies.yaml"
+
+    config_abs = Config(policy_rules_file="/absolute/policies.yaml")
+    assert config_abs.get_policy_rules_path("/app") == "/absolute/policies.yaml"
+
 def test_get_aws_config():
     config = Config(aws_timeout=15)
     aws_config = config.get_aws_config()
@@ -0,0 +1,135 @@
+import threading
+from unittest import mock
+
+from src.config import Config
+from src.daemon import Daemon
+from src.outbox import open_worker
+
+OPEN_SG = {
+    "GroupId": "sg-1",
+    "GroupName": "open",
+    "IpPermissions": [
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+    ],
+}
+
+def _make_daemon(tmp_path, interval=3600, jitter=0):
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text("[]", encoding="utf-8")
+    config = Config(
+        exclusion_rules_file=str(rules_file),
+        policy_rules_file=str(tmp_path / "policies.yaml"),
+        regions=["us-east-1"],
+    )
+    return Daemon(config, str(tmp_path), interval=interval, jitter=jitter), rules_file
+
+@mock.patch("src.daemon.send_slack_notification_if_configured")
+@mock.patch("src.utils.get_security_groups")
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_daemon_run_once_keeps_warm_state(mock_client, mock_get_groups, mock_send, tmp_path):
+    mock_get_groups.side_effect = lambda region, config=None, client=None: iter([OPEN_SG])
+    daemon, rules_file = _make_daemon(tmp_path)
+
+    found = daemon.run_once()
+    assert [f["group_id"] for f in found] == ["sg-1"]
+    mock_send.assert_called_once()
+    # 保持しているクライアントと在庫が使われる
+    assert mock_get_groups.call_args.kwargs["client"] is mock.sentinel.client
+    assert daemon.inventory.get("us-east-1", "sg-1") == OPEN_SG
+
+    # 除外ルールファイルの変更を検知して再読み込みする
+    assert not daemon.reload_if_changed()
+    rules_file.write_text(
+        "- security_group_id: sg-1\n  rules:\n    - ip_address: 0.0.0.0/0\n      protocol: tcp\n"
+        "      port_range: {from: 22, to: 22}\n",
+        encoding="utf-8",
+    )
+    with mock.patch("src.daemon._mtime", return_value=12345.0):
+        found = daemon.run_once()
+    assert found == []
+    assert len(daemon.scanner.exclusion_index) == 1
+
+@mock.patch("src.daemon.send_slack_notification_if_configured")
+@mock.patch("src.utils.get_security_groups")
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_daemon_delivers_notifications_in_background(
+    mock_client, mock_get_groups, mock_send, tmp_path
+):
+    mock_get_groups.side_effect = lambda region, config=None, client=None: iter([OPEN_SG])
+    delivered = threading.Event()
+    log_file = tmp_path / "notifications.jsonl"
+    daemon, _ = _make_daemon(tmp_path)
+    daemon.config.outbox_file = str(tmp_path / "outbox.sqlite")
+    daemon.config.notify_sinks = [f"file:{log_file}"]
+    daemon.notifier = open_worker(daemon.config)
+    sink = daemon.notifier.sinks[f"file:{log_file}"]
+
+    def deliver(payload, key):
+        sink(payload, key)
+        delivered.set()
+
+    daemon.notifier.sinks[f"file:{log_file}"] = deliver
+    daemon.run_once()
+    assert delivered.wait(5)
+    mock_send.assert_not_called()
+    assert daemon.notifier.stop()
+    assert "sg-1" in log_file.read_text(encoding="utf-8")
+
+def test_daemon_next_delay_jitter(tmp_path):
+    daemon, _ = _make_daemon(tmp_path, interval=100, jitter=10)
+    delays = {daemon.next_delay() for _ in range(50)}
+    assert all(90 <= d <= 110 for d in delays)
+    assert len(delays) > 1
+
+def test_daemon_trigger_and_stop(tmp_path):
+    daemon, _ = _make_daemon(tmp_path, interval=3600)
+    runs = []
+
+    def run_once():
+        runs.append(1)
+        if len(runs) == 1:
+            # 長い待機中でも即時スキャンの要求で次のスキャンが始まる
+            threading.Timer(0.05, daemon.trigger).start()
+        else:
+            daemon.stop()
+        return []
+
+    with mock.patch.object(daemon, "run_once", side_effect=run_once):
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert len(runs) == 2
+
+def test_daemon_serve_forever_survives_errors(tmp_path):
+    daemon, _ = _make_daemon(tmp_path)
+    with mock.patch.object(daemon, "run_once", side_effect=RuntimeError("boom")):
+        daemon.serve_forever(max_runs=1)
+
+@mock.patch("src.daemon.send_slack_notification_if_configured")
+@mock.patch("src.scanner.get_security_groups", return_value=[OPEN_SG])
+@mock.patch("src.utils.get_security_groups")
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_daemon_expires_exclusions(
+    mock_client, mock_get_groups, mock_get_by_id, mock_send, tmp_path
+):
+    """除外ルールの期限が来たら該当するセキュリティグループだけを再評価して通知する"""
+    mock_get_groups.side_effect = lambda region, config=None, client=None: iter([OPEN_SG])
+    daemon, rules_file = _make_daemon(tmp_path)
+    rules_file.write_text(
+        "- security_group_id: sg-1\n  expires_at: 2100-01-01T00:00:00Z\n  rules:\n"
+        "    - ip_address: 0.0.0.0/0\n      protocol: tcp\n      port_range: {from: 22, to: 22}\n",
+        encoding="utf-8",
+    )
+    assert daemon.run_once() == []
+    assert daemon.seconds_until_expiry() > 0
+    assert daemon.expire_due() == []
+
+    # 期限を過ぎた時刻では、全体のスキャンを待たずに該当するグループを再評価する
+    with mock.patch("time.time", return_value=4200000000.0):
+        assert daemon.seconds_until_expiry() == 0
+        found = daemon.expire_due()
+    assert [f["group_id"] for f in found] == ["sg-1"]
+    assert mock_get_by_id.call_args.kwargs["group_ids"] == ["sg-1"]
+    mock_send.assert_called_once()
+    assert daemon.seconds_until_expiry() is None
@@ -0,0 +1,119 @@
+from unittest import mock
+
+import pytest
+
+from src.diff import diff_command, diff_snapshots, read_snapshot_file, write_snapshot_file
+from src.store import SnapshotStore
+from src.utils import ScanReport
+
+
+def _group(region, group_id, rules, name=None):
+    return {
+        "region": region,
+        "group_id": group_id,
+        "group_name": name or group_id,
+        "description": "",
+        "rules": rules,
+    }
+
+SSH = ["tcp", 22, 22, "0.0.0.0/0"]
+HTTPS = ["tcp", 443, 443, "0.0.0.0/0"]
+
+def test_diff_snapshots():
+    old = [
+        _group("eu-west-1", "sg-a", [SSH]),
+        _group("eu-west-1", "sg-b", [HTTPS]),
+        _group("us-east-1", "sg-c", [SSH, HTTPS]),
+    ]
+    new = [
+        _group("eu-west-1", "sg-b", [HTTPS]),
+        _group("eu-west-1", "sg-d", [SSH]),
+        _group("us-east-1", "sg-c", [HTTPS], name="renamed"),
+    ]
+    diffs = list(diff_snapshots(old, new))
+    assert [(d.status, d.group_id) for d in diffs] == [
+        ("removed", "sg-a"),
+        ("added", "sg-d"),
+        ("modified", "sg-c"),
+    ]
+    assert diffs[0].removed_rules == [SSH]
+    assert diffs[2].removed_rules == [SSH]
+    assert diffs[2].added_rules == []
+    assert diffs[2].changed_fields == ["group_name"]
+
+def test_diff_snapshots_streams_inputs():
+    """入力を1グループずつ読み進める（全体をメモリに読み込まない）"""
+    consumed = []
+
+    def groups(tag, count):
+        for i in range(count):
+            consumed.append(tag)
+            yield _group("us-east-1", f"sg-{i:08d}", [SSH] if tag == "old" or i % 2 else [HTTPS])
+
+    diffs = diff_snapshots(groups("old", 20000), groups("new", 20000))
+    first = next(diffs)
+    assert first.group_id == "sg-00000000"
+    assert len(consumed) == 2
+    assert sum(1 for _ in diffs) == 9999
+
+def test_diff_snapshots_rejects_unsorted_input():
+    unsorted = [_group("us-east-1", "sg-b", []), _group("us-east-1", "sg-a", [])]
+    with pytest.raises(ValueError):
+        list(diff_snapshots(unsorted, []))
+
+def _sg(group_id, permissions):
+    return {"GroupId": group_id, "GroupName": group_id, "IpPermissions": permissions}
+
+def test_store_iter_groups_and_diff_command(tmp_path, capsys):
+    path = str(tmp_path / "inventory.db")
+    with SnapshotStore(path) as store:
+        for groups in (
+            [_sg("sg-a", [{"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}])],
+            [_sg("sg-a", []), _sg("sg-b", [])],
+        ):
+            store.begin("123")
+            store.replace_region("us-east-1", groups)
+            store.commit(ScanReport())
+        latest = store.resolve("latest")
+        previous = store.resolve("previous")
+        assert [g["group_id"] for g in store.iter_groups(latest)] == ["sg-a", "sg-b"]
+        assert list(store.iter_groups(previous))[0]["rules"] == [["tcp", 22, 22, "0.0.0.0/0"]]
+        export = str(tmp_path / "previous.jsonl")
+        write_snapshot_file(export, store.iter_groups(previous))
+    assert [g["group_id"] for g in read_snapshot_file(export)] == ["sg-a"]
+
+    with mock.patch("src.diff.load_dotenv"):
+        assert diff_command("previous", "latest", path) == 0
+        out = capsys.readouterr().out
+        assert "~ us-east-1 sg-a" in out
+        assert "- tcp 22 0.0.0.0/0" in out
+        assert "+ us-east-1 sg-b" in out
+
+        # エクスポートしたファイルとストアのスナップショットを比較できる
+        assert diff_command(export, "latest", path, as_json=True) == 0
+        assert '"status": "added"' in capsys.readouterr().out
+
+        assert diff_command("42", "latest", path) == 1
+
+def test_diff_command_refuses_partial_snapshot(tmp_path, capsys):
+    """一部のリージョンが未完了のスナップショットとは比較しない"""
+    path = str(tmp_path / "inventory.db")
+    with SnapshotStore(path) as store:
+        store.begin("123")
+        store.replace_region("us-east-1", [_sg("sg-a", [])])
+        store.replace_region("eu-west-1", [_sg("sg-b", [])])
+        store.commit(ScanReport())
+        store.begin("123")
+        store.replace_region("us-east-1", [_sg("sg-a", [])])
+        store.commit(ScanReport(completed=["us-east-1"], incomplete=["eu-west-1"]))
+
+    with mock.patch("src.diff.load_dotenv"), mock.patch("src.store.load_dotenv"):
+        assert diff_command("previous", "latest", path) == 1
+        out = capsys.readouterr().out
+        assert "未完了" in out
+        assert "- eu-west-1 sg-b" not in out
+        # 未完了のスナップショットは diff 用のファイルにも書き出さない
+        from src.store import query_command
+
+        assert query_command([], path, export_path=str(tmp_path / "latest.jsonl")) == 1
+    assert not (tmp_path / "latest.jsonl").exists()
@@ -0,0 +1,123 @@
+import io
+import queue
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from src.events import EventProcessor, GroupChange, iter_queue, parse_event, read_events
+
+OPEN_SG = {
+    "GroupId": "sg-1",
+    "GroupName": "open",
+    "IpPermissions": [
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+    ],
+}
+CLOSED_SG = {
+    "GroupId": "sg-1",
+    "GroupName": "open",
+    "IpPermissions": [
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "10.0.0.0/8"}]}
+    ],
+}
+
+def test_parse_event_eventbridge_and_cloudtrail():
+    eventbridge = {
+        "region": "us-east-1",
+        "detail": {
+            "eventName": "AuthorizeSecurityGroupIngress",
+            "awsRegion": "us-east-1",
+            "requestParameters": {"groupId": "sg-1"},
+        },
+    }
+    assert parse_event(eventbridge) == GroupChange(
+        "us-east-1", "sg-1", "AuthorizeSecurityGroupIngress"
+    )
+
+    create = {
+        "eventName": "CreateSecurityGroup",
+        "awsRegion": "eu-west-1",
+        "responseElements": {"groupId": "sg-2"},
+    }
+    assert parse_event(create) == GroupChange("eu-west-1", "sg-2", "CreateSecurityGroup")
+
+    modify = {
+        "eventName": "ModifySecurityGroupRules",
+        "awsRegion": "eu-west-1",
+        "requestParameters": {"ModifySecurityGroupRulesRequest": {"GroupId": "sg-3"}},
+    }
+    assert parse_event(modify).group_id == "sg-3"
+
+    # 失敗したAPI呼び出しや無関係なイベントは無視する
+    failed = dict(create, errorCode="UnauthorizedOperation")
+    assert parse_event(failed) is None
+    assert parse_event({"eventName": "RunInstances", "awsRegion": "us-east-1"}) is None
+
+def test_read_events_and_iter_queue():
+    stream = io.StringIO('{"eventName": "A"}\n\nnot json\n{"eventName": "B"}\n')
+    assert [e["eventName"] for e in read_events(stream)] == ["A", "B"]
+
+    q = queue.Queue()
+    q.put({"eventName": "A"})
+    q.put(None)
+    assert list(iter_queue(q)) == [{"eventName": "A"}]
+
+def _processor(describe):
+    client = mock.Mock()
+    client.describe_security_groups.side_effect = describe
+    clients = mock.Mock()
+    clients.get.return_value = client
+    return EventProcessor([], clients=clients), client
+
+def _event(name, group_id="sg-1"):
+    return {
+        "eventName": name,
+        "awsRegion": "us-east-1",
+        "requestParameters": {"groupId": group_id},
+    }
+
+def test_event_processor_opened_and_resolved():
+    responses = iter([OPEN_SG, OPEN_SG, CLOSED_SG])
+    processor, client = _processor(lambda GroupIds: {"SecurityGroups": [next(responses)]})
+
+    changes = list(processor.process([_event("AuthorizeSecurityGroupIngress")]))
+    assert [c.status for c in changes] == ["opened"]
+    assert changes[0].finding["group_id"] == "sg-1"
+    client.describe_security_groups.assert_called_with(GroupIds=["sg-1"])
+
+    # 検出状態が変わらない場合は何も返さない
+    assert list(processor.process([_event("UpdateSecurityGroupRuleDescriptionsIngress")])) == []
+
+    changes = list(processor.process([_event("RevokeSecurityGroupIngress")]))
+    assert [c.status for c in changes] == ["resolved"]
+    assert processor.findings == {}
+    assert processor.inventory.get("us-east-1", "sg-1")["IpPermissions"] == CLOSED_SG["IpPermissions"]
+
+def test_event_processor_delete_and_not_found():
+    not_found = ClientError(
+        {"Error": {"Code": "InvalidGroup.NotFound", "Message": "x"}}, "DescribeSecurityGroups"
+    )
+    processor, client = _processor(not_found)
+    processor.inventory.upsert("us-east-1", OPEN_SG)
+    processor.prime()
+    assert ("us-east-1", "sg-1") in processor.findings
+
+    # 削除イベントはAPIを呼ばずに解消とする
+    changes = list(processor.process([_event("DeleteSecurityGroup")]))
+    assert [c.status for c in changes] == ["resolved"]
+    client.describe_security_groups.assert_not_called()
+    assert processor.inventory.get("us-east-1", "sg-1") is None
+
+    # 取得時に存在しない場合も在庫から削除する
+    processor.inventory.upsert("us-east-1", OPEN_SG)
+    processor.prime()
+    changes = list(processor.process([_event("AuthorizeSecurityGroupIngress")]))
+    assert [c.status for c in changes] == ["resolved"]
+
+def test_event_processor_fetch_error_keeps_state():
+    throttled = ClientError({"Error": {"Code": "Throttling", "Message": "x"}}, "DescribeSecurityGroups")
+    processor, _ = _processor(throttled)
+    processor.inventory.upsert("us-east-1", OPEN_SG)
+    processor.prime()
+    assert list(processor.process([_event("RevokeSecurityGroupIngress")])) == []
+    assert ("us-east-1", "sg-1") in processor.findings
@@ -0,0 +1,138 @@
+import os
+from unittest import mock
+
+from src.config import Config
+from src.history import KIND_DELTA, KIND_FULL, HistoryLog, history_command, record_snapshot
+from src.store import SnapshotStore
+from src.utils import ScanReport
+
+DAY = 86400
+
+def _group(region, group_id, rules, name=None):
+    return {
+        "region": region,
+        "group_id": group_id,
+        "group_name": name or group_id,
+        "description": "",
+        "rules": rules,
+    }
+
+def _inventory(count, changed=()):
+    groups = []
+    for i in range(count):
+        port = 8000 + i if i in changed else 22
+        groups.append(_group("eu-west-1", f"sg-{i:05d}", [["tcp", port, port, "0.0.0.0/0"]]))
+    return groups
+
+def test_append_writes_full_then_deltas(tmp_path):
+    history = HistoryLog(str(tmp_path), full_every=3)
+    history.append(_inventory(100), timestamp=1000)
+    history.append(_inventory(100, changed={5}), timestamp=2000)
+    history.append(_inventory(99, changed={5}), timestamp=3000)
+    history.append(_inventory(99), timestamp=4000)
+    assert [entry.kind for entry in history.entries] == [KIND_FULL, KIND_DELTA, KIND_DELTA, KIND_FULL]
+    # 差分には変更されたグループだけが含まれる
+    assert history._read_payload(history.entries[1]) == {
+        "upserted": [_inventory(100, changed={5})[5]],
+        "removed": [],
+    }
+    assert history._read_payload(history.entries[2]) == {
+        "upserted": [],
+        "removed": [["eu-west-1", "sg-00099"]],
+    }
+    assert history.entries[1].length < history.entries[0].length
+
+def test_reconstruct_any_point(tmp_path):
+    history = HistoryLog(str(tmp_path), full_every=10)
+    snapshots = [_inventory(50), _inventory(50, changed={1}), _inventory(48, changed={1, 2})]
+    for i, groups in enumerate(snapshots):
+        history.append(groups, timestamp=1000 * (i + 1))
+    for entry, groups in zip(history.entries, snapshots, strict=True):
+        assert history.reconstruct(entry) == groups
+    assert history.find("2") == history.entries[1]
+    assert history.find("latest") == history.entries[-1]
+    assert history.find("99") is None
+
+def test_index_is_recovered_from_log(tmp_path):
+    history = HistoryLog(str(tmp_path))
+    history.append(_inventory(10), timestamp=1000)
+    history.append(_inventory(10, changed={3}), timestamp=2000)
+    os.remove(tmp_path / "history.idx")
+    # 書き込み途中で中断した不完全なレコード
+    with open(tmp_path / "history.log", "ab") as file:
+        file.write(b"NSGH\x01")
+    reopened = HistoryLog(str(tmp_path))
+    assert reopened.entries == history.entries
+    assert reopened.reconstruct(reopened.entries[-1]) == _inventory(10, changed={3})
+
+def test_prune_drops_expired_segments(tmp_path):
+    history = HistoryLog(str(tmp_path), full_every=2)
+    for day in range(4):
+        history.append(_inventory(10, changed={day}), timestamp=day * DAY)
+    history.retention_days = 10
+    # 2番目の完全スナップショット（2日目）が保持期間の開始より古くなると先頭の区間を削除する
+    assert history.prune(now=11 * DAY) == 0
+    assert history.prune(now=12 * DAY) == 2
+    assert [entry.seq for entry in history.entries] == [3, 4]
+    assert history.reconstruct(history.entries[-1]) == _inventory(10, changed={3})
+    assert [entry.seq for entry in HistoryLog(str(tmp_path)).entries] == [3, 4]
+
+def test_compact_rebases_on_full_snapshot(tmp_path):
+    history = HistoryLog(str(tmp_path), full_every=10)
+    for day in range(4):
+        history.append(_inventory(10, changed={day}), timestamp=day * DAY)
+    history.retention_days = 10
+    assert history.compact(now=12 * DAY) == 2
+    assert [(entry.seq, entry.kind) for entry in history.entries] == [(3, KIND_FULL), (4, KIND_DELTA)]
+    assert history.reconstruct(history.entries[0]) == _inventory(10, changed={2})
+    assert history.reconstruct(history.entries[1]) == _inventory(10, changed={3})
+
+def test_compact_keeps_everything_without_retention(tmp_path):
+    """保持期間が無期限（0以下）の場合、compact は何も削除しない"""
+    history = HistoryLog(str(tmp_path), full_every=10, retention_days=0)
+    for day in range(4):
+        history.append(_inventory(10, changed={day}), timestamp=day * DAY)
+    entries = list(history.entries)
+    assert history.compact(now=1000 * DAY) == 0
+    assert history.entries == entries
+    assert HistoryLog(str(tmp_path)).entries == entries
+    assert history.reconstruct(history.entries[0]) == _inventory(10, changed={0})
+
+def test_record_snapshot_from_store(tmp_path):
+    config = Config(history_dir=str(tmp_path / "history"))
+    with SnapshotStore(str(tmp_path / "store.db")) as store:
+        store.begin("123456789012")
+        store.replace_region(
+            "eu-west-1",
+            [
+                {
+                    "GroupId": "sg-1",
+                    "GroupName": "web",
+                    "Description": "",
+                    "IpPermissions": [
+                        {
+                            "IpProtocol": "tcp",
+                            "FromPort": 22,
+                            "ToPort": 22,
+                            "IpRanges": [{"CidrIp": "0.0.0.0/0"}],
+                        }
+                    ],
+                }
+            ],
+        )
+        store.commit(ScanReport(completed=["eu-west-1"]))
+        assert record_snapshot(config, store, ScanReport(incomplete=["eu-west-1"])) is None
+        entry = record_snapshot(config, store, ScanReport(completed=["eu-west-1"]))
+        expected = list(store.iter_groups(store.resolve("latest")))
+    history = HistoryLog(config.history_dir)
+    assert history.reconstruct(entry) == expected
+
+def test_history_command_export(tmp_path, capsys):
+    history = HistoryLog(str(tmp_path / "history"))
+    history.append(_inventory(3), timestamp=1000)
+    output = tmp_path / "snapshot.jsonl"
+    with mock.patch("src.history.load_dotenv"):
+        assert history_command("export", "1", str(output), str(tmp_path / "history")) == 0
+        assert history_command("list", history_dir=str(tmp_path / "history")) == 0
+    assert len(output.read_text().splitlines()) == 3
+    assert "full" in capsys.readouterr().out
@@ -0,0 +1,24 @@
+from src.inventory import InventoryCache
+
+
+def test_inventory_cache():
+    cache = InventoryCache()
+    cache.replace_region("us-east-1", [{"GroupId": "sg-1"}, {"GroupId": "sg-2"}])
+    cache.upsert("eu-west-1", {"GroupId": "sg-3"})
+    assert len(cache) == 3
+    assert cache.regions() == ["eu-west-1", "us-east-1"]
+    assert cache.get("us-east-1", "sg-2") == {"GroupId": "sg-2"}
+    assert cache.updated_at("us-east-1") is not None
+    assert cache.updated_at("eu-west-1") is None
+
+    cache.upsert("us-east-1", {"GroupId": "sg-1", "GroupName": "updated"})
+    assert cache.get("us-east-1", "sg-1")["GroupName"] == "updated"
+
+    cache.remove("us-east-1", "sg-2")
+    cache.remove("ap-east-1", "sg-x")
+    assert sorted(sg["GroupId"] for sg in cache.groups()) == ["sg-1", "sg-3"]
+    assert [sg["GroupId"] for sg in cache.groups("eu-west-1")] == ["sg-3"]
+
+    # リージョンの置き換えでは古いグループが残らない
+    cache.replace_region("us-east-1", [])
+    assert cache.groups("us-east-1") == []
@@ -0,0 +1,146 @@
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+
+from src import lambda_handler
+from src.lambda_handler import FakeContext, handler
+
+OPEN_SG = {
+    "GroupId": "sg-1",
+    "GroupName": "open",
+    "IpPermissions": [
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+    ],
+}
+
+@pytest.fixture
+def lambda_env(tmp_path, monkeypatch):
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text("[]", encoding="utf-8")
+    monkeypatch.setenv("EXCLUSION_RULES_FILE", str(rules_file))
+    monkeypatch.setenv("POLICY_RULES_FILE", str(tmp_path / "policies.yaml"))
+    monkeypatch.setenv("AWS_REGIONS", "us-east-1,eu-west-1")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "neko-sg")
+    for name in (
+        "CHECKPOINT_FILE",
+        "REGION_CACHE_FILE",
+        "SCAN_DEADLINE",
+        "LAMBDA_SAFETY_MARGIN",
+        "LAMBDA_MAX_RESUMES",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(lambda_handler, "_STATE", lambda_handler._WarmState())
+    return rules_file
+
+def test_import_defers_heavy_modules():
+    code = "import sys, src.lambda_handler; print([m for m in ('boto3', 'yaml', 'src.utils') if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+def test_fake_context_counts_down():
+    context = FakeContext(timeout=2)
+    assert 1000 < context.get_remaining_time_in_millis() <= 2000
+    assert FakeContext(timeout=-1).get_remaining_time_in_millis() == 0
+
+@mock.patch("src.main.send_slack_notification_if_configured")
+@mock.patch("src.utils.get_security_groups")
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_handler_reuses_warm_state(mock_client, mock_get_groups, mock_send, lambda_env):
+    mock_get_groups.side_effect = lambda region, config=None, client=None: iter(
+        [OPEN_SG] if region == "us-east-1" else []
+    )
+
+    result = handler({}, FakeContext(timeout=60))
+    assert result["cold_start"]
+    assert [f["group_id"] for f in result["findings"]] == ["sg-1"]
+    assert sorted(result["completed"]) == ["eu-west-1", "us-east-1"]
+    assert not result["partial"]
+    mock_send.assert_called_once()
+    scanner = lambda_handler._STATE.scanner
+    # 残り時間から安全マージンを引いた値がスキャンの期限になる
+    assert 49 < scanner.config.scan_deadline <= 50
+    assert scanner.config.region_cache_file == "/tmp/neko_sg/regions.json"
+
+    # ウォームスタートではスキャナーと除外ルールを使い回し、変更されたルールだけを読み込み直す
+    with mock.patch("src.utils.load_exclusion_rules") as mock_load:
+        result = handler({}, FakeContext(timeout=60))
+        mock_load.assert_not_called()
+    assert not result["cold_start"]
+    assert lambda_handler._STATE.scanner is scanner
+    lambda_env.write_text(
+        "- security_group_id: sg-1\n  rules:\n"
+        "    - ip_address: 0.0.0.0/0\n      protocol: tcp\n"
+        "      port_range: {from: 22, to: 22}\n",
+        encoding="utf-8",
+    )
+    with mock.patch("src.lambda_handler._mtime", return_value=12345.0):
+        result = handler({}, FakeContext(timeout=60))
+    assert result["findings"] == []
+
+@mock.patch("src.main.send_slack_notification_if_configured")
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.utils.get_account_id", return_value="123456789012")
+def test_handler_resumes_from_checkpoint(
+    mock_account, mock_find, mock_send, lambda_env, tmp_path, monkeypatch
+):
+    checkpoint_file = tmp_path / "checkpoint.jsonl"
+    monkeypatch.setenv("CHECKPOINT_FILE", str(checkpoint_file))
+    finding = {"region": "us-east-1", "group_id": "sg-1"}
+
+    def find_partial(rules, config, report, checkpoint, **kwargs):
+        # 残り時間に収まらず eu-west-1 が打ち切られたことを模擬する
+        assert config.scan_deadline == lambda_handler.MIN_SCAN_BUDGET
+        checkpoint.record("us-east-1", [finding])
+        report.completed.append("us-east-1")
+        report.incomplete.append("eu-west-1")
+        yield finding
+
+    mock_find.side_effect = find_partial
+    result = handler({}, FakeContext(timeout=5))
+    assert result["partial"] and result["resumable"]
+    assert result["resumes"] == 1
+    # 再開する場合も途中結果を不完全として通知する
+    mock_send.assert_called_once()
+    assert mock_send.call_args.kwargs["report"].incomplete == ["eu-west-1"]
+    assert checkpoint_file.exists()
+
+    def find_rest(rules, config, report, checkpoint, **kwargs):
+        assert checkpoint.is_completed("us-east-1")
+        report.completed.extend(["us-east-1", "eu-west-1"])
+        yield from checkpoint.completed["us-east-1"]
+
+    mock_find.side_effect = find_rest
+    result = handler({}, FakeContext(timeout=60))
+    assert not result["resumable"]
+    assert result["findings"] == [finding]
+    assert mock_send.call_count == 2
+    assert not checkpoint_file.exists()
+    assert not (tmp_path / "checkpoint.jsonl.resumes").exists()
+
+@mock.patch("src.main.send_slack_notification_if_configured")
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.utils.get_account_id", return_value="123456789012")
+def test_handler_stops_resuming_at_cap(
+    mock_account, mock_find, mock_send, lambda_env, tmp_path, monkeypatch
+):
+    """毎回期限内に終わらないリージョンがあっても、上限に達したらチェックポイントを破棄する"""
+    checkpoint_file = tmp_path / "checkpoint.jsonl"
+    monkeypatch.setenv("CHECKPOINT_FILE", str(checkpoint_file))
+    monkeypatch.setenv("LAMBDA_MAX_RESUMES", "2")
+
+    def find_never_done(rules, config, report, checkpoint, **kwargs):
+        if not checkpoint.is_completed("us-east-1"):
+            checkpoint.record("us-east-1", [])
+        report.completed.append("us-east-1")
+        report.incomplete.append("eu-west-1")
+        yield from ()
+
+    mock_find.side_effect = find_never_done
+    results = [handler({}, FakeContext(timeout=5)) for _ in range(3)]
+    assert [r["resumable"] for r in results] == [True, True, False]
+    assert [r["resumes"] for r in results] == [1, 2, 2]
+    assert mock_send.call_count == 3
+    assert not checkpoint_file.exists()
+    assert not (tmp_path / "checkpoint.jsonl.resumes").exists()
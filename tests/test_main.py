@@ -1,16 +1,24 @@
-import pytest
 from unittest import mock
-import sys
-from src.main import scan_security_groups, main, _send_slack_notification_if_configured
+
+import pytest
+
 from src.config import Config
+from src.main import main, scan_security_groups, send_slack_notification_if_configured
+
 
 @mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
 @mock.patch("src.main.load_exclusion_rules")
-@mock.patch("src.main.find_globally_accessible_security_groups")
-@mock.patch("src.main._send_slack_notification_if_configured")
-def test_scan_security_groups_no_groups(mock_send, mock_find, mock_load, mock_config):
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_scan_security_groups_no_groups(mock_send, mock_find, mock_load, mock_policies, mock_config):
     mock_conf = mock.Mock()
     mock_conf.log_level = "INFO"
+    mock_conf.checkpoint_file = ""
+    mock_conf.snapshot_store = ""
+    mock_conf.metrics_file = ""
+    mock_conf.metrics_summary = False
+    mock_conf.trace_file = ""
     mock_conf.get_exclusion_rules_path.return_value = "/rules.yaml"
     mock_config.return_value = mock_conf
 
@@ -19,16 +27,25 @@ def test_scan_security_groups_no_groups(mock_send, mock_find, mock_load, mock_co
 
     scan_security_groups()
 
-    mock_find.assert_called_once_with([], mock_conf)
+    mock_find.assert_called_once_with(
+        mock.ANY, mock_conf, policies=[], report=mock.ANY, checkpoint=None, clients=mock.ANY,
+        inventory=None, executor=mock.ANY, hedge_executor=mock.ANY,
+    )
     mock_send.assert_not_called()
 
 @mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
 @mock.patch("src.main.load_exclusion_rules")
-@mock.patch("src.main.find_globally_accessible_security_groups")
-@mock.patch("src.main._send_slack_notification_if_configured")
-def test_scan_security_groups_with_groups(mock_send, mock_find, mock_load, mock_config):
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_scan_security_groups_with_groups(mock_send, mock_find, mock_load, mock_policies, mock_config):
     mock_conf = mock.Mock()
     mock_conf.log_level = "INFO"
+    mock_conf.checkpoint_file = ""
+    mock_conf.snapshot_store = ""
+    mock_conf.metrics_file = ""
+    mock_conf.metrics_summary = False
+    mock_conf.trace_file = ""
     mock_conf.get_exclusion_rules_path.return_value = "/rules.yaml"
     mock_config.return_value = mock_conf
 
@@ -38,8 +55,82 @@ def test_scan_security_groups_with_groups(mock_send, mock_find, mock_load, mock_
 
     scan_security_groups()
 
-    mock_find.assert_called_once_with([], mock_conf)
-    mock_send.assert_called_once_with(mock_conf, groups)
+    mock_find.assert_called_once_with(
+        mock.ANY, mock_conf, policies=[], report=mock.ANY, checkpoint=None, clients=mock.ANY,
+        inventory=None, executor=mock.ANY, hedge_executor=mock.ANY,
+    )
+    mock_send.assert_called_once_with(mock_conf, groups, report=mock.ANY)
+
+@mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
+@mock.patch("src.main.load_exclusion_rules")
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_scan_security_groups_partial(mock_send, mock_find, mock_load, mock_policies, mock_config):
+    mock_conf = mock.Mock()
+    mock_conf.log_level = "INFO"
+    mock_conf.checkpoint_file = ""
+    mock_conf.snapshot_store = ""
+    mock_conf.metrics_file = ""
+    mock_conf.metrics_summary = False
+    mock_conf.trace_file = ""
+    mock_config.return_value = mock_conf
+    mock_load.return_value = []
+
+    def find(rules, config, policies, report, checkpoint, **kwargs):
+        report.incomplete.append("ap-east-1")
+        return iter([])
+
+    mock_find.side_effect = find
+
+    scan_security_groups()
+
+    # 検出がなくても結果が不完全な場合は通知する
+    mock_send.assert_called_once()
+    assert mock_send.call_args.kwargs["report"].incomplete == ["ap-east-1"]
+
+@mock.patch("src.main.get_account_id", return_value="123456789012")
+@mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
+@mock.patch("src.main.load_exclusion_rules", return_value=[])
+@mock.patch("src.utils.get_security_groups")
+@mock.patch("src.scanner.get_all_regions")
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_scan_security_groups_resume(
+    mock_send, mock_regions, mock_groups, mock_load, mock_policies, mock_config, mock_account, tmp_path
+):
+    from src.checkpoint import load_checkpoint
+    from src.cli import parse_args
+
+    config = Config(log_level="INFO")
+    mock_config.return_value = config
+    mock_regions.return_value = ["us-east-1", "us-west-2"]
+    checkpoint_file = tmp_path / "checkpoint.jsonl"
+    checkpoint_file.write_text(
+        '{"account": "123456789012", "region": "us-east-1", '
+        '"findings": [{"region": "us-east-1", "group_id": "sg-old", "group_name": "old"}]}\n',
+        encoding="utf-8",
+    )
+
+    def get_groups(region, config=None, client=None):
+        # us-west-2で中断したことを模擬する
+        raise RuntimeError("interrupted")
+
+    mock_groups.side_effect = get_groups
+    scan_security_groups(parse_args(["scan", "--checkpoint", str(checkpoint_file), "--resume"]))
+
+    # 完了済みのリージョンはスキャンせず記録済みの結果を使う
+    assert [c.args[0] for c in mock_groups.call_args_list] == ["us-west-2"]
+    found = mock_send.call_args.args[1]
+    assert [g["group_id"] for g in found] == ["sg-old"]
+    # 未完了のリージョンがあるためチェックポイントは残る
+    assert set(load_checkpoint(str(checkpoint_file))["123456789012"]) == {"us-east-1"}
+
+    mock_groups.side_effect = None
+    mock_groups.return_value = []
+    scan_security_groups(parse_args(["scan", "--checkpoint", str(checkpoint_file), "--resume"]))
+    # 全リージョンが完了したらチェックポイントを削除する
+    assert not checkpoint_file.exists()
 
 @mock.patch("src.main.parse_args")
 @mock.patch("src.main.scan_security_groups")
@@ -69,11 +160,11 @@ def test_main_subcommand(mock_parse_args):
 @mock.patch("src.main.format_slack_message")
 def test_send_slack_notification_if_configured(mock_format, mock_send_webhook, mock_send_sdk):
     mock_format.return_value = "formatted"
-    
+
     # 1. SDK Success
     config = Config(use_slack_sdk=True, slack_bot_token="xoxb-test", slack_channel="#alert")
     mock_send_sdk.return_value = True
-    _send_slack_notification_if_configured(config, [])
+    send_slack_notification_if_configured(config, [])
     mock_send_sdk.assert_called_once_with("xoxb-test", "#alert", "formatted")
     mock_send_webhook.assert_not_called()
 
@@ -84,7 +175,7 @@ def test_send_slack_notification_if_configured(mock_format, mock_send_webhook, m
     config_fallback = Config(use_slack_sdk=True, slack_bot_token="xoxb-test", slack_webhook_url="http://webhook")
     mock_send_sdk.return_value = False
     mock_send_webhook.return_value = True
-    _send_slack_notification_if_configured(config_fallback, [])
+    send_slack_notification_if_configured(config_fallback, [])
     mock_send_sdk.assert_called_once()
     mock_send_webhook.assert_called_once_with("http://webhook", "formatted")
 
@@ -94,7 +185,147 @@ def test_send_slack_notification_if_configured(mock_format, mock_send_webhook, m
     # 3. None configured (should print to stdout)
     config_empty = Config()
     with mock.patch("builtins.print") as mock_print:
-        _send_slack_notification_if_configured(config_empty, [])
+        send_slack_notification_if_configured(config_empty, [])
         mock_send_sdk.assert_not_called()
         mock_send_webhook.assert_not_called()
         mock_print.assert_called_once_with("formatted")
+
+@mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
+@mock.patch("src.main.load_exclusion_rules", return_value=[])
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.main.send_slack_notification_if_configured")
+@mock.patch("src.shard.get_all_regions", return_value=["us-east-1", "eu-west-1", "ap-northeast-1"])
+@mock.patch("src.shard.get_account_id", return_value="123456789012")
+def test_scan_security_groups_shard(
+    mock_account, mock_regions, mock_send, mock_find, mock_load, mock_policies, mock_config, tmp_path
+):
+    """シャード指定時は部分結果ファイルを書き出し、通知しない"""
+    import json
+
+    from src.cli import parse_args
+
+    mock_config.return_value = Config(checkpoint_file="")
+    mock_find.side_effect = lambda rules, config, **kwargs: iter(
+        [{"region": region, "group_id": "sg-1"} for region in config.regions]
+    )
+
+    regions = []
+    for index in (1, 2):
+        output = tmp_path / f"shard-{index}.json"
+        scan_security_groups(parse_args(["scan", "--shard", f"{index}/2", "--shard-output", str(output)]))
+        result = json.loads(output.read_text())
+        assert result["account"] == "123456789012"
+        assert [f["region"] for f in result["findings"]] == result["regions"]
+        regions.extend(result["regions"])
+    assert sorted(regions) == ["ap-northeast-1", "eu-west-1", "us-east-1"]
+    mock_send.assert_not_called()
+
+@mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
+@mock.patch("src.main.load_exclusion_rules", return_value=[])
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_scan_security_groups_streams_output(
+    mock_send, mock_find, mock_load, mock_policies, mock_config, tmp_path
+):
+    """--output 指定時は検出結果を生成された順に書き出す"""
+    import json
+
+    from src.cli import parse_args
+
+    mock_config.return_value = Config(checkpoint_file="", regions=["us-east-1"])
+    output = tmp_path / "findings.jsonl"
+    written_before_second = []
+
+    def find(*args, **kwargs):
+        yield {"region": "us-east-1", "group_id": "sg-1"}
+        written_before_second.append(output.read_text())
+        yield {"region": "us-east-1", "group_id": "sg-2"}
+
+    mock_find.side_effect = find
+    scan_security_groups(parse_args(["scan", "--output", "jsonl", "--output-file", str(output)]))
+
+    assert json.loads(written_before_second[0])["group_id"] == "sg-1"
+    assert [json.loads(line)["group_id"] for line in output.read_text().splitlines()] == ["sg-1", "sg-2"]
+    # Slackが未設定の場合は通知メッセージを表示しない
+    mock_send.assert_not_called()
+
+@mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
+@mock.patch("src.main.load_exclusion_rules", return_value=[])
+@mock.patch("src.scanner.find_globally_accessible_security_groups")
+@mock.patch("src.main.send_slack_notification_if_configured")
+@mock.patch("src.main.get_account_id", return_value="123456789012")
+def test_scan_security_groups_saves_snapshot(
+    mock_account, mock_send, mock_find, mock_load, mock_policies, mock_config, tmp_path
+):
+    """SNAPSHOT_STORE 設定時は在庫と検出結果をスナップショットに保存する"""
+    from src.store import SnapshotStore
+
+    path = str(tmp_path / "inventory.db")
+    mock_config.return_value = Config(checkpoint_file="", snapshot_store=path, regions=["us-east-1"])
+    sg = {
+        "GroupId": "sg-1",
+        "GroupName": "open",
+        "IpPermissions": [{"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}],
+    }
+
+    def find(*args, inventory=None, **kwargs):
+        inventory.replace_region("us-east-1", [sg])
+        yield {"region": "us-east-1", "group_id": "sg-1", "group_name": "open"}
+
+    mock_find.side_effect = find
+    scan_security_groups()
+
+    with SnapshotStore(path) as store:
+        assert store.latest()["account"] == "123456789012"
+        assert [row["group_id"] for row in store.query([])] == ["sg-1"]
+
+@mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
+@mock.patch("src.main.load_exclusion_rules", return_value=[])
+@mock.patch("src.scanner.find_globally_accessible_security_groups", return_value=iter([]))
+@mock.patch("src.main.send_slack_notification_if_configured")
+@mock.patch("src.main.get_account_id", return_value="123456789012")
+def test_scan_security_groups_skips_snapshot_in_rules_mode(
+    mock_account, mock_send, mock_find, mock_load, mock_policies, mock_config, tmp_path
+):
+    """FETCH_MODE=rules では在庫を取得しないため、空のスナップショットを保存しない"""
+    path = tmp_path / "inventory.db"
+    mock_config.return_value = Config(
+        checkpoint_file="", snapshot_store=str(path), fetch_mode="rules", regions=["us-east-1"]
+    )
+    scan_security_groups()
+    assert mock_find.call_args.kwargs["inventory"] is None
+    assert not path.exists()
+
+@mock.patch("src.main.get_account_id", return_value="123456789012")
+@mock.patch("src.main.Config.from_env")
+@mock.patch("src.main.load_policy_rules", return_value=[])
+@mock.patch("src.main.load_exclusion_rules", return_value=[])
+@mock.patch("src.utils.get_security_groups", return_value=[])
+@mock.patch("src.scanner.get_all_regions", return_value=["us-east-1", "us-west-2"])
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_scan_security_groups_resume_marks_snapshot_incomplete(
+    mock_send, mock_regions, mock_groups, mock_load, mock_policies, mock_config, mock_account, tmp_path
+):
+    """チェックポイントから再開した場合、在庫のないリージョンを含むスナップショットを完了扱いにしない"""
+    from src.cli import parse_args
+    from src.store import SnapshotStore
+
+    path = str(tmp_path / "inventory.db")
+    history_dir = tmp_path / "history"
+    mock_config.return_value = Config(snapshot_store=path, history_dir=str(history_dir))
+    checkpoint_file = tmp_path / "checkpoint.jsonl"
+    checkpoint_file.write_text(
+        '{"account": "123456789012", "region": "us-east-1", "findings": []}\n', encoding="utf-8"
+    )
+
+    scan_security_groups(parse_args(["scan", "--checkpoint", str(checkpoint_file), "--resume"]))
+
+    assert [c.args[0] for c in mock_groups.call_args_list] == ["us-west-2"]
+    with SnapshotStore(path) as store:
+        assert not store.latest()["complete"]
+    # 不完全なスナップショットは履歴に記録しない
+    assert not history_dir.exists() or not any(history_dir.iterdir())
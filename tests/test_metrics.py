@@ -0,0 +1,95 @@
+import io
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from src.config import Config
+from src.metrics import METRICS, MetricsRegistry, finish_run, record_api_error, record_page
+from src.utils import ScanReport, find_globally_accessible_security_groups
+
+OPEN_SG = {
+    "GroupId": "sg-1",
+    "GroupName": "open",
+    "IpPermissions": [
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+    ],
+}
+
+@pytest.fixture
+def metrics():
+    METRICS.reset()
+    METRICS.enable()
+    yield METRICS
+    METRICS.reset()
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry()
+    registry.inc("neko_sg_pages")
+    with registry.timer("neko_sg_page_seconds"):
+        pass
+    assert registry.counter_value("neko_sg_pages") == 0
+    assert registry.histogram_count("neko_sg_page_seconds") == 0
+    assert registry.render_openmetrics() == "# EOF\n"
+
+def test_render_openmetrics():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.enable()
+    registry.inc("neko_sg_pages", region="eu-west-1")
+    registry.inc("neko_sg_pages", 2, region="eu-west-1")
+    registry.observe("neko_sg_region_scan_seconds", 0.5, region="eu-west-1")
+    text = registry.render_openmetrics()
+    assert "# TYPE neko_sg_pages counter" in text
+    assert 'neko_sg_pages_total{region="eu-west-1"} 3' in text
+    assert "# UNIT neko_sg_region_scan_seconds seconds" in text
+    assert 'neko_sg_region_scan_seconds_bucket{region="eu-west-1",le="0.1"} 0' in text
+    assert 'neko_sg_region_scan_seconds_bucket{region="eu-west-1",le="1"} 1' in text
+    assert 'neko_sg_region_scan_seconds_bucket{region="eu-west-1",le="+Inf"} 1' in text
+    assert 'neko_sg_region_scan_seconds_count{region="eu-west-1"} 1' in text
+    assert text.endswith("# EOF\n")
+
+def test_record_page_and_errors(metrics):
+    page = {
+        "SecurityGroups": [OPEN_SG, {"GroupId": "sg-2", "IpPermissions": []}],
+        "ResponseMetadata": {"RetryAttempts": 2},
+    }
+    record_page("eu-west-1", "describe_security_groups", page, 0.0)
+    error = ClientError({"Error": {"Code": "RequestLimitExceeded"}}, "DescribeSecurityGroups")
+    record_api_error("eu-west-1", "describe_security_groups", error)
+    assert metrics.counter_value("neko_sg_groups", region="eu-west-1") == 2
+    assert metrics.counter_value("neko_sg_rules", region="eu-west-1") == 1
+    assert metrics.counter_value(
+        "neko_sg_api_retries", region="eu-west-1", api="describe_security_groups"
+    ) == 2
+    assert metrics.counter_value(
+        "neko_sg_api_throttles", region="eu-west-1", api="describe_security_groups"
+    ) == 1
+
+def test_scan_is_instrumented(metrics, tmp_path):
+    client = mock.Mock()
+    client.get_paginator.return_value.paginate.return_value = [
+        {"SecurityGroups": [OPEN_SG], "ResponseMetadata": {"RetryAttempts": 0}}
+    ]
+    config = Config(regions=["eu-west-1"], metrics_file=str(tmp_path / "neko_sg.prom"))
+    report = ScanReport()
+    with mock.patch("src.utils._create_ec2_client", return_value=client):
+        found = list(find_globally_accessible_security_groups([], config, report=report))
+    assert len(found) == 1
+    assert metrics.counter_value("neko_sg_pages", region="eu-west-1", api="describe_security_groups") == 1
+    assert metrics.counter_value("neko_sg_findings", region="eu-west-1") == 1
+    assert metrics.histogram_count("neko_sg_region_scan_seconds", region="eu-west-1") == 1
+
+    finish_run(config, report)
+    text = (tmp_path / "neko_sg.prom").read_text()
+    assert 'neko_sg_regions_total{status="completed"} 1' in text
+    assert "neko_sg_evaluations_total" in text
+
+def test_print_summary(metrics):
+    metrics.observe("neko_sg_notification_seconds", 0.25, sink="webhook")
+    metrics.inc("neko_sg_notifications", sink="webhook", result="success")
+    stream = io.StringIO()
+    metrics.print_summary(stream)
+    lines = stream.getvalue().splitlines()
+    assert lines[0].split() == ["metric", "count", "total", "avg", "max"]
+    assert "250.0ms" in lines[1]
+    assert lines[2].startswith('neko_sg_notifications{result="success",sink="webhook"}')
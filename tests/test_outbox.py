@@ -0,0 +1,159 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+import requests
+
+from src.config import Config
+from src.main import send_slack_notification_if_configured
+from src.outbox import (
+    STATE_DELIVERED,
+    STATE_FAILED,
+    STATE_PENDING,
+    Outbox,
+    backoff_delay,
+    build_sinks,
+    build_payload,
+    deliver_due,
+    outbox_command,
+)
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+def test_backoff_delay_is_capped_full_jitter():
+    with mock.patch("src.outbox.random.uniform", side_effect=lambda low, high: high):
+        assert [backoff_delay(n, base=1, cap=10) for n in (1, 2, 3, 4, 5)] == [1, 2, 4, 8, 10]
+    assert all(0 <= backoff_delay(3) <= 8 for _ in range(100))
+
+@mock.patch("src.outbox.backoff_delay", return_value=0.0)
+def test_deliveries_retry_per_sink_without_resending(mock_backoff, tmp_path, executor):
+    calls = {"flaky": 0, "stable": 0, "broken": 0}
+
+    def flaky(payload, key):
+        calls["flaky"] += 1
+        if calls["flaky"] == 1:
+            raise requests.ConnectionError("reset")
+
+    def stable(payload, key):
+        calls["stable"] += 1
+
+    def broken(payload, key):
+        calls["broken"] += 1
+        raise RuntimeError("down")
+
+    sinks = {"flaky": flaky, "stable": stable, "broken": broken}
+    path = str(tmp_path / "outbox.sqlite")
+    with Outbox(path, max_attempts=2) as outbox:
+        key = outbox.enqueue({"text": "hello"}, list(sinks))
+        # 同じキーの登録は1件にまとめる
+        assert outbox.enqueue({"text": "hello"}, list(sinks)) == key
+        assert deliver_due(outbox, sinks, executor) == 3
+        assert outbox.counts() == {STATE_PENDING: 2, STATE_DELIVERED: 1}
+        assert deliver_due(outbox, sinks, executor) == 2
+        assert deliver_due(outbox, sinks, executor) == 0
+        assert calls == {"flaky": 2, "stable": 1, "broken": 2}
+        assert [(f["sink"], f["attempts"]) for f in outbox.failures()] == [("broken", 2)]
+        assert outbox.retry_failed() == 1
+
+    # 未配信の通知はファイルに残り、次に開いたときに配信する
+    with Outbox(path) as outbox:
+        assert outbox.counts() == {STATE_PENDING: 1, STATE_DELIVERED: 2}
+        assert deliver_due(outbox, {"broken": stable}, executor) == 1
+        assert outbox.counts() == {STATE_DELIVERED: 3}
+        assert outbox.purge_delivered() == 3
+        assert outbox.counts() == {}
+
+@mock.patch("src.outbox.requests.post")
+def test_notification_fans_out_through_outbox(mock_post, tmp_path):
+    log_file = tmp_path / "notifications.jsonl"
+    config = Config(
+        outbox_file=str(tmp_path / "outbox.sqlite"),
+        notify_sinks=[f"file:{log_file}", "webhook:https://hooks.example.com/sg"],
+        outbox_flush_timeout=0,
+    )
+    finding = {"region": "us-east-1", "group_id": "sg-1", "group_name": "open"}
+    mock_post.side_effect = requests.ConnectionError("unreachable")
+
+    send_slack_notification_if_configured(config, [finding])
+
+    # 配信できなかったWebhookだけがアウトボックスに残る
+    record = json.loads(log_file.read_text(encoding="utf-8"))
+    assert record["findings"] == [finding]
+    with Outbox(config.outbox_file) as outbox:
+        assert outbox.counts() == {STATE_PENDING: 1, STATE_DELIVERED: 1}
+        outbox._conn.execute("UPDATE deliveries SET next_attempt_at = 0")
+        outbox._conn.commit()
+
+    mock_post.side_effect = None
+    mock_post.reset_mock()
+    config.outbox_max_attempts = 1
+    send_slack_notification_if_configured(config, [])
+
+    keys = {call.kwargs["headers"]["Idempotency-Key"] for call in mock_post.call_args_list}
+    assert record["key"] in keys and len(keys) == 2
+    assert len(log_file.read_text(encoding="utf-8").splitlines()) == 2
+    with Outbox(config.outbox_file) as outbox:
+        assert outbox.counts() == {STATE_DELIVERED: 4}
+        assert STATE_FAILED not in outbox.counts()
+
+def test_unconfigured_sink_does_not_consume_attempts(tmp_path, executor, capsys):
+    """設定されていない通知先の配信は試行回数を消費せず、flush はエラーで終了すること"""
+    path = str(tmp_path / "outbox.sqlite")
+    with Outbox(path, max_attempts=1) as outbox:
+        outbox.enqueue({"text": "hello"}, ["webhook:https://hooks.example.com/sg"])
+        assert deliver_due(outbox, {}, executor) == 0
+        assert outbox.next_due([]) is None
+
+    with mock.patch("src.outbox.load_dotenv"), \
+         mock.patch("src.outbox.Config.from_env", return_value=Config()):
+        assert outbox_command("flush", path) == 1
+    assert "通知先が設定されていません" in capsys.readouterr().out
+
+    with Outbox(path) as outbox:
+        assert outbox.counts() == {STATE_PENDING: 1}
+        row = outbox._conn.execute("SELECT attempts FROM deliveries").fetchone()
+        assert row["attempts"] == 0
+
+@mock.patch("src.outbox.backoff_delay", return_value=0.0)
+@mock.patch("src.slack_report.shared_client")
+def test_slack_thread_progress_survives_retry(mock_client, mock_backoff, tmp_path, executor):
+    """返信の一部が失敗した配信は未配信のまま残し、再試行では同じスレッドに残りだけを投稿すること"""
+    posts = []
+    failing = {"eu-west-1"}
+
+    def post_message(**kwargs):
+        posts.append(kwargs)
+        if "thread_ts" not in kwargs:
+            return {"ok": True, "channel": "C123", "ts": "1700000000.000100"}
+        if kwargs["text"].split("（")[0] in failing:
+            raise RuntimeError("ratelimited")
+        return {"ok": True}
+
+    mock_client.return_value.chat_postMessage.side_effect = post_message
+    config = Config(slack_bot_token="xoxb-test", slack_blocks=True, notify_sinks=["slack:#sec"])
+    findings = [
+        {"region": region, "group_id": f"sg-{i}", "group_name": "open"}
+        for i, region in enumerate(["us-east-1", "eu-west-1"])
+    ]
+    path = str(tmp_path / "outbox.sqlite")
+    with Outbox(path) as outbox:
+        sinks = build_sinks(config, outbox)
+        key = outbox.enqueue(build_payload(findings), ["slack:#sec"])
+        assert deliver_due(outbox, sinks, executor) == 1
+        assert outbox.counts() == {STATE_PENDING: 1}
+        assert outbox.load_progress(key, "slack:#sec")["ts"] == "1700000000.000100"
+
+    # 開き直しても進捗は残り、サマリーを送り直さない
+    failing.clear()
+    posts.clear()
+    with Outbox(path) as outbox:
+        assert deliver_due(outbox, build_sinks(config, outbox), executor) == 1
+        assert outbox.counts() == {STATE_DELIVERED: 1}
+    assert [(p.get("thread_ts"), p["text"].split("（")[0]) for p in posts] == [
+        ("1700000000.000100", "eu-west-1")
+    ]
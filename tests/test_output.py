@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.output import CsvWriter, FindingOutput, JsonLinesWriter, SarifWriter
+
+FINDINGS = [
+    {"region": "us-east-1", "group_id": "sg-1", "group_name": "web", "description": "Web"},
+    {
+        "region": "eu-west-1",
+        "group_id": "sg-2",
+        "group_name": "db",
+        "description": "DB",
+        "policy": "no-public-db",
+        "rule_id": "sgr-2",
+    },
+]
+
+def test_json_lines_writer():
+    stream = io.StringIO()
+    writer = JsonLinesWriter(stream)
+    for finding in FINDINGS:
+        writer.write(finding)
+    writer.close()
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == FINDINGS
+    assert writer.count == 2
+
+def test_csv_writer():
+    stream = io.StringIO()
+    writer = CsvWriter(stream)
+    for finding in FINDINGS:
+        writer.write(finding)
+    rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert rows[0]["group_id"] == "sg-1"
+    assert rows[0]["policy"] == ""
+    assert rows[1]["rule_id"] == "sgr-2"
+
+@pytest.mark.parametrize("findings", [[], FINDINGS])
+def test_sarif_writer(findings):
+    stream = io.StringIO()
+    writer = SarifWriter(stream)
+    for finding in findings:
+        writer.write(finding)
+    writer.close()
+    log = json.loads(stream.getvalue())
+    assert log["version"] == "2.1.0"
+    results = log["runs"][0]["results"]
+    assert len(results) == len(findings)
+    if findings:
+        assert results[0]["ruleId"] == "global-ingress"
+        assert results[1]["ruleId"] == "no-public-db"
+        location = results[1]["locations"][0]["logicalLocations"][0]
+        assert location["fullyQualifiedName"] == "eu-west-1/sg-2/sgr-2"
+    # すべての result のルールが tool.driver.rules に宣言されている
+    rules = log["runs"][0]["tool"]["driver"]["rules"]
+    for result in results:
+        assert rules[result["ruleIndex"]]["id"] == result["ruleId"]
+
+def test_sarif_writer_one_result_per_policy():
+    """複数のポリシーに該当した検出結果はポリシーごとの result にする"""
+    policies = [SimpleNamespace(name="ssh-open", description="SSH is open to the world")]
+    stream = io.StringIO()
+    writer = SarifWriter(stream, policies)
+    writer.write(dict(FINDINGS[1], policy="ssh-open,no-public-db"))
+    writer.close()
+    run = json.loads(stream.getvalue())["runs"][0]
+    rules = run["tool"]["driver"]["rules"]
+    assert [r["ruleId"] for r in run["results"]] == ["ssh-open", "no-public-db"]
+    assert [rules[r["ruleIndex"]]["id"] for r in run["results"]] == ["ssh-open", "no-public-db"]
+    assert rules[1]["shortDescription"]["text"] == "SSH is open to the world"
+    assert writer.count == 1
+
+def test_finding_output_file(tmp_path):
+    path = tmp_path / "findings.jsonl"
+    with FindingOutput("jsonl", str(path)) as output:
+        output.write(FINDINGS[0])
+        # 1件ごとにフラッシュされる
+        assert json.loads(path.read_text())["group_id"] == "sg-1"
+        assert not output.to_stdout
+    with pytest.raises(ValueError):
+        FindingOutput("xml")
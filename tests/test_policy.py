@@ -0,0 +1,151 @@
+from unittest import mock
+
+import pytest
+
+from src.policy import (
+    _compile_condition,
+    compile_policy,
+    load_policy_rules,
+    matching_policies,
+)
+from src.utils import find_globally_accessible_security_groups
+
+
+def _perm(protocol="tcp", from_port=22, to_port=22):
+    return {"IpProtocol": protocol, "FromPort": from_port, "ToPort": to_port}
+
+def test_compile_leaf_conditions():
+    sg = {"Tags": [{"Key": "Environment", "Value": "prod"}]}
+
+    protocol = compile_policy({"name": "p", "match": {"protocol": ["tcp", "udp"]}})
+    assert protocol.matches(_perm("tcp"), "0.0.0.0/0", sg)
+    assert protocol.matches(_perm("-1"), "0.0.0.0/0", sg)  # 全トラフィック許可
+    assert not protocol.matches(_perm("icmp"), "0.0.0.0/0", sg)
+
+    port = compile_policy({"name": "p", "match": {"port": 22}})
+    assert port.matches(_perm(from_port=0, to_port=1024), "0.0.0.0/0", sg)
+    assert not port.matches(_perm(from_port=80, to_port=80), "0.0.0.0/0", sg)
+
+    port_range = compile_policy({"name": "p", "match": {"port_range": {"from": 20, "to": 25}}})
+    assert port_range.matches(_perm(), "0.0.0.0/0", sg)
+    assert not port_range.matches(_perm(from_port=443, to_port=443), "0.0.0.0/0", sg)
+
+    cidr = compile_policy({"name": "p", "match": {"cidr": {"global": True, "ipv6": True}}})
+    assert cidr.matches(_perm(), "::/0", sg)
+    assert not cidr.matches(_perm(), "0.0.0.0/0", sg)
+    assert not cidr.matches(_perm(), "fc00::/7", sg)
+
+    within = compile_policy({"name": "p", "match": {"cidr": {"within": ["203.0.113.0/24"]}}})
+    assert within.matches(_perm(), "203.0.113.8/29", sg)
+    assert not within.matches(_perm(), "198.51.100.0/24", sg)
+
+    tag = compile_policy({"name": "p", "match": {"tag": {"key": "Environment", "value": "prod"}}})
+    assert tag.matches(_perm(), "0.0.0.0/0", sg)
+    assert not tag.matches(_perm(), "0.0.0.0/0", {"Tags": []})
+
+def test_compile_combinators():
+    policy = compile_policy({
+        "name": "ssh-world",
+        "match": {
+            "all": [
+                {"protocol": "tcp"},
+                {"port": 22},
+                {"cidr": {"global": True}},
+            ]
+        },
+    })
+    assert policy.matches(_perm(), "0.0.0.0/0", {})
+    assert not policy.matches(_perm(), "10.0.0.0/8", {})
+
+    policy_any = compile_policy({"name": "p", "match": {"any": [{"port": 22}, {"port": 3389}]}})
+    assert policy_any.matches(_perm(from_port=3389, to_port=3389), "0.0.0.0/0", {})
+    assert not policy_any.matches(_perm(from_port=80, to_port=80), "0.0.0.0/0", {})
+
+    policy_not = compile_policy({"name": "p", "match": {"not": {"port": 443}}})
+    assert policy_not.matches(_perm(), "0.0.0.0/0", {})
+    assert not policy_not.matches(_perm(from_port=443, to_port=443), "0.0.0.0/0", {})
+
+def test_constant_folding():
+    # 常に成立しない条件はAND全体を定数Falseに畳み込む
+    assert _compile_condition({"all": [{"port": 22}, {"protocol": []}]}).constant is False
+    assert _compile_condition({"any": [{"port": 22}, True]}).constant is True
+    assert _compile_condition({"not": False}).constant is True
+    assert _compile_condition({"cidr": {"within": ["0.0.0.0/0", "::/0"]}}).constant is True
+    # 子が1つになった場合はその子がそのまま使われる
+    assert _compile_condition({"all": [True, {"port": 22}]}).constant is None
+
+def test_selectivity_ordering():
+    calls = []
+    node = _compile_condition({"all": [{"cidr": {"global": True}}, {"port": 22}]})
+    with mock.patch("src.policy._parse_network", side_effect=lambda c: calls.append(c)):
+        # 選択率の高いポート条件が先に評価され、CIDR解析は行われない
+        assert not node.predicate(_perm(from_port=80, to_port=80), "0.0.0.0/0", {})
+    assert calls == []
+
+def test_compile_policy_invalid():
+    with pytest.raises(ValueError):
+        compile_policy({"name": "p"})
+    with pytest.raises(ValueError):
+        compile_policy({"name": "p", "match": {"unknown": 1}})
+    with pytest.raises(ValueError):
+        compile_policy({"name": "p", "match": {"cidr": {"within": ["bad"]}}})
+    # 全範囲への畳み込みより先にCIDRを検証する
+    for within in (["0.0.0.1/0", "::/0"], ["0.0.0.0/0", "::/0", "bad"], [0, "::/0"], 0):
+        with pytest.raises(ValueError, match="within|無効なCIDR形式"):
+            compile_policy({"name": "p", "match": {"cidr": {"within": within}}})
+    single = compile_policy({"name": "p", "match": {"cidr": {"within": "203.0.113.0/24"}}})
+    assert single.matches(_perm(), "203.0.113.8/29", {})
+
+def test_load_policy_rules(tmp_path):
+    assert load_policy_rules(str(tmp_path / "missing.yaml")) == []
+
+    policy_file = tmp_path / "policies.yaml"
+    policy_file.write_text(
+        "- name: ssh\n  match:\n    port: 22\n- name: broken\n  match:\n    bogus: 1\n",
+        encoding="utf-8",
+    )
+    policies = load_policy_rules(str(policy_file))
+    assert [p.name for p in policies] == ["ssh"]
+
+def test_matching_policies_respects_exclusions():
+    policies = [
+        compile_policy({"name": "ssh", "match": {"port": 22}}),
+        compile_policy({"name": "global", "match": {"cidr": {"global": True}}}),
+    ]
+    sg = {
+        "GroupId": "sg-1",
+        "IpPermissions": [
+            {**_perm(), "IpRanges": [{"CidrIp": "0.0.0.0/0"}], "Ipv6Ranges": []},
+        ],
+    }
+    assert matching_policies(sg, [], policies) == ["ssh", "global"]
+
+    exclusions = [{
+        "security_group_id": "sg-1",
+        "rules": [{"ip_address": "0.0.0.0/0", "protocol": "tcp", "port_range": {"from": 22, "to": 22}}],
+    }]
+    assert matching_policies(sg, exclusions, policies) == []
+
+@mock.patch("src.utils.get_all_regions")
+@mock.patch("src.utils.get_security_groups")
+def test_find_with_policies(mock_get_groups, mock_get_regions):
+    mock_get_regions.return_value = ["us-east-1"]
+    mock_get_groups.return_value = [
+        {
+            "GroupId": "sg-1",
+            "GroupName": "web",
+            "IpPermissions": [
+                {**_perm(from_port=443, to_port=443), "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+            ],
+        },
+        {
+            "GroupId": "sg-2",
+            "GroupName": "ssh",
+            "IpPermissions": [{**_perm(), "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}],
+        },
+    ]
+    policies = [compile_policy({"name": "ssh", "match": {"port": 22}})]
+
+    results = list(find_globally_accessible_security_groups([], policies=policies))
+    assert [r["group_id"] for r in results] == ["sg-2"]
+    assert results[0]["policy"] == "ssh"
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from src.profiling import SamplingProfiler, finish_profile
+
+
+def _hot_loop(deadline):
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+def test_profiler_attributes_samples_to_threads():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    worker = threading.Thread(
+        target=_hot_loop, args=(time.perf_counter() + 0.2,), name="neko-sg-region_0"
+    )
+    worker.start()
+    worker.join()
+    profiler.stop()
+    threads = {name: (total, busy, leaf) for name, total, busy, leaf in profiler.threads()}
+    assert threads["neko-sg-region_0"][1] > 0
+    assert threads["neko-sg-region_0"][2].startswith("_hot_loop (tests/test_profiling.py:")
+    assert profiler.hot_functions(1)[0][0].startswith("_hot_loop ")
+
+def test_finish_profile_writes_collapsed_stacks_and_summary(tmp_path, capsys):
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, name="neko-sg-region_1")
+    worker.start()
+    profiler = SamplingProfiler()
+    profiler.sample()
+    stop.set()
+    worker.join()
+    path = tmp_path / "scan.folded"
+    finish_profile(profiler, str(path), top=5)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert {line.split(";", 1)[0] for line in lines} == {"MainThread", "neko-sg-region_1"}
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    summary = (tmp_path / "scan.folded.txt").read_text(encoding="utf-8")
+    assert ["neko-sg-region_1", "1", "0%", "-"] in [line.split() for line in summary.splitlines()]
+    assert "SamplingProfiler.sample" in summary
+    assert "scan.folded" in capsys.readouterr().err
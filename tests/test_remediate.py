@@ -0,0 +1,163 @@
+import io
+import json
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from src.config import Config
+from src.remediate import (
+    GroupPlan,
+    RemediationResult,
+    build_plan,
+    load_findings,
+    remediate_command,
+    revoke,
+    rollback,
+)
+from src.utils import compile_exclusion_rules
+
+
+def _rule(rule_id, group_id, port, cidr="0.0.0.0/0", **extra):
+    rule = {
+        "SecurityGroupRuleId": rule_id,
+        "GroupId": group_id,
+        "IsEgress": False,
+        "IpProtocol": "tcp",
+        "FromPort": port,
+        "ToPort": port,
+    }
+    rule["CidrIpv6" if ":" in cidr else "CidrIpv4"] = cidr
+    rule.update(extra)
+    return rule
+
+RULES = {
+    "us-east-1": [
+        _rule("sgr-ssh", "sg-a", 22, Description="admin"),
+        _rule("sgr-https", "sg-a", 443),
+        _rule("sgr-v6", "sg-a", 80, "::/0"),
+        _rule("sgr-private", "sg-a", 3306, "10.0.0.0/8"),
+        _rule("sgr-egress", "sg-a", 0, IsEgress=True),
+        _rule("sgr-other", "sg-b", 22),
+    ],
+    "eu-west-1": [_rule("sgr-eu-1", "sg-c", 22), _rule("sgr-eu-2", "sg-c", 3389)],
+}
+
+def _dry_run_error(operation):
+    return ClientError({"Error": {"Code": "DryRunOperation", "Message": "ok"}}, operation)
+
+def test_load_findings_accepts_result_files(tmp_path):
+    finding = {"region": "us-east-1", "group_id": "sg-a"}
+    jsonl = tmp_path / "findings.jsonl"
+    jsonl.write_text(json.dumps(finding) + "\n" + json.dumps(finding) + "\n", encoding="utf-8")
+    shard = tmp_path / "shard.json"
+    shard.write_text(json.dumps({"shard": {}, "findings": [finding]}, indent=2), encoding="utf-8")
+    assert load_findings(str(jsonl)) == [finding, finding]
+    assert load_findings(str(shard)) == [finding]
+    # region / group_id のない検出結果は KeyError ではなく ValueError として報告する
+    jsonl.write_text(json.dumps({"group_name": "web"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_findings(str(jsonl))
+
+@mock.patch("src.remediate.get_security_group_rules")
+def test_plan_revoke_and_rollback(mock_get_rules, tmp_path):
+    mock_get_rules.side_effect = lambda region, config, client, group_ids: [
+        rule for rule in RULES[region] if rule["GroupId"] in group_ids
+    ]
+    clients = mock.Mock()
+    # HTTPS は除外ルールで許可されている
+    exclusion_index = compile_exclusion_rules(
+        [
+            {
+                "security_group_id": "sg-a",
+                "rules": [
+                    {"ip_address": "0.0.0.0/0", "protocol": "tcp", "port_range": {"from": 443, "to": 443}}
+                ],
+            }
+        ]
+    )
+    findings = [
+        {"region": "us-east-1", "group_id": "sg-a"},
+        {"region": "eu-west-1", "group_id": "sg-c", "rule_id": "sgr-eu-2"},
+    ]
+
+    plans = build_plan(findings, exclusion_index, clients, Config())
+    assert [(p.region, p.group_id, [r["SecurityGroupRuleId"] for r in p.rules]) for p in plans] == [
+        ("eu-west-1", "sg-c", ["sgr-eu-2"]),
+        ("us-east-1", "sg-a", ["sgr-ssh", "sgr-v6"]),
+    ]
+
+    stream = io.StringIO()
+    with mock.patch("src.remediate.REVOKE_BATCH_SIZE", 1):
+        result = revoke(plans, clients, rollback_stream=stream)
+    assert (result.groups, result.rules, result.failed) == (2, 3, [])
+    revoke_calls = clients.get.return_value.revoke_security_group_ingress.call_args_list
+    assert sorted(call.kwargs["SecurityGroupRuleIds"][0] for call in revoke_calls) == [
+        "sgr-eu-2",
+        "sgr-ssh",
+        "sgr-v6",
+    ]
+
+    rollback_file = tmp_path / "rollback.jsonl"
+    rollback_file.write_text(stream.getvalue(), encoding="utf-8")
+    authorize = clients.get.return_value.authorize_security_group_ingress
+    authorize.side_effect = [
+        None,
+        ClientError({"Error": {"Code": "InvalidPermission.Duplicate"}}, "AuthorizeSecurityGroupIngress"),
+        None,
+    ]
+    result = rollback(str(rollback_file), clients)
+    assert (result.rules, result.failed) == (3, [])
+    permissions = [call.kwargs["IpPermissions"][0] for call in authorize.call_args_list]
+    assert {
+        "IpProtocol": "tcp",
+        "FromPort": 22,
+        "ToPort": 22,
+        "IpRanges": [{"CidrIp": "0.0.0.0/0", "Description": "admin"}],
+    } in permissions
+    assert any(p.get("Ipv6Ranges") == [{"CidrIpv6": "::/0"}] for p in permissions)
+
+def test_revoke_dry_run_and_failures():
+    clients = mock.Mock()
+    ec2 = clients.get.return_value
+    plans = [
+        GroupPlan("us-east-1", "sg-a", [_rule("sgr-1", "sg-a", 22)]),
+        GroupPlan("us-east-1", "sg-b", [_rule("sgr-2", "sg-b", 22)]),
+    ]
+
+    def revoke_ingress(GroupId, SecurityGroupRuleIds, DryRun):
+        if GroupId == "sg-b":
+            raise ClientError({"Error": {"Code": "UnauthorizedOperation"}}, "RevokeSecurityGroupIngress")
+        raise _dry_run_error("RevokeSecurityGroupIngress")
+
+    ec2.revoke_security_group_ingress.side_effect = revoke_ingress
+    stream = io.StringIO()
+    result = revoke(plans, clients, dry_run=True, rollback_stream=stream)
+    assert result.rules == 1
+    assert [(region, group_id) for region, group_id, _ in result.failed] == [("us-east-1", "sg-b")]
+    assert all(call.kwargs["DryRun"] for call in ec2.revoke_security_group_ingress.call_args_list)
+    assert stream.getvalue() == ""
+
+@mock.patch("src.remediate.revoke", return_value=RemediationResult(groups=1, rules=1))
+@mock.patch("src.remediate.build_plan")
+@mock.patch("src.remediate.load_policy_rules", return_value=[])
+@mock.patch("src.remediate.load_exclusion_rules", return_value=[])
+@mock.patch("src.remediate.Config.from_env", return_value=Config(regions=["us-east-1"]))
+def test_remediate_command_writes_rollback_per_run(
+    mock_config, mock_rules, mock_policies, mock_plan, mock_revoke, tmp_path, monkeypatch
+):
+    """ロールバックファイルは実行ごとに作成し、既存のファイルには追記しない"""
+    monkeypatch.chdir(tmp_path)
+    findings = tmp_path / "findings.jsonl"
+    findings.write_text(json.dumps({"region": "us-east-1", "group_id": "sg-a"}) + "\n")
+    mock_plan.return_value = [GroupPlan("us-east-1", "sg-a", [_rule("sgr-ssh", "sg-a", 22)])]
+
+    assert remediate_command(input_path=str(findings)) == 0
+    created = sorted(p.name for p in tmp_path.glob("remediation-rollback-*.jsonl"))
+    assert len(created) == 1
+
+    assert remediate_command(input_path=str(findings), rollback_file=created[0]) == 1
+    assert mock_revoke.call_count == 1
+
+    findings.write_text(json.dumps({"group_id": "sg-a"}) + "\n")
+    assert remediate_command(input_path=str(findings)) == 1
@@ -0,0 +1,103 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from src.config import Config
+from src.inventory import InventoryCache
+from src.scanner import Scanner
+
+OPEN_SG = {
+    "GroupId": "sg-open",
+    "GroupName": "open",
+    "IpPermissions": [
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+    ],
+}
+CLOSED_SG = {"GroupId": "sg-closed", "GroupName": "closed", "IpPermissions": []}
+
+def _get_groups(region, config=None, client=None, group_ids=None):
+    groups = [OPEN_SG, CLOSED_SG] if region == "us-east-1" else []
+    return [sg for sg in groups if group_ids is None or sg["GroupId"] in group_ids]
+
+@mock.patch("src.utils.get_security_groups", side_effect=_get_groups)
+@mock.patch("src.scanner.get_all_regions", return_value=["us-east-1", "eu-west-1"])
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_scanner_reuses_resources_across_scans(mock_client, mock_regions, mock_get_groups):
+    worker_names = set()
+
+    def get_groups(*args, **kwargs):
+        worker_names.add(threading.current_thread().name)
+        return _get_groups(*args, **kwargs)
+
+    mock_get_groups.side_effect = get_groups
+    with Scanner(Config(), inventory=InventoryCache()) as scanner:
+        assert [f["group_id"] for f in scanner.scan()] == ["sg-open"]
+        executor = scanner._executor
+        assert [f["group_id"] for f in scanner.scan_iter()] == ["sg-open"]
+        # スレッドプールとリージョン一覧は2回目のスキャンでも使い回す
+        assert scanner._executor is executor
+        mock_regions.assert_called_once()
+        assert scanner.inventory.get("us-east-1", "sg-closed") == CLOSED_SG
+    assert all(name.startswith("neko-sg-region") for name in worker_names)
+    assert mock_get_groups.call_args.kwargs["client"] is mock.sentinel.client
+    with pytest.raises(RuntimeError):
+        scanner.scan()
+
+@mock.patch("src.scanner.get_security_groups", side_effect=_get_groups)
+@mock.patch("src.scanner.get_all_regions", return_value=["us-east-1", "eu-west-1"])
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_scanner_scan_group(mock_client, mock_regions, mock_get_groups):
+    inventory = InventoryCache()
+    scanner = Scanner(Config(), [{"security_group_id": "sg-excluded", "rules": []}], inventory=inventory)
+
+    # 在庫にないIDは全リージョンから検索する
+    findings = scanner.scan_group(["sg-open", "sg-closed", "sg-missing"])
+    assert [f["group_id"] for f in findings] == ["sg-open"]
+    assert sorted(c.args[0] for c in mock_get_groups.call_args_list) == ["eu-west-1", "us-east-1"]
+    assert mock_get_groups.call_args.kwargs["group_ids"] == ["sg-open", "sg-closed", "sg-missing"]
+    assert inventory.get("us-east-1", "sg-closed") == CLOSED_SG
+
+    # 在庫にあるIDはそのリージョンだけを取得する
+    mock_get_groups.reset_mock()
+    assert scanner.find_groups(["sg-closed"]) == [("us-east-1", CLOSED_SG)]
+    assert [c.args[0] for c in mock_get_groups.call_args_list] == ["us-east-1"]
+    assert scanner.find_groups([]) == []
+    scanner.close()
+
+@mock.patch("src.scanner.get_all_regions", return_value=["us-east-1"])
+def test_scanner_region_ttl_zero_always_refreshes(mock_regions):
+    """REGION_CACHE_TTL=0 はメモリ上にも保持せず毎回取得する"""
+    scanner = Scanner(Config(region_cache_ttl=0))
+    scanner.regions()
+    scanner.regions()
+    assert mock_regions.call_count == 2
+    scanner = Scanner(Config(region_cache_ttl=3600))
+    scanner.regions()
+    scanner.regions()
+    assert mock_regions.call_count == 3
+
+@mock.patch("src.utils.get_security_groups")
+@mock.patch("src.utils.ClientPool.get", return_value=mock.sentinel.client)
+def test_scanner_replaces_executor_with_hung_workers(mock_client, mock_get_groups):
+    """期限切れで打ち切ったワーカーが残っている場合は次のスキャンでスレッドプールを作り直す"""
+    release = threading.Event()
+
+    def get_groups(region, config=None, client=None):
+        if region == "eu-west-1":
+            release.wait(5)
+        return _get_groups(region)
+
+    mock_get_groups.side_effect = get_groups
+    config = Config(regions=["us-east-1", "eu-west-1"], region_deadline=0.2)
+    with Scanner(config) as scanner:
+        assert [f["group_id"] for f in scanner.scan()] == ["sg-open"]
+        # 応答を待ったままのワーカーがあるスレッドプールは手放す
+        assert scanner._executor is None
+        release.set()
+        scanner.scan()
+        executor = scanner._executor
+        assert executor is not None
+        # 正常に終わったスキャンの後はスレッドプールを使い回す
+        scanner.scan()
+        assert scanner._executor is executor
@@ -0,0 +1,92 @@
+import argparse
+import json
+from unittest import mock
+
+import pytest
+
+from src.config import Config
+from src.shard import (
+    apply_shard,
+    merge_command,
+    merge_shard_results,
+    parse_shard,
+    shard_of,
+    write_shard_result,
+)
+from src.utils import ScanReport
+
+REGIONS = [f"region-{i}" for i in range(30)]
+
+def test_parse_shard():
+    assert parse_shard("1/3") == (1, 3)
+    assert parse_shard("3/3") == (3, 3)
+    for value in ["0/3", "4/3", "1/0", "a/b", "3"]:
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(value)
+
+def test_shard_of_partitions_units():
+    shards = [shard_of("123456789012", region, 4) for region in REGIONS]
+    assert all(1 <= shard <= 4 for shard in shards)
+    assert len(set(shards)) == 4
+    # 実行ごとに同じ割り当てになる
+    assert shards == [shard_of("123456789012", region, 4) for region in REGIONS]
+    assert {shard_of("123456789012", region, 1) for region in REGIONS} == {1}
+
+@mock.patch("src.shard.get_all_regions", return_value=REGIONS)
+@mock.patch("src.shard.get_account_id", return_value="123456789012")
+def test_apply_shard(mock_account, mock_regions):
+    assigned = []
+    for index in range(1, 4):
+        config, account, regions = apply_shard(Config(), index, 3)
+        assert account == "123456789012"
+        assert config.regions == regions
+        assigned.extend(regions)
+    # 全ての単位がちょうど1つのシャードに割り当てられる
+    assert sorted(assigned) == sorted(REGIONS)
+
+def test_write_and_merge_shard_results(tmp_path, caplog):
+    finding = {"region": "us-east-1", "group_id": "sg-1", "group_name": "a", "description": ""}
+    paths = []
+    for index, findings, report in [
+        (1, [finding], ScanReport(completed=["us-east-1"])),
+        # 同じ検出結果は1件にまとめられる
+        (2, [finding, dict(finding, region="eu-west-1")], ScanReport(failed=["eu-west-1"])),
+    ]:
+        path = tmp_path / f"shard-{index}-of-3.json"
+        write_shard_result(str(path), index, 3, "123456789012", [], findings, report)
+        paths.append(str(path))
+    assert json.loads((tmp_path / "shard-1-of-3.json").read_text())["shard"] == {"index": 1, "count": 3}
+
+    findings, report = merge_shard_results(paths + [str(tmp_path / "missing.json")])
+    assert [(f["region"], f["group_id"]) for f in findings] == [
+        ("us-east-1", "sg-1"),
+        ("eu-west-1", "sg-1"),
+    ]
+    assert report.completed == ["us-east-1"]
+    assert report.failed == ["eu-west-1"]
+    assert "3" in caplog.text  # 3番目のシャードが欠けている
+
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_merge_command_notifies_once(mock_send, tmp_path):
+    path = tmp_path / "shard-1-of-1.json"
+    finding = {"region": "us-east-1", "group_id": "sg-1", "group_name": "a", "description": ""}
+    write_shard_result(str(path), 1, 1, "123", ["us-east-1"], [finding], ScanReport())
+    assert merge_command([str(path)]) == 0
+    mock_send.assert_called_once()
+    assert mock_send.call_args.args[1] == [finding]
+
+@mock.patch("src.shard.get_all_regions", return_value=REGIONS)
+@mock.patch("src.main.send_slack_notification_if_configured")
+def test_merge_command_marks_missing_shards_partial(mock_send, mock_regions, tmp_path):
+    """欠けているシャードの担当リージョンは未スキャンとして通知する"""
+    path = tmp_path / "shard-1-of-3.json"
+    mine = [region for region in REGIONS if shard_of("123", region, 3) == 1]
+    write_shard_result(str(path), 1, 3, "123", mine, [], ScanReport(completed=mine))
+    assert merge_command([str(path)]) == 0
+    report = mock_send.call_args.kwargs["report"]
+    assert report.is_partial
+    assert sorted(report.skipped) == sorted(set(REGIONS) - set(mine))
+
+    # 担当リージョンを求められない場合もシャード単位で不完全として扱う
+    findings, report = merge_shard_results([str(path)])
+    assert report.skipped == ["shard-2-of-3", "shard-3-of-3"]
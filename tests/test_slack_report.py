@@ -0,0 +1,124 @@
+import threading
+from unittest import mock
+
+from src.slack_report import (
+    MAX_BLOCKS,
+    MAX_SECTION_CHARS,
+    RateLimiter,
+    build_replies,
+    build_summary,
+    send_slack_report,
+    thread_complete,
+)
+from src.utils import ScanReport
+
+
+def _findings(count, regions=("ap-northeast-1", "eu-west-1", "us-east-1")):
+    return [
+        {
+            "region": regions[i % len(regions)],
+            "group_id": f"sg-{i:017x}",
+            "group_name": f"web-<{i}>",
+            "rule_id": f"sgr-{i:017x}",
+        }
+        for i in range(count)
+    ]
+
+def test_replies_fit_message_limits():
+    findings = _findings(3000)
+    replies = build_replies(findings)
+
+    text = "\n".join(
+        block["text"]["text"] for _, blocks in replies for block in blocks[1:]
+    )
+    assert sorted(line.split("`")[1] for line in text.splitlines()) == sorted(
+        f["group_id"] for f in findings
+    )
+    assert "web-&lt;1&gt;" in text
+    for _, blocks in replies:
+        assert len(blocks) <= MAX_BLOCKS
+        assert all(len(block["text"]["text"]) <= MAX_SECTION_CHARS for block in blocks)
+        assert sum(len(block["text"]["text"]) for block in blocks) < 40000
+    # 大きなリージョンは分割し、見出しに通番を付ける
+    assert [title for title, _ in replies][:2] == [
+        "ap-northeast-1（1000 件） 1/2",
+        "ap-northeast-1（1000 件） 2/2",
+    ]
+
+    report = ScanReport(completed=["us-east-1"], failed=["eu-west-1"])
+    text, blocks = build_summary(findings, report)
+    assert "3000 件" in text
+    assert "eu-west-1" in blocks[-1]["text"]["text"]
+
+def test_send_slack_report_threads_replies_concurrently():
+    client = mock.Mock()
+    threads = set()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def post_message(**kwargs):
+        if "thread_ts" not in kwargs:
+            return {"ok": True, "channel": "C123", "ts": "1700000000.000100"}
+        threads.add(threading.current_thread().name)
+        if kwargs["text"].startswith(("ap-northeast-1", "eu-west-1")):
+            # 2件の返信が同時に投稿されていることを確認する
+            barrier.wait()
+        if kwargs["text"].startswith("us-east-1"):
+            raise RuntimeError("channel_not_found")
+        return {"ok": True}
+
+    client.chat_postMessage.side_effect = post_message
+    assert send_slack_report(
+        client, "#alerts", _findings(30), concurrency=3, limiter=RateLimiter(rate=0)
+    )
+
+    calls = client.chat_postMessage.call_args_list
+    assert "thread_ts" not in calls[0].kwargs and calls[0].kwargs["channel"] == "#alerts"
+    replies = [call.kwargs for call in calls[1:]]
+    assert len(replies) == 3
+    assert {(r["channel"], r["thread_ts"]) for r in replies} == {("C123", "1700000000.000100")}
+    assert len(threads) >= 2
+
+def test_send_slack_report_without_summary_returns_false():
+    client = mock.Mock()
+    client.chat_postMessage.side_effect = RuntimeError("timeout")
+    assert not send_slack_report(client, "#alerts", _findings(3), limiter=RateLimiter(rate=0))
+    client.chat_postMessage.assert_called_once()
+
+def test_send_slack_report_retries_only_missing_replies():
+    """再試行では前回の進捗を使い、サマリーを送り直さず失敗した返信だけを投稿すること"""
+    client = mock.Mock()
+    failing = {"us-east-1"}
+
+    def post_message(**kwargs):
+        if "thread_ts" not in kwargs:
+            return {"ok": True, "channel": "C123", "ts": "1700000000.000100"}
+        if kwargs["text"].split("（")[0] in failing:
+            raise RuntimeError("ratelimited")
+        return {"ok": True}
+
+    client.chat_postMessage.side_effect = post_message
+    thread = {}
+    assert send_slack_report(
+        client, "#alerts", _findings(30), limiter=RateLimiter(rate=0), thread=thread
+    )
+    assert not thread_complete(thread)
+    assert thread["ts"] == "1700000000.000100" and len(thread["posted"]) == 2
+
+    failing.clear()
+    client.chat_postMessage.reset_mock()
+    assert send_slack_report(
+        client, "#alerts", _findings(30), limiter=RateLimiter(rate=0), thread=thread
+    )
+    assert thread_complete(thread)
+    calls = [call.kwargs for call in client.chat_postMessage.call_args_list]
+    assert [(c["thread_ts"], c["text"].split("（")[0]) for c in calls] == [
+        ("1700000000.000100", "us-east-1")
+    ]
+
+@mock.patch("src.slack_report.time.sleep")
+@mock.patch("src.slack_report.time.monotonic", return_value=100.0)
+def test_rate_limiter_spaces_posts_after_burst(mock_monotonic, mock_sleep):
+    limiter = RateLimiter(rate=2, burst=2)
+    for _ in range(4):
+        limiter.acquire()
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [0.5, 1.0]
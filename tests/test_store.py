@@ -0,0 +1,74 @@
+from unittest import mock
+
+import pytest
+
+from src.store import SnapshotStore, parse_filter, query_command
+from src.utils import ScanReport
+
+
+def _sg(group_id, name, permissions):
+    return {"GroupId": group_id, "GroupName": name, "Description": "", "IpPermissions": permissions}
+
+DB = _sg("sg-db", "db", [
+    {"IpProtocol": "tcp", "FromPort": 5432, "ToPort": 5432, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+])
+WEB = _sg("sg-web", "web", [
+    {"IpProtocol": "tcp", "FromPort": 80, "ToPort": 443, "IpRanges": [{"CidrIp": "10.0.0.0/8"}],
+     "Ipv6Ranges": [{"CidrIpv6": "::/0"}]},
+])
+ALL = _sg("sg-all", "all-traffic", [{"IpProtocol": "-1", "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}])
+
+@pytest.fixture
+def store(tmp_path):
+    with SnapshotStore(str(tmp_path / "inventory.db")) as store:
+        store.begin("123456789012")
+        store.replace_region("eu-west-1", [DB, WEB])
+        store.replace_region("us-east-1", [ALL])
+        store.record_finding({"region": "eu-west-1", "group_id": "sg-db"})
+        store.commit(ScanReport(completed=["eu-west-1", "us-east-1"]))
+        yield store
+
+def _query(store, *expressions):
+    return [(row["region"], row["group_id"], row["cidr"]) for row in store.query([parse_filter(e) for e in expressions])]
+
+def test_parse_filter():
+    assert parse_filter("port=5432").key == "port"
+    assert parse_filter("cidr!=0.0.0.0/0").negate
+    for expression in ["port", "port=abc", "color=red", "global=yes"]:
+        with pytest.raises(ValueError):
+            parse_filter(expression)
+
+def test_query_filters(store):
+    # 全プロトコルを許可するルールは全ポートに該当する
+    assert _query(store, "port=5432") == [
+        ("eu-west-1", "sg-db", "0.0.0.0/0"),
+        ("us-east-1", "sg-all", "0.0.0.0/0"),
+    ]
+    assert _query(store, "region=eu-west-1", "port=5432") == [("eu-west-1", "sg-db", "0.0.0.0/0")]
+    assert _query(store, "port=443", "global=true") == [
+        ("eu-west-1", "sg-web", "::/0"),
+        ("us-east-1", "sg-all", "0.0.0.0/0"),
+    ]
+    assert _query(store, "sg=sg-web", "cidr!=::/0") == [("eu-west-1", "sg-web", "10.0.0.0/8")]
+    assert _query(store, "protocol=all") == [("us-east-1", "sg-all", "0.0.0.0/0")]
+    assert _query(store, "name=w*") == [("eu-west-1", "sg-web", "10.0.0.0/8"), ("eu-west-1", "sg-web", "::/0")]
+    assert _query(store, "finding=true") == [("eu-west-1", "sg-db", "0.0.0.0/0")]
+
+def test_commit_keeps_latest_snapshot(store):
+    first = store.latest()["id"]
+    store.begin("123456789012")
+    store.replace_region("eu-west-1", [WEB])
+    # 確定前は直前のスナップショットを参照する
+    assert store.latest()["id"] == first
+    store.commit(ScanReport(failed=["us-east-1"]))
+    latest = store.latest()
+    assert latest["id"] != first
+    assert not latest["complete"]
+    assert {row["group_id"] for row in store.query([])} == {"sg-web"}
+
+def test_query_command(store, capsys):
+    with mock.patch("src.store.load_dotenv"):
+        assert query_command(["port=5432", "region=eu-west-1"], store.path, as_json=True) == 0
+        assert '"group_id": "sg-db"' in capsys.readouterr().out
+        assert query_command(["port=x"], store.path) == 1
+        assert query_command([], store.path + ".missing") == 1
@@ -0,0 +1,93 @@
+import json
+import threading
+from unittest import mock
+
+import pytest
+
+from src.config import Config
+from src.tracing import TRACER, Tracer, finish_trace
+from src.utils import find_globally_accessible_security_groups
+
+OPEN_SG = {
+    "GroupId": "sg-1",
+    "GroupName": "open",
+    "IpPermissions": [
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+    ],
+}
+
+@pytest.fixture
+def tracer():
+    TRACER.reset()
+    TRACER.enable()
+    yield TRACER
+    TRACER.reset()
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.span("run") as span:
+        assert span is None
+    assert list(tracer.traced([1, 2], "page")) == [1, 2]
+    assert tracer.start("run") is None
+    assert tracer.spans() == []
+
+def test_spans_nest_per_thread():
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span("run") as run:
+        with tracer.span("account", account="123") as account:
+            def scan_region():
+                with tracer.span("region", parent=account, region="eu-west-1"):
+                    pass
+
+            worker = threading.Thread(target=scan_region)
+            worker.start()
+            worker.join()
+    spans = {span.name: span for span in tracer.spans()}
+    assert spans["account"].parent is run
+    assert spans["region"].parent is account
+    assert spans["region"].thread_id != account.thread_id
+    assert spans["region"].attributes == {"region": "eu-west-1"}
+
+def test_traced_records_one_span_per_item():
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span("region"):
+        for page in tracer.traced([[1, 2], [3]], "page"):
+            tracer.annotate(page_size=len(page))
+            with tracer.span("evaluate"):
+                pass
+    spans = tracer.spans()
+    pages = [span for span in spans if span.name == "page"]
+    assert [span.attributes["page_size"] for span in pages] == [2, 1]
+    assert all("fetch_ms" in span.attributes for span in pages)
+    evaluations = [span for span in spans if span.name == "evaluate"]
+    assert [span.parent for span in evaluations] == pages
+
+def test_scan_trace_export(tracer, tmp_path):
+    client = mock.Mock()
+    client.get_paginator.return_value.paginate.return_value = [
+        {"SecurityGroups": [OPEN_SG], "ResponseMetadata": {"RetryAttempts": 1}}
+    ]
+    config = Config(regions=["eu-west-1", "us-east-1"], trace_file=str(tmp_path / "trace.json"))
+    with mock.patch("src.utils._create_ec2_client", return_value=client):
+        with tracer.span("run"):
+            found = list(find_globally_accessible_security_groups([], config))
+    assert len(found) == 2
+
+    finish_trace(config)
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    by_id = {event["args"]["span_id"]: event for event in events}
+    regions = [event for event in events if event["name"] == "region"]
+    assert sorted(event["args"]["region"] for event in regions) == ["eu-west-1", "us-east-1"]
+    assert all(by_id[event["args"]["parent_id"]]["name"] == "run" for event in regions)
+    pages = [event for event in events if event["name"] == "page"]
+    assert all(event["args"]["retries"] == 1 and event["args"]["page_size"] == 1 for event in pages)
+    assert all(by_id[event["args"]["parent_id"]]["name"] == "region" for event in pages)
+    evaluations = [event for event in events if event["name"] == "evaluate"]
+    assert all(by_id[event["args"]["parent_id"]]["name"] == "page" for event in evaluations)
+    # ワーカースレッドのリージョンには呼び出し元からのフローイベントがある
+    assert any(event["ph"] == "s" for event in trace["traceEvents"])
+    assert any(event["ph"] == "M" for event in trace["traceEvents"])
+    assert tracer.spans() == []
@@ -14,6 +14,14 @@ from src.utils import (
     get_security_groups,
     find_globally_accessible_security_groups,
     has_unexcluded_global_access,
+    ScanReport,
+    ExclusionIndex,
+    ClientPool,
+    evaluate_security_group_rule,
+    get_security_group_rules,
+    compact_security_group,
+    parse_expiry,
+    prune_expired_exclusions,
 )
 from src.config import Config
 
@@ -163,6 +171,19 @@ def test_load_exclusion_rules():
         assert len(rules) == 1
         assert rules[0]["security_group_id"] == "sg-123"
 
+    # 期限切れの除外ルールは読み込み時に取り除く
+    yaml_data = """
+    - security_group_id: sg-old
+      expires_at: 2000-01-01T00:00:00Z
+      rules: []
+    - security_group_id: sg-new
+      rules: []
+    """
+    with mock.patch("os.path.exists", return_value=True), \
+         mock.patch("builtins.open", mock.mock_open(read_data=yaml_data)):
+        rules = load_exclusion_rules("dummy.yaml")
+        assert [rule["security_group_id"] for rule in rules] == ["sg-new"]
+
 def test_format_slack_message():
     assert format_slack_message([]) == "グローバルにアクセス可能なセキュリティグループは見つかりませんでした。"
     
@@ -213,6 +234,54 @@ def test_get_all_regions(mock_session_class):
     assert regions == ["us-east-1", "us-west-2"]
     mock_session.client.assert_called_with("ec2", config=None)
 
+@mock.patch("boto3.session.Session")
+def test_get_all_regions_allowlist(mock_session_class):
+    config = Config(regions=["us-east-1", "ap-northeast-1"], excluded_regions=["ap-northeast-1"])
+    assert list(get_all_regions(config)) == ["us-east-1"]
+    # 許可リスト指定時はAPIを呼び出さない
+    mock_session_class.assert_not_called()
+
+@mock.patch("boto3.session.Session")
+def test_get_all_regions_cache(mock_session_class, tmp_path):
+    mock_ec2 = mock.Mock()
+    mock_ec2.describe_regions.return_value = {
+        "Regions": [{"RegionName": "us-east-1"}, {"RegionName": "eu-west-1"}]
+    }
+    mock_session_class.return_value.client.return_value = mock_ec2
+    cache_file = tmp_path / "cache" / "regions.json"
+    config = Config(region_cache_file=str(cache_file), excluded_regions=["eu-west-1"])
+
+    assert list(get_all_regions(config)) == ["us-east-1"]
+    assert cache_file.exists()
+    # オプトインしていないリージョンは除外して取得する
+    filters = mock_ec2.describe_regions.call_args.kwargs["Filters"]
+    assert filters[0]["Name"] == "opt-in-status"
+
+    # 2回目はキャッシュから読み込む
+    assert list(get_all_regions(config)) == ["us-east-1"]
+    assert mock_ec2.describe_regions.call_count == 1
+
+    # 有効期間を過ぎたキャッシュは使用しない
+    with mock.patch("src.utils.time.time", return_value=10**12):
+        list(get_all_regions(config))
+    assert mock_ec2.describe_regions.call_count == 2
+
+@mock.patch("boto3.session.Session")
+def test_get_all_regions_static(mock_session_class, tmp_path):
+    mock_session_class.return_value.get_available_regions.return_value = ["us-east-1", "us-west-2"]
+    config = Config(region_source="static", region_cache_file=str(tmp_path / "regions.json"))
+
+    assert list(get_all_regions(config)) == ["us-east-1", "us-west-2"]
+    mock_session_class.return_value.client.assert_not_called()
+    assert not (tmp_path / "regions.json").exists()
+
+    # describe_regions の結果のキャッシュがあればオプトイン済みのリージョンに絞り込む
+    (tmp_path / "regions.json").write_text(
+        '{"fetched_at": 0, "regions": ["us-east-1"]}', encoding="utf-8"
+    )
+    assert list(get_all_regions(config)) == ["us-east-1"]
+    mock_session_class.return_value.client.assert_not_called()
+
 @mock.patch("boto3.session.Session")
 def test_get_security_groups(mock_session_class):
     mock_session = mock.Mock()
@@ -230,6 +299,93 @@ def test_get_security_groups(mock_session_class):
     assert groups[0]["GroupId"] == "sg-1"
     mock_session.client.assert_called_with("ec2", region_name="us-east-1", config=None)
 
+    # IDを指定した場合は存在しないIDでエラーにならないようフィルターで取得する
+    list(get_security_groups("us-east-1", client=mock_ec2, group_ids=["sg-1", "sg-9"]))
+    mock_paginator.paginate.assert_called_with(
+        Filters=[{"Name": "group-id", "Values": ["sg-1", "sg-9"]}]
+    )
+
+@mock.patch("boto3.session.Session")
+def test_get_security_groups_vpc_partitioned(mock_session_class):
+    mock_ec2 = mock.Mock()
+    vpc_paginator = mock.Mock()
+    vpc_paginator.paginate.return_value = [{"Vpcs": [{"VpcId": "vpc-a"}, {"VpcId": "vpc-b"}]}]
+    sg_paginator = mock.Mock()
+
+    def paginate_groups(Filters):
+        vpc_id = Filters[0]["Values"][0]
+        if vpc_id == "vpc-a":
+            return [{"SecurityGroups": [{"GroupId": "sg-1"}, {"GroupId": "sg-2"}]}]
+        # 重複したグループは1件にまとめられる
+        return [{"SecurityGroups": [{"GroupId": "sg-2"}, {"GroupId": "sg-3"}]}]
+
+    sg_paginator.paginate.side_effect = paginate_groups
+    mock_ec2.get_paginator.side_effect = lambda name: (
+        vpc_paginator if name == "describe_vpcs" else sg_paginator
+    )
+    mock_session_class.return_value.client.return_value = mock_ec2
+
+    config = Config(vpc_partitioning=True, vpc_max_workers=2)
+    groups = list(get_security_groups("us-east-1", config))
+    assert sorted(g["GroupId"] for g in groups) == ["sg-1", "sg-2", "sg-3"]
+    assert sg_paginator.paginate.call_count == 2
+
+@mock.patch("src.utils.get_all_regions", return_value=["us-east-1"])
+@mock.patch("boto3.session.Session")
+def test_vpc_partitioned_failure_marks_region_incomplete(mock_session_class, mock_regions):
+    """一部のVPCの取得に失敗したリージョンは未完了とし、チェックポイントと在庫に記録しない"""
+    from botocore.exceptions import ClientError
+
+    mock_ec2 = mock.Mock()
+    vpc_paginator = mock.Mock()
+    vpc_paginator.paginate.return_value = [{"Vpcs": [{"VpcId": "vpc-a"}, {"VpcId": "vpc-b"}]}]
+    sg_paginator = mock.Mock()
+    open_sg = {
+        "GroupId": "sg-1",
+        "GroupName": "open",
+        "IpPermissions": [{"IpProtocol": "-1", "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}],
+    }
+
+    def paginate_groups(Filters):
+        if Filters[0]["Values"][0] == "vpc-a":
+            return [{"SecurityGroups": [open_sg]}]
+        raise ClientError({"Error": {"Code": "RequestLimitExceeded"}}, "DescribeSecurityGroups")
+
+    sg_paginator.paginate.side_effect = paginate_groups
+    mock_ec2.get_paginator.side_effect = lambda name: (
+        vpc_paginator if name == "describe_vpcs" else sg_paginator
+    )
+    mock_session_class.return_value.client.return_value = mock_ec2
+
+    report = ScanReport()
+    checkpoint = mock.Mock()
+    checkpoint.is_completed.return_value = False
+    inventory = mock.Mock()
+    found = list(find_globally_accessible_security_groups(
+        [], Config(vpc_partitioning=True), report=report, checkpoint=checkpoint, inventory=inventory
+    ))
+    assert [g["group_id"] for g in found] == ["sg-1"]
+    assert report.incomplete == ["us-east-1"] and report.completed == []
+    checkpoint.record.assert_not_called()
+    inventory.replace_region.assert_not_called()
+
+@mock.patch("boto3.session.Session")
+def test_get_security_groups_vpc_partitioned_single_vpc(mock_session_class):
+    mock_ec2 = mock.Mock()
+    vpc_paginator = mock.Mock()
+    vpc_paginator.paginate.return_value = [{"Vpcs": [{"VpcId": "vpc-a"}]}]
+    sg_paginator = mock.Mock()
+    sg_paginator.paginate.return_value = [{"SecurityGroups": [{"GroupId": "sg-1"}]}]
+    mock_ec2.get_paginator.side_effect = lambda name: (
+        vpc_paginator if name == "describe_vpcs" else sg_paginator
+    )
+    mock_session_class.return_value.client.return_value = mock_ec2
+
+    groups = list(get_security_groups("us-east-1", Config(vpc_partitioning=True)))
+    assert [g["GroupId"] for g in groups] == ["sg-1"]
+    # VPCが1つの場合はフィルタなしの通常ページングになる
+    sg_paginator.paginate.assert_called_once_with()
+
 @mock.patch("src.utils.get_all_regions")
 @mock.patch("src.utils.get_security_groups")
 def test_find_globally_accessible_security_groups(mock_get_groups, mock_get_regions):
@@ -259,6 +415,106 @@ def test_find_globally_accessible_security_groups(mock_get_groups, mock_get_regi
     assert results[0]["group_id"] == "sg-1"
     assert results[0]["region"] == "us-east-1"
 
+def _open_sg(group_id):
+    return {
+        "GroupId": group_id,
+        "GroupName": group_id,
+        "IpPermissions": [{"IpRanges": [{"CidrIp": "0.0.0.0/0"}], "Ipv6Ranges": []}],
+    }
+
+@mock.patch("src.utils.get_all_regions")
+@mock.patch("src.utils.get_security_groups")
+def test_find_region_deadline_partial(mock_get_groups, mock_get_regions):
+    import threading
+    release = threading.Event()
+    mock_get_regions.return_value = ["us-east-1", "ap-east-1"]
+
+    def get_groups(region, config=None, client=None):
+        if region == "ap-east-1":
+            yield _open_sg("sg-partial")
+            # 応答のないリージョンを模擬する
+            release.wait(5)
+            yield _open_sg("sg-late")
+            return
+        yield _open_sg("sg-ok")
+
+    mock_get_groups.side_effect = get_groups
+    report = ScanReport()
+    try:
+        results = list(find_globally_accessible_security_groups(
+            [], Config(region_deadline=0.2), report=report
+        ))
+    finally:
+        release.set()
+
+    assert sorted(r["group_id"] for r in results) == ["sg-ok", "sg-partial"]
+    assert report.completed == ["us-east-1"]
+    assert report.incomplete == ["ap-east-1"]
+    assert report.is_partial
+
+@mock.patch("src.utils.get_all_regions")
+@mock.patch("src.utils.get_security_groups")
+def test_find_region_deadline_hedge(mock_get_groups, mock_get_regions):
+    import threading
+    release = threading.Event()
+    calls = []
+    mock_get_regions.return_value = ["us-east-1"]
+
+    def get_groups(region, config=None, client=None):
+        calls.append(region)
+        if len(calls) == 1:
+            release.wait(5)
+        yield _open_sg("sg-1")
+
+    mock_get_groups.side_effect = get_groups
+    report = ScanReport()
+    try:
+        results = list(find_globally_accessible_security_groups(
+            [], Config(region_deadline=0.2, hedge_retry=True), report=report
+        ))
+    finally:
+        release.set()
+
+    # 再試行が完了したため結果は完全になる
+    assert [r["group_id"] for r in results] == ["sg-1"]
+    assert len(calls) == 2
+    assert report.completed == ["us-east-1"]
+    assert not report.is_partial
+
+@mock.patch("src.utils.get_all_regions")
+@mock.patch("src.utils.get_security_groups")
+def test_find_scan_deadline_skips_regions(mock_get_groups, mock_get_regions):
+    import threading
+    release = threading.Event()
+    mock_get_regions.return_value = ["us-east-1"]
+
+    def get_groups(region, config=None, client=None):
+        release.wait(5)
+        yield _open_sg("sg-1")
+
+    mock_get_groups.side_effect = get_groups
+    report = ScanReport()
+    try:
+        results = list(find_globally_accessible_security_groups(
+            [], Config(scan_deadline=0.2), report=report
+        ))
+    finally:
+        release.set()
+
+    assert results == []
+    assert report.incomplete == ["us-east-1"]
+
+def test_format_slack_message_partial():
+    report = ScanReport(incomplete=["ap-east-1"], skipped=["me-south-1"])
+    msg = format_slack_message([], report)
+    assert "見つかりませんでした" in msg
+    assert "ap-east-1" in msg
+    assert "me-south-1" in msg
+
+    msg = format_slack_message([{"region": "us-east-1", "group_id": "sg-1", "group_name": "n"}], report)
+    assert "sg-1" in msg
+    assert "ap-east-1" in msg
+
 def test_has_unexcluded_global_access():
     # 1. 除外ルールなし、グローバルアクセスあり -> True
     sg_global = {
@@ -323,3 +579,266 @@ def test_has_unexcluded_global_access():
         }
     ]
     assert has_unexcluded_global_access(sg_mixed, rules_ssh_only)
+
+def test_exclusion_index_matches_list_semantics():
+    rules = [
+        {
+            "security_group_id": "sg-123",
+            "rules": [
+                {"ip_address": "0.0.0.0/0", "protocol": "tcp", "port_range": {"from": 80, "to": 80}},
+                {"ip_address": "::/0", "protocol": "icmpv6", "port_range": {"from": "-1", "to": "-1"}},
+                {"ip_address": "0.0.0.0/0", "protocol": "tcp", "port_range": {"from": "bad", "to": 1}},
+            ],
+        }
+    ]
+    index = ExclusionIndex(rules)
+    assert len(index) == 1
+    sgs = [
+        {
+            "GroupId": "sg-123",
+            "IpPermissions": [
+                {"IpProtocol": "tcp", "FromPort": 80, "ToPort": 80, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+            ],
+        },
+        {
+            "GroupId": "sg-123",
+            "IpPermissions": [
+                {"IpProtocol": "icmpv6", "FromPort": -1, "ToPort": -1, "Ipv6Ranges": [{"CidrIpv6": "::/0"}]},
+                {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+            ],
+        },
+        {
+            "GroupId": "sg-999",
+            "IpPermissions": [
+                {"IpProtocol": "tcp", "FromPort": 80, "ToPort": 80, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+            ],
+        },
+    ]
+    for sg in sgs:
+        assert has_unexcluded_global_access(sg, index) == has_unexcluded_global_access(sg, rules)
+
+@mock.patch("boto3.session.Session")
+def test_client_pool_reuses_clients(mock_session_class):
+    mock_session_class.return_value.client.side_effect = lambda *a, **k: mock.Mock()
+    pool = ClientPool(Config())
+    assert pool.get("us-east-1") is pool.get("us-east-1")
+    assert pool.get("us-east-1") is not pool.get("eu-west-1")
+    pool.clear()
+    assert mock_session_class.return_value.client.call_count == 2
+
+@mock.patch("src.utils.get_all_regions")
+@mock.patch("src.utils.get_security_groups")
+def test_find_records_inventory(mock_get_groups, mock_get_regions):
+    from src.inventory import InventoryCache
+    mock_get_regions.return_value = ["us-east-1"]
+    mock_get_groups.return_value = [_open_sg("sg-1"), {"GroupId": "sg-2", "GroupName": "p", "IpPermissions": []}]
+    inventory = InventoryCache()
+
+    results = list(find_globally_accessible_security_groups([], inventory=inventory))
+    assert [r["group_id"] for r in results] == ["sg-1"]
+    assert sorted(sg["GroupId"] for sg in inventory.groups("us-east-1")) == ["sg-1", "sg-2"]
+
+def _rule(rule_id, group_id="sg-1", cidr="0.0.0.0/0", is_egress=False, port=22):
+    return {
+        "SecurityGroupRuleId": rule_id,
+        "GroupId": group_id,
+        "IsEgress": is_egress,
+        "IpProtocol": "tcp",
+        "FromPort": port,
+        "ToPort": port,
+        "CidrIpv4": cidr,
+    }
+
+@mock.patch("boto3.session.Session")
+def test_get_security_group_rules(mock_session_class):
+    mock_ec2 = mock.Mock()
+    mock_ec2.get_paginator.return_value.paginate.return_value = [
+        {"SecurityGroupRules": [_rule("sgr-1"), _rule("sgr-2")]}
+    ]
+    mock_session_class.return_value.client.return_value = mock_ec2
+
+    rules = list(get_security_group_rules("us-east-1", group_ids=["sg-1"]))
+    assert [r["SecurityGroupRuleId"] for r in rules] == ["sgr-1", "sgr-2"]
+    mock_ec2.get_paginator.assert_called_with("describe_security_group_rules")
+    # グループIDはサーバー側のフィルタで指定する
+    mock_ec2.get_paginator.return_value.paginate.assert_called_with(
+        Filters=[{"Name": "group-id", "Values": ["sg-1"]}]
+    )
+
+def test_evaluate_security_group_rule():
+    exclusion_index = ExclusionIndex([
+        {"security_group_id": "sg-1", "rules": [{"security_group_rule_id": "sgr-excluded"}]},
+        {
+            "security_group_id": "sg-1",
+            "rules": [
+                {"ip_address": "0.0.0.0/0", "protocol": "tcp", "port_range": {"from": 443, "to": 443}}
+            ],
+        },
+    ])
+    finding = evaluate_security_group_rule(_rule("sgr-1"), "us-east-1", exclusion_index)
+    assert finding["rule_id"] == "sgr-1"
+    assert finding["group_id"] == "sg-1"
+
+    # ルールID・CIDRとポートによる除外、アウトバウンド、プライベートCIDRは対象外
+    assert evaluate_security_group_rule(_rule("sgr-excluded"), "us-east-1", exclusion_index) is None
+    assert evaluate_security_group_rule(_rule("sgr-2", port=443), "us-east-1", exclusion_index) is None
+    assert evaluate_security_group_rule(_rule("sgr-3", is_egress=True), "us-east-1", exclusion_index) is None
+    assert evaluate_security_group_rule(_rule("sgr-4", cidr="10.0.0.0/8"), "us-east-1", exclusion_index) is None
+
+    ipv6 = {"SecurityGroupRuleId": "sgr-5", "GroupId": "sg-2", "IpProtocol": "-1", "CidrIpv6": "::/0"}
+    assert evaluate_security_group_rule(ipv6, "us-east-1", exclusion_index)["rule_id"] == "sgr-5"
+
+@mock.patch("src.utils.get_all_regions", return_value=["us-east-1"])
+@mock.patch("src.utils.get_security_group_rules")
+@mock.patch("src.utils.get_security_groups")
+def test_find_rules_mode(mock_get_groups, mock_get_rules, mock_get_regions):
+    mock_get_rules.return_value = [_rule("sgr-1"), _rule("sgr-2", cidr="10.0.0.0/8")]
+    client = mock.Mock()
+    client.describe_security_groups.return_value = {
+        "SecurityGroups": [{"GroupId": "sg-1", "GroupName": "web", "Description": "Web"}]
+    }
+    clients = mock.Mock()
+    clients.get.return_value = client
+
+    results = list(
+        find_globally_accessible_security_groups([], Config(fetch_mode="rules"), clients=clients)
+    )
+    assert results == [
+        {
+            "region": "us-east-1",
+            "group_id": "sg-1",
+            "group_name": "web",
+            "description": "Web",
+            "rule_id": "sgr-1",
+        }
+    ]
+    mock_get_groups.assert_not_called()
+    # 検出されたグループの名前だけをまとめて取得する
+    client.describe_security_groups.assert_called_once_with(GroupIds=["sg-1"])
+    assert "ルールID: sgr-1" in format_slack_message(results)
+
+def _full_sg(i):
+    """describe_security_groups の応答に近いセキュリティグループ"""
+    return {
+        "GroupId": f"sg-{i:017x}",
+        "GroupName": f"app-{i}-sg",
+        "Description": f"Security group for service {i}",
+        "OwnerId": "123456789012",
+        "VpcId": f"vpc-{i % 50:017x}",
+        "SecurityGroupArn": f"arn:aws:ec2:us-east-1:123456789012:security-group/sg-{i:017x}",
+        "IpPermissions": [
+            {
+                "IpProtocol": "tcp",
+                "FromPort": 443,
+                "ToPort": 443,
+                "IpRanges": [
+                    {"CidrIp": "0.0.0.0/0", "Description": "public https"},
+                    {"CidrIp": f"10.{i % 256}.0.0/16", "Description": "internal"},
+                ],
+                "Ipv6Ranges": [{"CidrIpv6": "::/0", "Description": "public https v6"}],
+                "PrefixListIds": [],
+                "UserIdGroupPairs": [],
+            },
+            {
+                "IpProtocol": "tcp",
+                "FromPort": 5432,
+                "ToPort": 5432,
+                "IpRanges": [],
+                "Ipv6Ranges": [],
+                "PrefixListIds": [],
+                "UserIdGroupPairs": [
+                    {"GroupId": f"sg-{i + 1:017x}", "UserId": "123456789012", "Description": "app"}
+                ],
+            },
+        ],
+        "IpPermissionsEgress": [
+            {"IpProtocol": "-1", "IpRanges": [{"CidrIp": "0.0.0.0/0"}], "Ipv6Ranges": []}
+        ],
+        "Tags": [{"Key": "Name", "Value": f"app-{i}"}, {"Key": "env", "Value": "prod"}],
+    }
+
+def test_compact_security_group():
+    sg = _full_sg(1)
+    compact = compact_security_group(sg)
+    assert set(compact) == {"GroupId", "GroupName", "Description", "IpPermissions", "Tags"}
+    # CIDRを含まないパーミッションと説明は取り除かれる
+    assert compact["IpPermissions"] == [
+        {
+            "IpProtocol": "tcp",
+            "FromPort": 443,
+            "ToPort": 443,
+            "IpRanges": [{"CidrIp": "0.0.0.0/0"}, {"CidrIp": "10.1.0.0/16"}],
+            "Ipv6Ranges": [{"CidrIpv6": "::/0"}],
+        }
+    ]
+    # 評価結果は縮小前と変わらない
+    assert has_unexcluded_global_access(compact, []) == has_unexcluded_global_access(sg, [])
+    assert "Tags" not in compact_security_group({"GroupId": "sg-2", "IpPermissions": []})
+
+def test_compact_security_group_memory():
+    import gc
+    import json
+    import tracemalloc
+
+    def measure(project):
+        gc.collect()
+        tracemalloc.start()
+        groups = [project(json.loads(json.dumps(_full_sg(i)))) for i in range(1000)]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del groups
+        return current
+
+    assert measure(compact_security_group) < measure(lambda sg: sg) * 0.5
+
+@mock.patch("boto3.session.Session")
+def test_get_security_groups_releases_raw_pages(mock_session_class):
+    mock_ec2 = mock_session_class.return_value.client.return_value
+    mock_ec2.get_paginator.return_value.paginate.return_value = [
+        {"SecurityGroups": [_full_sg(1)]}
+    ]
+    groups = list(get_security_groups("us-east-1"))
+    assert "IpPermissionsEgress" not in groups[0]
+    assert "OwnerId" not in groups[0]
+
+def test_exclusion_index_skips_expired_rules():
+    """期限切れの除外ルールは索引に含めず、残りの期限を記録する"""
+    sg = {
+        "GroupId": "sg-1",
+        "IpPermissions": [
+            {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+        ],
+    }
+    ssh = {"ip_address": "0.0.0.0/0", "protocol": "tcp", "port_range": {"from": 22, "to": 22}}
+    rules = [
+        {"security_group_id": "sg-1", "expires_at": "2026-01-01T00:00:00Z", "rules": [ssh]},
+        {"security_group_id": "sg-2", "rules": [{**ssh, "expires_at": "2026-03-01"}, ssh]},
+    ]
+    now = parse_expiry("2026-02-01T00:00:00+00:00")
+    index = ExclusionIndex(rules, now=now - 86400 * 60)
+    assert not has_unexcluded_global_access(sg, index)
+    assert index.next_expiry == parse_expiry("2026-01-01T00:00:00")
+
+    index = ExclusionIndex(rules, now=now)
+    assert index.expired == 1
+    assert has_unexcluded_global_access(sg, index)
+    assert index.expiries == [(parse_expiry("2026-03-01T00:00:00Z"), "sg-2")]
+
+    # 期限付きのルールだけを取り除き、ルールが残らないエントリは削除する
+    kept, removed = prune_expired_exclusions(rules, now=now)
+    assert removed == 1
+    assert [rule["security_group_id"] for rule in kept] == ["sg-2"]
+    kept, removed = prune_expired_exclusions(rules, now=parse_expiry("2026-04-01"))
+    assert removed == 2
+    assert kept == [{"security_group_id": "sg-2", "rules": [ssh]}]
+
+def test_parse_expiry():
+    import datetime
+
+    assert parse_expiry(None) is None
+    assert parse_expiry(1700000000) == 1700000000.0
+    assert parse_expiry(datetime.date(1970, 1, 2)) == 86400.0
+    assert parse_expiry(datetime.datetime(1970, 1, 1, 1)) == 3600.0
+    assert parse_expiry("1970-01-01T09:00:00+09:00") == 0.0
+    # 解釈できない値は無期限として扱う
+    assert parse_expiry("next week") is None